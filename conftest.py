@@ -3,4 +3,14 @@ from pathlib import Path
 
 ROOT = Path(__file__).resolve().parent
 if str(ROOT) not in sys.path:
-    sys.path.insert(0, str(ROOT)) 
\ No newline at end of file
+    sys.path.insert(0, str(ROOT)) 
+
+
+class FakeClock:
+    """Settable stand-in for time.time/time.monotonic; advance it by assigning to ``now``."""
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
@@ -0,0 +1,93 @@
+import sys
+import time
+import argparse
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Add project root to the Python path
+project_root = Path(__file__).resolve().parent
+sys.path.insert(0, str(project_root))
+
+load_dotenv()
+
+from src.intent_classifier import (
+    INTENT_CLASSIFIER_MIN_COVERAGE,
+    INTENT_CLASSIFIER_THRESHOLD,
+    IntentClassifier,
+    load_corpus,
+    load_logged_examples,
+)
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _report(name, results, latencies):
+    correct = sum(1 for predicted, expected in results if predicted == expected)
+    answered = [(p, e) for p, e in results if p is not None]
+    answered_correct = sum(1 for p, e in answered if p == e)
+    print(f"\n--- {name} ---")
+    print(f"examples:            {len(results)}")
+    print(f"accuracy:            {correct / len(results):.3f}")
+    print(f"answered locally:    {len(answered) / len(results):.3f}")
+    if answered:
+        print(f"accuracy (answered): {answered_correct / len(answered):.3f}")
+    print(f"latency p50 / p99:   {_percentile(latencies, 50) * 1000:.3f} ms / {_percentile(latencies, 99) * 1000:.3f} ms")
+
+
+def evaluate_classifier(examples, folds, threshold, min_coverage):
+    """k-fold cross-validation: every example is scored by a model that did not see it."""
+    top1, gated, latencies = [], [], []
+    for k in range(folds):
+        train = [ex for i, ex in enumerate(examples) if i % folds != k]
+        test = [ex for i, ex in enumerate(examples) if i % folds == k]
+        model = IntentClassifier().fit(train)
+        for text, expected in test:
+            start = time.perf_counter()
+            predicted, _, _ = model.predict(text)
+            latencies.append(time.perf_counter() - start)
+            top1.append((predicted, expected))
+            gated.append((model.classify(text, threshold, min_coverage), expected))
+    _report(f"Classifier ({folds}-fold, top-1)", top1, latencies)
+    _report(f"Classifier (threshold {threshold}, coverage {min_coverage})", gated, latencies)
+
+
+def evaluate_llm(examples, model_type):
+    """Baseline: the Gemini model currently used for first-pass intent parsing (uncached)."""
+    from src.intent_cache import IntentCache
+    from src.nlp import NLPClient
+
+    client = NLPClient(cache=IntentCache(ttl_secs=0, persist=False))
+    results, latencies = [], []
+    for text, expected in examples:
+        start = time.perf_counter()
+        parsed = client.parse_intent(text, model_type=model_type)
+        latencies.append(time.perf_counter() - start)
+        results.append((parsed.get("intent"), expected))
+    _report(f"Gemini {model_type}", results, latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline evaluation of the local intent classifier.")
+    parser.add_argument("--corpus", help="labelled JSON lines (default: INTENT_CORPUS_PATH)")
+    parser.add_argument("--logged", action="store_true", help="also use parses logged in the intent_cache table")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=INTENT_CLASSIFIER_THRESHOLD)
+    parser.add_argument("--min-coverage", type=float, default=INTENT_CLASSIFIER_MIN_COVERAGE)
+    parser.add_argument("--llm", choices=["flash", "pro"], help="also score this Gemini model (needs GEMINI_API_KEY)")
+    args = parser.parse_args()
+
+    examples = load_corpus(args.corpus)
+    if args.logged:
+        examples += load_logged_examples()
+    evaluate_classifier(examples, args.folds, args.threshold, args.min_coverage)
+    if args.llm:
+        evaluate_llm(examples, args.llm)
+
+
+if __name__ == "__main__":
+    main()
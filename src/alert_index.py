@@ -0,0 +1,160 @@
+import os
+import time
+import bisect
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Full reloads from the alerts table only guard against out-of-band edits;
+# normal inserts/deactivations update the index incrementally.
+ALERT_INDEX_RECONCILE_SECS = float(os.getenv("ALERT_INDEX_RECONCILE_SECS", "3600"))
+
+
+@dataclass(frozen=True)
+class IndexedAlert:
+    alert_id: int
+    user_id: int
+    symbol: str
+    target_price: float
+    condition: str  # 'above' or 'below'
+
+
+class AlertIndex:
+    """In-memory, per-symbol sorted index of active alert thresholds.
+
+    Each symbol keeps two lists of ``(target_price, alert_id)`` sorted
+    ascending: one for ``above`` alerts and one for ``below`` alerts. For a
+    new price every crossed alert sits at one end of its list, so triggering
+    is a bisect plus a slice instead of a scan over every alert.
+    """
+
+    def __init__(self, reconcile_secs: float | None = None):
+        self.reconcile_secs = reconcile_secs if reconcile_secs is not None else ALERT_INDEX_RECONCILE_SECS
+        self._lock = threading.Lock()
+        self._above: Dict[str, List[Tuple[float, int]]] = {}
+        self._below: Dict[str, List[Tuple[float, int]]] = {}
+        self._alerts: Dict[int, IndexedAlert] = {}
+        self._loaded_at: float | None = None
+
+    # ------------------------------------------------------------------
+    # Internal helpers (call with self._lock held)
+    # ------------------------------------------------------------------
+    def _side(self, condition: str) -> Dict[str, List[Tuple[float, int]]] | None:
+        if condition == "above":
+            return self._above
+        if condition == "below":
+            return self._below
+        return None
+
+    def _insert(self, alert: IndexedAlert) -> None:
+        side = self._side(alert.condition)
+        if side is None:
+            logger.warning("Ignoring alert %s with unknown condition %r", alert.alert_id, alert.condition)
+            return
+        if alert.alert_id in self._alerts:
+            self._remove(alert.alert_id)
+        bisect.insort(side.setdefault(alert.symbol, []), (alert.target_price, alert.alert_id))
+        self._alerts[alert.alert_id] = alert
+
+    def _remove(self, alert_id: int) -> IndexedAlert | None:
+        alert = self._alerts.pop(alert_id, None)
+        if alert is None:
+            return None
+        entries = self._side(alert.condition).get(alert.symbol, [])
+        entry = (alert.target_price, alert.alert_id)
+        i = bisect.bisect_left(entries, entry)
+        if i < len(entries) and entries[i] == entry:
+            del entries[i]
+        return alert
+
+    @staticmethod
+    def _make(alert_id, user_id, symbol, target_price, condition) -> IndexedAlert:
+        return IndexedAlert(int(alert_id), user_id, symbol.upper(), float(target_price), condition.lower())
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    @property
+    def needs_reload(self) -> bool:
+        """True before the first load and once the reconcile interval has elapsed."""
+        with self._lock:
+            return self._loaded_at is None or time.monotonic() - self._loaded_at >= self.reconcile_secs
+
+    def load(self, rows: Iterable[tuple]) -> None:
+        """Rebuild the index from ``(id, user_id, symbol, target_price, condition)`` rows."""
+        alerts = [self._make(*row) for row in rows]
+        with self._lock:
+            self._above.clear()
+            self._below.clear()
+            self._alerts.clear()
+            for alert in alerts:
+                side = self._side(alert.condition)
+                if side is None:
+                    continue
+                side.setdefault(alert.symbol, []).append((alert.target_price, alert.alert_id))
+                self._alerts[alert.alert_id] = alert
+            for side in (self._above, self._below):
+                for entries in side.values():
+                    entries.sort()
+            self._loaded_at = time.monotonic()
+        logger.info("Alert index loaded with %s active alert(s)", len(alerts))
+
+    def add(self, alert_id: int, user_id: int, symbol: str, target_price: float, condition: str) -> None:
+        """Index a newly created alert."""
+        alert = self._make(alert_id, user_id, symbol, target_price, condition)
+        with self._lock:
+            self._insert(alert)
+
+    def restore(self, alerts: Iterable[IndexedAlert]) -> None:
+        """Put previously popped alerts back (e.g. when their notification failed)."""
+        with self._lock:
+            for alert in alerts:
+                self._insert(alert)
+
+    def remove(self, alert_id: int) -> bool:
+        """Drop a deactivated alert; returns False if it was not indexed."""
+        with self._lock:
+            return self._remove(alert_id) is not None
+
+    def symbols(self) -> List[str]:
+        """Symbols that currently have at least one active alert."""
+        with self._lock:
+            return sorted({alert.symbol for alert in self._alerts.values()})
+
+    def pop_triggered(self, symbol: str, price: float) -> List[IndexedAlert]:
+        """Remove and return every alert on *symbol* crossed by *price*.
+
+        ``above`` fires when ``price > target`` (a prefix of the ascending list);
+        ``below`` fires when ``price < target`` (a suffix of the ascending list).
+        """
+        symbol = symbol.upper()
+        with self._lock:
+            above = self._above.get(symbol, [])
+            cut = bisect.bisect_left(above, (price,))
+            fired = above[:cut]
+            del above[:cut]
+
+            below = self._below.get(symbol, [])
+            cut = bisect.bisect_right(below, (price, float("inf")))
+            fired.extend(below[cut:])
+            del below[cut:]
+
+            return [self._alerts.pop(alert_id) for _, alert_id in fired]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._above.clear()
+            self._below.clear()
+            self._alerts.clear()
+            self._loaded_at = None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._alerts)
+
+
+# Singleton index shared by the Telegram handlers and the monitoring task
+alert_index = AlertIndex()
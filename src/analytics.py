@@ -0,0 +1,295 @@
+import os
+import logging
+import warnings
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from psycopg2.extras import Json, execute_values
+
+from src.database import db_connection
+from src.exceptions import DatabaseConnectionError
+
+logger = logging.getLogger(__name__)
+
+# Look-back windows (days) precomputed for every user by the nightly job
+ANALYTICS_WINDOWS_DAYS = [int(d) for d in os.getenv("ANALYTICS_WINDOWS_DAYS", "7,30,90").split(",") if d.strip()]
+ANALYTICS_VOL_WINDOW_DAYS = int(os.getenv("ANALYTICS_VOL_WINDOW_DAYS", "7"))  # rolling volatility window
+ANALYTICS_RISK_FREE_RATE = float(os.getenv("ANALYTICS_RISK_FREE_RATE", "0.0"))  # annual, e.g. 0.04
+ANALYTICS_RUN_HOUR_UTC = int(os.getenv("ANALYTICS_RUN_HOUR_UTC", "2"))  # the monitor runs the job after this hour
+
+PERIODS_PER_YEAR = 365  # crypto trades every day
+
+
+# ----------------------------------------------------------------------
+# Vectorised metrics. Every function takes a (users x days) float matrix
+# with NaN for missing observations and returns one value (or row) per user.
+# ----------------------------------------------------------------------
+def forward_fill(values: np.ndarray) -> np.ndarray:
+    """Carry the last observed value over missing days (leading gaps stay NaN)."""
+    observed = ~np.isnan(values)
+    idx = np.where(observed, np.arange(values.shape[1]), 0)
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    return values[np.arange(values.shape[0])[:, None], idx]
+
+
+def daily_returns(values: np.ndarray) -> np.ndarray:
+    """Simple day-over-day returns, shape (users, days - 1); NaN where undefined."""
+    prev, curr = values[:, :-1], values[:, 1:]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = curr / prev - 1
+    returns[~np.isfinite(returns) | (prev <= 0)] = np.nan
+    return returns
+
+
+def total_return(values: np.ndarray) -> np.ndarray:
+    """Last value over the first observed value in the window, minus one."""
+    filled = forward_fill(values)
+    first = filled[np.arange(filled.shape[0]), np.argmax(~np.isnan(filled), axis=1)]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = filled[:, -1] / first - 1
+    result[~np.isfinite(result)] = np.nan
+    return result
+
+
+def rolling_volatility(returns: np.ndarray, window: int) -> np.ndarray:
+    """Annualised standard deviation over each *window*-day slice, shape (users, days - window + 1)."""
+    if returns.shape[1] < window:
+        return np.full((returns.shape[0], 0), np.nan)
+    slices = sliding_window_view(returns, window, axis=1)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN / single-sample slices
+        return np.nanstd(slices, axis=2, ddof=1) * np.sqrt(PERIODS_PER_YEAR)
+
+
+def volatility(returns: np.ndarray) -> np.ndarray:
+    """Annualised standard deviation of daily returns over the whole window."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return np.nanstd(returns, axis=1, ddof=1) * np.sqrt(PERIODS_PER_YEAR)
+
+
+def max_drawdown(values: np.ndarray) -> np.ndarray:
+    """Largest peak-to-trough fall as a negative fraction (0 if the value never fell)."""
+    filled = forward_fill(values)
+    peaks = np.fmax.accumulate(filled, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drawdowns = filled / peaks - 1
+    drawdowns[~np.isfinite(drawdowns)] = np.nan
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return np.nanmin(drawdowns, axis=1)
+
+
+def _annualised_ratio(mean: np.ndarray, deviation: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = mean / deviation * np.sqrt(PERIODS_PER_YEAR)
+    ratio[~np.isfinite(ratio)] = np.nan
+    return ratio
+
+
+def sharpe_ratio(returns: np.ndarray, risk_free_rate: float = 0.0) -> np.ndarray:
+    excess = returns - risk_free_rate / PERIODS_PER_YEAR
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return _annualised_ratio(np.nanmean(excess, axis=1), np.nanstd(excess, axis=1, ddof=1))
+
+
+def sortino_ratio(returns: np.ndarray, risk_free_rate: float = 0.0) -> np.ndarray:
+    """Like Sharpe, but only returns below the risk-free rate count as risk."""
+    excess = returns - risk_free_rate / PERIODS_PER_YEAR
+    downside = np.where(excess < 0, excess, 0.0)
+    downside[np.isnan(excess)] = np.nan
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return _annualised_ratio(np.nanmean(excess, axis=1), np.sqrt(np.nanmean(downside ** 2, axis=1)))
+
+
+def asset_contributions(quantities: np.ndarray, start_prices: np.ndarray, end_prices: np.ndarray) -> np.ndarray:
+    """Each asset's share of the window return, shape (users, assets).
+
+    Prices the current *quantities* at the window's start and end prices, so
+    rows sum to the return of holding today's portfolio over the window.
+    Assets without a start price contribute NaN and are left out of the base.
+    """
+    start_values = quantities * start_prices
+    pnl = quantities * (end_prices - start_prices)
+    base = np.nansum(start_values, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        contributions = pnl / base[:, None]
+    contributions[~np.isfinite(contributions)] = np.nan
+    return contributions
+
+
+def compute_metrics(values: np.ndarray, risk_free_rate: float = 0.0, vol_window: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """All per-user window metrics for a (users x days) portfolio value matrix."""
+    vol_window = vol_window or ANALYTICS_VOL_WINDOW_DAYS
+    filled = forward_fill(values)
+    returns = daily_returns(filled)
+    rolling = rolling_volatility(returns, vol_window)
+    return {
+        "total_return": total_return(values),
+        "volatility": volatility(returns),
+        "rolling_volatility": rolling[:, -1] if rolling.shape[1] else np.full(values.shape[0], np.nan),
+        "max_drawdown": max_drawdown(values),
+        "sharpe": sharpe_ratio(returns, risk_free_rate),
+        "sortino": sortino_ratio(returns, risk_free_rate),
+    }
+
+
+# ----------------------------------------------------------------------
+# Batch job
+# ----------------------------------------------------------------------
+def load_history(days: int, today: Optional[date] = None) -> Tuple[List[int], np.ndarray]:
+    """``(user_ids, values)`` where ``values[i, d]`` is user *i*'s portfolio value on day *d*.
+
+    Covers the last *days* days up to *today* inclusive, read with one query.
+    """
+    today = today or date.today()
+    start = today - timedelta(days=days)
+    with db_connection() as conn:
+        if conn is None:
+            raise DatabaseConnectionError("No database connection available.")
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT user_id, snapshot_date, total_value_usd
+                FROM portfolio_history
+                WHERE snapshot_date >= %s AND snapshot_date <= %s
+                ORDER BY user_id, snapshot_date;
+                """,
+                (start, today),
+            )
+            rows = cur.fetchall()
+
+    user_ids = sorted({row[0] for row in rows})
+    index = {user_id: i for i, user_id in enumerate(user_ids)}
+    values = np.full((len(user_ids), days + 1), np.nan)
+    if rows:
+        users, dates, totals = zip(*rows)
+        rows_idx = np.fromiter((index[u] for u in users), dtype=int, count=len(rows))
+        cols_idx = np.fromiter(((d - start).days for d in dates), dtype=int, count=len(rows))
+        values[rows_idx, cols_idx] = np.asarray(totals, dtype=float)
+    return user_ids, values
+
+
+def load_positions(user_ids: Sequence[int]) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """``(symbols, quantities, values_usd)`` matrices (users x symbols) of current holdings."""
+    with db_connection() as conn:
+        if conn is None:
+            raise DatabaseConnectionError("No database connection available.")
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT p.user_id, UPPER(h.symbol),
+                       SUM(h.amount / POWER(10::NUMERIC, COALESCE(h.decimals, 18))),
+                       SUM(COALESCE(h.value_usd, 0))
+                FROM holdings h
+                JOIN portfolios p ON h.portfolio_id = p.id
+                WHERE p.user_id = ANY(%s)
+                GROUP BY p.user_id, UPPER(h.symbol);
+                """,
+                (list(user_ids),),
+            )
+            rows = cur.fetchall()
+
+    symbols = sorted({row[1] for row in rows})
+    user_index = {user_id: i for i, user_id in enumerate(user_ids)}
+    symbol_index = {symbol: j for j, symbol in enumerate(symbols)}
+    quantities = np.zeros((len(user_ids), len(symbols)))
+    values_usd = np.zeros((len(user_ids), len(symbols)))
+    for user_id, symbol, quantity, value_usd in rows:
+        i, j = user_index[user_id], symbol_index[symbol]
+        quantities[i, j] = float(quantity or 0)
+        values_usd[i, j] = float(value_usd or 0)
+    return symbols, quantities, values_usd
+
+
+def _clean(value) -> Optional[float]:
+    return None if value is None or not np.isfinite(value) else round(float(value), 6)
+
+
+def run_nightly(candles=None, windows: Optional[Sequence[int]] = None, today: Optional[date] = None) -> int:
+    """Compute every user's metrics for each window and upsert them into portfolio_analytics.
+
+    *candles* is a CandleStore; when given, per-asset contributions are
+    included. Returns the number of rows written.
+    """
+    windows = sorted(windows or ANALYTICS_WINDOWS_DAYS)
+    today = today or date.today()
+    user_ids, history = load_history(max(windows), today)
+    if not user_ids:
+        return 0
+    symbols, quantities, values_usd = load_positions(user_ids) if candles is not None else ([], None, None)
+    # Current price per symbol from the stored holdings (value / quantity of all users)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        end_prices = values_usd.sum(axis=0) / quantities.sum(axis=0) if symbols else None
+
+    rows = []
+    for window in windows:
+        metrics = compute_metrics(history[:, -(window + 1):], ANALYTICS_RISK_FREE_RATE)
+        contributions = None
+        if symbols:
+            opens = candles.opening_prices(symbols, bar="1D", bars=window)
+            start_prices = np.array([float(opens[s]) if s in opens else np.nan for s in symbols])
+            contributions = asset_contributions(quantities, start_prices, end_prices)
+        for i, user_id in enumerate(user_ids):
+            contrib = {}
+            if contributions is not None:
+                contrib = {s: _clean(c) for s, c, q in zip(symbols, contributions[i], quantities[i]) if q and _clean(c) is not None}
+            rows.append((
+                user_id, window, today,
+                _clean(metrics["total_return"][i]), _clean(metrics["volatility"][i]),
+                _clean(metrics["rolling_volatility"][i]), _clean(metrics["max_drawdown"][i]),
+                _clean(metrics["sharpe"][i]), _clean(metrics["sortino"][i]), Json(contrib),
+            ))
+
+    with db_connection() as conn:
+        if conn is None:
+            raise DatabaseConnectionError("No database connection available.")
+        with conn.cursor() as cur:
+            execute_values(
+                cur,
+                """
+                INSERT INTO portfolio_analytics (
+                    user_id, window_days, computed_on, total_return, volatility, rolling_volatility,
+                    max_drawdown, sharpe, sortino, contributions
+                ) VALUES %s
+                ON CONFLICT (user_id, window_days) DO UPDATE
+                SET computed_on = EXCLUDED.computed_on, total_return = EXCLUDED.total_return,
+                    volatility = EXCLUDED.volatility, rolling_volatility = EXCLUDED.rolling_volatility,
+                    max_drawdown = EXCLUDED.max_drawdown, sharpe = EXCLUDED.sharpe,
+                    sortino = EXCLUDED.sortino, contributions = EXCLUDED.contributions;
+                """,
+                rows,
+            )
+        conn.commit()
+    logger.info("Portfolio analytics computed for %s user(s) over windows %s", len(user_ids), windows)
+    return len(rows)
+
+
+def get_user_metrics(telegram_id: int) -> Dict[int, Dict]:
+    """The stored metrics of *telegram_id* keyed by window (days); ``{}`` if none or on error."""
+    with db_connection() as conn:
+        if conn is None:
+            return {}
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    SELECT a.window_days, a.computed_on, a.total_return, a.volatility, a.rolling_volatility,
+                           a.max_drawdown, a.sharpe, a.sortino, a.contributions
+                    FROM portfolio_analytics a
+                    JOIN users u ON a.user_id = u.id
+                    WHERE u.telegram_id = %s
+                    ORDER BY a.window_days;
+                    """,
+                    (telegram_id,),
+                )
+                rows = cur.fetchall()
+        except Exception as e:
+            logger.error("get_user_metrics error: %s", e)
+            return {}
+    keys = ("computed_on", "total_return", "volatility", "rolling_volatility", "max_drawdown", "sharpe", "sortino", "contributions")
+    return {row[0]: dict(zip(keys, row[1:])) for row in rows}
@@ -0,0 +1,219 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from psycopg2.extras import execute_values
+
+from src.database import db_connection
+from src.exceptions import DatabaseConnectionError
+
+logger = logging.getLogger(__name__)
+
+# Upstream kline requests issued at the same time when filling gaps
+CANDLE_FETCH_CONCURRENCY = int(os.getenv("CANDLE_FETCH_CONCURRENCY", "8"))
+# Instruments OKX returned no candles for are not asked for again until this expires
+CANDLE_MISS_TTL_SECS = int(os.getenv("CANDLE_MISS_TTL_SECS", "3600"))
+
+KLINE_PAGE_LIMIT = 100  # max candles per candlesticks-history request
+
+BAR_MS = {
+    "1m": 60_000,
+    "3m": 180_000,
+    "5m": 300_000,
+    "15m": 900_000,
+    "30m": 1_800_000,
+    "1H": 3_600_000,
+    "2H": 7_200_000,
+    "4H": 14_400_000,
+    "6H": 21_600_000,
+    "12H": 43_200_000,
+    "1D": 86_400_000,
+    "1W": 604_800_000,
+}
+
+# (ts, open, high, low, close)
+Candle = Tuple[int, Decimal, Decimal, Decimal, Decimal]
+
+
+def inst_id(symbol: str) -> str:
+    """OKX instrument id used for *symbol*'s USD candles."""
+    return f"{symbol.upper()}-USDT"
+
+
+def _parse_candle(row) -> Optional[Candle]:
+    """Accept OKX array rows ``[ts, o, h, l, c, ...]`` or dicts with ts/open/high/low/close."""
+    try:
+        if isinstance(row, dict):
+            ts, o = row["ts"], row["open"]
+            values = (ts, o, row.get("high", o), row.get("low", o), row.get("close", o))
+        else:
+            values = row[:5]
+        ts, o, h, l, c = values
+        return int(ts), Decimal(str(o)), Decimal(str(h)), Decimal(str(l)), Decimal(str(c))
+    except (KeyError, IndexError, TypeError, ValueError, ArithmeticError):
+        return None
+
+
+def _pages(lo: int, hi: int, bar_ms: int) -> Iterator[Tuple[int, int]]:
+    """``(after, limit)`` requests covering bar opens in ``[lo, hi]``, newest page first."""
+    after = hi + bar_ms
+    while after > lo:
+        limit = min(KLINE_PAGE_LIMIT, (after - lo) // bar_ms)
+        yield after, limit
+        after -= limit * bar_ms
+
+
+class CandleStore:
+    """Local copy of OKX candles in the ``candles`` table, keyed by (inst_id, bar, ts).
+
+    Reads are served from the table. Before a read, the stored range of each
+    instrument is compared with the requested window, and only the missing bars
+    at either end are requested upstream. Those requests run concurrently, in
+    pages of KLINE_PAGE_LIMIT. The newest stored bar is always re-fetched with
+    the gap because it may still have been forming when stored.
+    """
+
+    def __init__(self, explorer, clock: Callable[[], float] = time.time):
+        self.explorer = explorer
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._misses: Dict[Tuple[str, str], float] = {}  # (inst_id, bar) -> retry after
+        self._floors: Dict[Tuple[str, str], int] = {}  # (inst_id, bar) -> oldest ts upstream has
+        self.upstream_calls = 0
+
+    def window(self, bar: str, bars: int) -> Tuple[int, int]:
+        """``(start_ts, latest_ts)`` bar opens for the last *bars* bars up to the current one."""
+        bar_ms = BAR_MS[bar]
+        latest = int(self._clock() * 1000) // bar_ms * bar_ms
+        return latest - bars * bar_ms, latest
+
+    def opening_prices(self, symbols: Iterable[str], bar: str = "1D", bars: int = 30) -> Dict[str, Decimal]:
+        """Open price of the first stored bar in the window for each symbol that has candles.
+
+        Missing bars are fetched first. Returns ``{}`` if the database is unavailable.
+        """
+        symbols = list(dict.fromkeys(s.upper() for s in symbols))
+        if not symbols:
+            return {}
+        start, latest = self.window(bar, bars)
+        insts = [inst_id(s) for s in symbols]
+        try:
+            coverage = self._coverage(insts, bar, start)
+            requests = self._plan(insts, bar, coverage, start, latest)
+            if requests:
+                self._store(bar, self._fetch(bar, requests, coverage))
+                coverage = self._coverage(insts, bar, start)
+        except DatabaseConnectionError as e:
+            logger.error("Candle store unavailable: %s", e)
+            return {}
+        except Exception as e:
+            logger.error("Candle store error: %s", e)
+            return {}
+        return {s: coverage[inst_id(s)][2] for s in symbols if inst_id(s) in coverage}
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+    def _coverage(self, insts: List[str], bar: str, start: int) -> Dict[str, Tuple[int, int, Decimal]]:
+        """``inst_id -> (min_ts, max_ts, open of min_ts)`` for bars at or after *start*."""
+        with db_connection() as conn:
+            if conn is None:
+                raise DatabaseConnectionError("No database connection available.")
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    SELECT inst_id, MIN(ts), MAX(ts), (ARRAY_AGG(open ORDER BY ts))[1]
+                    FROM candles
+                    WHERE bar = %s AND inst_id = ANY(%s) AND ts >= %s
+                    GROUP BY inst_id;
+                    """,
+                    (bar, insts, start),
+                )
+                rows = cur.fetchall()
+        return {inst: (int(lo), int(hi), open_) for inst, lo, hi, open_ in rows}
+
+    def _plan(self, insts, bar, coverage, start, latest) -> List[Tuple[str, int, int]]:
+        """The ``(inst_id, after, limit)`` requests needed to cover ``[start, latest]``."""
+        bar_ms = BAR_MS[bar]
+        now = self._clock()
+        requests = []
+        for inst in insts:
+            key = (inst, bar)
+            with self._lock:
+                if self._misses.get(key, 0) > now:
+                    continue
+                floor = self._floors.get(key)
+            if inst not in coverage:
+                gaps = [(start, latest)]
+            else:
+                lo, hi, _ = coverage[inst]
+                gaps = []
+                if hi < latest:
+                    gaps.append((hi, latest))
+                if lo > start and floor != lo:
+                    gaps.append((start, lo - bar_ms))
+            for gap_lo, gap_hi in gaps:
+                requests.extend((inst, after, limit) for after, limit in _pages(gap_lo, gap_hi, bar_ms))
+        return requests
+
+    def _fetch(self, bar: str, requests, coverage) -> Dict[str, List[Candle]]:
+        def fetch(request):
+            inst, after, limit = request
+            try:
+                return self.explorer.get_kline(inst.split("-")[0], bar=bar, limit=limit, after=after)
+            except Exception as e:
+                return {"success": False, "error": str(e), "code": "E_OKX_HTTP"}
+
+        workers = max(1, min(CANDLE_FETCH_CONCURRENCY, len(requests)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="candles") as pool:
+            responses = list(pool.map(fetch, requests))
+        self.upstream_calls += len(requests)
+
+        fetched: Dict[str, List[Candle]] = {}
+        answered = set()
+        for (inst, _, _), resp in zip(requests, responses):
+            if not resp.get("success"):
+                logger.warning("Kline fetch for %s failed: %s", inst, resp.get("error"))
+                continue
+            answered.add(inst)
+            candles = fetched.setdefault(inst, [])
+            candles.extend(c for c in map(_parse_candle, resp.get("data") or []) if c is not None)
+
+        # Instruments whose front (older) end of the window was requested
+        backfilled = {inst for inst, after, _ in requests if inst in coverage and after <= coverage[inst][0]}
+        retry_at = self._clock() + CANDLE_MISS_TTL_SECS
+        with self._lock:
+            for inst in answered:
+                candles = fetched.get(inst, [])
+                if inst not in coverage:
+                    if not candles:
+                        self._misses[(inst, bar)] = retry_at
+                elif inst in backfilled:
+                    lo = coverage[inst][0]
+                    if not any(ts < lo for ts, *_ in candles):
+                        # Nothing older upstream (e.g. listed recently): stop asking
+                        self._floors[(inst, bar)] = lo
+        return fetched
+
+    def _store(self, bar: str, fetched: Dict[str, List[Candle]]) -> None:
+        rows = {(inst, bar, c[0]): (inst, bar) + c for inst, candles in fetched.items() for c in candles}
+        if not rows:
+            return
+        with db_connection() as conn:
+            if conn is None:
+                raise DatabaseConnectionError("No database connection available.")
+            with conn.cursor() as cur:
+                execute_values(
+                    cur,
+                    """
+                    INSERT INTO candles (inst_id, bar, ts, open, high, low, close) VALUES %s
+                    ON CONFLICT (inst_id, bar, ts) DO UPDATE
+                    SET open = EXCLUDED.open, high = EXCLUDED.high, low = EXCLUDED.low, close = EXCLUDED.close;
+                    """,
+                    list(rows.values()),
+                )
+            conn.commit()
@@ -1,9 +1,16 @@
 import os
+import time
 import psycopg2
 import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from typing import Dict, Iterator, Optional
 from dotenv import load_dotenv
 from src.exceptions import WalletAlreadyExistsError, DatabaseConnectionError
 from psycopg2 import OperationalError, IntegrityError
+from psycopg2 import extensions
+from psycopg2.pool import ThreadedConnectionPool
 
 # Load environment variables
 load_dotenv()
@@ -14,8 +21,18 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Connection pool tuning
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT_SECS = float(os.getenv("DB_POOL_TIMEOUT_SECS", "5"))  # max wait for a free connection
+DB_POOL_PING_IDLE_SECS = float(os.getenv("DB_POOL_PING_IDLE_SECS", "30"))  # ping connections idle longer than this
+
 def get_db_connection():
-    """Establishes a connection to the PostgreSQL database."""
+    """Establishes a dedicated, un-pooled connection to the PostgreSQL database.
+
+    Application code should check connections out of the shared pool with
+    ``db_connection()`` instead; this remains for one-off scripts.
+    """
     DATABASE_URL = os.getenv("DATABASE_URL")
     if not DATABASE_URL:
         logger.error("DATABASE_URL not found in environment variables.")
@@ -27,255 +44,495 @@ def get_db_connection():
         logger.error(f"Could not connect to the database: {e}")
         return None
 
+@dataclass
+class PoolStats:
+    checkouts: int = 0
+    timeouts: int = 0  # checkouts that gave up after DB_POOL_TIMEOUT_SECS
+    discarded: int = 0  # connections dropped by the health check
+    wait_time_secs: float = 0.0
+    max_wait_secs: float = 0.0
+    in_use: int = 0
+    max_in_use: int = 0
+
+
+class DatabasePool:
+    """Process-wide PostgreSQL connection pool.
+
+    Wraps ``psycopg2.pool.ThreadedConnectionPool`` (created lazily on first
+    checkout) with a semaphore so callers wait up to DB_POOL_TIMEOUT_SECS for a
+    free connection instead of failing when the pool is exhausted. Checked-out
+    connections are health-checked and any uncommitted transaction is rolled
+    back when they are returned.
+    """
+
+    def __init__(
+        self,
+        dsn: Optional[str] = None,
+        minconn: Optional[int] = None,
+        maxconn: Optional[int] = None,
+        timeout_secs: Optional[float] = None,
+        ping_idle_secs: Optional[float] = None,
+    ):
+        self.dsn = dsn
+        self.minconn = minconn if minconn is not None else DB_POOL_MIN
+        self.maxconn = maxconn if maxconn is not None else DB_POOL_MAX
+        self.timeout_secs = timeout_secs if timeout_secs is not None else DB_POOL_TIMEOUT_SECS
+        self.ping_idle_secs = ping_idle_secs if ping_idle_secs is not None else DB_POOL_PING_IDLE_SECS
+
+        self._pool: Optional[ThreadedConnectionPool] = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.maxconn)
+        self._idle_since: Dict[int, float] = {}
+        self._stats = PoolStats()
+
+    def _get_pool(self) -> ThreadedConnectionPool:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    dsn = self.dsn or os.getenv("DATABASE_URL")
+                    if not dsn:
+                        logger.error("DATABASE_URL not found in environment variables.")
+                        raise DatabaseConnectionError("DATABASE_URL not found in environment variables.")
+                    self._pool = ThreadedConnectionPool(self.minconn, self.maxconn, dsn)
+        return self._pool
+
+    def _is_healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        idle_since = self._idle_since.get(id(conn))
+        if idle_since is None or time.monotonic() - idle_since < self.ping_idle_secs:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        """Check out a healthy connection, or return None if none could be obtained."""
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout_secs):
+            with self._lock:
+                self._stats.timeouts += 1
+            logger.error("Timed out after %.1fs waiting for a database connection.", self.timeout_secs)
+            return None
+
+        try:
+            pool = self._get_pool()
+            conn = pool.getconn()
+            if not self._is_healthy(conn):
+                logger.warning("Discarding unhealthy pooled database connection.")
+                self._idle_since.pop(id(conn), None)
+                pool.putconn(conn, close=True)
+                with self._lock:
+                    self._stats.discarded += 1
+                conn = pool.getconn()
+        except OperationalError as e:
+            self._slots.release()
+            logger.error(f"Could not connect to the database: {e}")
+            return None
+        except BaseException:
+            self._slots.release()
+            raise
+
+        waited = time.perf_counter() - start
+        with self._lock:
+            self._stats.checkouts += 1
+            self._stats.wait_time_secs += waited
+            self._stats.max_wait_secs = max(self._stats.max_wait_secs, waited)
+            self._stats.in_use += 1
+            self._stats.max_in_use = max(self._stats.max_in_use, self._stats.in_use)
+        return conn
+
+    def putconn(self, conn) -> None:
+        """Return *conn* to the pool, rolling back anything left uncommitted."""
+        close = bool(conn.closed)
+        if not close and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                close = True
+        try:
+            self._get_pool().putconn(conn, close=close)
+        finally:
+            if close:
+                self._idle_since.pop(id(conn), None)
+            else:
+                self._idle_since[id(conn)] = time.monotonic()
+            with self._lock:
+                self._stats.in_use -= 1
+            self._slots.release()
+
+    @contextmanager
+    def connection(self) -> Iterator[Optional["extensions.connection"]]:
+        """Context manager yielding a pooled connection (or None if the database is unavailable)."""
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            if conn is not None:
+                self.putconn(conn)
+
+    def metrics(self) -> dict:
+        """Return checkout counts, wait times and saturation (in_use / maxconn)."""
+        with self._lock:
+            data = asdict(self._stats)
+        data["max_size"] = self.maxconn
+        data["saturation"] = data["in_use"] / self.maxconn if self.maxconn else 0.0
+        return data
+
+    def closeall(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+            self._idle_since.clear()
+
+
+# Singleton pool for process-wide use
+db_pool = DatabasePool()
+
+
+def db_connection():
+    """Check a connection out of the shared pool: ``with db_connection() as conn: ...``.
+
+    Yields None when the database is unreachable, mirroring get_db_connection().
+    """
+    return db_pool.connection()
+
+
 def initialize_database():
     """
     Initializes the database by creating the necessary tables if they don't exist
     and adding any missing columns to existing tables.
     Creates tables in a dependency-safe order so a fresh database initializes cleanly.
     """
-    try:
-        conn = get_db_connection()
-        with conn.cursor() as cur:
-            # 1) Create wallets first (referenced by users)
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS wallets (
-                    id SERIAL PRIMARY KEY,
-                    user_id INTEGER,
-                    name VARCHAR(255) NOT NULL,
-                    address VARCHAR(255) UNIQUE NOT NULL,
-                    encrypted_private_key TEXT NOT NULL,
-                    chain_id INTEGER DEFAULT 1,
-                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-                );
-                """
-            )
-
-            # Ensure chain_id column exists (backward compatibility)
-            cur.execute(
-                """
-                DO $$
-                BEGIN
-                    IF NOT EXISTS (
-                        SELECT 1 FROM information_schema.columns 
-                        WHERE table_name='wallets' AND column_name='chain_id'
-                    ) THEN
-                        ALTER TABLE wallets ADD COLUMN chain_id INTEGER DEFAULT 1;
-                    END IF;
-                END$$;
-                """
-            )
-
-            # 2) Create users (may reference wallets)
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS users (
-                    id SERIAL PRIMARY KEY,
-                    telegram_id BIGINT UNIQUE NOT NULL,
-                    username VARCHAR(255),
-                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                    default_wallet_id INTEGER REFERENCES wallets(id) ON DELETE SET NULL,
-                    live_trading_enabled BOOLEAN DEFAULT FALSE
-                );
-                """
-            )
-
-            # 3) Add missing columns to users (idempotent)
-            cur.execute(
-                """
-                DO $$
-                BEGIN
-                    IF NOT EXISTS (
-                        SELECT 1 FROM information_schema.columns
-                        WHERE table_name='users' AND column_name='default_wallet_id'
-                    ) THEN
-                        ALTER TABLE users ADD COLUMN default_wallet_id INTEGER REFERENCES wallets(id) ON DELETE SET NULL;
-                    END IF;
-                END$$;
-                """
-            )
-
-            cur.execute(
-                """
-                DO $$
-                BEGIN
-                    IF NOT EXISTS (
-                        SELECT 1 FROM information_schema.columns
-                        WHERE table_name='users' AND column_name='live_trading_enabled'
-                    ) THEN
-                        ALTER TABLE users ADD COLUMN live_trading_enabled BOOLEAN DEFAULT FALSE;
-                    END IF;
-                END$$;
-                """
-            )
-
-            # 4) Credentials (depends on users)
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS credentials (
-                    id SERIAL PRIMARY KEY,
-                    user_id INTEGER UNIQUE NOT NULL REFERENCES users(id),
-                    encrypted_okx_api_key TEXT,
-                    encrypted_okx_api_secret TEXT,
-                    encrypted_okx_passphrase TEXT,
-                    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-                );
-                """
-            )
-
-            # 5) Alerts (depends on users)
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS alerts (
-                    id SERIAL PRIMARY KEY,
-                    user_id INTEGER NOT NULL REFERENCES users(id),
-                    symbol VARCHAR(255) NOT NULL,
-                    target_price DECIMAL NOT NULL,
-                    condition VARCHAR(10) NOT NULL, -- 'above' or 'below'
-                    is_active BOOLEAN DEFAULT TRUE,
-                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-                );
-                """
-            )
-
-            # 6) Portfolios (depends on users)
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS portfolios (
-                    id SERIAL PRIMARY KEY,
-                    user_id INTEGER NOT NULL REFERENCES users(id),
-                    last_synced TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-                );
-                """
-            )
-
-            # 7) Holdings (depends on portfolios)
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS holdings (
-                    id SERIAL PRIMARY KEY,
-                    portfolio_id INTEGER NOT NULL REFERENCES portfolios(id) ON DELETE CASCADE,
-                    chain_id INTEGER,
-                    token_address TEXT,
-                    symbol VARCHAR(255),
-                    amount NUMERIC,
-                    decimals INTEGER,
-                    value_usd NUMERIC,
-                    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-                );
-                """
-            )
-
-            # 8) Prices (independent)
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS prices (
-                    id SERIAL PRIMARY KEY,
-                    symbol VARCHAR(255),
-                    timestamp TIMESTAMP WITH TIME ZONE NOT NULL,
-                    price_usd NUMERIC NOT NULL
-                );
-                """
-            )
-
-            # 9) Portfolio history (depends on users)
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS portfolio_history (
-                    id SERIAL PRIMARY KEY,
-                    user_id INTEGER NOT NULL REFERENCES users(id),
-                    total_value_usd NUMERIC NOT NULL,
-                    snapshot_date DATE NOT NULL,
-                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(user_id, snapshot_date)
-                );
-                """
-            )
-
-            # 10) Tokens metadata (independent)
-            cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS tokens (
-                    symbol VARCHAR(255) NOT NULL,
-                    chain_id INTEGER NOT NULL,
-                    address TEXT NOT NULL,
-                    decimals INTEGER NOT NULL,
-                    PRIMARY KEY(symbol, chain_id)
-                );
-                """
-            )
-
-            conn.commit()
-            logger.info("Database tables initialized successfully.")
-    except (OperationalError, psycopg2.Error) as e:
-        logger.error(f"Error initializing database tables: {e}")
-        if conn:
-            conn.rollback()
-    finally:
-        if conn:
-            conn.close()
+    with db_connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                # 1) Create wallets first (referenced by users)
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS wallets (
+                        id SERIAL PRIMARY KEY,
+                        user_id INTEGER,
+                        name VARCHAR(255) NOT NULL,
+                        address VARCHAR(255) UNIQUE NOT NULL,
+                        encrypted_private_key TEXT NOT NULL,
+                        chain_id INTEGER DEFAULT 1,
+                        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+                    );
+                    """
+                )
+
+                # Ensure chain_id column exists (backward compatibility)
+                cur.execute(
+                    """
+                    DO $$
+                    BEGIN
+                        IF NOT EXISTS (
+                            SELECT 1 FROM information_schema.columns 
+                            WHERE table_name='wallets' AND column_name='chain_id'
+                        ) THEN
+                            ALTER TABLE wallets ADD COLUMN chain_id INTEGER DEFAULT 1;
+                        END IF;
+                    END$$;
+                    """
+                )
+
+                # 2) Create users (may reference wallets)
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS users (
+                        id SERIAL PRIMARY KEY,
+                        telegram_id BIGINT UNIQUE NOT NULL,
+                        username VARCHAR(255),
+                        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                        default_wallet_id INTEGER REFERENCES wallets(id) ON DELETE SET NULL,
+                        live_trading_enabled BOOLEAN DEFAULT FALSE
+                    );
+                    """
+                )
+
+                # 3) Add missing columns to users (idempotent)
+                cur.execute(
+                    """
+                    DO $$
+                    BEGIN
+                        IF NOT EXISTS (
+                            SELECT 1 FROM information_schema.columns
+                            WHERE table_name='users' AND column_name='default_wallet_id'
+                        ) THEN
+                            ALTER TABLE users ADD COLUMN default_wallet_id INTEGER REFERENCES wallets(id) ON DELETE SET NULL;
+                        END IF;
+                    END$$;
+                    """
+                )
+
+                cur.execute(
+                    """
+                    DO $$
+                    BEGIN
+                        IF NOT EXISTS (
+                            SELECT 1 FROM information_schema.columns
+                            WHERE table_name='users' AND column_name='live_trading_enabled'
+                        ) THEN
+                            ALTER TABLE users ADD COLUMN live_trading_enabled BOOLEAN DEFAULT FALSE;
+                        END IF;
+                    END$$;
+                    """
+                )
+
+                # 4) Credentials (depends on users)
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS credentials (
+                        id SERIAL PRIMARY KEY,
+                        user_id INTEGER UNIQUE NOT NULL REFERENCES users(id),
+                        encrypted_okx_api_key TEXT,
+                        encrypted_okx_api_secret TEXT,
+                        encrypted_okx_passphrase TEXT,
+                        updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+                    );
+                    """
+                )
+
+                # 5) Alerts (depends on users)
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS alerts (
+                        id SERIAL PRIMARY KEY,
+                        user_id INTEGER NOT NULL REFERENCES users(id),
+                        symbol VARCHAR(255) NOT NULL,
+                        target_price DECIMAL NOT NULL,
+                        condition VARCHAR(10) NOT NULL, -- 'above' or 'below'
+                        is_active BOOLEAN DEFAULT TRUE,
+                        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+                    );
+                    """
+                )
+
+                # 6) Portfolios (depends on users)
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS portfolios (
+                        id SERIAL PRIMARY KEY,
+                        user_id INTEGER NOT NULL REFERENCES users(id),
+                        last_synced TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+                    );
+                    """
+                )
+
+                # 7) Holdings (depends on portfolios)
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS holdings (
+                        id SERIAL PRIMARY KEY,
+                        portfolio_id INTEGER NOT NULL REFERENCES portfolios(id) ON DELETE CASCADE,
+                        chain_id INTEGER,
+                        token_address TEXT,
+                        symbol VARCHAR(255),
+                        amount NUMERIC,
+                        decimals INTEGER,
+                        value_usd NUMERIC,
+                        updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+                    );
+                    """
+                )
+
+                # Sync freshness / activity tracking used to prioritise and skip syncs
+                cur.execute("ALTER TABLE wallets ADD COLUMN IF NOT EXISTS last_synced_at TIMESTAMP WITH TIME ZONE;")
+                cur.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS last_active_at TIMESTAMP WITH TIME ZONE;")
+
+                # Holdings are diffed per (chain, token, wallet) on every sync
+                cur.execute("ALTER TABLE holdings ADD COLUMN IF NOT EXISTS wallet_address TEXT;")
+                cur.execute(
+                    """
+                    CREATE UNIQUE INDEX IF NOT EXISTS holdings_position_key
+                    ON holdings (portfolio_id, chain_id, token_address, wallet_address);
+                    """
+                )
+
+                # 8) Prices (independent)
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS prices (
+                        id SERIAL PRIMARY KEY,
+                        symbol VARCHAR(255),
+                        timestamp TIMESTAMP WITH TIME ZONE NOT NULL,
+                        price_usd NUMERIC NOT NULL
+                    );
+                    """
+                )
+
+                # 9) Portfolio history (depends on users)
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS portfolio_history (
+                        id SERIAL PRIMARY KEY,
+                        user_id INTEGER NOT NULL REFERENCES users(id),
+                        total_value_usd NUMERIC NOT NULL,
+                        snapshot_date DATE NOT NULL,
+                        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                        UNIQUE(user_id, snapshot_date)
+                    );
+                    """
+                )
+
+                # 10) Tokens metadata (independent)
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS tokens (
+                        symbol VARCHAR(255) NOT NULL,
+                        chain_id INTEGER NOT NULL,
+                        address TEXT NOT NULL,
+                        decimals INTEGER NOT NULL,
+                        PRIMARY KEY(symbol, chain_id)
+                    );
+                    """
+                )
+
+                # 11) Portfolio sync shard leases (independent)
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS sync_shards (
+                        shard_id INTEGER PRIMARY KEY,
+                        pass_id BIGINT,
+                        owner TEXT,
+                        leased_until TIMESTAMP WITH TIME ZONE,
+                        completed_at TIMESTAMP WITH TIME ZONE,
+                        users_synced INTEGER DEFAULT 0,
+                        users_failed INTEGER DEFAULT 0,
+                        duration_secs NUMERIC
+                    );
+                    """
+                )
+
+                # 12) Historical candles, filled incrementally by CandleStore (independent)
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS candles (
+                        inst_id TEXT NOT NULL,
+                        bar TEXT NOT NULL,
+                        ts BIGINT NOT NULL,
+                        open NUMERIC NOT NULL,
+                        high NUMERIC NOT NULL,
+                        low NUMERIC NOT NULL,
+                        close NUMERIC NOT NULL,
+                        PRIMARY KEY(inst_id, bar, ts)
+                    );
+                    """
+                )
+
+                # 13) Nightly portfolio analytics, one row per user and window (depends on users)
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS portfolio_analytics (
+                        user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                        window_days INTEGER NOT NULL,
+                        computed_on DATE NOT NULL,
+                        total_return NUMERIC,
+                        volatility NUMERIC,
+                        rolling_volatility NUMERIC,
+                        max_drawdown NUMERIC,
+                        sharpe NUMERIC,
+                        sortino NUMERIC,
+                        contributions JSONB,
+                        PRIMARY KEY(user_id, window_days)
+                    );
+                    """
+                )
+
+                # 14) Parsed intents shared across restarts and replicas by IntentCache (independent)
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS intent_cache (
+                        model TEXT NOT NULL,
+                        text TEXT NOT NULL,
+                        parsed JSONB NOT NULL,
+                        expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+                        PRIMARY KEY(model, text)
+                    );
+                    """
+                )
+
+                # 15) Latest generated insights per user, shared across replicas by InsightsCache (independent)
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS insights_cache (
+                        telegram_id BIGINT PRIMARY KEY,
+                        portfolio_hash TEXT NOT NULL,
+                        market_epoch BIGINT NOT NULL,
+                        insights TEXT NOT NULL,
+                        generated_at TIMESTAMP WITH TIME ZONE NOT NULL
+                    );
+                    """
+                )
+
+                conn.commit()
+                logger.info("Database tables initialized successfully.")
+        except (OperationalError, psycopg2.Error) as e:
+            logger.error(f"Error initializing database tables: {e}")
+            if conn:
+                conn.rollback()
 
 def add_wallet(user_id, wallet_name, wallet_address, encrypted_private_key, chain_id=1):
     """Adds a new wallet to the database for a given user."""
-    try:
-        conn = get_db_connection()
-        with conn.cursor() as cur:
-            # Get the internal user ID from the telegram_id
-            cur.execute("SELECT id FROM users WHERE telegram_id = %s;", (user_id,))
-            user_record = cur.fetchone()
-            if not user_record:
-                # If the user doesn't exist, create a new one
-                cur.execute("INSERT INTO users (telegram_id) VALUES (%s) RETURNING id;", (user_id,))
+    with db_connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                # Get the internal user ID from the telegram_id
+                cur.execute("SELECT id FROM users WHERE telegram_id = %s;", (user_id,))
                 user_record = cur.fetchone()
+                if not user_record:
+                    # If the user doesn't exist, create a new one
+                    cur.execute("INSERT INTO users (telegram_id) VALUES (%s) RETURNING id;", (user_id,))
+                    user_record = cur.fetchone()
             
-            internal_user_id = user_record[0]
-
-            cur.execute(
-                """
-                INSERT INTO wallets (user_id, name, address, encrypted_private_key, chain_id)
-                VALUES (%s, %s, %s, %s, %s);
-                """,
-                (internal_user_id, wallet_name, wallet_address, encrypted_private_key, chain_id)
-            )
-            conn.commit()
-            logger.info(f"Wallet {wallet_name} added for user {internal_user_id}.")
-    except IntegrityError as e:
-        if e.pgcode == '23505': # unique_violation
-            raise WalletAlreadyExistsError(f"Wallet with address {wallet_address} already exists.")
-        else:
-            raise e
-    except (OperationalError, psycopg2.Error) as e:
-        logger.error(f"Error adding wallet for user {user_id}: {e}")
-        if conn:
-            conn.rollback()
-        raise
-    finally:
-        if conn:
-            conn.close()
+                internal_user_id = user_record[0]
+
+                cur.execute(
+                    """
+                    INSERT INTO wallets (user_id, name, address, encrypted_private_key, chain_id)
+                    VALUES (%s, %s, %s, %s, %s);
+                    """,
+                    (internal_user_id, wallet_name, wallet_address, encrypted_private_key, chain_id)
+                )
+                conn.commit()
+                logger.info(f"Wallet {wallet_name} added for user {internal_user_id}.")
+        except IntegrityError as e:
+            if e.pgcode == '23505': # unique_violation
+                raise WalletAlreadyExistsError(f"Wallet with address {wallet_address} already exists.")
+            else:
+                raise e
+        except (OperationalError, psycopg2.Error) as e:
+            logger.error(f"Error adding wallet for user {user_id}: {e}")
+            if conn:
+                conn.rollback()
+            raise
 
 def save_portfolio_snapshot(user_id, total_value_usd):
     """Saves a daily snapshot of the user's portfolio value."""
-    try:
-        conn = get_db_connection()
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                INSERT INTO portfolio_history (user_id, total_value_usd, snapshot_date)
-                VALUES (%s, %s, CURRENT_DATE)
-                ON CONFLICT (user_id, snapshot_date) DO UPDATE SET total_value_usd = EXCLUDED.total_value_usd;
-                """,
-                (user_id, total_value_usd)
-            )
-            conn.commit()
-            logger.info(f"Portfolio snapshot saved for user {user_id}.")
-    except (OperationalError, psycopg2.Error) as e:
-        logger.error(f"Error saving portfolio snapshot for user {user_id}: {e}")
-        if conn:
-            conn.rollback()
-        raise
-    finally:
-        if conn:
-            conn.close()
+    with db_connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    INSERT INTO portfolio_history (user_id, total_value_usd, snapshot_date)
+                    VALUES (%s, %s, CURRENT_DATE)
+                    ON CONFLICT (user_id, snapshot_date) DO UPDATE SET total_value_usd = EXCLUDED.total_value_usd;
+                    """,
+                    (user_id, total_value_usd)
+                )
+                conn.commit()
+                logger.info(f"Portfolio snapshot saved for user {user_id}.")
+        except (OperationalError, psycopg2.Error) as e:
+            logger.error(f"Error saving portfolio snapshot for user {user_id}: {e}")
+            if conn:
+                conn.rollback()
+            raise
 
 if __name__ == '__main__':
     print("Attempting to initialize the PostgreSQL database...")
@@ -84,7 +84,7 @@ def guarded_handler(error_code: str) -> Callable[[Callable[..., Awaitable]], Cal
                 advisor_actions = None
                 try:
                     if failure_advisor.enabled:
-                        advice = failure_advisor.summarize(error_context)
+                        advice = await failure_advisor.asummarize(error_context)
                         if advice and isinstance(advice, dict):
                             advisor_message = advice.get("message")
                             advisor_actions = advice.get("actions")
@@ -9,6 +9,8 @@ try:
 except Exception:  # pragma: no cover - tests will inject a mock client
     NLPClient = None  # type: ignore
 
+from src.llm_executor import PRIORITY_BACKGROUND, llm_executor
+
 logger = logging.getLogger(__name__)
 
 
@@ -98,7 +100,10 @@ class FailureAdvisor:
             nlp = self._get_nlp()
             # Prefer Flash for speed/cost
             model = getattr(nlp, "flash_model") if self._model_type == "flash" else getattr(nlp, "pro_model")
-            response = model.generate_content(prompt)
+            # Let the SDK abandon the request too, so a timed-out call frees its executor slot
+            response = model.generate_content(
+                prompt, request_options={"timeout": llm_executor.timeout_for(self._model_type)}
+            )
             text = getattr(response, "text", "") or ""
             if not text:
                 # Some SDK variants expose parts; try to reconstruct
@@ -109,4 +114,17 @@ class FailureAdvisor:
             return parsed
         except Exception as e:  # Never let advisor failures affect UX
             logger.info("FailureAdvisor disabled due to runtime error: %s", e)
-            return None 
\ No newline at end of file
+            return None 
+
+    async def asummarize(self, error_context: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Async summarize for handlers: runs on the shared LLM executor and gives up after the model timeout.
+
+        Advice is background work, so it never takes the slots reserved for intent parsing.
+        """
+        if not self.enabled:
+            return None
+        try:
+            return await llm_executor.run(self._model_type, self.summarize, error_context, priority=PRIORITY_BACKGROUND)
+        except Exception as e:  # Timeouts included; the caller falls back to the static message
+            logger.info("FailureAdvisor skipped: %s", e)
+            return None
@@ -0,0 +1,283 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass, asdict
+from typing import Dict, Optional, Set, Tuple
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# Environment-configurable defaults
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))  # number of per-host pools kept
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))  # keep-alive connections per host
+HTTP_POOL_BLOCK = os.getenv("HTTP_POOL_BLOCK", "false").lower() in ("1", "true", "yes")
+HTTP_CONNECT_TIMEOUT_SECS = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECS", "3.05"))
+HTTP_READ_TIMEOUT_SECS = float(os.getenv("HTTP_READ_TIMEOUT_SECS", "10"))
+# Upper bound on concurrent in-flight requests from the async transport
+HTTP_MAX_CONCURRENCY = int(os.getenv("HTTP_MAX_CONCURRENCY", "16"))
+
+
+@dataclass
+class PoolMetrics:
+    requests: int = 0
+    hits: int = 0  # checkouts served by an already-open keep-alive connection
+    new_connections: int = 0
+    wait_time_secs: float = 0.0
+    max_wait_secs: float = 0.0
+
+
+class _MetricsRegistry:
+    """Thread-safe per-host counters updated by the instrumented urllib3 pools."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, PoolMetrics] = {}
+
+    def _get(self, host: str) -> PoolMetrics:
+        if host not in self._hosts:
+            self._hosts[host] = PoolMetrics()
+        return self._hosts[host]
+
+    def record_checkout(self, host: str, waited: float, reused: bool) -> None:
+        with self._lock:
+            m = self._get(host)
+            m.requests += 1
+            m.wait_time_secs += waited
+            m.max_wait_secs = max(m.max_wait_secs, waited)
+            if reused:
+                m.hits += 1
+
+    def record_new_connection(self, host: str) -> None:
+        with self._lock:
+            self._get(host).new_connections += 1
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            return {host: asdict(m) for host, m in self._hosts.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._hosts.clear()
+
+
+def _instrument(pool_cls, registry: _MetricsRegistry):
+    """Return a subclass of *pool_cls* that reports checkouts to *registry*."""
+
+    class InstrumentedPool(pool_cls):
+        def _new_conn(self):
+            registry.record_new_connection(self.host)
+            return super()._new_conn()
+
+        def _get_conn(self, timeout=None):
+            start = time.perf_counter()
+            conn = super()._get_conn(timeout)
+            # A connection with a live socket was reused from the keep-alive pool
+            reused = getattr(conn, "sock", None) is not None
+            registry.record_checkout(self.host, time.perf_counter() - start, reused)
+            return conn
+
+    InstrumentedPool.__name__ = f"Instrumented{pool_cls.__name__}"
+    return InstrumentedPool
+
+
+class _InstrumentedAdapter(HTTPAdapter):
+    def __init__(self, registry: _MetricsRegistry, **kwargs):
+        self._registry = registry
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _instrument(HTTPConnectionPool, self._registry),
+            "https": _instrument(HTTPSConnectionPool, self._registry),
+        }
+
+
+class HTTPTransport:
+    """Pooled, keep-alive HTTP transport shared by the OKX clients.
+
+    Wraps a single ``requests.Session`` whose adapter keeps one urllib3
+    connection pool per host, so repeated calls to the same OKX host reuse
+    an open TCP+TLS connection instead of paying a fresh handshake.
+    Retries are left to the callers (they own backoff and the circuit breaker).
+    """
+
+    def __init__(
+        self,
+        pool_connections: Optional[int] = None,
+        pool_maxsize: Optional[int] = None,
+        pool_block: Optional[bool] = None,
+        connect_timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+    ):
+        self.pool_connections = pool_connections if pool_connections is not None else HTTP_POOL_CONNECTIONS
+        self.pool_maxsize = pool_maxsize if pool_maxsize is not None else HTTP_POOL_MAXSIZE
+        self.pool_block = pool_block if pool_block is not None else HTTP_POOL_BLOCK
+        self.connect_timeout = connect_timeout if connect_timeout is not None else HTTP_CONNECT_TIMEOUT_SECS
+        self.read_timeout = read_timeout if read_timeout is not None else HTTP_READ_TIMEOUT_SECS
+
+        self._registry = _MetricsRegistry()
+        self.session = requests.Session()
+        adapter = _InstrumentedAdapter(
+            self._registry,
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block,
+            max_retries=0,
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @property
+    def timeout(self) -> Tuple[float, float]:
+        """Default (connect, read) timeout tuple."""
+        return (self.connect_timeout, self.read_timeout)
+
+    def timeout_for(self, read_secs: float) -> Tuple[float, float]:
+        """Return a timeout tuple with a custom read timeout (e.g. slower swap endpoints)."""
+        return (self.connect_timeout, read_secs)
+
+    def request(self, method: str, url: str, timeout=None, **kwargs) -> requests.Response:
+        return self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def metrics(self) -> Dict[str, dict]:
+        """Return per-host pool counters: requests, hits, new_connections, wait times."""
+        return self._registry.snapshot()
+
+    def reset_metrics(self) -> None:
+        self._registry.reset()
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class AsyncHTTPTransport:
+    """asyncio counterpart of HTTPTransport backed by ``httpx.AsyncClient``.
+
+    Keeps keep-alive connections per host and caps the number of in-flight
+    requests with a semaphore so a burst of handlers cannot flood OKX.
+    The underlying client and semaphore are bound to the running event loop
+    and are recreated transparently if the loop changes (e.g. between tests);
+    the replaced client is closed on its own loop if that is still running,
+    otherwise on the current one.
+    """
+
+    def __init__(
+        self,
+        max_connections: Optional[int] = None,
+        max_keepalive: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        connect_timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.max_connections = max_connections if max_connections is not None else HTTP_POOL_MAXSIZE
+        self.max_keepalive = max_keepalive if max_keepalive is not None else HTTP_POOL_MAXSIZE
+        self.max_concurrency = max_concurrency if max_concurrency is not None else HTTP_MAX_CONCURRENCY
+        self.connect_timeout = connect_timeout if connect_timeout is not None else HTTP_CONNECT_TIMEOUT_SECS
+        self.read_timeout = read_timeout if read_timeout is not None else HTTP_READ_TIMEOUT_SECS
+        self._transport = transport  # optional httpx transport override (e.g. httpx.MockTransport)
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closing: Set[asyncio.Task] = set()  # closes of replaced clients still running
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._in_flight = 0
+        self._max_in_flight = 0
+        self._wait_time_secs = 0.0
+
+    @property
+    def timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+
+    def timeout_for(self, read_secs: float) -> httpx.Timeout:
+        return httpx.Timeout(read_secs, connect=self.connect_timeout)
+
+    def _ensure_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            if self._client is not None:
+                self._close_replaced(self._client, self._loop)
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive,
+                ),
+                timeout=self.timeout,
+                transport=self._transport,
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._client
+
+    def _close_replaced(self, client: httpx.AsyncClient, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+        """Close a client left over from another event loop without blocking the current one."""
+        if loop is not None and loop.is_running() and not loop.is_closed():
+            asyncio.run_coroutine_threadsafe(self._aclose_quietly(client), loop)
+            return
+        task = asyncio.get_running_loop().create_task(self._aclose_quietly(client))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _aclose_quietly(client: httpx.AsyncClient) -> None:
+        try:
+            await client.aclose()
+        except Exception as e:
+            # Connections opened on a closed loop may not shut down cleanly; they are dropped either way
+            logger.debug("Closing a replaced HTTP client failed: %s", e)
+
+    async def request(self, method: str, url: str, timeout=None, **kwargs) -> httpx.Response:
+        client = self._ensure_client()
+        start = time.perf_counter()
+        async with self._semaphore:
+            with self._lock:
+                self._requests += 1
+                self._wait_time_secs += time.perf_counter() - start
+                self._in_flight += 1
+                self._max_in_flight = max(self._max_in_flight, self._in_flight)
+            try:
+                return await client.request(method, url, timeout=timeout or self.timeout, **kwargs)
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    def metrics(self) -> dict:
+        """Return request count, current/max in-flight requests and total semaphore wait."""
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "in_flight": self._in_flight,
+                "max_in_flight": self._max_in_flight,
+                "wait_time_secs": self._wait_time_secs,
+            }
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# Singleton transports for process-wide use
+transport = HTTPTransport()
+async_transport = AsyncHTTPTransport()
@@ -1,9 +1,13 @@
 import os
+import asyncio
 import google.generativeai as genai
 import logging
-from src.database import get_db_connection
+from typing import Optional
 from src.okx_client import OKXClient
 from src.portfolio import PortfolioService
+from src.llm_executor import PRIORITY_BACKGROUND, llm_executor
+from src.market_data import market_data
+from src.insights_cache import CachedInsight, InsightsCache, insights_cache, portfolio_hash
 
 # Enable logging
 logging.basicConfig(
@@ -11,8 +15,10 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+INSIGHTS_UNAVAILABLE = "I'm sorry, I'm having trouble generating insights for you right now. Please try again later."
+
 class InsightsClient:
-    def __init__(self):
+    def __init__(self, cache: Optional[InsightsCache] = None):
         self.api_key = os.getenv("GEMINI_API_KEY")
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY not found in environment variables.")
@@ -20,6 +26,8 @@ class InsightsClient:
         self.pro_model = genai.GenerativeModel('gemini-2.5-pro')
         self.okx_client = OKXClient()
         self.portfolio_service = PortfolioService()
+        # Insights are cached per user by portfolio composition and market epoch
+        self.cache = cache if cache is not None else insights_cache
 
     def get_user_portfolio(self, user_id: int) -> dict:
         """Return a simplified snapshot of the user's portfolio from PortfolioService."""
@@ -31,10 +39,14 @@ class InsightsClient:
 
     def get_market_data(self) -> dict:
         """
-        Retrieves market data from the OKX API.
+        Returns ``{symbol: {"price", "trend", "change_24h_pct"}}`` from the shared
+        market-data snapshot. Falls back to live ETH and BTC quotes (trend unknown)
+        when the poller has not produced fresh prices yet.
         """
-        # In a real app, you would fetch a variety of market data.
-        # For now, we will just fetch the price of ETH and BTC.
+        fresh = {s: market_data.price(s) for s in ("ETH", "BTC")}
+        if all(fresh.values()):
+            return market_data.snapshot.as_dict()
+
         eth_price_response = self.okx_client.get_live_quote(
             from_token_address="0xeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee",
             to_token_address="0xdac17f958d2ee523a2206206994597c13d831ec7",
@@ -46,25 +58,18 @@ class InsightsClient:
             amount="100000000"
         )
 
-        market_data = {}
+        market_data_dict = {}
         if eth_price_response.get("success"):
             price_estimate = float(eth_price_response["data"].get('toTokenAmount', 0)) / 1_000_000
-            market_data["ETH"] = {"price": price_estimate, "trend": "up"}
+            market_data_dict["ETH"] = {"price": price_estimate, "trend": "unknown"}
         if btc_price_response.get("success"):
             price_estimate = float(btc_price_response["data"].get('toTokenAmount', 0)) / 1_000_000
-            market_data["BTC"] = {"price": price_estimate, "trend": "down"}
+            market_data_dict["BTC"] = {"price": price_estimate, "trend": "unknown"}
             
-        return market_data
-
-    def generate_insights(self, user_id: int) -> str:
-        """
-        Generates personalized market insights for a user.
-        """
-        try:
-            portfolio = self.get_user_portfolio(user_id)
-            market_data = self.get_market_data()
+        return market_data_dict
 
-            prompt = f"""
+    def _build_prompt(self, portfolio: dict, market_data: dict) -> str:
+        return f"""
             You are Esther, a friendly, concise crypto market copilot. Provide approachable insights for a user with the following portfolio:
             {portfolio}
 
@@ -75,9 +80,78 @@ class InsightsClient:
             Style: warm, encouraging, beginner‑friendly, but non‑promissory. Include a brief caution that this is not financial advice.
             """
 
+    def generate_insights(self, user_id: int) -> str:
+        """
+        Generates personalized market insights for a user.
+        """
+        try:
+            portfolio = self.get_user_portfolio(user_id)
+            market_data = self.get_market_data()
+            prompt = self._build_prompt(portfolio, market_data)
+
             response = self.pro_model.generate_content(prompt)
             return response.text
 
         except Exception as e:
             logger.error(f"Error generating insights with Gemini Pro model: {e}")
-            return "I'm sorry, I'm having trouble generating insights for you right now. Please try again later."
+            return INSIGHTS_UNAVAILABLE
+
+    async def _agenerate_text(self, portfolio: dict) -> Optional[str]:
+        """One Pro generation for *portfolio*; None on failure so nothing is cached."""
+        try:
+            market_data = await asyncio.to_thread(self.get_market_data)
+            prompt = self._build_prompt(portfolio, market_data)
+
+            response = await llm_executor.run(
+                "pro",
+                self.pro_model.generate_content,
+                prompt,
+                priority=PRIORITY_BACKGROUND,
+                request_options={"timeout": llm_executor.timeout_for("pro")},
+            )
+            return response.text
+
+        except Exception as e:
+            logger.error(f"Error generating insights with Gemini Pro model: {e}")
+            return None
+
+    async def aget_insights(self, user_id: int, generate: bool = True, background: bool = False) -> Optional[CachedInsight]:
+        """
+        Returns the user's insight for their current portfolio and market epoch,
+        generating it (Pro call on the LLM executor at background priority) only
+        on a cache miss. Returns None if it could not be generated, or on a miss
+        when *generate* is False.
+        """
+        try:
+            portfolio = await asyncio.to_thread(self.get_user_portfolio, user_id)
+            digest = portfolio_hash(portfolio)
+            if not generate:
+                return await self.cache.get(user_id, digest)
+            return await self.cache.aget_or_generate(
+                user_id, digest, lambda: self._agenerate_text(portfolio), background=background
+            )
+        except Exception as e:
+            logger.error(f"Error loading insights for user {user_id}: {e}")
+            return None
+
+    async def agenerate_insights(self, user_id: int) -> str:
+        """
+        Async generate_insights for handlers, served from the insights cache when possible.
+        """
+        insight = await self.aget_insights(user_id)
+        return insight.text if insight else INSIGHTS_UNAVAILABLE
+
+    async def precompute(self, user_ids, concurrency: int = 2) -> int:
+        """
+        Warms the cache for *user_ids* (e.g. right after their portfolios synced).
+        Users whose portfolio and market epoch are unchanged cost no Pro call.
+        Returns how many users now have a fresh insight.
+        """
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def warm(user_id):
+            async with semaphore:
+                return await self.aget_insights(user_id, background=True) is not None
+
+        results = await asyncio.gather(*(warm(u) for u in user_ids))
+        return sum(results)
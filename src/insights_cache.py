@@ -0,0 +1,273 @@
+import os
+import time
+import json
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from src.database import db_connection
+
+logger = logging.getLogger(__name__)
+
+# Environment-configurable defaults
+INSIGHTS_CACHE_ENABLED = os.getenv("INSIGHTS_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Market data is bucketed into epochs of this length; a new epoch makes a user's cached insight stale.
+# Each user's epochs are offset by a stable per-user amount, so entries do not all expire at once.
+INSIGHTS_MARKET_EPOCH_SECS = float(os.getenv("INSIGHTS_MARKET_EPOCH_SECS", "3600"))
+INSIGHTS_CACHE_MAX_ENTRIES = int(os.getenv("INSIGHTS_CACHE_MAX_ENTRIES", "4096"))
+# Also keep insights in the insights_cache table so every replica serves what any node precomputed
+INSIGHTS_CACHE_PERSIST = os.getenv("INSIGHTS_CACHE_PERSIST", "true").lower() in ("1", "true", "yes")
+# Significant digits of each holding's quantity that count as a composition change
+INSIGHTS_QUANTITY_DIGITS = int(os.getenv("INSIGHTS_QUANTITY_DIGITS", "3"))
+
+InsightsKey = Tuple[int, str, int]  # (telegram_id, portfolio_hash, market_epoch)
+
+# Result handed to followers when the leading generation was cancelled; they retry
+_LEADER_CANCELLED = object()
+
+
+def portfolio_hash(portfolio: Dict[str, float], digits: Optional[int] = None) -> str:
+    """Stable digest of a ``{symbol: quantity}`` portfolio.
+
+    Quantities are rounded to *digits* significant digits so dust movements
+    and re-syncs of an unchanged portfolio keep the same hash.
+    """
+    digits = INSIGHTS_QUANTITY_DIGITS if digits is None else digits
+    composition = sorted(
+        (str(symbol).upper(), f"{float(quantity):.{digits}g}")
+        for symbol, quantity in (portfolio or {}).items()
+        if float(quantity or 0) > 0
+    )
+    return hashlib.sha256(json.dumps(composition).encode()).hexdigest()[:16]
+
+
+@dataclass(frozen=True)
+class CachedInsight:
+    text: str
+    portfolio_hash: str
+    market_epoch: int
+    generated_at: float  # unix time
+
+    def age_secs(self, now: Optional[float] = None) -> float:
+        return max(0.0, (time.time() if now is None else now) - self.generated_at)
+
+
+@dataclass
+class InsightsCacheStats:
+    hits: int = 0  # served from memory
+    db_hits: int = 0  # served from the insights_cache table
+    misses: int = 0  # user requests that had to wait for a generation
+    coalesced: int = 0  # requests that joined a generation already in flight
+    precomputed: int = 0  # generations done in the background after a sync
+    evictions: int = 0
+
+
+class InsightsCache:
+    """Latest insight per user, valid while the portfolio hash and market epoch match.
+
+    One entry is kept per user (a newer key replaces the old one), bounded
+    by an LRU. Generations are single-flight per key, so a user asking while
+    the background refresh for them is running waits for that one Pro call.
+    Epoch boundaries are staggered per user (see ``market_epoch``), so
+    regenerations after a rollover are spread over the whole epoch instead
+    of arriving together. Only successful generations are stored. With *persist*, entries are also
+    read from and written to the ``insights_cache`` table; database errors
+    are logged and treated as misses.
+    """
+
+    def __init__(
+        self,
+        epoch_secs: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        persist: Optional[bool] = None,
+        enabled: Optional[bool] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.epoch_secs = epoch_secs if epoch_secs is not None else INSIGHTS_MARKET_EPOCH_SECS
+        self.max_entries = max_entries if max_entries is not None else INSIGHTS_CACHE_MAX_ENTRIES
+        self.persist = persist if persist is not None else INSIGHTS_CACHE_PERSIST
+        self.enabled = (enabled if enabled is not None else INSIGHTS_CACHE_ENABLED) and self.max_entries > 0
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, CachedInsight]" = OrderedDict()
+        self._flights: Dict[InsightsKey, asyncio.Future] = {}
+        self._stats = InsightsCacheStats()
+
+    def market_epoch(self, telegram_id: int) -> int:
+        """The user's current epoch; its boundaries are shifted by a stable offset derived from *telegram_id*."""
+        epoch_secs = max(1.0, self.epoch_secs)
+        digest = hashlib.sha256(str(telegram_id).encode()).digest()
+        offset = int.from_bytes(digest[:8], "big") / 2 ** 64 * epoch_secs
+        return int((self._clock() + offset) // epoch_secs)
+
+    # ------------------------------------------------------------------
+    # Internal helpers
+    # ------------------------------------------------------------------
+    def _remember(self, telegram_id: int, insight: CachedInsight) -> None:
+        """Insert into the in-memory LRU (call with self._lock held)."""
+        self._entries[telegram_id] = insight
+        self._entries.move_to_end(telegram_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats.evictions += 1
+
+    def _load(self, telegram_id: int) -> Optional[CachedInsight]:
+        try:
+            with db_connection() as conn:
+                if conn is None:
+                    return None
+                with conn.cursor() as cur:
+                    cur.execute(
+                        """
+                        SELECT insights, portfolio_hash, market_epoch, EXTRACT(EPOCH FROM generated_at)
+                        FROM insights_cache WHERE telegram_id = %s;
+                        """,
+                        (telegram_id,)
+                    )
+                    row = cur.fetchone()
+        except Exception as e:
+            logger.warning("Insights cache lookup failed: %s", e)
+            return None
+        if row is None:
+            return None
+        return CachedInsight(text=row[0], portfolio_hash=row[1], market_epoch=int(row[2]), generated_at=float(row[3]))
+
+    def _save(self, telegram_id: int, insight: CachedInsight) -> None:
+        try:
+            with db_connection() as conn:
+                if conn is None:
+                    return
+                with conn.cursor() as cur:
+                    cur.execute(
+                        """
+                        INSERT INTO insights_cache (telegram_id, portfolio_hash, market_epoch, insights, generated_at)
+                        VALUES (%s, %s, %s, %s, TO_TIMESTAMP(%s))
+                        ON CONFLICT (telegram_id) DO UPDATE
+                        SET portfolio_hash = EXCLUDED.portfolio_hash, market_epoch = EXCLUDED.market_epoch,
+                            insights = EXCLUDED.insights, generated_at = EXCLUDED.generated_at;
+                        """,
+                        (telegram_id, insight.portfolio_hash, insight.market_epoch, insight.text, insight.generated_at)
+                    )
+                conn.commit()
+        except Exception as e:
+            logger.warning("Insights cache write failed: %s", e)
+
+    @staticmethod
+    def _matches(insight: Optional[CachedInsight], key: InsightsKey) -> bool:
+        return insight is not None and (insight.portfolio_hash, insight.market_epoch) == key[1:]
+
+    async def _cached(self, telegram_id: int, portfolio_digest: str, record: bool) -> Optional[CachedInsight]:
+        if not self.enabled:
+            return None
+        key = (telegram_id, portfolio_digest, self.market_epoch(telegram_id))
+        with self._lock:
+            insight = self._entries.get(telegram_id)
+            if self._matches(insight, key):
+                self._entries.move_to_end(telegram_id)
+                self._stats.hits += record
+                return insight
+        if not self.persist:
+            return None
+        stored = await asyncio.to_thread(self._load, telegram_id)
+        if not self._matches(stored, key):
+            return None
+        with self._lock:
+            self._remember(telegram_id, stored)
+            self._stats.db_hits += record
+        return stored
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    async def get(self, telegram_id: int, portfolio_digest: str) -> Optional[CachedInsight]:
+        """The cached insight for this portfolio in the current market epoch, or None."""
+        return await self._cached(telegram_id, portfolio_digest, record=True)
+
+    async def aget_or_generate(
+        self,
+        telegram_id: int,
+        portfolio_digest: str,
+        generate: Callable[[], Awaitable[Optional[str]]],
+        background: bool = False,
+    ) -> Optional[CachedInsight]:
+        """Return the cached insight or await *generate* once for all concurrent callers.
+
+        *generate* returns the insight text, or None when generation failed
+        (nothing is cached then). *background* marks precomputation in stats.
+        If the leading caller is cancelled, its followers are not: they retry,
+        and one of them generates for the rest.
+        """
+        # Background refreshes of still-valid entries are not counted as hits
+        cached = await self._cached(telegram_id, portfolio_digest, record=not background)
+        if cached is not None:
+            return cached
+
+        loop = asyncio.get_running_loop()
+        key = (telegram_id, portfolio_digest, self.market_epoch(telegram_id))
+        with self._lock:
+            future = self._flights.get(key)
+            # A future left over from another event loop cannot be awaited here
+            leader = future is None or future.get_loop() is not loop
+            if leader:
+                future = self._flights[key] = loop.create_future()
+                if background:
+                    self._stats.precomputed += 1
+                else:
+                    self._stats.misses += 1
+            else:
+                self._stats.coalesced += 1
+
+        if not leader:
+            insight = await asyncio.shield(future)
+            if insight is _LEADER_CANCELLED:
+                return await self.aget_or_generate(telegram_id, portfolio_digest, generate, background)
+            return insight
+
+        try:
+            text = await generate()
+            insight = None
+            if text:
+                insight = CachedInsight(text=text, portfolio_hash=key[1], market_epoch=key[2], generated_at=self._clock())
+                if self.enabled:
+                    with self._lock:
+                        self._remember(telegram_id, insight)
+                    if self.persist:
+                        await asyncio.to_thread(self._save, telegram_id, insight)
+            future.set_result(insight)
+            return insight
+        except asyncio.CancelledError:
+            future.set_result(_LEADER_CANCELLED)
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so an exception nobody waited on is not logged
+            future.exception()
+            raise
+        finally:
+            with self._lock:
+                if self._flights.get(key) is future:
+                    del self._flights[key]
+
+    def stats(self) -> dict:
+        """Hit/miss/precompute counters, the share of requests served without waiting, the size and epoch length."""
+        with self._lock:
+            data = asdict(self._stats)
+            data["size"] = len(self._entries)
+        served = data["hits"] + data["db_hits"]
+        requests = served + data["misses"] + data["coalesced"]
+        data["hit_rate"] = served / requests if requests else 0.0
+        data["epoch_secs"] = self.epoch_secs
+        return data
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._stats = InsightsCacheStats()
+
+
+# Singleton cache shared by the bot handlers and the background refresh
+insights_cache = InsightsCache()
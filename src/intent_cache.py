@@ -0,0 +1,238 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, asdict, field
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from psycopg2.extras import Json
+
+from src.database import db_connection
+from src.intent_grammar import IntentGrammar
+
+logger = logging.getLogger(__name__)
+
+# Environment-configurable defaults
+INTENT_CACHE_TTL_SECS = float(os.getenv("INTENT_CACHE_TTL_SECS", "86400"))  # <= 0 disables caching
+INTENT_CACHE_MAX_ENTRIES = int(os.getenv("INTENT_CACHE_MAX_ENTRIES", "2048"))
+# Also keep parses in the intent_cache table so they survive restarts and are shared by replicas
+INTENT_CACHE_PERSIST = os.getenv("INTENT_CACHE_PERSIST", "false").lower() in ("1", "true", "yes")
+
+IntentKey = Tuple[str, str]  # (model_type, normalized text)
+
+
+@dataclass
+class IntentCacheStats:
+    hits: int = 0  # served from memory
+    db_hits: int = 0  # served from the intent_cache table
+    misses: int = 0  # lookups that needed an LLM call
+    evictions: int = 0
+    llm_calls: Dict[str, int] = field(default_factory=dict)  # model_type -> calls made
+    llm_secs: Dict[str, float] = field(default_factory=dict)  # model_type -> total call time
+    saved: Dict[str, int] = field(default_factory=dict)  # model_type -> calls avoided
+
+
+class IntentCache:
+    """Bounded LRU + TTL cache of parsed intents, keyed by model and normalized text.
+
+    Text is normalized with ``IntentGrammar.normalize`` so case, spacing,
+    trailing punctuation and politeness prefixes do not create new entries.
+    Only successful parses are stored (never ``"unknown"``). With *persist*,
+    misses fall back to the ``intent_cache`` table and new parses are written
+    there; database errors are logged and treated as misses.
+    """
+
+    def __init__(
+        self,
+        ttl_secs: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        persist: Optional[bool] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl_secs = ttl_secs if ttl_secs is not None else INTENT_CACHE_TTL_SECS
+        self.max_entries = max_entries if max_entries is not None else INTENT_CACHE_MAX_ENTRIES
+        self.persist = persist if persist is not None else INTENT_CACHE_PERSIST
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[IntentKey, Tuple[float, dict]]" = OrderedDict()
+        self._stats = IntentCacheStats()
+
+    @staticmethod
+    def make_key(text: str, model_type: str) -> IntentKey:
+        return (model_type, IntentGrammar.normalize(text))
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_secs > 0 and self.max_entries > 0
+
+    # ------------------------------------------------------------------
+    # Internal helpers
+    # ------------------------------------------------------------------
+    def _remember(self, key: IntentKey, value: dict, expires_at: float) -> None:
+        """Insert into the in-memory LRU (call with self._lock held)."""
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats.evictions += 1
+
+    def _load(self, key: IntentKey) -> Optional[Tuple[dict, float]]:
+        """``(parsed, remaining_secs)`` from the intent_cache table, or None."""
+        try:
+            with db_connection() as conn:
+                if conn is None:
+                    return None
+                with conn.cursor() as cur:
+                    cur.execute(
+                        """
+                        SELECT parsed, EXTRACT(EPOCH FROM (expires_at - NOW()))
+                        FROM intent_cache
+                        WHERE model = %s AND text = %s AND expires_at > NOW();
+                        """,
+                        key,
+                    )
+                    row = cur.fetchone()
+        except Exception as e:
+            logger.warning("Intent cache lookup failed: %s", e)
+            return None
+        if row is None:
+            return None
+        return row[0], float(row[1])
+
+    def _save(self, key: IntentKey, value: dict) -> None:
+        try:
+            with db_connection() as conn:
+                if conn is None:
+                    return
+                with conn.cursor() as cur:
+                    cur.execute(
+                        """
+                        INSERT INTO intent_cache (model, text, parsed, expires_at)
+                        VALUES (%s, %s, %s, NOW() + %s * INTERVAL '1 second')
+                        ON CONFLICT (model, text) DO UPDATE
+                        SET parsed = EXCLUDED.parsed, expires_at = EXCLUDED.expires_at;
+                        """,
+                        (key[0], key[1], Json(value), self.ttl_secs),
+                    )
+                conn.commit()
+        except Exception as e:
+            logger.warning("Intent cache write failed: %s", e)
+
+    def _memory_hit(self, key: IntentKey) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if self._clock() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self._stats.hits += 1
+            self._stats.saved[key[0]] = self._stats.saved.get(key[0], 0) + 1
+            return value
+
+    def _database_hit(self, key: IntentKey, stored: Tuple[dict, float]) -> dict:
+        value, remaining = stored
+        with self._lock:
+            self._remember(key, value, self._clock() + min(remaining, self.ttl_secs))
+            self._stats.db_hits += 1
+            self._stats.saved[key[0]] = self._stats.saved.get(key[0], 0) + 1
+        return value
+
+    def _keep(self, key: IntentKey, value: dict) -> bool:
+        """Cache a fresh parse in memory; returns True if it should also be persisted."""
+        if not isinstance(value, dict) or value.get("intent") in (None, "unknown"):
+            return False
+        with self._lock:
+            self._remember(key, value, self._clock() + self.ttl_secs)
+        return self.persist
+
+    def _record_call(self, model_type: str, elapsed: float) -> None:
+        with self._lock:
+            self._stats.llm_calls[model_type] = self._stats.llm_calls.get(model_type, 0) + 1
+            self._stats.llm_secs[model_type] = self._stats.llm_secs.get(model_type, 0.0) + elapsed
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def get_or_parse(self, text: str, model_type: str, parse: Callable[[], dict]) -> dict:
+        """Return the cached parse of *text* for *model_type* or call *parse* and cache it."""
+        if not self.enabled:
+            return self._timed(model_type, parse)
+        key = self.make_key(text, model_type)
+        cached = self._memory_hit(key)
+        if cached is not None:
+            return cached
+        if self.persist:
+            stored = self._load(key)
+            if stored is not None:
+                return self._database_hit(key, stored)
+
+        with self._lock:
+            self._stats.misses += 1
+        value = self._timed(model_type, parse)
+        if self._keep(key, value):
+            self._save(key, value)
+        return value
+
+    async def aget_or_parse(self, text: str, model_type: str, parse: Callable[[], Awaitable[dict]]) -> dict:
+        """Async variant of get_or_parse; database reads and writes run in a thread."""
+        if not self.enabled:
+            return await self._atimed(model_type, parse)
+        key = self.make_key(text, model_type)
+        cached = self._memory_hit(key)
+        if cached is not None:
+            return cached
+        if self.persist:
+            stored = await asyncio.to_thread(self._load, key)
+            if stored is not None:
+                return self._database_hit(key, stored)
+
+        with self._lock:
+            self._stats.misses += 1
+        value = await self._atimed(model_type, parse)
+        if self._keep(key, value):
+            await asyncio.to_thread(self._save, key, value)
+        return value
+
+    def _timed(self, model_type: str, parse: Callable[[], dict]) -> dict:
+        started = time.perf_counter()
+        try:
+            return parse()
+        finally:
+            self._record_call(model_type, time.perf_counter() - started)
+
+    async def _atimed(self, model_type: str, parse: Callable[[], Awaitable[dict]]) -> dict:
+        started = time.perf_counter()
+        try:
+            return await parse()
+        finally:
+            self._record_call(model_type, time.perf_counter() - started)
+
+    def stats(self) -> dict:
+        """Hit/miss counters, hit rate, and the LLM calls and seconds the cache saved.
+
+        Saved seconds are estimated from each model's mean observed call latency.
+        """
+        with self._lock:
+            data = asdict(self._stats)
+            data["size"] = len(self._entries)
+        lookups = data["hits"] + data["db_hits"] + data["misses"]
+        data["hit_rate"] = (data["hits"] + data["db_hits"]) / lookups if lookups else 0.0
+        mean_secs = {m: data["llm_secs"][m] / n for m, n in data["llm_calls"].items() if n}
+        data["llm_mean_secs"] = mean_secs
+        data["llm_calls_saved"] = sum(data["saved"].values())
+        data["est_secs_saved"] = sum(n * mean_secs.get(m, 0.0) for m, n in data["saved"].items())
+        return data
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._stats = IntentCacheStats()
+
+
+# Singleton cache shared by every NLPClient in the process
+intent_cache = IntentCache()
@@ -0,0 +1,225 @@
+import os
+import re
+import json
+import math
+import logging
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.constants import TOKEN_ADDRESSES
+from src.database import db_connection
+from src.intent_grammar import SYMBOL_ALIASES, IntentGrammar
+
+logger = logging.getLogger(__name__)
+
+# Environment-configurable defaults
+INTENT_CLASSIFIER_ENABLED = os.getenv("INTENT_CLASSIFIER_ENABLED", "true").lower() in ("1", "true", "yes")
+# Probability the top intent needs before the LLM is skipped
+INTENT_CLASSIFIER_THRESHOLD = float(os.getenv("INTENT_CLASSIFIER_THRESHOLD", "0.8"))
+# Share of a message's features that must have been seen in training (rejects off-topic text)
+INTENT_CLASSIFIER_MIN_COVERAGE = float(os.getenv("INTENT_CLASSIFIER_MIN_COVERAGE", "0.6"))
+INTENT_CORPUS_PATH = os.getenv("INTENT_CORPUS_PATH", str(Path(__file__).parent / "data" / "intent_corpus.jsonl"))
+
+CHAR_NGRAM_RANGE = (2, 4)
+TRAIN_EPOCHS = 300
+TRAIN_LEARNING_RATE = 8.0
+
+# Intents the bot can act on without entities, so a confident label is a full parse
+ENTITY_FREE_INTENTS = frozenset({
+    "greeting",
+    "list_wallets",
+    "add_wallet",
+    "show_portfolio",
+    "get_insights",
+    "execute_rebalance",
+    "set_default_wallet",
+    "enable_live_trading",
+})
+
+Example = Tuple[str, str]  # (text, intent)
+
+_NUMBER = re.compile(r"^\$?\d+(?:\.\d+)?k?$|^\$?\.\d+$")
+_NON_WORD = re.compile(r"[^\w\s'$.]")
+_SYMBOLS = frozenset(s.lower() for s in list(TOKEN_ADDRESSES) + list(SYMBOL_ALIASES))
+# Negated or cancelling requests ("don't rebalance", "cancel rebalance") always go to the LLM,
+# however close they look to a command the bot would act on without entities
+_NEGATION = re.compile(r"\b(?:don'?t|do not|doesn'?t|does not|not|never|no|cancel|stop|abort|undo)\b")
+
+
+def load_corpus(path: Optional[str] = None) -> List[Example]:
+    """Labelled ``{"text", "intent"}`` JSON lines from *path* (defaults to INTENT_CORPUS_PATH)."""
+    examples = []
+    with open(path or INTENT_CORPUS_PATH, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                row = json.loads(line)
+                examples.append((row["text"], row["intent"]))
+    return examples
+
+
+def load_logged_examples() -> List[Example]:
+    """Gemini parses stored in the intent_cache table, preferring the Pro label for a text.
+
+    Returns ``[]`` when the database is unavailable.
+    """
+    try:
+        with db_connection() as conn:
+            if conn is None:
+                return []
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    SELECT DISTINCT ON (text) text, parsed->>'intent'
+                    FROM intent_cache
+                    WHERE parsed->>'intent' IS NOT NULL AND parsed->>'intent' <> 'unknown'
+                    ORDER BY text, (model = 'pro') DESC;
+                    """
+                )
+                return [(text, intent) for text, intent in cur.fetchall()]
+    except Exception as e:
+        logger.warning("Could not load logged intents: %s", e)
+        return []
+
+
+class IntentClassifier:
+    """Softmax regression over character n-grams and word uni/bigrams.
+
+    Amounts and known token symbols are replaced by ``<num>``/``<sym>`` so the
+    model learns phrasing rather than particular tokens. Training takes well
+    under a second on the seed corpus; prediction is a sparse dot product in
+    pure Python and stays far below a millisecond. ``classify`` applies the
+    confidence and coverage thresholds and returns ``None`` when the message
+    should go to the LLM instead. Corpus rows labelled ``"unknown"`` (negated
+    commands, questions about state) are counter-examples; that label is not
+    entity-free, so the bot hands such messages to the LLM too.
+    """
+
+    def __init__(self):
+        self.labels: List[str] = []
+        self._weights: Dict[str, List[float]] = {}
+        self._bias: List[float] = []
+        self._lock = threading.Lock()
+
+    @property
+    def is_fitted(self) -> bool:
+        return bool(self.labels)
+
+    @staticmethod
+    def features(text: str) -> Counter:
+        words = []
+        for word in _NON_WORD.sub(" ", IntentGrammar.normalize(text)).split():
+            if _NUMBER.match(word):
+                word = "<num>"
+            elif word.lstrip("$") in _SYMBOLS:
+                word = "<sym>"
+            words.append(word)
+        grams: Counter = Counter()
+        lo, hi = CHAR_NGRAM_RANGE
+        for i, word in enumerate(words):
+            grams["w:" + word] += 1
+            if i:
+                grams["b:" + words[i - 1] + " " + word] += 1
+            if word.startswith("<"):
+                continue
+            padded = f" {word} "
+            for n in range(lo, hi + 1):
+                for j in range(len(padded) - n + 1):
+                    grams[padded[j:j + n]] += 1
+        return grams
+
+    def fit(self, examples: Iterable[Example]) -> "IntentClassifier":
+        rows = [(self.features(text), intent) for text, intent in examples]
+        labels = sorted({intent for _, intent in rows})
+        vocab = sorted(set().union(*(grams for grams, _ in rows))) if rows else []
+        if not labels or not vocab:
+            return self
+        index = {gram: i for i, gram in enumerate(vocab)}
+        label_index = {label: i for i, label in enumerate(labels)}
+
+        x = np.zeros((len(rows), len(vocab)))
+        y = np.zeros((len(rows), len(labels)))
+        for r, (grams, intent) in enumerate(rows):
+            for gram, count in grams.items():
+                x[r, index[gram]] = count
+            y[r, label_index[intent]] = 1.0
+        x /= np.maximum(np.linalg.norm(x, axis=1, keepdims=True), 1e-12)
+
+        # Full-batch gradient descent on the cross-entropy loss
+        w = np.zeros((len(vocab), len(labels)))
+        b = np.zeros(len(labels))
+        for _ in range(TRAIN_EPOCHS):
+            z = x @ w + b
+            z -= z.max(axis=1, keepdims=True)
+            p = np.exp(z)
+            p /= p.sum(axis=1, keepdims=True)
+            grad = (p - y) / len(rows)
+            w -= TRAIN_LEARNING_RATE * (x.T @ grad)
+            b -= TRAIN_LEARNING_RATE * grad.sum(axis=0)
+
+        weights = {gram: w[i].tolist() for gram, i in index.items()}
+        with self._lock:
+            self.labels = labels
+            self._weights = weights
+            self._bias = b.tolist()
+        return self
+
+    def predict(self, text: str) -> Tuple[Optional[str], float, float]:
+        """``(intent, probability, coverage)``; coverage is the share of known features."""
+        with self._lock:
+            labels, weights, scores = self.labels, self._weights, list(self._bias)
+        if not labels:
+            return None, 0.0, 0.0
+        grams = self.features(text)
+        norm = math.sqrt(sum(c * c for c in grams.values()))
+        total = sum(grams.values())
+        known = 0
+        for gram, count in grams.items():
+            row = weights.get(gram)
+            if row is None:
+                continue
+            known += count
+            value = count / norm
+            for i, weight in enumerate(row):
+                scores[i] += value * weight
+        best = max(range(len(labels)), key=scores.__getitem__)
+        top = scores[best]
+        probability = 1.0 / sum(math.exp(s - top) for s in scores)
+        return labels[best], probability, (known / total if total else 0.0)
+
+    def classify(
+        self,
+        text: str,
+        threshold: Optional[float] = None,
+        min_coverage: Optional[float] = None,
+    ) -> Optional[str]:
+        """The predicted intent if it clears both thresholds, else None (escalate to the LLM).
+
+        Negated requests always escalate (see ``_NEGATION``).
+        """
+        if _NEGATION.search(IntentGrammar.normalize(text)):
+            return None
+        intent, probability, coverage = self.predict(text)
+        threshold = INTENT_CLASSIFIER_THRESHOLD if threshold is None else threshold
+        min_coverage = INTENT_CLASSIFIER_MIN_COVERAGE if min_coverage is None else min_coverage
+        if intent is None or probability < threshold or coverage < min_coverage:
+            return None
+        return intent
+
+
+def train(include_logged: bool = True) -> IntentClassifier:
+    """Fit the shared classifier on the seed corpus plus, optionally, logged LLM parses."""
+    examples = load_corpus()
+    if include_logged:
+        examples += load_logged_examples()
+    intent_classifier.fit(examples)
+    logger.info("Intent classifier trained on %s example(s), %s intent(s)", len(examples), len(intent_classifier.labels))
+    return intent_classifier
+
+
+# Shared instance; unfitted (always escalates) until train() runs at start-up
+intent_classifier = IntentClassifier()
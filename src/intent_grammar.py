@@ -0,0 +1,135 @@
+import re
+import logging
+from typing import Callable, Dict, Iterable, Optional
+
+from src.constants import CHAIN_ID_MAP, TOKEN_ADDRESSES
+
+logger = logging.getLogger(__name__)
+
+# Names people type instead of the ticker
+SYMBOL_ALIASES = {
+    "BITCOIN": "BTC",
+    "ETHER": "ETH",
+    "ETHEREUM": "ETH",
+    "TETHER": "USDT",
+    "DOLLARS": "USDT",
+    "USD": "USDT",
+    "POLYGON": "MATIC",
+}
+
+_AMOUNT = r"(?P<amount>\d+(?:\.\d+)?|\.\d+)"
+_SYM = r"\$?(?P<{name}>[a-z][a-z0-9]{{1,9}})"
+_PERIOD = (
+    r"(?P<period>(?:\d+\s*(?:h|hrs?|hours?|d|days?|w|wks?|weeks?|m|mo|months?|y|yrs?|years?))"
+    r"|(?:(?:last|past|this)\s+)?(?:day|week|month|year))"
+)
+_CHAIN = r"(?:\s+on\s+(?P<chain>{chains}))?".format(chains="|".join(map(re.escape, CHAIN_ID_MAP)))
+_PREFIX = re.compile(
+    r"^(?:(?:hey|ok|okay|please|pls|kindly|can you|could you|would you|i want to|i'd like to|i would like to|"
+    r"let me|help me|i wanna)\s+)+"
+)
+
+
+def _sym(name: str) -> str:
+    return _SYM.format(name=name)
+
+
+def _rule(pattern: str) -> re.Pattern:
+    # Group the pattern so the anchors apply to every alternative, not just the first and last
+    return re.compile(r"^(?:" + pattern + r")$")
+
+
+# (intent, compiled pattern); the first full match wins. Every pattern is
+# anchored, so any extra words make the message fall through to the LLM.
+_RULES = [
+    ("greeting", _rule(r"(?:hi|hello|hey|hiya|gm|yo|good (?:morning|afternoon|evening))(?: there| bot| esther)?")),
+    ("get_price", _rule(r"(?:(?:what(?: is|'s|s)|whats|show|get|check)(?: me)? )?(?:the )?(?:current )?price (?:of |for )?" + _sym("symbol") + r"(?: now| today)?")),
+    ("get_price", _rule(_sym("symbol") + r" price(?: now| today)?")),
+    ("get_price", _rule(r"how much is (?:1 |one |a )?" + _sym("symbol") + r"(?: worth)?(?: now| today)?")),
+    ("buy_token", _rule(r"(?:buy|purchase|get me) " + _AMOUNT + r" " + _sym("symbol") + r" (?:with|using|for|from)(?: my)? " + _sym("currency") + _CHAIN)),
+    ("sell_token", _rule(r"(?:sell|dump) " + _AMOUNT + r" " + _sym("symbol") + r" (?:for|to|into)(?: some)? " + _sym("currency") + _CHAIN)),
+    ("sell_token", _rule(r"(?:swap|convert|exchange|trade) " + _AMOUNT + r" " + _sym("symbol") + r" (?:for|to|into) " + _sym("currency") + _CHAIN)),
+    ("set_stop_loss", _rule(r"(?:set |add |place )?(?:a )?stop[- ]?loss (?:for |on )?" + _sym("symbol") + r" (?:at|@) \$?(?P<price>\d+(?:\.\d+)?)")),
+    ("set_take_profit", _rule(r"(?:set |add |place )?(?:a )?take[- ]?profit (?:for |on )?" + _sym("symbol") + r" (?:at|@) \$?(?P<price>\d+(?:\.\d+)?)")),
+    ("get_price_chart", _rule(r"(?:show |get |give |draw |plot )?(?:me )?(?:a |the )?(?:price )?(?:chart|graph) (?:of |for )" + _sym("symbol") + r"(?: (?:for |over |in )?(?:the )?" + _PERIOD + r")?")),
+    ("get_price_chart", _rule(r"(?:show |get )?(?:me )?" + _sym("symbol") + r" (?:price )?(?:chart|graph)(?: (?:for |over |in )?(?:the )?" + _PERIOD + r")?")),
+    ("get_portfolio_performance", _rule(r"(?:what(?: is|'s|s) |whats |show |get |check )?(?:me )?(?:my )?(?:portfolio )?performance(?: (?:over |for |in )?(?:the )?" + _PERIOD + r")?")),
+    ("get_portfolio_performance", _rule(r"how (?:is|has|did) my portfolio (?:doing|done|performed|perform)(?: (?:over |for |in )?(?:the )?" + _PERIOD + r")?")),
+    ("list_wallets", _rule(r"(?:(?:show|list|view|display|see)(?: me)?(?: all)? )?my wallets|(?:list |show )?wallets")),
+    ("add_wallet", _rule(r"(?:add|create|connect|import|link)(?: a| my)?(?: new)? wallet")),
+    ("show_portfolio", _rule(r"(?:(?:show|view|display|check|see)(?: me)? )?my (?:portfolio|assets|holdings|balances?|bags)|portfolio|balances?|holdings")),
+    ("get_insights", _rule(r"(?:(?:give|show|get)(?: me)? )?(?:some )?(?:market |portfolio |trading )?insights?")),
+    ("execute_rebalance", _rule(r"rebalance(?: my)?(?: portfolio)?(?: now)?")),
+    ("set_default_wallet", _rule(r"(?:set|change|update|choose|pick)(?: my)?(?: the)? default wallet")),
+    ("enable_live_trading", _rule(r"(?:enable|disable|turn on|turn off|activate|deactivate|switch on|switch off) live trading")),
+]
+
+# Entities that must be known token symbols for a match to count
+_SYMBOL_ENTITIES = ("symbol", "currency")
+# Entities returned as numbers, as they are in the LLM's JSON
+_NUMERIC_ENTITIES = ("amount", "price")
+
+
+def _number(value: str):
+    return float(value) if "." in value else int(value)
+
+
+class IntentGrammar:
+    """Deterministic parser for common, tightly structured requests.
+
+    Returns the same ``{"intent", "entities"}`` shape as ``NLPClient.parse_intent``
+    or ``None`` when the text is not matched exactly, so free-form or ambiguous
+    messages still go to the LLM. Token symbols must be known (constants, the
+    token registry via *known_symbols*, or SYMBOL_ALIASES); an unknown word in
+    a symbol slot is treated as ambiguous.
+    """
+
+    def __init__(self, known_symbols: Optional[Callable[[], Iterable[str]]] = None):
+        self._known_symbols = known_symbols
+
+    def _resolve_symbol(self, word: str) -> Optional[str]:
+        symbol = SYMBOL_ALIASES.get(word.upper(), word.upper())
+        if symbol in TOKEN_ADDRESSES:
+            return symbol
+        if self._known_symbols is not None:
+            try:
+                if symbol in set(self._known_symbols()):
+                    return symbol
+            except Exception as e:
+                logger.debug("Known-symbol lookup failed: %s", e)
+        return None
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        text = text.strip().lower().replace("’", "'")
+        text = re.sub(r"[?!.,;:]+$", "", text)
+        text = re.sub(r"\s+", " ", text).strip()
+        return _PREFIX.sub("", text)
+
+    def parse(self, text: str) -> Optional[Dict]:
+        if not text:
+            return None
+        normalized = self.normalize(text)
+        for intent, pattern in _RULES:
+            match = pattern.match(normalized)
+            if not match:
+                continue
+            entities = {k: v for k, v in match.groupdict().items() if v is not None}
+            for key in _SYMBOL_ENTITIES:
+                if key in entities:
+                    resolved = self._resolve_symbol(entities[key])
+                    if resolved is None:
+                        return None  # unknown token name: let the LLM decide
+                    entities[key] = resolved
+            for key in _NUMERIC_ENTITIES:
+                if key in entities:
+                    entities[key] = _number(entities[key])
+            chain = entities.pop("chain", None)
+            if chain:
+                entities["source_chain"] = entities["destination_chain"] = chain
+            return {"intent": intent, "entities": entities}
+        return None
+
+
+# Default instance (constants + aliases only); main wires in the token registry
+intent_grammar = IntentGrammar()
@@ -0,0 +1,274 @@
+import os
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Threads available for blocking Gemini SDK calls
+LLM_EXECUTOR_WORKERS = int(os.getenv("LLM_EXECUTOR_WORKERS", "8"))
+# Threads background work (insights, error advice, re-checks) may never take, so intent parsing always has room
+LLM_RESERVED_INTERACTIVE_WORKERS = int(os.getenv("LLM_RESERVED_INTERACTIVE_WORKERS", "2"))
+# Calls in flight per model
+LLM_CONCURRENCY = {
+    "flash": int(os.getenv("LLM_FLASH_CONCURRENCY", "6")),
+    "pro": int(os.getenv("LLM_PRO_CONCURRENCY", "2")),
+}
+# Slots of each model background work may never take, so a user's Pro call is not stuck behind insights
+LLM_RESERVED_INTERACTIVE_PER_MODEL = int(os.getenv("LLM_RESERVED_INTERACTIVE_PER_MODEL", "1"))
+# Seconds a caller waits for a model's answer (queueing included) before giving up
+LLM_TIMEOUT_SECS = {
+    "flash": float(os.getenv("LLM_FLASH_TIMEOUT_SECS", "15")),
+    "pro": float(os.getenv("LLM_PRO_TIMEOUT_SECS", "60")),
+}
+
+PRIORITY_INTERACTIVE = 0  # the user is waiting on this (intent parsing)
+PRIORITY_BACKGROUND = 1  # can wait (insights, error advice, background re-checks)
+
+
+class LLMTimeoutError(TimeoutError):
+    """A model call did not finish within its timeout."""
+
+
+class _PrioritySlots:
+    """Counting semaphore that hands free slots to the highest-priority waiter first.
+
+    Not bound to an event loop: waiters are futures of whichever loop awaits.
+    Within a priority, waiters are served in arrival order.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.in_use = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+
+    def waiting(self) -> Dict[int, int]:
+        with self._lock:
+            counts: Dict[int, int] = {}
+            for priority, _, future in self._waiters:
+                if not future.done():
+                    counts[priority] = counts.get(priority, 0) + 1
+            return counts
+
+    async def acquire(self, priority: int) -> None:
+        with self._lock:
+            if self.in_use < self.limit and not any(not f.done() for _, _, f in self._waiters):
+                self.in_use += 1
+                return
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, next(self._order), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if future.done() and not future.cancelled():
+                    # The slot was handed to us as we were cancelled: pass it on
+                    self._release_locked()
+                else:
+                    future.cancel()
+            raise
+
+    def release(self) -> None:
+        with self._lock:
+            self._release_locked()
+
+    def _release_locked(self) -> None:
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            # Hand the slot over directly; in_use is unchanged
+            try:
+                future.get_loop().call_soon_threadsafe(self._grant, future)
+                return
+            except RuntimeError:  # the waiter's loop is closed
+                continue
+        self.in_use -= 1
+
+    def _grant(self, future: asyncio.Future) -> None:
+        if future.done():
+            # Cancelled between release and hand-over: pass the slot on
+            self.release()
+        else:
+            future.set_result(None)
+
+
+@dataclass
+class ModelStats:
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    timeouts: int = 0
+    wait_secs_total: float = 0.0
+    wait_secs_max: float = 0.0
+    run_secs_total: float = 0.0
+
+
+class LLMExecutor:
+    """Runs blocking Gemini SDK calls on a dedicated, bounded thread pool.
+
+    Each model has its own concurrency limit, and queued calls are admitted
+    by priority, so intent parsing (PRIORITY_INTERACTIVE) overtakes queued
+    insight generations. Background calls are also kept off the last
+    LLM_RESERVED_INTERACTIVE_WORKERS threads and the last
+    LLM_RESERVED_INTERACTIVE_PER_MODEL slots of each model (a model with a
+    single slot still lets background work through). A call that exceeds its timeout
+    raises LLMTimeoutError in the caller right away. A running SDK call
+    cannot be interrupted, so its slot is released only when the thread
+    finishes. Pass the timeout to the SDK as well (``timeout_for``) so the
+    request itself is abandoned.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        reserved_interactive: Optional[int] = None,
+        concurrency: Optional[Dict[str, int]] = None,
+        timeouts: Optional[Dict[str, float]] = None,
+        reserved_per_model: Optional[int] = None,
+    ):
+        self.workers = max(1, workers if workers is not None else LLM_EXECUTOR_WORKERS)
+        reserved = reserved_interactive if reserved_interactive is not None else LLM_RESERVED_INTERACTIVE_WORKERS
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="llm")
+        self._threads = _PrioritySlots(self.workers)
+        self._background = _PrioritySlots(max(1, self.workers - max(0, reserved)))
+        self._concurrency = dict(LLM_CONCURRENCY, **(concurrency or {}))
+        self._timeouts = dict(LLM_TIMEOUT_SECS, **(timeouts or {}))
+        self._reserved_per_model = max(
+            0, reserved_per_model if reserved_per_model is not None else LLM_RESERVED_INTERACTIVE_PER_MODEL
+        )
+        self._models: Dict[str, _PrioritySlots] = {}
+        self._model_background: Dict[str, _PrioritySlots] = {}
+        self._stats: Dict[str, ModelStats] = {}
+        self._lock = threading.Lock()
+
+    def timeout_for(self, model_type: str) -> float:
+        return self._timeouts.get(model_type, self._timeouts["flash"])
+
+    def _model(self, model_type: str) -> Tuple[_PrioritySlots, _PrioritySlots, ModelStats]:
+        """The model's slots, the share of them background calls may use, and its stats."""
+        with self._lock:
+            if model_type not in self._models:
+                limit = self._concurrency.get(model_type, self._concurrency["flash"])
+                self._models[model_type] = _PrioritySlots(limit)
+                self._model_background[model_type] = _PrioritySlots(max(1, limit - self._reserved_per_model))
+                self._stats[model_type] = ModelStats()
+            return self._models[model_type], self._model_background[model_type], self._stats[model_type]
+
+    async def run(
+        self,
+        model_type: str,
+        fn: Callable[..., Any],
+        *args,
+        priority: int = PRIORITY_INTERACTIVE,
+        timeout: Optional[float] = None,
+        **kwargs,
+    ) -> Any:
+        """Call ``fn(*args, **kwargs)`` on the LLM pool under *model_type*'s limits.
+
+        Raises LLMTimeoutError if the result is not ready within *timeout*
+        seconds (default: the model's LLM_*_TIMEOUT_SECS), waiting in the queue included.
+        """
+        timeout = self.timeout_for(model_type) if timeout is None else timeout
+        slots, background, stats = self._model(model_type)
+        with self._lock:
+            stats.submitted += 1
+        gates = [slots, self._threads]
+        if priority >= PRIORITY_BACKGROUND:
+            gates = [self._background, background] + gates
+        try:
+            return await asyncio.wait_for(self._run(gates, stats, priority, fn, args, kwargs), timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                stats.timeouts += 1
+            logger.warning("%s call %s timed out after %.1fs", model_type, getattr(fn, "__name__", fn), timeout)
+            raise LLMTimeoutError(f"{model_type} call timed out after {timeout:.1f}s") from None
+
+    async def _run(self, gates, stats, priority, fn, args, kwargs) -> Any:
+        queued_at = time.perf_counter()
+        acquired: List[_PrioritySlots] = []
+        try:
+            for gate in gates:
+                await gate.acquire(priority)
+                acquired.append(gate)
+        except BaseException:
+            for gate in acquired:
+                gate.release()
+            raise
+        waited = time.perf_counter() - queued_at
+        with self._lock:
+            stats.wait_secs_total += waited
+            stats.wait_secs_max = max(stats.wait_secs_max, waited)
+
+        def call():
+            started = time.perf_counter()
+            ok = False
+            try:
+                result = fn(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                with self._lock:
+                    stats.run_secs_total += time.perf_counter() - started
+                    if ok:
+                        stats.completed += 1
+                    else:
+                        stats.failed += 1
+                # Slots follow the thread, not the (possibly timed-out) caller
+                for gate in acquired:
+                    gate.release()
+
+        def release_if_never_run(f) -> None:
+            if f.cancelled():
+                for gate in acquired:
+                    gate.release()
+
+        try:
+            future = self._pool.submit(call)
+        except BaseException:
+            for gate in acquired:
+                gate.release()
+            raise
+        future.add_done_callback(release_if_never_run)
+        return await asyncio.wrap_future(future)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Per-model queue depth, in-flight calls, outcomes and wait/run times, plus pool usage."""
+        with self._lock:
+            models = dict(self._models)
+            background = dict(self._model_background)
+            stats = {name: asdict(s) for name, s in self._stats.items()}
+        data: Dict[str, Any] = {
+            "workers": self.workers,
+            "threads_in_use": self._threads.in_use,
+            "background_in_use": self._background.in_use,
+            "models": {},
+        }
+        for name, slots in models.items():
+            waiting = slots.waiting()
+            entry = stats[name]
+            entry.update({
+                "limit": slots.limit,
+                "in_flight": slots.in_use,
+                "background_limit": background[name].limit,
+                "background_in_use": background[name].in_use,
+                "queued_interactive": waiting.get(PRIORITY_INTERACTIVE, 0),
+                "queued_background": sum(n for p, n in waiting.items() if p >= PRIORITY_BACKGROUND),
+            })
+            data["models"][name] = entry
+        return data
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Process-wide executor shared by every Gemini caller
+llm_executor = LLMExecutor()
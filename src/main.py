@@ -1,6 +1,7 @@
 import os
 import logging
 import asyncio
+import time
 import sys
 import re
 from pathlib import Path
@@ -47,14 +48,29 @@ MOBILE_WEBAPP_FALLBACK = os.getenv("MOBILE_WEBAPP_FALLBACK", "false").lower() in
 PORT = int(os.environ.get('PORT', 8080))
 
 from src.nlp import NLPClient
-from src.okx_client import OKXClient
-from src.database import add_wallet, get_db_connection, initialize_database
+from src.intent_grammar import IntentGrammar
+from src.intent_classifier import (
+    ENTITY_FREE_INTENTS,
+    INTENT_CLASSIFIER_ENABLED,
+    intent_classifier,
+    train as train_intent_classifier,
+)
+from src.okx_client import AsyncOKXClient
+from src.http_transport import async_transport
+from src.database import add_wallet, db_connection, db_pool, initialize_database
+from src import repository
 from src.encryption import encrypt_data, decrypt_data
-from src.insights import InsightsClient
+from src.insights import INSIGHTS_UNAVAILABLE, InsightsClient
+from src.llm_executor import PRIORITY_BACKGROUND, llm_executor
 from src.exceptions import WalletAlreadyExistsError, InvalidWalletAddressError, DatabaseConnectionError
 from src.portfolio import PortfolioService
+from src.rebalance import execute_legs, price_legs
+from src import speculative_parse
+from src.speculative_parse import TRADE_INTENTS, describe_trade, parse_amount, speculation_metrics, validate_trade
 from src.chart_generator import generate_price_chart
 from src.token_resolver import TokenResolver
+from src.alert_index import alert_index
+from src.market_data import market_data
 from src.constants import (
     TOKEN_ADDRESSES,
     TOKEN_DECIMALS,
@@ -64,10 +80,12 @@ from src.constants import (
 
 # Initialize clients
 nlp_client = NLPClient()
-okx_client = OKXClient()
+okx_client = AsyncOKXClient()
 insights_client = InsightsClient()
 portfolio_service = PortfolioService()
 token_resolver = None
+# Known symbols come from the token registry once it is loaded
+intent_grammar = IntentGrammar(known_symbols=lambda: token_resolver.symbols() if token_resolver else ())
 
 # --- Conversation Handler States ---
 AWAIT_CONFIRMATION = 1
@@ -137,71 +155,41 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     keyboard = [[InlineKeyboardButton("What can I do?", callback_data='help')]]
     reply_markup = InlineKeyboardMarkup(keyboard)
 
-    conn = get_db_connection()
-    if conn is None:
+    try:
+        created = await repository.get_or_create_user(user.id, user.username)
+    except DatabaseConnectionError:
         await update.message.reply_text("Sorry, I'm having trouble connecting to the database. Please try again later.")
         return
-
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT id FROM users WHERE telegram_id = %s;", (user.id,))
-            result = cur.fetchone()
-
-            if result is None:
-                cur.execute(
-                    "INSERT INTO users (telegram_id, username) VALUES (%s, %s);",
-                    (user.id, user.username)
-                )
-                conn.commit()
-                logger.info(f"New user {user.username} ({user.id}) created.")
-                await update.message.reply_text(
-                    "Hello! I'm Esther — your friendly DeFi co-pilot. Ready when you are! 🚀",
-                    reply_markup=reply_markup
-                )
-            else:
-                logger.info(f"Existing user {user.username} ({user.id}) returned.")
-                await update.message.reply_text(
-                    "Welcome back! What can I do for you today? 😊",
-                    reply_markup=reply_markup
-                )
     except Exception as e:
         logger.error(f"Database error during /start for user {user.id}: {e}")
         # If the schema was cleared after startup, try to re-initialize on the fly
-        if "relation \"users\" does not exist" in str(e).lower():
-            try:
-                initialize_database()
-                # Retry once after initializing schema
-                conn_retry = get_db_connection()
-                if conn_retry is not None:
-                    with conn_retry.cursor() as cur:
-                        cur.execute("SELECT id FROM users WHERE telegram_id = %s;", (user.id,))
-                        result = cur.fetchone()
-                        if result is None:
-                            cur.execute(
-                                "INSERT INTO users (telegram_id, username) VALUES (%s, %s);",
-                                (user.id, user.username)
-                            )
-                            conn_retry.commit()
-                            logger.info(f"New user {user.username} ({user.id}) created after DB init.")
-                            await update.message.reply_text(
-                                "Hello! I'm Esther — your friendly DeFi co-pilot. Ready when you are! 🚀",
-                                reply_markup=reply_markup
-                            )
-                        else:
-                            await update.message.reply_text(
-                                "Welcome back! What can I do for you today? 😊",
-                                reply_markup=reply_markup
-                            )
-                else:
-                    await update.message.reply_text("Database connection failed. Please try again shortly.")
-            except Exception as e2:
-                logger.error(f"Retry after DB init failed during /start for user {user.id}: {e2}")
-                await update.message.reply_text("An error occurred while initializing your account. Please try again.")
-        else:
+        if "relation \"users\" does not exist" not in str(e).lower():
             await update.message.reply_text("An error occurred while accessing your account.")
-    finally:
-        if conn:
-            conn.close()
+            return
+        try:
+            await repository.run(initialize_database)
+            # Retry once after initializing schema
+            created = await repository.get_or_create_user(user.id, user.username)
+        except DatabaseConnectionError:
+            await update.message.reply_text("Database connection failed. Please try again shortly.")
+            return
+        except Exception as e2:
+            logger.error(f"Retry after DB init failed during /start for user {user.id}: {e2}")
+            await update.message.reply_text("An error occurred while initializing your account. Please try again.")
+            return
+
+    if created:
+        logger.info(f"New user {user.username} ({user.id}) created.")
+        await update.message.reply_text(
+            "Hello! I'm Esther — your friendly DeFi co-pilot. Ready when you are! 🚀",
+            reply_markup=reply_markup
+        )
+    else:
+        logger.info(f"Existing user {user.username} ({user.id}) returned.")
+        await update.message.reply_text(
+            "Welcome back! What can I do for you today? 😊",
+            reply_markup=reply_markup
+        )
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Sends a message when the command /help is issued or the 'help' button is clicked."""
@@ -238,22 +226,72 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         await update.message.reply_text(help_text)
 
 
+def _resolve_token(symbol: str):
+    return token_resolver.get_token_info(symbol) if token_resolver else None
+
+
+async def _check_trade_parse(update: Update, user_message: str, flash_parse: dict) -> dict:
+    """Decide whether a Flash buy/sell parse can be acted on without waiting for Pro.
+
+    A parse that validates (see speculative_parse.validate_trade) is returned
+    with its amount normalized (``"1,000"`` -> ``"1000"``) so the quote is
+    requested at once; in reconcile mode Pro re-reads the message in the
+    background. Otherwise Pro parses the message now.
+    """
+    if speculative_parse.SPECULATIVE_PARSE_MODE == "off":
+        return await nlp_client.aparse_intent(user_message, model_type='pro')
+    reason = validate_trade(flash_parse.get("entities") or {}, _resolve_token)
+    if reason:
+        speculation_metrics.record_rejected(reason)
+        return await nlp_client.aparse_intent(user_message, model_type='pro')
+    speculation_metrics.record_accepted()
+    # The trade handlers do float(amount); hand them the amount the validator accepted
+    entities = dict(flash_parse["entities"], amount=str(parse_amount(flash_parse["entities"]["amount"])))
+    flash_parse = dict(flash_parse, entities=entities)
+    if speculative_parse.SPECULATIVE_PARSE_MODE == "reconcile":
+        _spawn_background(_reconcile_trade_parse(update, user_message, flash_parse))
+    return flash_parse
+
+
+async def _reconcile_trade_parse(update: Update, user_message: str, flash_parse: dict) -> None:
+    """Re-parse with Pro while the quote is fetched and warn the user if it reads the trade differently."""
+    try:
+        pro_parse = await nlp_client.aparse_intent(user_message, model_type='pro', priority=PRIORITY_BACKGROUND)
+    except Exception as e:
+        logger.warning("Background Pro parse failed: %s", e)
+        pro_parse = None
+    if not speculation_metrics.record_reconciled(flash_parse, pro_parse):
+        return
+    logger.info("Pro changed a speculative trade parse: %s -> %s", describe_trade(flash_parse), describe_trade(pro_parse))
+    await update.message.reply_text(
+        f"⚠️ On a second read I understood: {describe_trade(pro_parse)}.\n"
+        f"If that is what you meant, tap ❌ Cancel on the quote and send the request again."
+    )
+
+
 async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handles regular text messages, parses intent, and initiates actions."""
     user_message = update.message.text
+    await repository.touch_user(update.effective_user.id)
     
-    # Use the faster Flash model for initial intent recognition
-    parsed_intent = nlp_client.parse_intent(user_message, model_type='flash')
-    
+    # Tightly structured requests are parsed locally; anything else goes to Gemini
+    parsed_intent = intent_grammar.parse(user_message)
+    if parsed_intent is None:
+        # The local classifier answers confident, entity-free requests; everything
+        # else (trades included) starts with Flash, whose trade parses are validated
+        # and used directly when they check out.
+        predicted = intent_classifier.classify(user_message) if INTENT_CLASSIFIER_ENABLED else None
+        if predicted in ENTITY_FREE_INTENTS:
+            parsed_intent = {"intent": predicted, "entities": {}}
+        else:
+            # Use the faster Flash model for initial intent recognition
+            parsed_intent = await nlp_client.aparse_intent(user_message, model_type='flash')
+            if parsed_intent.get("intent") in TRADE_INTENTS:
+                parsed_intent = await _check_trade_parse(update, user_message, parsed_intent)
+
     intent = parsed_intent.get("intent")
     entities = parsed_intent.get("entities", {})
 
-    # For complex tasks that require deeper understanding, re-parse with the Pro model.
-    if intent in ["buy_token", "sell_token", "get_insights"]:
-        parsed_intent = nlp_client.parse_intent(user_message, model_type='pro')
-        intent = parsed_intent.get("intent")
-        entities = parsed_intent.get("entities", {})
-
     if intent == "get_price":
         await get_price_intent(update, context, entities)
         return ConversationHandler.END
@@ -333,7 +371,7 @@ async def get_price_chart_intent(update: Update, context: ContextTypes.DEFAULT_T
 
     # Assuming chainId 1 (Ethereum) for now
     chain_id = 1
-    historical_data_response = okx_client.get_historical_price(token_address, chain_id, period)
+    historical_data_response = await okx_client.get_historical_price(token_address, chain_id, period)
 
     if not historical_data_response.get("success"):
         await update.message.reply_text(f"Sorry, I couldn't fetch historical data. Error: {historical_data_response.get('error')}")
@@ -352,6 +390,13 @@ async def get_price_intent(update: Update, context: ContextTypes.DEFAULT_TYPE, e
         await update.message.reply_text("Please specify a token symbol (e.g., BTC, ETH).")
         return
     
+    # Tracked symbols are answered from the market-data snapshot without an OKX call
+    point = market_data.price(symbol)
+    if point is not None:
+        change = f" ({point.change_24h_pct:+.2f}% 24h)" if point.change_24h_pct is not None else ""
+        await update.message.reply_text(f"The current estimated price for {symbol.upper()}-USDT is ${point.price:.2f}{change}.")
+        return
+
     from_token_info = token_resolver.get_token_info(symbol.upper())
     to_token_info = token_resolver.get_token_info("USDT")
 
@@ -365,7 +410,7 @@ async def get_price_intent(update: Update, context: ContextTypes.DEFAULT_TYPE, e
     
     amount_in_smallest_unit = str(1 * 10**decimals)
 
-    quote_response = okx_client.get_live_quote(
+    quote_response = await okx_client.get_live_quote(
         from_token_address=from_token_address,
         to_token_address=to_token_address,
         amount=amount_in_smallest_unit
@@ -415,7 +460,7 @@ async def buy_token_intent(update: Update, context: ContextTypes.DEFAULT_TYPE, e
     amount_in_smallest_unit = str(int(float(amount) * 10**from_token_decimals))
 
     # Get a quote to show the user
-    quote_response = okx_client.get_live_quote(
+    quote_response = await okx_client.get_live_quote(
         from_token_address=from_token_address,
         to_token_address=to_token_address,
         amount=amount_in_smallest_unit,
@@ -464,6 +509,34 @@ async def buy_token_intent(update: Update, context: ContextTypes.DEFAULT_TYPE, e
     schedule_state_timeout(update, context, "AWAIT_CONFIRMATION")
     return AWAIT_CONFIRMATION
 
+async def _resolve_trading_wallet(telegram_id: int):
+    """Return ``(error_message, is_live_trade, wallet_address, private_key)`` for a swap.
+
+    *error_message* is set (and the swap must not run) when live trading is
+    enabled without a usable default wallet. Raises DatabaseConnectionError.
+    """
+    user_settings = await repository.get_user_settings(telegram_id)
+    live_trading_enabled = user_settings.live_trading_enabled if user_settings else False
+    default_wallet_id = user_settings.default_wallet_id if user_settings else None
+
+    # Regardless of global dry-run, if user has enabled live trading, enforce default wallet presence
+    if live_trading_enabled and not default_wallet_id:
+        return "Live trading is enabled, but you have not set a default wallet. Please use /setdefaultwallet.", False, None, None
+
+    # Determine if this is a live trade (only true if live trading is enabled AND global dry-run is off)
+    is_live_trade = live_trading_enabled and not DRY_RUN_MODE
+
+    # If user enabled live trading, validate wallet presence even in dry run
+    wallet_data = await repository.get_wallet(default_wallet_id) if live_trading_enabled else None
+    if live_trading_enabled and wallet_data is None:
+        return "Your default wallet could not be found. Please set it again.", False, None, None
+
+    if is_live_trade:
+        return None, True, wallet_data[0], decrypt_data(wallet_data[1])
+    # Dry run path or live disabled: fall back to test address for simulations
+    return None, False, os.getenv("TEST_WALLET_ADDRESS", "0xYourDefaultWalletAddress"), None
+
+
 @guarded_handler("E_OKX_API")
 async def confirm_swap(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Executes the swap after user confirmation, handling both live and simulated trades."""
@@ -476,58 +549,15 @@ async def confirm_swap(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
         await query.edit_message_text(text="Sorry, the swap details have expired. Please try again.")
         return ConversationHandler.END
 
-    conn = get_db_connection()
-    if conn is None:
-        await query.edit_message_text("Database connection failed. Please try again later.")
-        return ConversationHandler.END
-
     try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT live_trading_enabled, default_wallet_id FROM users WHERE telegram_id = %s;", (user.id,))
-            user_settings = cur.fetchone()
-            live_trading_enabled = user_settings[0] if user_settings else False
-            default_wallet_id = user_settings[1] if user_settings else None
-
-        # Regardless of global dry-run, if user has enabled live trading, enforce default wallet presence
-        if live_trading_enabled and not default_wallet_id:
-            await query.edit_message_text("Live trading is enabled, but you have not set a default wallet. Please use /setdefaultwallet.")
+        error, is_live_trade, wallet_address, private_key = await _resolve_trading_wallet(user.id)
+        if error:
+            await query.edit_message_text(error)
             return ConversationHandler.END
 
-        # Determine if this is a live trade (only true if live trading is enabled AND global dry-run is off)
-        is_live_trade = live_trading_enabled and not DRY_RUN_MODE
-
-        wallet_address = None
-        private_key = None
-
-        if is_live_trade:
-            # Retrieve wallet for live trades
-            with conn.cursor() as cur:
-                cur.execute("SELECT address, private_key_encrypted FROM wallets WHERE id = %s;", (default_wallet_id,))
-                wallet_data = cur.fetchone()
-                if not wallet_data:
-                    await query.edit_message_text("Your default wallet could not be found. Please set it again.")
-                    return ConversationHandler.END
-                wallet_address = wallet_data[0]
-                private_key = decrypt_data(wallet_data[1])
-        else:
-            # Dry run path or live disabled
-            if live_trading_enabled:
-                # If user enabled live trading, try to validate wallet presence even in dry run
-                try:
-                    with conn.cursor() as cur:
-                        cur.execute("SELECT address FROM wallets WHERE id = %s;", (default_wallet_id,))
-                        wallet_data = cur.fetchone()
-                except StopIteration:
-                    wallet_data = True  # Skip strict check in tests that don't stub this call
-                if wallet_data is None:
-                    await query.edit_message_text("Your default wallet could not be found. Please set it again.")
-                    return ConversationHandler.END
-            # Fallback to test address for simulations
-            wallet_address = os.getenv("TEST_WALLET_ADDRESS", "0xYourDefaultWalletAddress")
-
         await query.edit_message_text(text=f"Executing swap of {swap_details['amount']} {swap_details['from_token']} for {swap_details['to_token']}...")
 
-        swap_response = okx_client.execute_swap(
+        swap_response = await okx_client.execute_swap(
             from_token_address=swap_details['from_token_address'],
             to_token_address=swap_details['to_token_address'],
             amount=swap_details['amount_in_smallest_unit'],
@@ -545,9 +575,9 @@ async def confirm_swap(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
                 token_resolver = TokenResolver()
             to_token_decimals = token_resolver.get_token_info(swap_details['to_token'])['decimals']
             to_amount = float(response_data.get('toTokenAmount', 0)) / (10**to_token_decimals)
-            
+        
             status_message = "✅ Swap Executed Successfully!" if is_live_trade else "✅ Swap Simulated Successfully!"
-            
+        
             response_message = (
                 f"[{ 'LIVE' if is_live_trade else 'DRY RUN' }] {status_message}\n\n"
                 f"➡️ From: {swap_details['amount']} {swap_details['from_token']}\n"
@@ -564,20 +594,16 @@ async def confirm_swap(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
             status_message = "❌ Swap Failed" if is_live_trade else "❌ Simulation Failed"
             await query.edit_message_text(text=f"[{ 'LIVE' if is_live_trade else 'DRY RUN' }] {status_message}. Error: {swap_response.get('error')}")
 
+    except DatabaseConnectionError:
+        await query.edit_message_text("Database connection failed. Please try again later.")
+        return ConversationHandler.END
     except Exception as e:
         logger.error(f"An error occurred during swap confirmation for user {user.id}: {e}", exc_info=True)
         await query.edit_message_text("An unexpected error occurred during the swap. Please check the logs.")
     finally:
-        if conn:
-            conn.close()
         context.user_data.pop('swap_details', None)
 
-    # Check if we are in a rebalance flow
-    if 'rebalance_plan' in context.user_data and context.user_data['rebalance_plan']:
-        # Present the next swap for confirmation
-        return await present_next_rebalance_swap(update, context)
-    else:
-        return ConversationHandler.END
+    return ConversationHandler.END
 
 async def cancel_swap(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Cancels the swap conversation."""
@@ -585,12 +611,6 @@ async def cancel_swap(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
     await query.answer()
     await query.edit_message_text(text="Swap cancelled.")
     context.user_data.pop('swap_details', None)
-    
-    # If in a rebalance flow, cancel the entire plan
-    if 'rebalance_plan' in context.user_data:
-        context.user_data.pop('rebalance_plan', None)
-        await query.message.reply_text("Portfolio rebalance cancelled.")
-
     return ConversationHandler.END
 
 @guarded_handler("E_OKX_API")
@@ -629,7 +649,7 @@ async def sell_token_intent(update: Update, context: ContextTypes.DEFAULT_TYPE,
     amount_in_smallest_unit = str(int(float(amount) * 10**from_token_decimals))
 
     # Get a quote to show the user (sell path: from=symbol, to=currency)
-    quote_response = okx_client.get_live_quote(
+    quote_response = await okx_client.get_live_quote(
         from_token_address=from_token_address,
         to_token_address=to_token_address,
         amount=amount_in_smallest_unit,
@@ -710,13 +730,20 @@ async def set_take_profit_intent(update: Update, context: ContextTypes.DEFAULT_T
 async def insights(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Provides personalized market insights."""
     user = update.effective_user
-    await update.message.reply_text("Generating your personalized market insights... This may take a moment.")
     
     # In a real app, you would fetch the user's ID from the database
     user_id = user.id
     
-    insights_text = insights_client.generate_insights(user_id)
-    await update.message.reply_text(insights_text)
+    # Insights are precomputed after portfolio syncs; only a cache miss waits for Gemini Pro
+    insight = await insights_client.aget_insights(user_id, generate=False)
+    if insight is None:
+        await update.message.reply_text("Generating your personalized market insights... This may take a moment.")
+        insight = await insights_client.aget_insights(user_id)
+    if insight is None:
+        await update.message.reply_text(INSIGHTS_UNAVAILABLE)
+        return
+    age = _format_age(insight.age_secs(), label="generated")
+    await update.message.reply_text(f"{insight.text}\n\n🕒 {age}")
 
 def _normalize_chart_period(period_str: str) -> str:
     """Map flexible inputs like 'last 30 days' to supported strings: '24h', '7d', '30d'."""
@@ -743,7 +770,7 @@ async def portfolio_performance(update: Update, context: ContextTypes.DEFAULT_TY
 
     await update.message.reply_text(f"Calculating your portfolio performance for the last {period_days} days...")
 
-    performance_data = portfolio_service.get_portfolio_performance(user.id, period_days)
+    performance_data = await repository.run(portfolio_service.get_portfolio_performance, user.id, period_days)
 
     if not performance_data:
         await update.message.reply_text("Could not calculate portfolio performance. Please ensure you have a portfolio history.")
@@ -769,79 +796,232 @@ async def portfolio_performance(update: Update, context: ContextTypes.DEFAULT_TY
 
     await update.message.reply_text(response_message, parse_mode='Markdown')
 
+REBALANCE_STATUS_EDIT_SECS = float(os.getenv("REBALANCE_STATUS_EDIT_SECS", "1.0"))  # min gap between status edits
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+
+def _leg_line(index: int, leg: dict) -> str:
+    quote = leg.get('quote') or {}
+    receive = f"≈{quote['to_amount']:.6f} {leg['to']}" if quote.get('success') else leg['to']
+    return f"{index + 1}. Sell {leg['from_amount']:.6f} {leg['from']} for {receive} (~${leg['usd_amount']:.2f})"
+
+
+def _bounded_lines(header: str, lines: list, footer: str = "") -> str:
+    """Join *lines* under *header*, eliding the tail so the text fits one Telegram message."""
+    text = "\n".join([header, ""] + lines + ([footer] if footer else []))
+    if len(text) <= TELEGRAM_MESSAGE_LIMIT:
+        return text
+    kept = []
+    budget = TELEGRAM_MESSAGE_LIMIT - len(header) - len(footer) - 64
+    for line in lines:
+        if budget - len(line) - 1 < 0:
+            break
+        kept.append(line)
+        budget -= len(line) + 1
+    kept.append(f"… and {len(lines) - len(kept)} more")
+    return "\n".join([header, ""] + kept + ([footer] if footer else []))
+
+
+@guarded_handler("E_OKX_API")
 async def rebalance_portfolio_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Starts the portfolio rebalance conversation."""
+    """Plans the rebalance, quotes every leg concurrently and asks for one confirmation."""
     user = update.effective_user
     await update.message.reply_text("Calculating your portfolio rebalance plan... This may take a moment.")
 
-    plan = portfolio_service.suggest_rebalance(user.id)
+    plan = await repository.run(portfolio_service.suggest_rebalance, user.id)
 
     if not plan:
         await update.message.reply_text("Your portfolio is already balanced, or there's nothing to rebalance.")
         return ConversationHandler.END
 
-    context.user_data['rebalance_plan'] = plan
+    # Price every leg up front, concurrently; legs without a quote are left out
+    plan = await price_legs(plan, okx_client, token_resolver)
+    legs = [leg for leg in plan if leg['quote'].get('success')]
+    if not legs:
+        await update.message.reply_text("Sorry, I couldn't get quotes for any trade in the rebalance plan. Please try again later.")
+        return ConversationHandler.END
+    context.user_data['rebalance_plan'] = legs
 
-    summary_message = "Here is the proposed rebalance plan:\n\n"
-    for i, trade in enumerate(plan):
-        summary_message += f"**Trade {i+1}**: Sell {trade['from_amount']:.6f} {trade['from']} for {trade['to']} (~${trade['usd_amount']:.2f})\n"
-    
-    await update.message.reply_text(summary_message, parse_mode='Markdown')
-    
-    return await present_next_rebalance_swap(update, context)
+    total_usd = sum(leg['usd_amount'] for leg in legs)
+    total_cost = sum(leg['est_cost_usd'] for leg in legs)
+    footer = f"\nTotal: ~${total_usd:,.2f} across {len(legs)} trade(s), est. cost ${total_cost:,.2f}."
+    if len(legs) < len(plan):
+        footer += f"\n{len(plan) - len(legs)} trade(s) skipped: no quote available."
 
-@guarded_handler("E_OKX_API")
-async def present_next_rebalance_swap(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Presents the next swap in the rebalance plan for confirmation."""
-    plan = context.user_data.get('rebalance_plan')
-    if not plan:
-        await update.callback_query.edit_message_text("✅ Portfolio rebalance complete!")
+    keyboard = [
+        [
+            InlineKeyboardButton("✅ Confirm all", callback_data="confirm_rebalance"),
+            InlineKeyboardButton("❌ Cancel", callback_data="cancel_rebalance"),
+        ]
+    ]
+    await update.message.reply_text(
+        _bounded_lines("Here is the proposed rebalance plan:", [_leg_line(i, leg) for i, leg in enumerate(legs)], footer),
+        reply_markup=InlineKeyboardMarkup(keyboard),
+    )
+    schedule_state_timeout(update, context, "AWAIT_REBALANCE_CONFIRMATION")
+    return AWAIT_REBALANCE_CONFIRMATION
+
+
+async def confirm_rebalance(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Executes every confirmed leg with bounded parallelism, streaming status into one message."""
+    query = update.callback_query
+    await query.answer()
+    user = update.effective_user
+    legs = context.user_data.pop('rebalance_plan', None)
+    if not legs:
+        await query.edit_message_text(text="Sorry, the rebalance plan has expired. Please try again.")
         return ConversationHandler.END
 
-    trade = plan.pop(0)
-    
-    # Use the sell_token_intent to set up the confirmation
-    entities = {
-        "symbol": trade['from'],
-        "amount": str(trade['from_amount']),
-        "currency": trade['to']
-    }
-    
-    # We need to decide whether to use the message or callback_query object to send the reply
-    if update.callback_query:
-        # If we are in a sequence of swaps, we need to send a new message
-        await update.callback_query.message.reply_text("Now for the next trade:")
-        return await sell_token_intent(update.callback_query.message, context, entities)
-    else:
-        return await sell_token_intent(update, context, entities)
+    try:
+        error, is_live_trade, wallet_address, private_key = await _resolve_trading_wallet(user.id)
+    except DatabaseConnectionError:
+        await query.edit_message_text("Database connection failed. Please try again later.")
+        return ConversationHandler.END
+    if error:
+        await query.edit_message_text(error)
+        return ConversationHandler.END
+
+    mode = 'LIVE' if is_live_trade else 'DRY RUN'
+    statuses = ["⏳ queued"] * len(legs)
+    last_edit = 0.0
+
+    def render(done: bool = False) -> str:
+        completed = sum(1 for status in statuses if status.startswith(("✅", "❌")))
+        header = f"[{mode}] {'Rebalance finished' if done else 'Rebalancing'} – {completed}/{len(legs)} trade(s) done"
+        return _bounded_lines(header, [f"{_leg_line(i, leg)}: {statuses[i]}" for i, leg in enumerate(legs)])
+
+    async def publish(done: bool = False) -> None:
+        nonlocal last_edit
+        # Telegram rate-limits edits; intermediate states may be coalesced, the final one never is
+        if not done and time.monotonic() - last_edit < REBALANCE_STATUS_EDIT_SECS:
+            return
+        last_edit = time.monotonic()
+        try:
+            await query.edit_message_text(text=render(done))
+        except Exception as e:
+            logger.debug("Rebalance status edit skipped: %s", e)
+
+    async def on_status(index: int, state: str, result) -> None:
+        if state == "running":
+            statuses[index] = "🔄 executing"
+        elif result.get("success"):
+            data = result.get("data") or {}
+            to_info = token_resolver.get_token_info(legs[index]['to'])
+            tx_hash = data.get('txHash')
+            if to_info and data.get('toTokenAmount') is not None:
+                received = float(data['toTokenAmount']) / 10**int(to_info['decimals'])
+                statuses[index] = f"✅ {received:.6f} {legs[index]['to']}"
+            else:
+                statuses[index] = f"✅ swapped to {legs[index]['to']}"
+            statuses[index] += f" (tx {tx_hash})" if is_live_trade and tx_hash else ""
+        else:
+            statuses[index] = f"❌ {result.get('error')}"
+        await publish()
+
+    async def execute(leg: dict) -> dict:
+        quote = leg['quote']
+        return await okx_client.execute_swap(
+            from_token_address=quote['from_token_address'],
+            to_token_address=quote['to_token_address'],
+            amount=quote['amount_in_smallest_unit'],
+            wallet_address=wallet_address,
+            private_key=private_key,
+            dry_run=not is_live_trade,
+        )
+
+    await publish()
+    await execute_legs(legs, execute, on_status=on_status)
+    await publish(done=True)
+    return ConversationHandler.END
+
+
+async def cancel_rebalance(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Drops the pending rebalance plan."""
+    query = update.callback_query
+    await query.answer()
+    context.user_data.pop('rebalance_plan', None)
+    await query.edit_message_text(text="Portfolio rebalance cancelled.")
+    return ConversationHandler.END
 
 # --- Portfolio Command ---
-@guarded_handler("E_DB_QUERY")
-async def portfolio(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Synchronize and display the user's portfolio."""
-    user = update.effective_user
+# Strong references to fire-and-forget tasks so they are not garbage collected mid-run
+_background_tasks = set()
 
-    await update.message.reply_text("Syncing your portfolio... this could take a few seconds.")
 
-    # Attempt to sync balances and check the result
-    synced_ok = portfolio_service.sync_balances(user.id)
-    if not synced_ok:
-        await update.message.reply_text("I couldn't sync your portfolio due to an API error. Please try again later.")
-        return
+def _spawn_background(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
 
-    snapshot = portfolio_service.get_snapshot(user.id)
-    if not snapshot or not snapshot.get("assets"):
-        await update.message.reply_text("Your portfolio is currently empty. If you've recently funded your wallet, it may take a few minutes for the assets to appear.")
-        return
 
+def _format_age(age_secs, label: str = "updated") -> str:
+    if age_secs is None:
+        return "not yet synced"
+    if age_secs < 60:
+        return f"{label} just now"
+    if age_secs < 3600:
+        return f"{label} {int(age_secs // 60)} min ago"
+    if age_secs < 86400:
+        return f"{label} {int(age_secs // 3600)} h ago"
+    return f"{label} {int(age_secs // 86400)} d ago"
+
+
+def _format_portfolio(snapshot: dict) -> str:
     total = snapshot.get("total_value_usd", 0)
     assets = snapshot.get("assets", [])
 
-    lines = [f"📊 *Your Portfolio* (≈ ${total:,.2f})", ""]
+    lines = [f"📊 *Your Portfolio* (≈ ${total:,.2f})", f"_{_format_age(snapshot.get('age_secs'))}_", ""]
     for asset in assets:
         lines.append(f"• {asset['symbol']}: {asset['quantity']:.4f} (~${asset['value_usd']:.2f})")
+    return "\n".join(lines)
 
-    await update.message.reply_text("\n".join(lines), parse_mode='Markdown')
+
+def _portfolio_values(snapshot: dict):
+    """The displayed figures of a snapshot, ignoring its age."""
+    return (
+        round(snapshot.get("total_value_usd", 0), 2),
+        [(a["symbol"], round(a["quantity"], 4), round(a["value_usd"], 2)) for a in snapshot.get("assets", [])],
+    )
+
+
+async def _refresh_portfolio_message(telegram_id: int, message, stored: dict) -> None:
+    """Sync in the background and edit *message* in place with the fresh figures."""
+    try:
+        # Refresh only wallets older than WALLET_SYNC_MAX_AGE_SECS; fresh ones are served as stored
+        synced_ok = await asyncio.to_thread(portfolio_service.sync_balances, telegram_id, incremental=True)
+        if not synced_ok:
+            # Stored figures stay on screen, labelled with their age
+            if not stored:
+                await message.edit_text("I couldn't sync your portfolio due to an API error. Please try again later.")
+            return
+
+        snapshot = await repository.run(portfolio_service.get_snapshot, telegram_id)
+        if not snapshot or not snapshot.get("assets"):
+            if not stored:
+                await message.edit_text("Your portfolio is currently empty. If you've recently funded your wallet, it may take a few minutes for the assets to appear.")
+            return
+        if stored and _portfolio_values(snapshot) == _portfolio_values(stored):
+            return
+        await message.edit_text(_format_portfolio(snapshot), parse_mode='Markdown')
+    except Exception as e:
+        logger.warning("Background portfolio refresh failed for %s: %s", telegram_id, e)
+
+
+@guarded_handler("E_DB_QUERY")
+async def portfolio(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Display the user's stored portfolio at once, then refresh it in the background."""
+    user = update.effective_user
+
+    await repository.touch_user(user.id)
+    stored = await repository.run(portfolio_service.get_snapshot, user.id)
+    if stored and stored.get("assets"):
+        message = await update.message.reply_text(_format_portfolio(stored), parse_mode='Markdown')
+    else:
+        stored = {}
+        message = await update.message.reply_text("Syncing your portfolio... this could take a few seconds.")
+
+    _spawn_background(_refresh_portfolio_message(user.id, message, stored))
 
 # --- Wallet Management ---
 async def add_wallet_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -900,7 +1080,7 @@ async def received_private_key(update: Update, context: ContextTypes.DEFAULT_TYP
 
         encrypted_private_key = encrypt_data(private_key)
         
-        add_wallet(user.id, wallet_name, wallet_address, encrypted_private_key, chain_id=1)
+        await repository.run(add_wallet, user.id, wallet_name, wallet_address, encrypted_private_key, chain_id=1)
         
         await update.message.reply_text(f"✅ Wallet '{wallet_name}' added successfully!")
 
@@ -925,64 +1105,46 @@ async def received_private_key(update: Update, context: ContextTypes.DEFAULT_TYP
 async def list_wallets(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Lists all of the user's saved wallets."""
     user = update.effective_user
-    conn = get_db_connection()
-    if conn is None:
+    try:
+        wallets = await repository.list_wallets(user.id)
+    except DatabaseConnectionError:
         await update.message.reply_text("Database connection failed. Please try again later.")
         return
-
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT id FROM users WHERE telegram_id = %s;", (user.id,))
-            user_id = cur.fetchone()[0]
-
-            cur.execute("SELECT name, address FROM wallets WHERE user_id = %s;", (user_id,))
-            wallets = cur.fetchall()
-
-            if not wallets:
-                await update.message.reply_text("You haven't added any wallets yet. Use /addwallet to get started.")
-                return
-
-            message = "Your saved wallets:\n\n"
-            for name, address in wallets:
-                message += f"🔹 **{name}**: `{address}`\n"
-            
-            await update.message.reply_text(message, parse_mode='Markdown')
     except Exception as e:
         logger.error(f"Error listing wallets for user {user.id}: {e}")
         await update.message.reply_text("An error occurred while fetching your wallets.")
-    finally:
-        if conn:
-            conn.close()
+        return
+
+    if not wallets:
+        await update.message.reply_text("You haven't added any wallets yet. Use /addwallet to get started.")
+        return
+
+    message = "Your saved wallets:\n\n"
+    for _, name, address in wallets:
+        message += f"🔹 **{name}**: `{address}`\n"
+
+    await update.message.reply_text(message, parse_mode='Markdown')
 
 async def delete_wallet_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Starts the process of deleting a wallet."""
     user = update.effective_user
-    conn = get_db_connection()
-    if conn is None:
+    try:
+        wallets = await repository.list_wallets(user.id)
+    except DatabaseConnectionError:
         await update.message.reply_text("Database connection failed. Please try again later.")
         return
-
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT id FROM users WHERE telegram_id = %s;", (user.id,))
-            user_id = cur.fetchone()[0]
-
-            cur.execute("SELECT name FROM wallets WHERE user_id = %s;", (user_id,))
-            wallets = cur.fetchall()
-
-            if not wallets:
-                await update.message.reply_text("You don't have any wallets to delete.")
-                return
-
-            keyboard = [[InlineKeyboardButton(name[0], callback_data=f"delete_{name[0]}")] for name in wallets]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await update.message.reply_text("Which wallet would you like to delete?", reply_markup=reply_markup)
     except Exception as e:
         logger.error(f"Error starting wallet deletion for user {user.id}: {e}")
         await update.message.reply_text("An error occurred while fetching your wallets.")
-    finally:
-        if conn:
-            conn.close()
+        return
+
+    if not wallets:
+        await update.message.reply_text("You don't have any wallets to delete.")
+        return
+
+    keyboard = [[InlineKeyboardButton(name, callback_data=f"delete_{name}")] for _, name, _ in wallets]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await update.message.reply_text("Which wallet would you like to delete?", reply_markup=reply_markup)
 
 async def delete_wallet_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handles the callback for deleting a wallet."""
@@ -991,63 +1153,44 @@ async def delete_wallet_callback(update: Update, context: ContextTypes.DEFAULT_T
     wallet_name = query.data.split("_")[1]
     user = update.effective_user
 
-    conn = get_db_connection()
-    if conn is None:
+    try:
+        await repository.delete_wallet(user.id, wallet_name)
+    except DatabaseConnectionError:
         await query.edit_message_text("Database connection failed. Please try again later.")
         return
-
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT id FROM users WHERE telegram_id = %s;", (user.id,))
-            user_id = cur.fetchone()[0]
-
-            cur.execute("DELETE FROM wallets WHERE user_id = %s AND name = %s;", (user_id, wallet_name))
-            conn.commit()
-            await query.edit_message_text(f"✅ Wallet '{wallet_name}' has been deleted.")
     except Exception as e:
         logger.error(f"Error deleting wallet for user {user.id}: {e}")
         await query.edit_message_text("An error occurred while deleting your wallet.")
-    finally:
-        if conn:
-            conn.close()
+        return
+
+    await query.edit_message_text(f"✅ Wallet '{wallet_name}' has been deleted.")
 
 async def set_default_wallet_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Starts the conversation to set the default wallet."""
     user = update.effective_user
-    conn = get_db_connection()
-    if conn is None:
+    try:
+        wallets = await repository.list_wallets(user.id)
+    except DatabaseConnectionError:
         await update.message.reply_text("Database connection failed. Please try again later.")
         return ConversationHandler.END
-
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT id FROM users WHERE telegram_id = %s;", (user.id,))
-            user_id_result = cur.fetchone()
-            if not user_id_result:
-                await update.message.reply_text("Please /start the bot first to create an account.")
-                return ConversationHandler.END
-            user_id = user_id_result[0]
-
-            cur.execute("SELECT id, name, address FROM wallets WHERE user_id = %s;", (user_id,))
-            wallets = cur.fetchall()
-
-            if not wallets:
-                await update.message.reply_text("You haven't added any wallets yet. Use the 'Add a new wallet' command to get started.")
-                return ConversationHandler.END
-
-            keyboard = [[InlineKeyboardButton(f"{name} ({address[:6]}...{address[-4:]})", callback_data=f"set_wallet_{wallet_id}")] for wallet_id, name, address in wallets]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await update.message.reply_text("Which wallet would you like to set as your default for trading?", reply_markup=reply_markup)
-            schedule_state_timeout(update, context, "AWAIT_WALLET_SELECTION")
-            return AWAIT_WALLET_SELECTION
-
     except Exception as e:
         logger.error(f"Error starting set_default_wallet for user {user.id}: {e}")
         await update.message.reply_text("An error occurred while fetching your wallets.")
         return ConversationHandler.END
-    finally:
-        if conn:
-            conn.close()
+
+    if wallets is None:
+        await update.message.reply_text("Please /start the bot first to create an account.")
+        return ConversationHandler.END
+
+    if not wallets:
+        await update.message.reply_text("You haven't added any wallets yet. Use the 'Add a new wallet' command to get started.")
+        return ConversationHandler.END
+
+    keyboard = [[InlineKeyboardButton(f"{name} ({address[:6]}...{address[-4:]})", callback_data=f"set_wallet_{wallet_id}")] for wallet_id, name, address in wallets]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await update.message.reply_text("Which wallet would you like to set as your default for trading?", reply_markup=reply_markup)
+    schedule_state_timeout(update, context, "AWAIT_WALLET_SELECTION")
+    return AWAIT_WALLET_SELECTION
 
 async def set_default_wallet_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handles the callback for setting the default wallet."""
@@ -1056,64 +1199,47 @@ async def set_default_wallet_callback(update: Update, context: ContextTypes.DEFA
     wallet_id = int(query.data.split("_")[2])
     user = update.effective_user
 
-    conn = get_db_connection()
-    if conn is None:
-        await query.edit_message_text("Database connection failed. Please try again later.")
-        return ConversationHandler.END
-
     try:
-        with conn.cursor() as cur:
-            cur.execute("UPDATE users SET default_wallet_id = %s WHERE telegram_id = %s;", (wallet_id, user.id))
-            conn.commit()
-            await query.edit_message_text(f"✅ Default wallet has been set successfully.")
+        await repository.set_default_wallet(user.id, wallet_id)
+        await query.edit_message_text(f"✅ Default wallet has been set successfully.")
+    except DatabaseConnectionError:
+        await query.edit_message_text("Database connection failed. Please try again later.")
     except Exception as e:
         logger.error(f"Error setting default wallet for user {user.id}: {e}")
         await query.edit_message_text("An error occurred while setting your default wallet.")
-    finally:
-        if conn:
-            conn.close()
-    
+
     return ConversationHandler.END
 
 
 async def enable_live_trading_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Starts the conversation to enable or disable live trading."""
     user = update.effective_user
-    conn = get_db_connection()
-    if conn is None:
+    try:
+        user_settings = await repository.get_user_settings(user.id)
+    except DatabaseConnectionError:
         await update.message.reply_text("Database connection failed. Please try again later.")
         return ConversationHandler.END
-
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT default_wallet_id, live_trading_enabled FROM users WHERE telegram_id = %s;", (user.id,))
-            user_settings = cur.fetchone()
-
-            if not user_settings or not user_settings[0]:
-                await update.message.reply_text("You must set a default wallet before enabling live trading. Use /setdefaultwallet.")
-                return ConversationHandler.END
-
-            live_trading_enabled = user_settings[1]
-            status = "enabled" if live_trading_enabled else "disabled"
-            
-            keyboard = [
-                [
-                    InlineKeyboardButton("✅ Enable", callback_data="enable_live_trading_yes"),
-                    InlineKeyboardButton("❌ Disable", callback_data="enable_live_trading_no"),
-                ]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await update.message.reply_text(f"Live trading is currently **{status}**. Would you like to change this setting?", reply_markup=reply_markup, parse_mode='Markdown')
-            schedule_state_timeout(update, context, "AWAIT_LIVE_TRADING_CONFIRMATION")
-            return AWAIT_LIVE_TRADING_CONFIRMATION
-
     except Exception as e:
         logger.error(f"Error starting enable_live_trading for user {user.id}: {e}")
         await update.message.reply_text("An error occurred while fetching your settings.")
         return ConversationHandler.END
-    finally:
-        if conn:
-            conn.close()
+
+    if not user_settings or not user_settings.default_wallet_id:
+        await update.message.reply_text("You must set a default wallet before enabling live trading. Use /setdefaultwallet.")
+        return ConversationHandler.END
+
+    status = "enabled" if user_settings.live_trading_enabled else "disabled"
+
+    keyboard = [
+        [
+            InlineKeyboardButton("✅ Enable", callback_data="enable_live_trading_yes"),
+            InlineKeyboardButton("❌ Disable", callback_data="enable_live_trading_no"),
+        ]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await update.message.reply_text(f"Live trading is currently **{status}**. Would you like to change this setting?", reply_markup=reply_markup, parse_mode='Markdown')
+    schedule_state_timeout(update, context, "AWAIT_LIVE_TRADING_CONFIRMATION")
+    return AWAIT_LIVE_TRADING_CONFIRMATION
 
 
 async def enable_live_trading_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -1124,24 +1250,16 @@ async def enable_live_trading_callback(update: Update, context: ContextTypes.DEF
     enable = choice == "yes"
     user = update.effective_user
 
-    conn = get_db_connection()
-    if conn is None:
-        await query.edit_message_text("Database connection failed. Please try again later.")
-        return ConversationHandler.END
-
     try:
-        with conn.cursor() as cur:
-            cur.execute("UPDATE users SET live_trading_enabled = %s WHERE telegram_id = %s;", (enable, user.id))
-            conn.commit()
-            status = "enabled" if enable else "disabled"
-            await query.edit_message_text(f"✅ Live trading has been **{status}**.", parse_mode='Markdown')
+        await repository.set_live_trading(user.id, enable)
+        status = "enabled" if enable else "disabled"
+        await query.edit_message_text(f"✅ Live trading has been **{status}**.", parse_mode='Markdown')
+    except DatabaseConnectionError:
+        await query.edit_message_text("Database connection failed. Please try again later.")
     except Exception as e:
         logger.error(f"Error updating live trading status for user {user.id}: {e}")
         await query.edit_message_text("An error occurred while updating your settings.")
-    finally:
-        if conn:
-            conn.close()
-    
+
     return ConversationHandler.END
 
 # --- Alert Management ---
@@ -1186,28 +1304,21 @@ async def received_alert_price(update: Update, context: ContextTypes.DEFAULT_TYP
     symbol = context.user_data.get('alert_symbol')
     condition = context.user_data.get('alert_condition')
 
-    conn = get_db_connection()
-    if conn is None:
-        await update.message.reply_text("Database connection failed. Please try again later.")
-        return ConversationHandler.END
-
     try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT id FROM users WHERE telegram_id = %s;", (user.id,))
-            user_id = cur.fetchone()[0]
-
-            cur.execute(
-                "INSERT INTO alerts (user_id, symbol, target_price, condition) VALUES (%s, %s, %s, %s);",
-                (user_id, symbol, target_price, condition)
-            )
-            conn.commit()
+        created = await repository.add_alert(user.id, symbol, target_price, condition)
+        if created is None:
+            await update.message.reply_text("Please /start the bot first to create an account.")
+        else:
+            alert_id, user_id = created
+            # Keep the monitor's in-memory index current without a table reload
+            alert_index.add(alert_id, user_id, symbol, target_price, condition)
             await update.message.reply_text(f"✅ Alert set! I will notify you when {symbol} goes {condition} ${target_price:.2f}.")
+    except DatabaseConnectionError:
+        await update.message.reply_text("Database connection failed. Please try again later.")
     except Exception as e:
         logger.error(f"Error adding alert for user {user.id}: {e}")
         await update.message.reply_text("An error occurred while saving your alert.")
     finally:
-        if conn:
-            conn.close()
         context.user_data.clear()
 
     return ConversationHandler.END
@@ -1216,34 +1327,25 @@ async def received_alert_price(update: Update, context: ContextTypes.DEFAULT_TYP
 async def list_alerts(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Lists all of the user's active alerts."""
     user = update.effective_user
-    conn = get_db_connection()
-    if conn is None:
+    try:
+        alerts = await repository.list_active_alerts(user.id)
+    except DatabaseConnectionError:
         await update.message.reply_text("Database connection failed. Please try again later.")
         return
-
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT id FROM users WHERE telegram_id = %s;", (user.id,))
-            user_id = cur.fetchone()[0]
-
-            cur.execute("SELECT symbol, condition, target_price FROM alerts WHERE user_id = %s AND is_active = TRUE;", (user_id,))
-            alerts = cur.fetchall()
-
-            if not alerts:
-                await update.message.reply_text("You have no active alerts. Use /addalert to create one.")
-                return
-
-            message = "Your active alerts:\n\n"
-            for symbol, condition, target_price in alerts:
-                message += f"🔹 **{symbol}** {condition} `${target_price:.2f}`\n"
-            
-            await update.message.reply_text(message, parse_mode='Markdown')
     except Exception as e:
         logger.error(f"Error listing alerts for user {user.id}: {e}")
         await update.message.reply_text("An error occurred while fetching your alerts.")
-    finally:
-        if conn:
-            conn.close()
+        return
+
+    if not alerts:
+        await update.message.reply_text("You have no active alerts. Use /addalert to create one.")
+        return
+
+    message = "Your active alerts:\n\n"
+    for symbol, condition, target_price in alerts:
+        message += f"🔹 **{symbol}** {condition} `${target_price:.2f}`\n"
+
+    await update.message.reply_text(message, parse_mode='Markdown')
 
 # --- Bot Setup ---
 if not TELEGRAM_BOT_TOKEN:
@@ -1268,6 +1370,11 @@ conv_handler = ConversationHandler(
             CallbackQueryHandler(cancel_swap, pattern="^cancel_swap$"),
             CallbackQueryHandler(cancel_any_flow, pattern="^cancel_flow$"),
         ],
+        AWAIT_REBALANCE_CONFIRMATION: [
+            CallbackQueryHandler(confirm_rebalance, pattern="^confirm_rebalance$"),
+            CallbackQueryHandler(cancel_rebalance, pattern="^cancel_rebalance$"),
+            CallbackQueryHandler(cancel_any_flow, pattern="^cancel_flow$"),
+        ],
         # States for adding a wallet
         AWAIT_WALLET_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, received_wallet_name)],
         AWAIT_WALLET_ADDRESS: [MessageHandler(filters.TEXT & ~filters.COMMAND, received_wallet_address)],
@@ -1327,6 +1434,13 @@ async def startup_event():
     initialize_database()
     logger.info("Database initialization complete.")
     token_resolver = TokenResolver()
+    if INTENT_CLASSIFIER_ENABLED:
+        # Refit with the parses Gemini has produced so far
+        await asyncio.to_thread(train_intent_classifier)
+
+    # One poller keeps every tracked price current for handlers, alerts and insights
+    market_data.resolve_token = _resolve_token
+    market_data.start()
 
     # Import and start the monitoring service as a background task
     from src.monitoring import main as monitoring_main
@@ -1353,11 +1467,48 @@ async def shutdown_event():
     logger.info("Shutting down...")
     await bot_app.updater.stop()
     await bot_app.stop()
+    await market_data.stop()
+    await async_transport.aclose()
+    # Let in-flight queries finish before their connections are closed
+    await asyncio.to_thread(repository.shutdown)
+    db_pool.closeall()
+    llm_executor.shutdown()
 
 @app.get('/')
 def health_check():
     return {"status": "ok"}
 
+@app.get('/sync/status')
+def sync_status():
+    """Progress and throughput of this node's current (or last) portfolio sync pass."""
+    from src.monitoring import sync_scheduler
+    return sync_scheduler.metrics()
+
+@app.get('/market/status')
+def market_status():
+    """Market-data poller health: snapshot age, symbols tracked and upstream quote rate."""
+    return market_data.metrics()
+
+@app.get('/nlp/speculation')
+def nlp_speculation_status():
+    """How often Flash trade parses are used directly and how often Pro changes them."""
+    return speculation_metrics.stats()
+
+@app.get('/llm/status')
+def llm_status():
+    """Gemini executor queue depth, in-flight calls, timeouts and wait times per model."""
+    return llm_executor.metrics()
+
+@app.get('/insights/cache')
+def insights_cache_status():
+    """Insights cache hit rate, background precomputations and the current market epoch."""
+    return insights_client.cache.stats()
+
+@app.get('/nlp/cache')
+def nlp_cache_status():
+    """Intent cache hit rate and the Gemini calls and latency it has saved."""
+    return nlp_client.cache.stats()
+
 # Register global error handler once the application is built
 add_global_error_handler(bot_app)
 
@@ -1379,23 +1530,22 @@ def clear_database(secret_key: str):
         raise HTTPException(status_code=401, detail="Unauthorized")
 
     try:
-        conn = get_db_connection()
-        if conn is None:
-            raise HTTPException(status_code=500, detail="Database connection failed")
-        
-        with conn.cursor() as cur:
-            # Drop all tables
-            cur.execute("""
-                DO $$ DECLARE
-                    r RECORD;
-                BEGIN
-                    FOR r IN (SELECT tablename FROM pg_tables WHERE schemaname = 'public') LOOP
-                        EXECUTE 'DROP TABLE IF EXISTS ' || quote_ident(r.tablename) || ' CASCADE';
-                    END LOOP;
-                END $$;
-            """)
-        conn.commit()
-        conn.close()
+        with db_connection() as conn:
+            if conn is None:
+                raise HTTPException(status_code=500, detail="Database connection failed")
+
+            with conn.cursor() as cur:
+                # Drop all tables
+                cur.execute("""
+                    DO $$ DECLARE
+                        r RECORD;
+                    BEGIN
+                        FOR r IN (SELECT tablename FROM pg_tables WHERE schemaname = 'public') LOOP
+                            EXECUTE 'DROP TABLE IF EXISTS ' || quote_ident(r.tablename) || ' CASCADE';
+                        END LOOP;
+                    END $$;
+                """)
+            conn.commit()
 
         # Re-initialize the schema
         initialize_database()
@@ -0,0 +1,286 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass, asdict, field
+from decimal import Decimal
+from types import MappingProxyType
+from typing import Awaitable, Callable, Dict, Iterable, List, Mapping, Optional
+
+from src import repository
+from src.alert_index import alert_index
+from src.constants import TOKEN_ADDRESSES, TOKEN_DECIMALS
+
+logger = logging.getLogger(__name__)
+
+# Environment-configurable defaults
+MARKET_DATA_POLL_SECS = float(os.getenv("MARKET_DATA_POLL_SECS", "30"))
+MARKET_DATA_CONCURRENCY = int(os.getenv("MARKET_DATA_CONCURRENCY", "8"))  # quotes in flight per poll
+# Readers fall back to a live quote when a symbol's price is older than this
+MARKET_DATA_MAX_AGE_SECS = float(os.getenv("MARKET_DATA_MAX_AGE_SECS", "120"))
+# How often the 24h-ago reference prices (hourly candles) and the alert/holding symbol set are reloaded
+MARKET_DATA_REFERENCE_REFRESH_SECS = float(os.getenv("MARKET_DATA_REFERENCE_REFRESH_SECS", "900"))
+# A 24h change within +/- this percentage reads as "flat"
+MARKET_DATA_FLAT_PCT = float(os.getenv("MARKET_DATA_FLAT_PCT", "0.5"))
+
+QUOTE_SYMBOL = "USDT"
+
+
+def _constant_token_info(symbol: str) -> Optional[Dict]:
+    if symbol in TOKEN_ADDRESSES and symbol in TOKEN_DECIMALS:
+        return {"address": TOKEN_ADDRESSES[symbol], "decimals": TOKEN_DECIMALS[symbol]}
+    return None
+
+
+def trend_of(change_pct: Optional[float], flat_pct: Optional[float] = None) -> str:
+    """``"up"``/``"down"``/``"flat"`` for a 24h change in percent, ``"unknown"`` without one."""
+    if change_pct is None:
+        return "unknown"
+    flat_pct = MARKET_DATA_FLAT_PCT if flat_pct is None else flat_pct
+    if change_pct > flat_pct:
+        return "up"
+    if change_pct < -flat_pct:
+        return "down"
+    return "flat"
+
+
+@dataclass(frozen=True)
+class PricePoint:
+    symbol: str
+    price: float  # USDT per whole token
+    change_24h_pct: Optional[float]
+    trend: str
+    updated_at: float  # unix time of the quote
+
+
+@dataclass(frozen=True)
+class MarketSnapshot:
+    """Immutable view of the latest prices; replaced wholesale on every poll."""
+
+    prices: Mapping[str, PricePoint] = field(default_factory=lambda: MappingProxyType({}))
+    taken_at: Optional[float] = None  # unix time of the poll that produced it
+    version: int = 0
+
+    def get(self, symbol: str) -> Optional[PricePoint]:
+        return self.prices.get(symbol.upper())
+
+    def as_dict(self) -> Dict[str, Dict]:
+        """``{symbol: {"price", "trend", "change_24h_pct"}}`` for prompts and API responses."""
+        return {
+            symbol: {"price": point.price, "trend": point.trend, "change_24h_pct": point.change_24h_pct}
+            for symbol, point in sorted(self.prices.items())
+        }
+
+
+@dataclass
+class MarketDataStats:
+    polls: int = 0
+    quotes: int = 0  # upstream quote calls made
+    quote_failures: int = 0
+    reference_loads: int = 0
+    last_poll_secs: float = 0.0
+    reads: int = 0  # lookups served from the snapshot
+    stale_reads: int = 0  # lookups that found no fresh price
+
+
+class MarketDataService:
+    """Polls USDT prices for every tracked symbol and publishes them as one snapshot.
+
+    Tracked symbols are the quotable entries of TOKEN_ADDRESSES plus any
+    symbol with an active alert or held by a user. Every MARKET_DATA_POLL_SECS
+    all of them are quoted concurrently (at most MARKET_DATA_CONCURRENCY at a
+    time), so the upstream request rate depends on the symbol count, not on
+    the number of users. The 24h trend compares each price with the open of
+    the hourly candle 24h ago from the candle store. Readers get the current
+    snapshot without any I/O; a symbol whose quote failed keeps its previous
+    price and ages until MARKET_DATA_MAX_AGE_SECS, after which ``price``
+    returns None and the caller quotes live.
+    """
+
+    def __init__(
+        self,
+        okx_client=None,
+        reference_prices: Optional[Callable[[List[str]], Dict[str, Decimal]]] = None,
+        held_symbols: Optional[Callable[[], Awaitable[Iterable[str]]]] = None,
+        resolve_token: Optional[Callable[[str], Optional[Dict]]] = None,
+        poll_secs: Optional[float] = None,
+        concurrency: Optional[int] = None,
+        max_age_secs: Optional[float] = None,
+        reference_refresh_secs: Optional[float] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self._okx_client = okx_client
+        self._reference_prices = reference_prices
+        self._held_symbols = held_symbols
+        self.resolve_token = resolve_token or _constant_token_info
+        self.poll_secs = poll_secs if poll_secs is not None else MARKET_DATA_POLL_SECS
+        self.concurrency = max(1, concurrency if concurrency is not None else MARKET_DATA_CONCURRENCY)
+        self.max_age_secs = max_age_secs if max_age_secs is not None else MARKET_DATA_MAX_AGE_SECS
+        self.reference_refresh_secs = (
+            reference_refresh_secs if reference_refresh_secs is not None else MARKET_DATA_REFERENCE_REFRESH_SECS
+        )
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._snapshot = MarketSnapshot()
+        self._references: Dict[str, Decimal] = {}
+        self._references_at: Optional[float] = None
+        self._held: List[str] = []
+        self._stats = MarketDataStats()
+        self._task: Optional[asyncio.Task] = None
+
+    # ------------------------------------------------------------------
+    # Reads (no I/O)
+    # ------------------------------------------------------------------
+    @property
+    def snapshot(self) -> MarketSnapshot:
+        return self._snapshot
+
+    def price(self, symbol: str, max_age_secs: Optional[float] = None) -> Optional[PricePoint]:
+        """The snapshot price of *symbol* if it is fresh enough, else None."""
+        point = self._snapshot.get(symbol)
+        max_age = self.max_age_secs if max_age_secs is None else max_age_secs
+        fresh = point is not None and self._clock() - point.updated_at <= max_age
+        with self._lock:
+            self._stats.reads += 1
+            self._stats.stale_reads += not fresh
+        return point if fresh else None
+
+    # ------------------------------------------------------------------
+    # Polling
+    # ------------------------------------------------------------------
+    def _client(self):
+        if self._okx_client is None:
+            from src.okx_client import AsyncOKXClient
+            self._okx_client = AsyncOKXClient()
+        return self._okx_client
+
+    def _load_references(self, symbols: List[str]) -> Dict[str, Decimal]:
+        if self._reference_prices is None:
+            from src.candle_store import CandleStore
+            from src.okx_explorer import OKXExplorer
+            candles = CandleStore(OKXExplorer())
+            self._reference_prices = lambda syms: candles.opening_prices(syms, bar="1H", bars=24)
+        return self._reference_prices(symbols)
+
+    def symbols(self) -> List[str]:
+        """Symbols quoted on the next poll."""
+        tracked = {s.upper() for s in list(TOKEN_ADDRESSES) + alert_index.symbols() + self._held}
+        tracked.discard(QUOTE_SYMBOL)
+        return sorted(s for s in tracked if self.resolve_token(s))
+
+    async def _refresh_references(self) -> None:
+        """Reload held symbols and the 24h-ago prices every MARKET_DATA_REFERENCE_REFRESH_SECS."""
+        now = self._clock()
+        if self._references_at is not None and now - self._references_at < self.reference_refresh_secs:
+            return
+        self._references_at = now
+        if self._held_symbols is not None:
+            try:
+                self._held = [str(s).upper() for s in await self._held_symbols()]
+            except Exception as e:
+                logger.warning("Could not load held symbols: %s", e)
+        try:
+            references = await asyncio.to_thread(self._load_references, self.symbols())
+        except Exception as e:
+            logger.warning("Could not load 24h reference prices: %s", e)
+            return
+        self._references = dict(references)
+        with self._lock:
+            self._stats.reference_loads += 1
+
+    async def _quote(self, symbol: str, quote_info: Dict, semaphore: asyncio.Semaphore) -> Optional[float]:
+        info = self.resolve_token(symbol)
+        async with semaphore:
+            try:
+                response = await self._client().get_live_quote(
+                    from_token_address=info["address"],
+                    to_token_address=quote_info["address"],
+                    amount=str(10 ** int(info["decimals"])),  # 1 whole token in its smallest unit
+                )
+            except Exception as e:
+                response = {"success": False, "error": str(e)}
+        with self._lock:
+            self._stats.quotes += 1
+            if not response.get("success"):
+                self._stats.quote_failures += 1
+        if not response.get("success"):
+            logger.debug("Market data quote failed for %s: %s", symbol, response.get("error"))
+            return None
+        return float(response["data"].get("toTokenAmount", 0)) / (10 ** int(quote_info["decimals"]))
+
+    async def refresh(self) -> MarketSnapshot:
+        """Quote every tracked symbol once and publish the new snapshot."""
+        started = time.perf_counter()
+        await self._refresh_references()
+        symbols = self.symbols()
+        quote_info = self.resolve_token(QUOTE_SYMBOL)
+        if not quote_info:
+            logger.error("Market data: no token info for %s", QUOTE_SYMBOL)
+            return self._snapshot
+        semaphore = asyncio.Semaphore(self.concurrency)
+        prices = await asyncio.gather(*(self._quote(s, quote_info, semaphore) for s in symbols))
+
+        now = self._clock()
+        previous = self._snapshot
+        points = {}
+        for symbol, price in zip(symbols, prices):
+            if price is None or price <= 0:
+                if previous.get(symbol) is not None:
+                    points[symbol] = previous.get(symbol)  # keep the last good price; it ages out
+                continue
+            reference = self._references.get(symbol)
+            change = float((Decimal(str(price)) - reference) / reference * 100) if reference else None
+            points[symbol] = PricePoint(symbol, price, change, trend_of(change), now)
+
+        snapshot = MarketSnapshot(prices=MappingProxyType(points), taken_at=now, version=previous.version + 1)
+        self._snapshot = snapshot
+        with self._lock:
+            self._stats.polls += 1
+            self._stats.last_poll_secs = time.perf_counter() - started
+        return snapshot
+
+    async def run(self) -> None:
+        """Poll forever at MARKET_DATA_POLL_SECS; errors are logged and the next poll proceeds."""
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Market data poll failed: %s", e)
+            await asyncio.sleep(self.poll_secs)
+
+    def start(self) -> asyncio.Task:
+        """Start polling on the running event loop (idempotent)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def metrics(self) -> dict:
+        """Poll counters, snapshot age and the upstream quote rate the poller implies."""
+        snapshot = self._snapshot
+        with self._lock:
+            data = asdict(self._stats)
+        data.update(
+            symbols=len(snapshot.prices),
+            version=snapshot.version,
+            snapshot_age_secs=(self._clock() - snapshot.taken_at) if snapshot.taken_at else None,
+            poll_secs=self.poll_secs,
+            quotes_per_min=len(self.symbols()) * 60 / self.poll_secs if self.poll_secs > 0 else None,
+            running=self._task is not None and not self._task.done(),
+        )
+        return data
+
+
+# Process-wide snapshot shared by handlers, alerts and insights
+market_data = MarketDataService(held_symbols=repository.held_symbols)
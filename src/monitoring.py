@@ -1,12 +1,17 @@
 import os
-import time
 import logging
 import asyncio
 import random
+from datetime import datetime, timezone
 from telegram import Bot
-from src.database import get_db_connection
-from src.okx_client import OKXClient
+from src.database import db_connection
+from src import repository
+from src.okx_client import AsyncOKXClient
 from src.portfolio import PortfolioService
+from src import analytics
+from src.alert_index import alert_index
+from src.market_data import market_data
+from src.sync_scheduler import ShardedSyncScheduler
 from src.constants import TOKEN_ADDRESSES, TOKEN_DECIMALS
 
 # Enable logging
@@ -16,7 +21,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Initialize clients
-okx_client = OKXClient()
+okx_client = AsyncOKXClient()
 bot = Bot(token=os.getenv("TELEGRAM_BOT_TOKEN"))
 portfolio_service = PortfolioService()
 
@@ -24,120 +29,213 @@ portfolio_service = PortfolioService()
 PORTFOLIO_SYNC_INTERVAL = int(os.getenv("PORTFOLIO_SYNC_INTERVAL", "600"))
 ALERT_QUOTE_DELAY_MS = int(os.getenv("ALERT_QUOTE_DELAY_MS", "100"))  # per-alert throttle
 ALERT_ERROR_BACKOFF_MS = int(os.getenv("ALERT_ERROR_BACKOFF_MS", "500"))
+# Regenerate cached insights for recently active users once their portfolios have synced
+INSIGHTS_PRECOMPUTE_ENABLED = os.getenv("INSIGHTS_PRECOMPUTE_ENABLED", "true").lower() in ("1", "true", "yes")
+INSIGHTS_ACTIVE_WINDOW_SECS = float(os.getenv("INSIGHTS_ACTIVE_WINDOW_SECS", "259200"))  # 3 days
+INSIGHTS_PRECOMPUTE_CONCURRENCY = int(os.getenv("INSIGHTS_PRECOMPUTE_CONCURRENCY", "2"))
+
+# Users synced by this node since the last insights refresh (added from sync worker threads)
+_synced_users = set()
+# Alerts whose owners were notified but which are not yet deactivated in the table
+_pending_deactivations = set()
+_insights_client = None
+
+def _sync_user(telegram_id: int) -> bool:
+    # Refresh only stale wallets and record today's snapshot in one transaction
+    ok = portfolio_service.sync_balances(telegram_id, record_snapshot=True, incremental=True)
+    if ok:
+        _synced_users.add(telegram_id)
+    return ok
+
+
+sync_scheduler = ShardedSyncScheduler(sync_user=_sync_user, interval_secs=PORTFOLIO_SYNC_INTERVAL)
+
 
 async def sync_all_portfolios():
-    """Iterate over every user and call PortfolioService.sync_balances.
+    """Sync every user's portfolio as one sharded pass (see ShardedSyncScheduler).
 
-    Runs quickly and ignores individual failures so the worker keeps going.
+    Ignores individual failures so the worker keeps going.
     """
-    logger.info("Starting portfolio sync for all users ...")
+    return await sync_scheduler.run_pass()
 
-    conn = get_db_connection()
-    if conn is None:
-        logger.error("Database connection failed – cannot sync portfolios.")
-        return
+def _get_insights_client():
+    global _insights_client
+    if _insights_client is None:
+        from src.insights import InsightsClient
+        _insights_client = InsightsClient()
+    return _insights_client
 
+
+async def precompute_insights() -> int:
+    """Warm the insights cache for active users synced since the last call.
+
+    Only users whose portfolio composition or market epoch changed cost a Pro
+    call; the rest are already cached. Returns how many users have fresh insights.
+    """
+    synced = set()
+    while _synced_users:
+        synced.add(_synced_users.pop())
+    if not INSIGHTS_PRECOMPUTE_ENABLED or not synced:
+        return 0
     try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT id, telegram_id FROM users;")
-            user_rows = cur.fetchall()
+        active = await repository.active_users(list(synced), INSIGHTS_ACTIVE_WINDOW_SECS)
+        warmed = await _get_insights_client().precompute(active, INSIGHTS_PRECOMPUTE_CONCURRENCY)
+    except Exception as e:
+        logger.error("Insights precompute failed: %s", e)
+        return 0
+    logger.info("Insights ready for %s of %s active user(s) synced this pass", warmed, len(active))
+    return warmed
 
-        total = len(user_rows)
-        success = 0
-        for (user_pk, telegram_id) in user_rows:
-            try:
-                if portfolio_service.sync_balances(telegram_id):
-                    success += 1
-                    # After a successful sync, save a snapshot
-                    snapshot = portfolio_service.get_snapshot(telegram_id)
-                    if snapshot and "total_value_usd" in snapshot:
-                        from src.database import save_portfolio_snapshot
-                        save_portfolio_snapshot(user_pk, snapshot["total_value_usd"])
-            except Exception as exc:
-                logger.warning("Portfolio sync failed for %s: %s", telegram_id, exc)
-
-        logger.info("Portfolio sync done – %s/%s users updated", success, total)
+async def run_nightly_analytics():
+    """Precompute every user's returns/volatility/drawdown/Sharpe/Sortino (see src.analytics)."""
+    try:
+        written = await asyncio.to_thread(analytics.run_nightly, portfolio_service.candles)
+        logger.info("Nightly analytics wrote %s row(s)", written)
     except Exception as e:
-        logger.error("Error during portfolio sync: %s", e)
-    finally:
-        if conn:
-            conn.close()
+        logger.error("Nightly analytics failed: %s", e)
+
+
+def _is_quotable(symbol: str) -> bool:
+    return bool(TOKEN_ADDRESSES.get(symbol) and TOKEN_ADDRESSES.get("USDT") and TOKEN_DECIMALS.get(symbol))
+
+
+async def fetch_symbol_price(symbol: str) -> dict:
+    """Quote one whole *symbol* token against USDT; returns ``{"success", "price"|"error"}``."""
+    # This is a simplified price check. In a real app, you would need to handle different quote currencies.
+    amount = str(1 * 10**TOKEN_DECIMALS[symbol])  # 1 whole token in its smallest unit
+    quote_response = await okx_client.get_live_quote(
+        from_token_address=TOKEN_ADDRESSES[symbol],
+        to_token_address=TOKEN_ADDRESSES["USDT"],
+        amount=amount
+    )
+    if not quote_response.get("success"):
+        return {"success": False, "error": quote_response.get("error") or ""}
+
+    to_decimals = TOKEN_DECIMALS.get("USDT")
+    return {"success": True, "price": float(quote_response["data"].get('toTokenAmount', 0)) / (10**to_decimals)}
+
+
+async def _notify_triggered(symbol: str, current_price: float) -> None:
+    """Notify the owners of *symbol*'s crossed alerts; delivered alert ids are queued for deactivation."""
+    failed = []
+    for alert in alert_index.pop_triggered(symbol, current_price):
+        message = f"🚨 Price Alert! {alert.symbol} is now ${current_price:.2f}, which is {alert.condition} your target of ${alert.target_price:.2f}."
+        try:
+            await bot.send_message(chat_id=alert.user_id, text=message)
+        except Exception as exc:
+            logger.warning("Failed to notify user %s for alert %s: %s", alert.user_id, alert.alert_id, exc)
+            failed.append(alert)
+            continue
+        _pending_deactivations.add(alert.alert_id)
+    # Keep alerts whose notification failed so they are retried on the next tick
+    alert_index.restore(failed)
+
+
+def _deactivate_pending() -> None:
+    """Deactivate every notified alert in one round-trip; failed ids stay pending for the next tick."""
+    if not _pending_deactivations:
+        return
+    triggered_ids = sorted(_pending_deactivations)
+    try:
+        with db_connection() as conn:
+            if conn is None:
+                logger.error("Database connection failed. Will retry deactivating alerts %s.", triggered_ids)
+                return
+            with conn.cursor() as cur:
+                cur.execute("UPDATE alerts SET is_active = FALSE WHERE id = ANY(%s);", (triggered_ids,))
+            conn.commit()
+    except Exception as e:
+        logger.error(f"Error deactivating alerts {triggered_ids}, will retry: {e}")
+        return
+    _pending_deactivations.difference_update(triggered_ids)
+    logger.info("Triggered and deactivated %s alert(s): %s", len(triggered_ids), triggered_ids)
+
 
 async def check_alerts():
-    """Checks for triggered price alerts and sends notifications."""
-    conn = get_db_connection()
-    if conn is None:
-        logger.error("Database connection failed. Cannot check alerts.")
-        return
+    """Checks for triggered price alerts and sends notifications.
+
+    Active alerts live in ``alert_index`` (reloaded from the table only on
+    start-up and every ALERT_INDEX_RECONCILE_SECS). Prices come from the
+    shared market-data snapshot; only symbols without a fresh snapshot price
+    cost a live quote. Crossed alerts are popped from the sorted index, and
+    every notified alert is deactivated with a single batched UPDATE at the
+    end of the tick, even if the scan fails. Ids whose UPDATE failed are
+    retried on the next tick and kept out of reloads until then, so their
+    users are not notified twice.
+    """
+    _deactivate_pending()
+    if alert_index.needs_reload:
+        with db_connection() as conn:
+            if conn is None:
+                logger.error("Database connection failed. Cannot check alerts.")
+                return
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT id, user_id, symbol, target_price, condition FROM alerts WHERE is_active = TRUE;")
+                    rows = cur.fetchall()
+                alert_index.load(row for row in rows if row[0] not in _pending_deactivations)
+            except Exception as e:
+                logger.error(f"Error loading alerts: {e}")
+                return
 
     try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT id, user_id, symbol, target_price, condition FROM alerts WHERE is_active = TRUE;")
-            alerts = cur.fetchall()
-
-            for alert in alerts:
-                alert_id, user_id, symbol, target_price, condition = alert
-                
-                # This is a simplified price check. In a real app, you would need to handle different quote currencies.
-                from_token_address = TOKEN_ADDRESSES.get(symbol.upper())
-                to_token_address = TOKEN_ADDRESSES.get("USDT")
-                decimals = TOKEN_DECIMALS.get(symbol.upper())
-                
-                if not from_token_address or not to_token_address or not decimals:
-                    logger.warning(f"Skipping alert {alert_id} due to unknown symbol {symbol}")
-                    # Throttle between alerts regardless
-                    await asyncio.sleep((ALERT_QUOTE_DELAY_MS + random.randint(0, 50)) / 1000)
-                    continue
-
-                amount = str(1 * 10**decimals) # 1 whole token in its smallest unit
-
-                quote_response = okx_client.get_live_quote(
-                    from_token_address=from_token_address,
-                    to_token_address=to_token_address,
-                    amount=amount
-                )
-
-                if quote_response.get("success"):
-                    to_decimals = TOKEN_DECIMALS.get("USDT")
-                    current_price = float(quote_response["data"].get('toTokenAmount', 0)) / (10**to_decimals)
-                    
-                    if (condition == 'above' and current_price > target_price) or \
-                       (condition == 'below' and current_price < target_price):
-                        
-                        message = f"🚨 Price Alert! {symbol} is now ${current_price:.2f}, which is {condition} your target of ${target_price:.2f}."
-                        await bot.send_message(chat_id=user_id, text=message)
-                        
-                        # Deactivate the alert after it has been triggered
-                        cur.execute("UPDATE alerts SET is_active = FALSE WHERE id = %s;", (alert_id,))
-                        conn.commit()
-                        logger.info(f"Triggered and deactivated alert {alert_id} for user {user_id}")
-                    # Throttle between alerts
-                    await asyncio.sleep((ALERT_QUOTE_DELAY_MS + random.randint(0, 50)) / 1000)
-                else:
-                    # Extra backoff on errors (simple heuristic for rate limiting)
-                    err = (quote_response.get("error") or "").lower()
-                    backoff_ms = ALERT_ERROR_BACKOFF_MS
-                    if "429" in err or "rate" in err or "limit" in err:
-                        backoff_ms = max(ALERT_ERROR_BACKOFF_MS, ALERT_QUOTE_DELAY_MS * 5)
-                    logger.warning("Quote failed for alert %s (%s): %s. Backing off %sms.", alert_id, symbol, err, backoff_ms)
-                    await asyncio.sleep(backoff_ms / 1000)
-
+        for symbol in alert_index.symbols():
+            point = market_data.price(symbol)
+            if point is not None:
+                # Served from the shared snapshot; no upstream call, no throttle
+                await _notify_triggered(symbol, point.price)
+                continue
+            if not _is_quotable(symbol):
+                logger.debug("Skipping alerts for unknown symbol %s", symbol)
+                continue
+
+            price_response = await fetch_symbol_price(symbol)
+            if not price_response["success"]:
+                # Extra backoff on errors (simple heuristic for rate limiting)
+                err = price_response["error"].lower()
+                backoff_ms = ALERT_ERROR_BACKOFF_MS
+                if "429" in err or "rate" in err or "limit" in err:
+                    backoff_ms = max(ALERT_ERROR_BACKOFF_MS, ALERT_QUOTE_DELAY_MS * 5)
+                logger.warning("Quote failed for %s: %s. Backing off %sms.", symbol, err, backoff_ms)
+                await asyncio.sleep(backoff_ms / 1000)
+                continue
+
+            await _notify_triggered(symbol, price_response["price"])
+
+            # Throttle between symbols
+            await asyncio.sleep((ALERT_QUOTE_DELAY_MS + random.randint(0, 50)) / 1000)
     except Exception as e:
         logger.error(f"Error checking alerts: {e}")
     finally:
-        if conn:
-            conn.close()
+        _deactivate_pending()
+
 
 async def main():
     """Main loop for the monitoring service."""
-    last_portfolio_run = 0
+    last_pass_id = None
+    sync_task = None
+    last_analytics_day = None
+    analytics_task = None
+    insights_task = None
     while True:
-        now = time.time()
-
-        # Portfolio sync (runs every PORTFOLIO_SYNC_INTERVAL seconds)
-        if now - last_portfolio_run >= PORTFOLIO_SYNC_INTERVAL:
-            await sync_all_portfolios()
-            last_portfolio_run = now
+        # Portfolio sync (one pass per PORTFOLIO_SYNC_INTERVAL window), in the
+        # background so alert checks keep their cadence during long passes
+        pass_id = sync_scheduler.current_pass_id()
+        if pass_id != last_pass_id and (sync_task is None or sync_task.done()):
+            sync_task = asyncio.create_task(sync_all_portfolios())
+            last_pass_id = pass_id
+
+        # Insight precompute for the users the finished pass synced
+        if (sync_task is not None and sync_task.done() and _synced_users
+                and (insights_task is None or insights_task.done())):
+            insights_task = asyncio.create_task(precompute_insights())
+
+        # Portfolio analytics, once a day after ANALYTICS_RUN_HOUR_UTC
+        now = datetime.now(timezone.utc)
+        if (now.hour >= analytics.ANALYTICS_RUN_HOUR_UTC and now.date() != last_analytics_day
+                and (analytics_task is None or analytics_task.done())):
+            analytics_task = asyncio.create_task(run_nightly_analytics())
+            last_analytics_day = now.date()
 
         # Price alert check (every minute)
         await check_alerts()
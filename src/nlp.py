@@ -2,6 +2,10 @@ import os
 import google.generativeai as genai
 import logging
 import json
+from typing import Optional
+
+from src.intent_cache import IntentCache, intent_cache
+from src.llm_executor import PRIORITY_INTERACTIVE, LLMTimeoutError, llm_executor
 
 # Enable logging
 logging.basicConfig(
@@ -12,13 +16,16 @@ logger = logging.getLogger(__name__)
 class NLPClient:
     """A client for interacting with the Gemini API for NLP tasks."""
 
-    def __init__(self):
+    def __init__(self, cache: Optional[IntentCache] = None):
         """Initializes the NLP client by configuring the Gemini API."""
         api_key = os.getenv("GEMINI_API_KEY")
         if not api_key:
             raise ValueError("GEMINI_API_KEY not found in environment variables.")
         genai.configure(api_key=api_key)
         
+        # Parses are cached by normalized text; pass a private IntentCache to isolate them
+        self.cache = cache if cache is not None else intent_cache
+
         # Use lazy initialization for the models
         self._flash_model = None
         self._pro_model = None
@@ -40,7 +47,24 @@ class NLPClient:
     def parse_intent(self, text: str, model_type: str = 'flash') -> dict:
         """
         Parses the user's intent from a text query using the specified Gemini model.
+        Repeated phrasings are answered from the intent cache without a Gemini call.
+        """
+        return self.cache.get_or_parse(text, model_type, lambda: self._parse_with_model(text, model_type))
+
+    async def aparse_intent(self, text: str, model_type: str = 'flash', priority: int = PRIORITY_INTERACTIVE) -> dict:
+        """
+        Async parse_intent for the bot: the Gemini call runs on the shared LLM executor,
+        so it never blocks the event loop and is bounded by the model's concurrency and timeout.
         """
+        async def call():
+            try:
+                return await llm_executor.run(model_type, self._parse_with_model, text, model_type, priority=priority)
+            except LLMTimeoutError:
+                return {"intent": "unknown", "entities": {}}
+
+        return await self.cache.aget_or_parse(text, model_type, call)
+
+    def _parse_with_model(self, text: str, model_type: str) -> dict:
         
         # This is a standard string template, not an f-string.
         prompt_template = """
@@ -101,8 +125,10 @@ class NLPClient:
 
         try:
             model = self.pro_model if model_type == 'pro' else self.flash_model
-            response = model.generate_content(prompt)
-            
+            response = model.generate_content(
+                prompt, request_options={"timeout": llm_executor.timeout_for(model_type)}
+            )
+
             if not response.parts:
                 logger.error(f"Gemini {model_type} model returned no content. Finish reason: {response.prompt_feedback}")
                 return {"intent": "unknown", "entities": {}}
@@ -1,6 +1,5 @@
 import os
-import requests
-import os
+import httpx
 import requests
 import logging
 import hmac
@@ -11,8 +10,15 @@ from datetime import datetime, timezone, timedelta
 from dotenv import load_dotenv
 
 from src.constants import DRY_RUN_MODE, OKX_PROJECT_ID
-from src.retry import compute_exponential_backoff_delays, sleep_with_backoff
+from src.retry import compute_exponential_backoff_delays, sleep_with_backoff, async_sleep_with_backoff
 from src.circuit import breaker, short_circuit_response
+from src.quote_cache import QuoteCache, quote_cache as default_quote_cache
+from src.http_transport import (
+    AsyncHTTPTransport,
+    HTTPTransport,
+    async_transport as default_async_transport,
+    transport as default_transport,
+)
 
 # Load environment variables from .env file
 load_dotenv()
@@ -31,8 +37,19 @@ def sign(message, secret_key):
     return base64.b64encode(mac.digest()).decode()
 
 class OKXClient:
-    def __init__(self, max_retries=3, retry_delay=2):
-        self.base_url = "https://web3.okx.com"
+    def __init__(
+        self,
+        max_retries=3,
+        retry_delay=2,
+        transport: HTTPTransport | None = None,
+        base_url: str | None = None,
+        market_base_url: str | None = None,
+        quote_cache: QuoteCache | None = None,
+    ):
+        self.base_url = base_url or os.getenv("OKX_BASE_URL", "https://web3.okx.com")
+        self.market_base_url = market_base_url or os.getenv("OKX_MARKET_BASE_URL", "https://www.okx.com")
+        self.transport = transport or default_transport
+        self.quote_cache = quote_cache or default_quote_cache
         self.api_key = os.getenv("OKX_API_KEY")
         self.api_secret = os.getenv("OKX_API_SECRET")
         self.passphrase = os.getenv("OKX_API_PASSPHRASE")
@@ -55,32 +72,131 @@ class OKXClient:
             headers['OK-ACCESS-PROJECT'] = OKX_PROJECT_ID
         return headers
 
-    def get_live_quote(self, from_token_address: str, to_token_address: str, amount: str, chainId: int = 1) -> dict:
+    def _signed_request(self, method: str, base_url: str, request_path: str, params: dict | None = None, body: str = '') -> tuple[str, dict]:
+        """Return the absolute URL and signed headers for a request."""
+        query_string = '&'.join([f'{k}={v}' for k, v in (params or {}).items()])
+        full_request_path = f"{request_path}?{query_string}" if query_string else request_path
+        headers = self._get_request_headers(method, full_request_path, body)
+        return f"{base_url}{full_request_path}", headers
+
+    # ------------------------------------------------------------------
+    # Request builders (shared with AsyncOKXClient)
+    # ------------------------------------------------------------------
+    def _quote_request(self, from_token_address: str, to_token_address: str, amount: str, chainId: int) -> tuple[str, dict]:
+        params = {
+            "chainId": chainId,
+            "amount": amount,
+            "toTokenAddress": to_token_address,
+            "fromTokenAddress": from_token_address
+        }
+        return self._signed_request('GET', self.base_url, '/api/v5/dex/aggregator/quote', params)
+
+    def _swap_request(self, from_token_address: str, to_token_address: str, amount: str, wallet_address: str, private_key: str, chainId: int, slippage: str) -> tuple[str, dict, dict]:
+        request_path = '/api/v5/dex/aggregator/swap'
+        body = {
+            "fromTokenAddress": from_token_address,
+            "toTokenAddress": to_token_address,
+            "amount": amount,
+            "walletAddress": wallet_address,
+            "privateKey": private_key,
+            "slippage": slippage,
+            "chainId": chainId
+        }
+        headers = self._get_request_headers('POST', request_path, json.dumps(body))
+        return f"{self.base_url}{request_path}", headers, body
+
+    def _history_plan(self, token_address: str, chainId: int, period: str) -> dict:
+        """Translate a chart period into the endpoint, params and ETH fallback to use."""
+        now = datetime.now(timezone.utc)
+        if period == "24h":
+            begin = int((now - timedelta(hours=24)).timestamp() * 1000)
+            bar = "1H"
+            limit = "24"
+            okx_period = "1H" # Period for wallet API
+        elif period == "7d":
+            begin = int((now - timedelta(days=7)).timestamp() * 1000)
+            bar = "1D"
+            limit = "7"
+            okx_period = "1D"
+        elif period == "1m" or period == "30d":
+            begin = int((now - timedelta(days=30)).timestamp() * 1000)
+            bar = "1D"
+            limit = "30"
+            okx_period = "1D"
+        else: # default to 7d
+            begin = int((now - timedelta(days=7)).timestamp() * 1000)
+            bar = "1D"
+            limit = "7"
+            okx_period = "1D"
+
+        # Check if it's an instrument ID or a token address
+        if '-' in token_address:
+            return {
+                "endpoint_key": "market/history-candles",
+                "request_path": '/api/v5/market/history-candles',
+                "params": {"instId": token_address, "bar": bar, "limit": limit},
+                "base_url": self.market_base_url,
+                "is_candles": True,
+                "fallback_inst_id": None,
+                "bar": bar,
+                "limit": limit,
+            }
+
+        eth_zero_addr = "0xeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee"
+        return {
+            "endpoint_key": "wallet/token/historical-price",
+            "request_path": '/api/v5/wallet/token/historical-price',
+            "params": {
+                "tokenAddress": token_address,
+                "chainIndex": str(chainId),
+                "limit": limit,
+                "begin": str(begin),
+                "period": okx_period
+            },
+            "base_url": self.base_url,
+            "is_candles": False,
+            "fallback_inst_id": "ETH-USD" if token_address.lower() == eth_zero_addr else None,
+            "bar": bar,
+            "limit": limit,
+        }
+
+    def _fallback_candles_request(self, plan: dict) -> tuple[str, dict]:
+        m_params = {"instId": plan["fallback_inst_id"], "bar": plan["bar"], "limit": plan["limit"]}
+        return self._signed_request('GET', self.market_base_url, '/api/v5/market/history-candles', m_params)
+
+    @staticmethod
+    def _candles_to_points(raw_data: list) -> list:
+        return [{"ts": item[0], "price": item[4]} for item in raw_data]
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def get_live_quote(self, from_token_address: str, to_token_address: str, amount: str, chainId: int = 1, use_cache: bool = True) -> dict:
         """
         Fetches a real swap quote from the OKX DEX aggregator with retry logic and circuit breaker.
+        Successful quotes are served from a short-lived cache and identical concurrent
+        requests share one upstream call; pass use_cache=False to always hit OKX.
         """
+        if not use_cache:
+            return self._fetch_live_quote(from_token_address, to_token_address, amount, chainId)
+        key = QuoteCache.make_key(chainId, from_token_address, to_token_address, amount)
+        return self.quote_cache.get_or_fetch(
+            key, lambda: self._fetch_live_quote(from_token_address, to_token_address, amount, chainId)
+        )
+
+    def _fetch_live_quote(self, from_token_address: str, to_token_address: str, amount: str, chainId: int) -> dict:
         endpoint_key = "dex/aggregator/quote"
         if not breaker.allow_request(endpoint_key):
             return short_circuit_response(endpoint_key)
 
-        request_path = '/api/v5/dex/aggregator/quote'
-        params = {
-            "chainId": chainId,
-            "amount": amount,
-            "toTokenAddress": to_token_address,
-            "fromTokenAddress": from_token_address
-        }
-        query_string = '&'.join([f'{k}={v}' for k, v in params.items()])
-        full_request_path = f"{request_path}?{query_string}"
-        headers = self._get_request_headers('GET', full_request_path)
-        url = f"{self.base_url}{full_request_path}"
+        url, headers = self._quote_request(from_token_address, to_token_address, amount, chainId)
 
         delays = compute_exponential_backoff_delays(self.max_retries)
         last_error = None
         for attempt in range(self.max_retries):
             try:
                 logger.info(f"Sending GET request to OKX: {url}")
-                response = requests.get(url, headers=headers, timeout=10)
+                response = self.transport.get(url, headers=headers)
                 response.raise_for_status()
                 data = response.json()
 
@@ -116,20 +232,14 @@ class OKXClient:
         if dry_run is None:
             dry_run = DRY_RUN_MODE
 
-        # Always get a quote first
-        quote_response = self.get_live_quote(from_token_address, to_token_address, amount, chainId)
+        # Always get a fresh quote first; cached prices must not drive execution
+        quote_response = self.get_live_quote(from_token_address, to_token_address, amount, chainId, use_cache=False)
 
         if not quote_response.get("success"):
             return quote_response  # Propagate the error from get_live_quote (includes short-circuit case)
 
         if dry_run:
-            logger.info(f"Executing DRY RUN swap from {from_token_address} to {to_token_address}")
-            return {
-                "success": True,
-                "status": "simulated",
-                "data": quote_response["data"],
-                "message": "✅ Swap simulated successfully (no real transaction)"
-            }
+            return self._simulated_swap(from_token_address, to_token_address, quote_response)
 
         if not private_key:
             return {"success": False, "error": "Private key is required for live swaps.", "code": "E_OKX_API"}
@@ -138,26 +248,14 @@ class OKXClient:
         if not breaker.allow_request(endpoint_key):
             return short_circuit_response(endpoint_key)
 
-        request_path = '/api/v5/dex/aggregator/swap'
-        body = {
-            "fromTokenAddress": from_token_address,
-            "toTokenAddress": to_token_address,
-            "amount": amount,
-            "walletAddress": wallet_address,
-            "privateKey": private_key,
-            "slippage": slippage,
-            "chainId": chainId
-        }
-        body_str = json.dumps(body)
-        headers = self._get_request_headers('POST', request_path, body_str)
-        url = f"{self.base_url}{request_path}"
+        url, headers, body = self._swap_request(from_token_address, to_token_address, amount, wallet_address, private_key, chainId, slippage)
 
         delays = compute_exponential_backoff_delays(self.max_retries)
         last_error = None
         for attempt in range(self.max_retries):
             try:
                 logger.info(f"Sending POST request to OKX: {url}")
-                response = requests.post(url, headers=headers, json=body, timeout=15)
+                response = self.transport.post(url, headers=headers, json=body, timeout=self.transport.timeout_for(15))
                 response.raise_for_status()
                 data = response.json()
 
@@ -183,87 +281,41 @@ class OKXClient:
 
         return {"success": False, "error": last_error or "Failed to execute swap after multiple retries.", "code": "E_OKX_HTTP"}
 
+    @staticmethod
+    def _simulated_swap(from_token_address: str, to_token_address: str, quote_response: dict) -> dict:
+        logger.info(f"Executing DRY RUN swap from {from_token_address} to {to_token_address}")
+        return {
+            "success": True,
+            "status": "simulated",
+            "data": quote_response["data"],
+            "message": "✅ Swap simulated successfully (no real transaction)"
+        }
+
     def get_historical_price(self, token_address: str, chainId: int, period: str) -> dict:
         """
         Fetches historical price data for a token with retry and circuit breaker.
         Handles both instrument IDs (e.g., 'BTC-USD') and token addresses.
         """
-        # Convert period to parameters
-        now = datetime.now(timezone.utc)
-        if period == "24h":
-            begin = int((now - timedelta(hours=24)).timestamp() * 1000)
-            bar = "1H"
-            limit = "24"
-            okx_period = "1H" # Period for wallet API
-        elif period == "7d":
-            begin = int((now - timedelta(days=7)).timestamp() * 1000)
-            bar = "1D"
-            limit = "7"
-            okx_period = "1D"
-        elif period == "1m" or period == "30d":
-            begin = int((now - timedelta(days=30)).timestamp() * 1000)
-            bar = "1D"
-            limit = "30"
-            okx_period = "1D"
-        else: # default to 7d
-            begin = int((now - timedelta(days=7)).timestamp() * 1000)
-            bar = "1D"
-            limit = "7"
-            okx_period = "1D"
-
-        # Check if it's an instrument ID or a token address
-        endpoint_key = "market/history-candles" if '-' in token_address else "wallet/token/historical-price"
+        plan = self._history_plan(token_address, chainId, period)
+        endpoint_key = plan["endpoint_key"]
 
         if not breaker.allow_request(endpoint_key):
             return short_circuit_response(endpoint_key)
 
-        if '-' in token_address:
-            request_path = '/api/v5/market/history-candles'
-            params = {
-                "instId": token_address,
-                "bar": bar,
-                "limit": limit
-            }
-            base_url = "https://www.okx.com"
-        else:
-            request_path = f'/api/v5/wallet/token/historical-price'
-            params = {
-                "tokenAddress": token_address,
-                "chainIndex": str(chainId),
-                "limit": limit,
-                "begin": str(begin),
-                "period": okx_period
-            }
-            base_url = self.base_url
-
-            eth_zero_addr = "0xeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee"
-            fallback_inst_id = None
-            if token_address.lower() == eth_zero_addr:
-                fallback_inst_id = "ETH-USD"
-
         delays = compute_exponential_backoff_delays(self.max_retries)
         last_error = None
         for attempt in range(self.max_retries):
             try:
-                query_string = '&'.join([f'{k}={v}' for k, v in params.items()])
-                full_request_path = f"{request_path}?{query_string}"
-
-                headers = self._get_request_headers('GET', full_request_path)
-                url = f"{base_url}{full_request_path}"
+                url, headers = self._signed_request('GET', plan["base_url"], plan["request_path"], plan["params"])
 
                 logger.info(f"Sending GET request to OKX for historical price: {url}")
-                response = requests.get(url, headers=headers, timeout=10)
+                response = self.transport.get(url, headers=headers)
                 response.raise_for_status()
                 data = response.json()
 
                 if data.get("code") == "0":
                     raw_data = data.get("data", [])
-                    processed_data = []
-                    if '-' in token_address:
-                        for item in raw_data:
-                            processed_data.append({"ts": item[0], "price": item[4]})
-                    else:
-                        processed_data = raw_data
+                    processed_data = self._candles_to_points(raw_data) if plan["is_candles"] else raw_data
                     breaker.record_success(endpoint_key)
                     return {"success": True, "data": processed_data}
                 else:
@@ -284,28 +336,191 @@ class OKXClient:
             sleep_with_backoff(attempt, delays)
 
         # Fallback to market candles for ETH if wallet endpoint failed
-        if 'fallback_inst_id' in locals() and fallback_inst_id:
+        if plan["fallback_inst_id"]:
             try:
-                m_request_path = '/api/v5/market/history-candles'
-                m_params = {"instId": fallback_inst_id, "bar": bar, "limit": limit}
-                m_qs = '&'.join([f'{k}={v}' for k, v in m_params.items()])
-                m_full = f"{m_request_path}?{m_qs}"
-                headers = self._get_request_headers('GET', m_full)
-                url = f"https://www.okx.com{m_full}"
+                url, headers = self._fallback_candles_request(plan)
                 logger.info(f"Fallback: Sending GET request to OKX Market API: {url}")
-                resp = requests.get(url, headers=headers, timeout=10)
+                resp = self.transport.get(url, headers=headers)
                 resp.raise_for_status()
                 m_data = resp.json()
                 if m_data.get("code") == "0":
-                    raw_data = m_data.get("data", [])
-                    processed_data = [{"ts": item[0], "price": item[4]} for item in raw_data]
                     breaker.record_success(endpoint_key)
-                    return {"success": True, "data": processed_data}
+                    return {"success": True, "data": self._candles_to_points(m_data.get("data", []))}
             except Exception:
                 pass
         return {"success": False, "error": last_error or "Failed to fetch historical price after multiple retries.", "code": "E_OKX_HTTP"}
 
 
+class AsyncOKXClient(OKXClient):
+    """asyncio counterpart of OKXClient.
+
+    Shares signing and request building with OKXClient but awaits an
+    AsyncHTTPTransport and backs off with asyncio.sleep, so handlers and the
+    monitoring loop never block the event loop. Responses keep the same
+    ``{"success": ..., "data"/"error": ...}`` shape.
+    """
+
+    def __init__(
+        self,
+        max_retries=3,
+        retry_delay=2,
+        transport: AsyncHTTPTransport | None = None,
+        base_url: str | None = None,
+        market_base_url: str | None = None,
+        quote_cache: QuoteCache | None = None,
+    ):
+        super().__init__(
+            max_retries, retry_delay, base_url=base_url, market_base_url=market_base_url, quote_cache=quote_cache
+        )
+        self.transport = transport or default_async_transport
+
+    async def _get_json(self, url: str, headers: dict) -> dict:
+        response = await self.transport.get(url, headers=headers)
+        response.raise_for_status()
+        return response.json()
+
+    async def get_live_quote(self, from_token_address: str, to_token_address: str, amount: str, chainId: int = 1, use_cache: bool = True) -> dict:
+        """Async version of OKXClient.get_live_quote (same caching and coalescing)."""
+        if not use_cache:
+            return await self._fetch_live_quote(from_token_address, to_token_address, amount, chainId)
+        key = QuoteCache.make_key(chainId, from_token_address, to_token_address, amount)
+        return await self.quote_cache.aget_or_fetch(
+            key, lambda: self._fetch_live_quote(from_token_address, to_token_address, amount, chainId)
+        )
+
+    async def _fetch_live_quote(self, from_token_address: str, to_token_address: str, amount: str, chainId: int) -> dict:
+        endpoint_key = "dex/aggregator/quote"
+        if not breaker.allow_request(endpoint_key):
+            return short_circuit_response(endpoint_key)
+
+        url, headers = self._quote_request(from_token_address, to_token_address, amount, chainId)
+
+        delays = compute_exponential_backoff_delays(self.max_retries)
+        last_error = None
+        for attempt in range(self.max_retries):
+            try:
+                logger.info(f"Sending async GET request to OKX: {url}")
+                data = await self._get_json(url, headers)
+
+                if data.get("code") == "0":
+                    breaker.record_success(endpoint_key)
+                    return {"success": True, "data": data.get("data", [{}])[0]}
+                error_msg = data.get("msg", "Unknown API error")
+                logger.error(f"Error fetching quote from OKX API: {error_msg}")
+                last_error = error_msg
+                breaker.record_failure(endpoint_key)
+            except httpx.HTTPStatusError as e:
+                logger.warning(f"HTTP Error on attempt {attempt + 1}: {e}.")
+                last_error = str(e)
+                breaker.record_failure(endpoint_key)
+            except httpx.HTTPError as e:
+                logger.error(f"Network error fetching quote: {e}")
+                last_error = str(e)
+                breaker.record_failure(endpoint_key)
+                break
+            await async_sleep_with_backoff(attempt, delays)
+
+        return {"success": False, "error": last_error or "Failed to fetch quote after multiple retries.", "code": "E_OKX_HTTP"}
+
+    async def execute_swap(self, from_token_address: str, to_token_address: str, amount: str, wallet_address: str, private_key: str = None, chainId: int = 1, slippage: str = "1", dry_run: bool = None) -> dict:
+        """Async version of OKXClient.execute_swap."""
+        if dry_run is None:
+            dry_run = DRY_RUN_MODE
+
+        quote_response = await self.get_live_quote(from_token_address, to_token_address, amount, chainId, use_cache=False)
+        if not quote_response.get("success"):
+            return quote_response
+
+        if dry_run:
+            return self._simulated_swap(from_token_address, to_token_address, quote_response)
+
+        if not private_key:
+            return {"success": False, "error": "Private key is required for live swaps.", "code": "E_OKX_API"}
+
+        endpoint_key = "dex/aggregator/swap"
+        if not breaker.allow_request(endpoint_key):
+            return short_circuit_response(endpoint_key)
+
+        url, headers, body = self._swap_request(from_token_address, to_token_address, amount, wallet_address, private_key, chainId, slippage)
+
+        delays = compute_exponential_backoff_delays(self.max_retries)
+        last_error = None
+        for attempt in range(self.max_retries):
+            try:
+                logger.info(f"Sending async POST request to OKX: {url}")
+                response = await self.transport.post(url, headers=headers, json=body, timeout=self.transport.timeout_for(15))
+                response.raise_for_status()
+                data = response.json()
+
+                if data.get("code") == "0":
+                    logger.info(f"Successfully executed swap: {data.get('msg')}")
+                    breaker.record_success(endpoint_key)
+                    return {"success": True, "data": data.get("data", [{}])[0]}
+                error_msg = data.get("msg", "Unknown API error")
+                logger.error(f"Error executing swap on OKX API: {error_msg}")
+                last_error = error_msg
+                breaker.record_failure(endpoint_key)
+            except httpx.HTTPStatusError as e:
+                logger.warning(f"HTTP Error on attempt {attempt + 1}: {e}.")
+                last_error = str(e)
+                breaker.record_failure(endpoint_key)
+            except httpx.HTTPError as e:
+                logger.error(f"Network error executing swap: {e}")
+                last_error = str(e)
+                breaker.record_failure(endpoint_key)
+                break
+            await async_sleep_with_backoff(attempt, delays)
+
+        return {"success": False, "error": last_error or "Failed to execute swap after multiple retries.", "code": "E_OKX_HTTP"}
+
+    async def get_historical_price(self, token_address: str, chainId: int, period: str) -> dict:
+        """Async version of OKXClient.get_historical_price."""
+        plan = self._history_plan(token_address, chainId, period)
+        endpoint_key = plan["endpoint_key"]
+
+        if not breaker.allow_request(endpoint_key):
+            return short_circuit_response(endpoint_key)
+
+        delays = compute_exponential_backoff_delays(self.max_retries)
+        last_error = None
+        for attempt in range(self.max_retries):
+            try:
+                url, headers = self._signed_request('GET', plan["base_url"], plan["request_path"], plan["params"])
+                logger.info(f"Sending async GET request to OKX for historical price: {url}")
+                data = await self._get_json(url, headers)
+
+                if data.get("code") == "0":
+                    raw_data = data.get("data", [])
+                    processed_data = self._candles_to_points(raw_data) if plan["is_candles"] else raw_data
+                    breaker.record_success(endpoint_key)
+                    return {"success": True, "data": processed_data}
+                error_msg = data.get("msg", "Unknown API error")
+                logger.error(f"Error fetching historical price from OKX API: {error_msg}")
+                last_error = error_msg
+                breaker.record_failure(endpoint_key)
+            except httpx.HTTPStatusError as e:
+                logger.warning(f"HTTP Error on attempt {attempt + 1}: {e}.")
+                last_error = str(e)
+                breaker.record_failure(endpoint_key)
+            except httpx.HTTPError as e:
+                logger.error(f"Network error fetching historical price: {e}")
+                last_error = str(e)
+                breaker.record_failure(endpoint_key)
+                break
+            await async_sleep_with_backoff(attempt, delays)
+
+        if plan["fallback_inst_id"]:
+            try:
+                url, headers = self._fallback_candles_request(plan)
+                logger.info(f"Fallback: Sending async GET request to OKX Market API: {url}")
+                m_data = await self._get_json(url, headers)
+                if m_data.get("code") == "0":
+                    breaker.record_success(endpoint_key)
+                    return {"success": True, "data": self._candles_to_points(m_data.get("data", []))}
+            except Exception:
+                pass
+        return {"success": False, "error": last_error or "Failed to fetch historical price after multiple retries.", "code": "E_OKX_HTTP"}
+
 if __name__ == '__main__':
     # Example usage to test API credentials
     print("Attempting to verify OKX API credentials with a DEX endpoint...")
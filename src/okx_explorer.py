@@ -1,14 +1,21 @@
 import os
 import time
 import logging
+import httpx
 import requests
 import hmac
 import base64
 from datetime import datetime, timezone
 from dotenv import load_dotenv
 
-from src.retry import compute_exponential_backoff_delays, sleep_with_backoff
+from src.retry import compute_exponential_backoff_delays, sleep_with_backoff, async_sleep_with_backoff
 from src.circuit import breaker, short_circuit_response
+from src.http_transport import (
+    AsyncHTTPTransport,
+    HTTPTransport,
+    async_transport as default_async_transport,
+    transport as default_transport,
+)
 
 # Load environment variables early so they are available for any import order
 load_dotenv()
@@ -37,8 +44,15 @@ class OKXExplorer:
     interface for the rest of the application.
     """
 
-    def __init__(self, max_retries: int = 3, retry_delay: int = 2):
-        self.base_url = os.getenv("OKX_BASE_URL", "https://web3.okx.com")
+    def __init__(
+        self,
+        max_retries: int = 3,
+        retry_delay: int = 2,
+        transport: HTTPTransport | None = None,
+        base_url: str | None = None,
+    ):
+        self.base_url = base_url or os.getenv("OKX_BASE_URL", "https://web3.okx.com")
+        self.transport = transport or default_transport
         self.api_key = os.getenv("OKX_API_KEY")
         self.api_secret = os.getenv("OKX_API_SECRET")
         self.passphrase = os.getenv("OKX_API_PASSPHRASE")
@@ -66,20 +80,23 @@ class OKXExplorer:
             headers["OK-ACCESS-PROJECT"] = project
         return headers
 
+    def _url(self, request_path: str, params: dict | None = None) -> tuple[str, str]:
+        query = "&".join([f"{k}={v}" for k, v in (params or {}).items()])
+        full_path = f"{request_path}?{query}" if query else request_path
+        return full_path, f"{self.base_url}{full_path}"
+
     def _get(self, request_path: str, params: dict | None = None, endpoint_key: str | None = None) -> dict:
         """Generic GET with exponential backoff, circuit breaker, and unified response shape."""
         if endpoint_key and not breaker.allow_request(endpoint_key):
             return short_circuit_response(endpoint_key)
 
-        query = "&".join([f"{k}={v}" for k, v in (params or {}).items()])
-        full_path = f"{request_path}?{query}" if query else request_path
-        url = f"{self.base_url}{full_path}"
+        full_path, url = self._url(request_path, params)
 
         delays = compute_exponential_backoff_delays(self.max_retries)
         last_error = None
         for attempt in range(self.max_retries):
             try:
-                resp = requests.get(url, headers=self._headers("GET", full_path), timeout=10)
+                resp = self.transport.get(url, headers=self._headers("GET", full_path))
                 resp.raise_for_status()
                 payload = resp.json()
                 if payload.get("code") == "0":
@@ -119,30 +136,99 @@ class OKXExplorer:
             chains: A list of numeric chain IDs (e.g., [1, 56]). Defaults to
                     Ethereum mainnet.
         """
+        return self._get(*self._balances_request(address, chains))
+
+    def get_kline(self, symbol: str, bar: str = "1D", limit: int = 30, after: int | None = None) -> dict:
+        """Return historical candle data, newest first.
+
+        ``bar`` examples: 1m, 5m, 1H, 1D etc.
+        ``limit`` max 100.
+        ``after`` (ms timestamp) returns only candles older than it, for paging back.
+        """
+        return self._get(*self._kline_request(symbol, bar, limit, after))
+
+    @staticmethod
+    def _balances_request(address: str, chains: list[int] | None) -> tuple[str, dict, str]:
         if chains is None:
             chains = [1]
-
         chain_list = ",".join(map(str, chains))
-        params = {"address": address, "chains": chain_list}
-        return self._get(
+        return (
             "/api/v5/dex/balance/all-token-balances-by-address",
-            params,
-            endpoint_key="dex/balance/all-token-balances-by-address",
+            {"address": address, "chains": chain_list},
+            "dex/balance/all-token-balances-by-address",
         )
 
-    def get_kline(self, symbol: str, bar: str = "1D", limit: int = 30) -> dict:
-        """Return historical candle data.
-
-        ``bar`` examples: 1m, 5m, 1H, 1D etc.
-        ``limit`` max 100.
-        """
-        return self._get(
+    @staticmethod
+    def _kline_request(symbol: str, bar: str, limit: int, after: int | None = None) -> tuple[str, dict, str]:
+        params = {"instId": f"{symbol.upper()}-USDT", "bar": bar, "limit": limit}
+        if after is not None:
+            params["after"] = after
+        return (
             "/api/v5/dex/market/candlesticks-history",
-            {"instId": f"{symbol.upper()}-USDT", "bar": bar, "limit": limit},
-            endpoint_key="dex/market/candlesticks-history",
+            params,
+            "dex/market/candlesticks-history",
         )
 
 
+class AsyncOKXExplorer(OKXExplorer):
+    """asyncio counterpart of OKXExplorer using the shared AsyncHTTPTransport."""
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        retry_delay: int = 2,
+        transport: AsyncHTTPTransport | None = None,
+        base_url: str | None = None,
+    ):
+        super().__init__(max_retries, retry_delay, base_url=base_url)
+        self.transport = transport or default_async_transport
+
+    async def _get(self, request_path: str, params: dict | None = None, endpoint_key: str | None = None) -> dict:
+        """Async GET with non-blocking backoff, circuit breaker, and unified response shape."""
+        if endpoint_key and not breaker.allow_request(endpoint_key):
+            return short_circuit_response(endpoint_key)
+
+        full_path, url = self._url(request_path, params)
+
+        delays = compute_exponential_backoff_delays(self.max_retries)
+        last_error = None
+        for attempt in range(self.max_retries):
+            try:
+                resp = await self.transport.get(url, headers=self._headers("GET", full_path))
+                resp.raise_for_status()
+                payload = resp.json()
+                if payload.get("code") == "0":
+                    if endpoint_key:
+                        breaker.record_success(endpoint_key)
+                    return {"success": True, "data": payload.get("data", [])}
+                error_msg = payload.get("msg", "Unknown API error")
+                logger.error("OKX Explorer API error: %s", error_msg)
+                last_error = error_msg
+                if endpoint_key:
+                    breaker.record_failure(endpoint_key)
+            except httpx.HTTPStatusError as e:
+                logger.warning("HTTP error (%s) on attempt %d", e, attempt + 1)
+                last_error = str(e)
+                if endpoint_key:
+                    breaker.record_failure(endpoint_key)
+            except httpx.HTTPError as e:
+                logger.error("Network error while calling OKX Explorer: %s", e)
+                last_error = str(e)
+                if endpoint_key:
+                    breaker.record_failure(endpoint_key)
+                break
+            await async_sleep_with_backoff(attempt, delays)
+        return {"success": False, "error": last_error or "Retries exhausted", "code": "E_OKX_HTTP"}
+
+    async def get_all_balances(self, address: str, chains: list[int] | None = None) -> dict:
+        """Async version of OKXExplorer.get_all_balances."""
+        return await self._get(*self._balances_request(address, chains))
+
+    async def get_kline(self, symbol: str, bar: str = "1D", limit: int = 30, after: int | None = None) -> dict:
+        """Async version of OKXExplorer.get_kline."""
+        return await self._get(*self._kline_request(symbol, bar, limit, after))
+
+
 if __name__ == "__main__":
     explorer = OKXExplorer()
     addr = os.getenv("TEST_WALLET_ADDRESS", "0x000000000000000000000000000000000000dead")
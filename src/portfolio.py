@@ -1,8 +1,15 @@
+import os
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from decimal import Decimal
-from typing import Dict, List
+from typing import Dict, List, Optional, Set, Tuple
 
-from src.database import get_db_connection
+from psycopg2.extras import execute_values
+
+from src.database import db_connection
+from src.candle_store import CandleStore
+from src.rebalance import plan_rebalance
 from src.okx_explorer import OKXExplorer
 from src.constants import TOKEN_DECIMALS
 
@@ -11,209 +18,352 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Max wallets of one user fetched from OKX at the same time during a sync
+SYNC_WALLET_CONCURRENCY = int(os.getenv("SYNC_WALLET_CONCURRENCY", "4"))
+# Incremental syncs skip wallets whose balances are younger than this; users
+# idle for USER_IDLE_AFTER_SECS get the longer IDLE_WALLET_SYNC_MAX_AGE_SECS.
+WALLET_SYNC_MAX_AGE_SECS = int(os.getenv("WALLET_SYNC_MAX_AGE_SECS", "300"))
+IDLE_WALLET_SYNC_MAX_AGE_SECS = int(os.getenv("IDLE_WALLET_SYNC_MAX_AGE_SECS", "3600"))
+USER_IDLE_AFTER_SECS = int(os.getenv("USER_IDLE_AFTER_SECS", "86400"))
+
+
+@dataclass
+class HoldingsSyncStats:
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+    unchanged: int = 0  # rows left untouched because nothing changed
+
+
+@dataclass
+class PortfolioView:
+    """Read model of one user's portfolio, loaded by ``PortfolioService.load_view``.
+
+    Holds the current total, per-asset values and allocation, and the
+    portfolio_history value *period_days* ago. Load it once per request and
+    pass it to the analytics methods via ``view=`` to avoid re-querying.
+    """
+    total_value_usd: Decimal = Decimal("0")
+    assets: List[Dict] = field(default_factory=list)  # symbol, quantity, value_usd, allocation_pct
+    past_value_usd: Optional[Decimal] = None
+    period_days: int = 7
+    age_secs: Optional[float] = None
+
+    def to_snapshot(self) -> Dict:
+        """The ``get_snapshot`` dict for this view."""
+        return {
+            "total_value_usd": float(self.total_value_usd),
+            "assets": [
+                {"symbol": a["symbol"], "quantity": float(a["quantity"]), "value_usd": float(a["value_usd"])}
+                for a in self.assets
+            ],
+            "age_secs": self.age_secs,
+        }
+
+    def by_symbol(self) -> Dict[str, Dict[str, Decimal]]:
+        """Quantity, USD value and allocation summed per symbol (a token may sit in several wallets)."""
+        totals: Dict[str, Dict[str, Decimal]] = {}
+        for a in self.assets:
+            entry = totals.setdefault(
+                a["symbol"], {"quantity": Decimal("0"), "value_usd": Decimal("0"), "allocation_pct": Decimal("0")}
+            )
+            for key in entry:
+                entry[key] += a[key]
+        return totals
+
 
 class PortfolioService:
     """High-level portfolio utilities (sync + snapshot)."""
 
-    def __init__(self, explorer: OKXExplorer | None = None):
+    def __init__(self, explorer: OKXExplorer | None = None, candles: CandleStore | None = None):
         self.explorer = explorer or OKXExplorer()
+        self.candles = candles or CandleStore(self.explorer)
+        self.last_sync_stats: HoldingsSyncStats | None = None
 
     # ------------------------------------------------------------------
     # Public API
     # ------------------------------------------------------------------
-    def sync_balances(self, telegram_id: int) -> bool:
+    def wallet_max_age(self, idle_secs: float | None) -> int:
+        """Max balance age for a user last active *idle_secs* ago (None = never)."""
+        if idle_secs is not None and idle_secs < USER_IDLE_AFTER_SECS:
+            return WALLET_SYNC_MAX_AGE_SECS
+        return IDLE_WALLET_SYNC_MAX_AGE_SECS
+
+    def sync_balances(self, telegram_id: int, record_snapshot: bool = False, incremental: bool = False) -> bool:
         """Pull latest on-chain balances for every wallet of *telegram_id*.
 
         This now consults the OKX DEX API, which can query multiple chains at once.
-        Returns ``True`` on success, ``False`` otherwise.
+        Wallets are fetched concurrently (up to SYNC_WALLET_CONCURRENCY at a time)
+        without holding a database connection. A wallet whose fetch fails keeps
+        its previously stored holdings. With *incremental*, wallets synced more
+        recently than ``wallet_max_age()`` are skipped and keep their rows too.
+        With *record_snapshot*, today's portfolio_history row is written in the
+        same transaction. Returns ``True`` if at least one wallet synced (or
+        there is nothing to sync), ``False`` otherwise.
         """
-        conn = get_db_connection()
-        if conn is None:
-            return False
+        # 1. Resolve internal user id and wallets (with their balance age)
+        with db_connection() as conn:
+            if conn is None:
+                return False
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "SELECT id, EXTRACT(EPOCH FROM (NOW() - last_active_at)) FROM users WHERE telegram_id = %s;",
+                        (telegram_id,),
+                    )
+                    result = cur.fetchone()
+                    if result is None:
+                        logger.warning("sync_balances: unknown user %s", telegram_id)
+                        return False
+                    user_pk, idle_secs = result
 
-        try:
-            with conn.cursor() as cur:
-                # 1. Resolve internal user id
-                cur.execute("SELECT id FROM users WHERE telegram_id = %s;", (telegram_id,))
-                result = cur.fetchone()
-                if result is None:
-                    logger.warning("sync_balances: unknown user %s", telegram_id)
-                    return False
-                user_pk = result[0]
-
-                # 2. Ensure portfolio row exists
-                cur.execute("SELECT id FROM portfolios WHERE user_id = %s;", (user_pk,))
-                row = cur.fetchone()
-                if row is None:
                     cur.execute(
-                        "INSERT INTO portfolios (user_id) VALUES (%s) RETURNING id;", (user_pk,)
+                        """
+                        SELECT address, chain_id, EXTRACT(EPOCH FROM (NOW() - last_synced_at))
+                        FROM wallets WHERE user_id = %s ORDER BY id;
+                        """,
+                        (user_pk,),
                     )
-                    portfolio_id = cur.fetchone()[0]
-                else:
-                    portfolio_id = row[0]
-
-                # 3. Fetch all user wallets and chains
-                cur.execute("SELECT address, chain_id FROM wallets WHERE user_id = %s;", (user_pk,))
-                wallet_rows = cur.fetchall()
-                if not wallet_rows:
-                    logger.info("User %s has no wallets – skipping sync", telegram_id)
-                    return True  # nothing to sync but not an error
-
-                # Clear previous holdings (simple strategy)
-                cur.execute("DELETE FROM holdings WHERE portfolio_id = %s;", (portfolio_id,))
-
-                # We can query all wallets and chains in a single API call.
-                all_addresses = [row[0] for row in wallet_rows]
-                all_chains = sorted(list(set(str(row[1]) for row in wallet_rows)))
-
-                for address in all_addresses:
-                    resp = self.explorer.get_all_balances(address, chains=all_chains)
-                    if resp.get("success"):
-                        # The response is a list of chains, each with a list of assets
-                        for chain_data in resp["data"]:
-                            chain_id = int(chain_data.get("chainIndex"))
-                            for asset in chain_data.get("tokenAssets", []):
-                                self._upsert_holding(cur, portfolio_id, chain_id, asset)
-                    else:
-                        logger.error("Failed to fetch balances for %s: %s", address, resp.get("error"))
-
-                # Update last_synced timestamp
-                cur.execute(
-                    "UPDATE portfolios SET last_synced = CURRENT_TIMESTAMP WHERE id = %s;",
-                    (portfolio_id,),
-                )
-                conn.commit()
-                return True
-        except Exception as e:
-            logger.error("sync_balances error for user %s: %s", telegram_id, e)
-            conn.rollback()
+                    wallet_rows = cur.fetchall()
+            except Exception as e:
+                logger.error("sync_balances error for user %s: %s", telegram_id, e)
+                return False
+
+        if not wallet_rows:
+            logger.info("User %s has no wallets – skipping sync", telegram_id)
+            return True  # nothing to sync but not an error
+
+        # 2. Fetch balances for every stale wallet concurrently (no connection held)
+        all_chains = sorted(list(set(str(row[1]) for row in wallet_rows)))
+        max_age = self.wallet_max_age(float(idle_secs) if idle_secs is not None else None) if incremental else None
+        all_addresses = list(dict.fromkeys(row[0] for row in wallet_rows))
+        fresh_wallets = {
+            address.lower() for address, _, age in wallet_rows
+            if max_age is not None and age is not None and float(age) < max_age
+        }
+        stale_addresses = [a for a in all_addresses if a.lower() not in fresh_wallets]
+        if not stale_addresses and not record_snapshot:
+            logger.info("User %s: all %s wallet(s) fresher than %ss – skipping sync", telegram_id, len(all_addresses), max_age)
+            return True
+        responses = self._fetch_wallet_balances(stale_addresses, all_chains)
+
+        # Merge in wallet order so the result does not depend on completion order
+        desired: Dict[Tuple[int, str, str], Tuple] = {}
+        failed_wallets = set()
+        for address, resp in zip(stale_addresses, responses):
+            if not resp.get("success"):
+                logger.error("Failed to fetch balances for %s: %s", address, resp.get("error"))
+                failed_wallets.add(address.lower())
+                continue
+            # The response is a list of chains, each with a list of assets
+            for chain_data in resp["data"]:
+                chain_id = int(chain_data.get("chainIndex"))
+                for asset in chain_data.get("tokenAssets", []):
+                    key, values = self._holding_row(chain_id, address, asset)
+                    desired[key] = values
+
+        if stale_addresses and len(failed_wallets) == len(stale_addresses):
+            logger.error("sync_balances: every wallet fetch failed for user %s", telegram_id)
             return False
-        finally:
-            conn.close()
+        synced_wallets = [a.lower() for a in stale_addresses if a.lower() not in failed_wallets]
+
+        # 3. Diff against stored rows and write only what changed
+        with db_connection() as conn:
+            if conn is None:
+                return False
+            try:
+                with conn.cursor() as cur:
+                    # Ensure portfolio row exists
+                    cur.execute("SELECT id FROM portfolios WHERE user_id = %s;", (user_pk,))
+                    row = cur.fetchone()
+                    if row is None:
+                        cur.execute(
+                            "INSERT INTO portfolios (user_id) VALUES (%s) RETURNING id;", (user_pk,)
+                        )
+                        portfolio_id = cur.fetchone()[0]
+                    else:
+                        portfolio_id = row[0]
+
+                    if synced_wallets:
+                        stats = self._write_holdings(cur, portfolio_id, desired, failed_wallets | fresh_wallets)
+                        self.last_sync_stats = stats
+                        logger.info(
+                            "sync_balances user=%s: %s inserted, %s updated, %s deleted, %s unchanged, "
+                            "%s/%s wallet(s) failed, %s fresh",
+                            telegram_id, stats.inserted, stats.updated, stats.deleted, stats.unchanged,
+                            len(failed_wallets), len(stale_addresses), len(fresh_wallets),
+                        )
+                        cur.execute(
+                            "UPDATE wallets SET last_synced_at = CURRENT_TIMESTAMP WHERE user_id = %s AND LOWER(address) = ANY(%s);",
+                            (user_pk, synced_wallets),
+                        )
+                        # Update last_synced timestamp
+                        cur.execute(
+                            "UPDATE portfolios SET last_synced = CURRENT_TIMESTAMP WHERE id = %s;",
+                            (portfolio_id,),
+                        )
+                    if record_snapshot:
+                        cur.execute(
+                            """
+                            INSERT INTO portfolio_history (user_id, total_value_usd, snapshot_date)
+                            SELECT %s, COALESCE(SUM(value_usd), 0), CURRENT_DATE FROM holdings WHERE portfolio_id = %s
+                            ON CONFLICT (user_id, snapshot_date) DO UPDATE SET total_value_usd = EXCLUDED.total_value_usd;
+                            """,
+                            (user_pk, portfolio_id),
+                        )
+                    conn.commit()
+                    return True
+            except Exception as e:
+                logger.error("sync_balances error for user %s: %s", telegram_id, e)
+                conn.rollback()
+                return False
+
+    def _fetch_wallet_balances(self, addresses: List[str], chains: List[str]) -> List[Dict]:
+        """Fetch balances for *addresses* concurrently; results are returned in input order."""
+        def fetch(address: str) -> Dict:
+            try:
+                return self.explorer.get_all_balances(address, chains=chains)
+            except Exception as e:
+                return {"success": False, "error": str(e), "code": "E_OKX_HTTP"}
+
+        workers = max(1, min(SYNC_WALLET_CONCURRENCY, len(addresses)))
+        if workers == 1:
+            return [fetch(address) for address in addresses]
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="wallet-sync") as pool:
+            return list(pool.map(fetch, addresses))
+
+    def load_view(self, telegram_id: int, period_days: int = 7) -> Optional[PortfolioView]:
+        """Load holdings, totals, allocation and the value *period_days* ago in one query.
+
+        Returns None if the database is unavailable or the query fails.
+        """
+        with db_connection() as conn:
+            if conn is None:
+                return None
+            try:
+                with conn.cursor() as cur:
+                    # Anchored on a single row so the history value comes back even without holdings
+                    cur.execute(
+                        """
+                        WITH owner AS (
+                            SELECT id FROM users WHERE telegram_id = %s
+                        ),
+                        positions AS (
+                            SELECT h.symbol, h.amount, h.decimals, COALESCE(h.value_usd, 0) AS value_usd,
+                                   EXTRACT(EPOCH FROM (NOW() - p.last_synced)) AS synced_age
+                            FROM holdings h
+                            JOIN portfolios p ON h.portfolio_id = p.id
+                            JOIN owner o ON p.user_id = o.id
+                        ),
+                        past AS (
+                            SELECT ph.total_value_usd
+                            FROM portfolio_history ph
+                            JOIN owner o ON ph.user_id = o.id
+                            WHERE ph.snapshot_date <= CURRENT_DATE - %s * INTERVAL '1 day'
+                            ORDER BY ph.snapshot_date DESC
+                            LIMIT 1
+                        )
+                        SELECT pos.symbol, pos.amount, pos.decimals, pos.value_usd, pos.synced_age,
+                               COALESCE(SUM(pos.value_usd) OVER (), 0),
+                               COALESCE(pos.value_usd * 100 / NULLIF(SUM(pos.value_usd) OVER (), 0), 0),
+                               (SELECT total_value_usd FROM past)
+                        FROM (SELECT 1) AS anchor
+                        LEFT JOIN positions pos ON TRUE
+                        ORDER BY pos.value_usd DESC NULLS LAST, pos.symbol;
+                        """,
+                        (telegram_id, period_days),
+                    )
+                    rows = cur.fetchall()
+            except Exception as e:
+                logger.error("load_view error: %s", e)
+                return None
+
+        view = PortfolioView(period_days=period_days)
+        for symbol, amount, decimals, value_usd, synced_age, total, allocation_pct, past_value in rows:
+            view.total_value_usd = _decimal(total)
+            if past_value is not None:
+                view.past_value_usd = _decimal(past_value)
+            if symbol is None:  # the anchor row of a portfolio without holdings
+                continue
+            if synced_age is not None:
+                view.age_secs = float(synced_age)
+            view.assets.append({
+                "symbol": symbol,
+                "quantity": _decimal(amount) / (Decimal(10) ** (decimals or 18)),
+                "value_usd": _decimal(value_usd),
+                "allocation_pct": _decimal(allocation_pct),
+            })
+        return view
 
     def get_snapshot(self, telegram_id: int) -> Dict:
-        """Return structured portfolio snapshot with USD valuation."""
-        conn = get_db_connection()
-        if conn is None:
-            return {}
-        try:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    SELECT h.symbol, h.amount, h.decimals, h.value_usd
-                    FROM holdings h
-                    JOIN portfolios p ON h.portfolio_id = p.id
-                    JOIN users u ON p.user_id = u.id
-                    WHERE u.telegram_id = %s;
-                    """,
-                    (telegram_id,),
-                )
-                rows = cur.fetchall()
-                assets: List[Dict] = []
-                total_value = Decimal("0")
-                for symbol, amount, decimals, value_usd in rows:
-                    amt_dec = amount if isinstance(amount, Decimal) else Decimal(str(amount))
-                    qty = amt_dec / (Decimal(10) ** (decimals or 18))
-                    assets.append({
-                        "symbol": symbol,
-                        "quantity": float(qty),
-                        "value_usd": float(value_usd or 0),
-                    })
-                    val_dec = value_usd if isinstance(value_usd, Decimal) else Decimal(str(value_usd or 0))
-                    total_value += val_dec
-                return {"total_value_usd": float(total_value), "assets": assets}
-        except Exception as e:
-            logger.error("get_snapshot error: %s", e)
-            return {}
-        finally:
-            conn.close()
+        """Return structured portfolio snapshot with USD valuation.
+
+        ``age_secs`` is the time since the portfolio was last synced (None if
+        it never was), so callers can label stored values as possibly stale.
+        """
+        view = self.load_view(telegram_id)
+        return view.to_snapshot() if view else {}
 
     # ------------------------------------------------------------------
     # Analytics helpers
     # ------------------------------------------------------------------
-    def get_diversification(self, telegram_id: int) -> Dict:
+    def _view(self, telegram_id: int, view: Optional[PortfolioView], period_days: int = 7) -> Optional[PortfolioView]:
+        return view if view is not None else self.load_view(telegram_id, period_days)
+
+    def get_diversification(self, telegram_id: int, view: Optional[PortfolioView] = None) -> Dict:
         """Return portfolio allocation per token symbol (percentage of USD value)."""
-        snap = self.get_snapshot(telegram_id)
-        total = snap.get("total_value_usd", 0)
-        assets = snap.get("assets", [])
-        if total == 0:
+        view = self._view(telegram_id, view)
+        if view is None or view.total_value_usd == 0:
             return {}
-        alloc = {a["symbol"]: round(a["value_usd"] / total * 100, 2) for a in assets}
-        return alloc
+        return {sym: float(round(data["allocation_pct"], 2)) for sym, data in view.by_symbol().items()}
 
-    def get_portfolio_performance(self, user_id: int, period_days: int = 7) -> Dict:
+    def get_portfolio_performance(self, user_id: int, period_days: int = 7, view: Optional[PortfolioView] = None) -> Dict:
         """
         Calculates portfolio performance over a specified period.
         """
-        conn = get_db_connection()
-        if conn is None:
-            return {}
-        try:
-            with conn.cursor() as cur:
-                # 1. Get current portfolio value
-                current_snapshot = self.get_snapshot(user_id)
-                current_value = Decimal(str(current_snapshot.get("total_value_usd", 0)))
-
-                # 2. Get historical portfolio value
-                cur.execute(
-                    """
-                    SELECT total_value_usd
-                    FROM portfolio_history
-                    WHERE user_id = (SELECT id FROM users WHERE telegram_id = %s)
-                    AND snapshot_date <= (CURRENT_DATE - INTERVAL '%s days')
-                    ORDER BY snapshot_date DESC
-                    LIMIT 1;
-                    """,
-                    (user_id, period_days),
-                )
-                result = cur.fetchone()
-                past_value = Decimal(str(result[0])) if result else Decimal("0")
-
-                if past_value == 0:
-                    return {
-                        "current_value": float(current_value),
-                        "past_value": 0,
-                        "absolute_change": float(current_value),
-                        "percentage_change": "inf" if current_value > 0 else 0,
-                    }
-
-                # 3. Calculate performance
-                absolute_change = current_value - past_value
-                percentage_change = (absolute_change / past_value) * 100
-
-                return {
-                    "current_value": float(current_value),
-                    "past_value": float(past_value),
-                    "absolute_change": float(absolute_change),
-                    "percentage_change": float(percentage_change),
-                }
-        except Exception as e:
-            logger.error("get_portfolio_performance error: %s", e)
+        if view is None or view.period_days != period_days:
+            view = self.load_view(user_id, period_days)
+        if view is None:
             return {}
-        finally:
-            conn.close()
 
-    def get_roi(self, telegram_id: int, window_days: int = 30) -> float:
+        current_value = view.total_value_usd
+        past_value = view.past_value_usd or Decimal("0")
+        if past_value == 0:
+            return {
+                "current_value": float(current_value),
+                "past_value": 0,
+                "absolute_change": float(current_value),
+                "percentage_change": "inf" if current_value > 0 else 0,
+            }
+
+        absolute_change = current_value - past_value
+        percentage_change = (absolute_change / past_value) * 100
+
+        return {
+            "current_value": float(current_value),
+            "past_value": float(past_value),
+            "absolute_change": float(absolute_change),
+            "percentage_change": float(percentage_change),
+        }
+
+    def get_roi(self, telegram_id: int, window_days: int = 30, view: Optional[PortfolioView] = None) -> float:
         """Calculate simple ROI over *window_days* based on historical price data.
 
-        ROI = (current_value - past_value) / past_value
-        This is a naive implementation for illustration/testing.
+        ROI = (current_value - past_value) / past_value, where past_value prices
+        today's quantities at the daily open *window_days* ago.
         """
-        snap = self.get_snapshot(telegram_id)
-        current_total = Decimal(str(snap.get("total_value_usd", 0)))
-        if current_total == 0:
+        view = self._view(telegram_id, view)
+        if view is None or view.total_value_usd == 0:
             return 0.0
-
-        past_total = Decimal("0")
-        for asset in snap.get("assets", []):
-            symbol = asset["symbol"]
-            qty = Decimal(str(asset["quantity"]))
-
-            price_resp = self.explorer.get_kline(symbol, bar="1D", limit=window_days + 1)
-            if price_resp.get("success") and price_resp["data"]:
-                # Use the first element (earliest) as past price open
-                past_price = Decimal(str(price_resp["data"][0].get("open", "0")))
-                past_total += qty * past_price
+        current_total = view.total_value_usd
+
+        # Daily opens come from the local candle store; only missing bars go upstream
+        assets = view.by_symbol()
+        past_prices = self.candles.opening_prices(list(assets), bar="1D", bars=window_days)
+        past_total = sum(
+            (data["quantity"] * past_prices[symbol] for symbol, data in assets.items() if symbol in past_prices),
+            Decimal("0"),
+        )
 
         if past_total == 0:
             return 0.0
@@ -221,79 +371,33 @@ class PortfolioService:
         return float(round(roi, 4))
 
     # ------------------------------------------------------------------
-    def suggest_rebalance(self, telegram_id: int, target_alloc: Dict[str, float] | None = None) -> List[Dict]:
-        """Generate a naïve rebalance plan to reach *target_alloc*.
+    def suggest_rebalance(
+        self, telegram_id: int, target_alloc: Dict[str, float] | None = None, view: Optional[PortfolioView] = None
+    ) -> List[Dict]:
+        """Generate a rebalance plan to reach *target_alloc* (see ``src.rebalance.plan_rebalance``).
 
-        target_alloc – mapping symbol -> desired % allocation (sums to 100).
+        target_alloc – mapping symbol -> desired % allocation (normalised to 100).
         If None, assume equal weight across existing tokens.
 
         Returns list of trades of the form
-        {"from": symbol_a, "to": symbol_b, "from_amount": float, "usd_amount": float}.
-        Only single hop suggestions are returned; caller can translate into swaps.
+        {"from": symbol_a, "to": symbol_b, "from_amount": float, "usd_amount": float, "est_cost_usd": float}.
+        Overweight tokens may be split across several underweight ones; caller can translate into swaps.
         """
-        snap = self.get_snapshot(telegram_id)
-        total = Decimal(str(snap.get("total_value_usd", 0)))
-        if total == 0:
+        view = self._view(telegram_id, view)
+        if view is None or view.total_value_usd == 0:
             return []
-
-        assets = {a["symbol"]: {"value_usd": Decimal(str(a["value_usd"])), "quantity": Decimal(str(a["quantity"]))} for a in snap["assets"]}
-
+        assets = view.by_symbol()
         if not target_alloc:
             # Equal allocation among current holdings
-            count = len(assets)
-            if count == 0:
-                return []
-            target_alloc = {sym: 100 / count for sym in assets}
-
-        # Ensure target percentages sum to 100
-        total_target = sum(target_alloc.values())
-        if abs(total_target - 100) > 0.01:
-            # Normalise
-            target_alloc = {k: v * 100 / total_target for k, v in target_alloc.items()}
-
-        diffs: Dict[str, Decimal] = {}
-        for sym, data in assets.items():
-            current_pct = (data["value_usd"] / total) * 100
-            desired = Decimal(str(target_alloc.get(sym, 0)))
-            diffs[sym] = current_pct - desired  # positive -> overweight
-
-        # Tokens not currently held but in target => underweight
-        for sym, pct in target_alloc.items():
-            if sym not in diffs:
-                diffs[sym] = Decimal("-") + Decimal(str(pct))
-
-        # Build lists
-        over = {s: d for s, d in diffs.items() if d > 0}
-        under = {s: -d for s, d in diffs.items() if d < 0}
-        if not under or not over:
-            return []  # already balanced
-
-        plan: List[Dict] = []
-        # Simple greedy: convert each overweight token into the single most underweight token
-        most_under_symbol = max(under, key=under.get)
-        for sym, pct_excess in over.items():
-            usd_excess = (pct_excess / 100) * total
-            
-            # Calculate from_amount
-            from_amount = 0.0
-            if assets[sym]["value_usd"] > 0:
-                price = assets[sym]["value_usd"] / assets[sym]["quantity"]
-                from_amount = usd_excess / price
-
-            plan.append({
-                "from": sym,
-                "to": most_under_symbol,
-                "from_amount": float(round(from_amount, 6)),
-                "usd_amount": float(round(usd_excess, 2))
-            })
-
-        return plan
+            target_alloc = {sym: 100 / len(assets) for sym in assets}
+        return plan_rebalance(assets, target_alloc)
 
     # ------------------------------------------------------------------
     # Internals
     # ------------------------------------------------------------------
-    def _upsert_holding(self, cur, portfolio_id: int, chain_id: int, entry: dict):
-        """Insert single holding row derived from DEX API balance entry."""
+    @staticmethod
+    def _holding_row(chain_id: int, wallet_address: str, entry: dict) -> Tuple[Tuple[int, str, str], Tuple]:
+        """Map a DEX API balance entry to its holdings key and ``(symbol, amount, decimals, value_usd)``."""
         symbol = entry.get("symbol", "UNKNOWN")
         token_address = entry.get("tokenContractAddress", "0x")
         balance_str = entry.get("balance", "0")
@@ -308,18 +412,89 @@ class PortfolioService:
         price_usd = Decimal(str(entry.get("tokenPrice", "0")))
         value_usd = (quantity / (Decimal(10) ** decimals)) * price_usd
 
+        key = (chain_id, token_address.lower(), wallet_address.lower())
+        return key, (symbol, quantity, decimals, value_usd)
+
+    @staticmethod
+    def _same_holding(stored: Tuple, fresh: Tuple) -> bool:
+        symbol, amount, decimals, value_usd = stored
+        return (
+            symbol == fresh[0]
+            and Decimal(str(amount or 0)) == fresh[1]
+            and decimals == fresh[2]
+            and Decimal(str(value_usd or 0)) == fresh[3]
+        )
+
+    def _write_holdings(
+        self,
+        cur,
+        portfolio_id: int,
+        desired: Dict[Tuple[int, str, str], Tuple],
+        untouched_wallets: Set[str] = frozenset(),
+    ) -> "HoldingsSyncStats":
+        """Bring the portfolio's holdings in line with *desired* using one upsert and one delete.
+
+        Stored rows of wallets in *untouched_wallets* (failed or skipped) are kept as they are.
+        """
         cur.execute(
             """
-            INSERT INTO holdings (portfolio_id, chain_id, token_address, symbol, amount, decimals, value_usd)
-            VALUES (%s, %s, %s, %s, %s, %s, %s);
+            SELECT id, chain_id, token_address, wallet_address, symbol, amount, decimals, value_usd
+            FROM holdings WHERE portfolio_id = %s FOR UPDATE;
             """,
-            (
-                portfolio_id,
-                chain_id,
-                token_address,
-                symbol,
-                str(quantity),
-                decimals,
-                str(value_usd),
-            ),
+            (portfolio_id,),
         )
+        stats = HoldingsSyncStats()
+        stale_ids: List[int] = []
+        seen = set()
+        changed = []
+        for row in cur.fetchall():
+            holding_id, chain_id, token_address, wallet_address = row[:4]
+            key = (chain_id, (token_address or "").lower(), (wallet_address or "").lower())
+            if key[2] in untouched_wallets:
+                stats.unchanged += 1
+                continue
+            fresh = desired.get(key)
+            if fresh is None or key in seen:
+                # Gone from the wallet (or a duplicate left by the old delete-and-insert sync)
+                stale_ids.append(holding_id)
+                continue
+            seen.add(key)
+            if self._same_holding(row[4:], fresh):
+                stats.unchanged += 1
+            else:
+                changed.append(key)
+                stats.updated += 1
+        for key in desired:
+            if key not in seen:
+                changed.append(key)
+                stats.inserted += 1
+
+        if stale_ids:
+            cur.execute("DELETE FROM holdings WHERE id = ANY(%s);", (stale_ids,))
+            stats.deleted = len(stale_ids)
+        if changed:
+            rows = []
+            for key in changed:
+                chain_id, token_address, wallet_address = key
+                symbol, amount, decimals, value_usd = desired[key]
+                rows.append((portfolio_id, chain_id, token_address, wallet_address, symbol, str(amount), decimals, str(value_usd)))
+            execute_values(
+                cur,
+                """
+                INSERT INTO holdings (portfolio_id, chain_id, token_address, wallet_address, symbol, amount, decimals, value_usd)
+                VALUES %s
+                ON CONFLICT (portfolio_id, chain_id, token_address, wallet_address) DO UPDATE SET
+                    symbol = EXCLUDED.symbol,
+                    amount = EXCLUDED.amount,
+                    decimals = EXCLUDED.decimals,
+                    value_usd = EXCLUDED.value_usd,
+                    updated_at = CURRENT_TIMESTAMP;
+                """,
+                rows,
+                page_size=max(len(rows), 1),
+            )
+        return stats
+
+
+def _decimal(value) -> Decimal:
+    return value if isinstance(value, Decimal) else Decimal(str(value or 0))
@@ -0,0 +1,187 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Environment-configurable defaults
+QUOTE_CACHE_TTL_SECS = float(os.getenv("QUOTE_CACHE_TTL_SECS", "5"))  # <= 0 disables caching (single-flight still applies)
+QUOTE_CACHE_MAX_ENTRIES = int(os.getenv("QUOTE_CACHE_MAX_ENTRIES", "512"))
+
+QuoteKey = Tuple[int, str, str, str]
+
+# Result handed to async followers when the leading coroutine was cancelled; they retry
+_LEADER_CANCELLED = object()
+
+
+@dataclass
+class QuoteCacheStats:
+    hits: int = 0
+    misses: int = 0  # lookups that triggered an upstream call
+    coalesced: int = 0  # lookups that joined an identical in-flight call
+    evictions: int = 0
+
+
+class _Flight:
+    """An in-flight upstream call that other threads can wait on."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class QuoteCache:
+    """Bounded LRU + TTL cache for OKX quotes with single-flight loading.
+
+    Only successful responses (``{"success": True, ...}``) are stored, so
+    errors and short-circuit responses are never served from cache.
+    Concurrent identical lookups share one upstream call, both for threads
+    (``get_or_fetch``) and for coroutines (``aget_or_fetch``).
+    """
+
+    def __init__(
+        self,
+        ttl_secs: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl_secs = ttl_secs if ttl_secs is not None else QUOTE_CACHE_TTL_SECS
+        self.max_entries = max_entries if max_entries is not None else QUOTE_CACHE_MAX_ENTRIES
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[QuoteKey, Tuple[float, dict]]" = OrderedDict()
+        self._flights: Dict[QuoteKey, _Flight] = {}
+        self._async_flights: Dict[QuoteKey, asyncio.Future] = {}
+        self._stats = QuoteCacheStats()
+
+    @staticmethod
+    def make_key(chain_id: int, from_token_address: str, to_token_address: str, amount: str) -> QuoteKey:
+        return (int(chain_id), from_token_address.lower(), to_token_address.lower(), str(amount))
+
+    # ------------------------------------------------------------------
+    # Internal helpers (call with self._lock held)
+    # ------------------------------------------------------------------
+    def _lookup(self, key: QuoteKey) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if self._clock() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key: QuoteKey, value: dict) -> None:
+        if self.ttl_secs <= 0 or self.max_entries <= 0 or not value.get("success"):
+            return
+        self._entries[key] = (self._clock() + self.ttl_secs, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats.evictions += 1
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def get_or_fetch(self, key: QuoteKey, fetch: Callable[[], dict]) -> dict:
+        """Return a cached quote for *key* or call *fetch* once for all concurrent callers."""
+        with self._lock:
+            cached = self._lookup(key)
+            if cached is not None:
+                self._stats.hits += 1
+                return cached
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                self._stats.misses += 1
+                flight = self._flights[key] = _Flight()
+            else:
+                self._stats.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fetch()
+            with self._lock:
+                self._store(key, flight.result)
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    async def aget_or_fetch(self, key: QuoteKey, fetch: Callable[[], Awaitable[dict]]) -> dict:
+        """Async variant of get_or_fetch; identical in-flight coroutines await one upstream call.
+
+        If the leading coroutine is cancelled, its followers are not: they
+        retry, and one of them leads a fresh fetch for the rest.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            cached = self._lookup(key)
+            if cached is not None:
+                self._stats.hits += 1
+                return cached
+            future = self._async_flights.get(key)
+            # A future left over from another event loop cannot be awaited here
+            leader = future is None or future.get_loop() is not loop
+            if leader:
+                self._stats.misses += 1
+                future = self._async_flights[key] = loop.create_future()
+            else:
+                self._stats.coalesced += 1
+
+        if not leader:
+            result = await asyncio.shield(future)
+            if result is _LEADER_CANCELLED:
+                return await self.aget_or_fetch(key, fetch)
+            return result
+
+        try:
+            result = await fetch()
+            with self._lock:
+                self._store(key, result)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.set_result(_LEADER_CANCELLED)
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so an exception nobody waited on is not logged
+            future.exception()
+            raise
+        finally:
+            with self._lock:
+                if self._async_flights.get(key) is future:
+                    del self._async_flights[key]
+
+    def stats(self) -> dict:
+        """Return hit/miss/coalesced/eviction counters plus the current size."""
+        with self._lock:
+            data = asdict(self._stats)
+            data["size"] = len(self._entries)
+            return data
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._stats = QuoteCacheStats()
+
+
+# Singleton cache shared by the sync and async OKX clients
+quote_cache = QuoteCache()
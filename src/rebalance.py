@@ -0,0 +1,191 @@
+import os
+import asyncio
+import logging
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Awaitable, Callable, Dict, List, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Assets within this many percentage points of their target are left alone
+REBALANCE_TOLERANCE_PCT = Decimal(os.getenv("REBALANCE_TOLERANCE_PCT", "2"))
+# Legs smaller than this (USD) are dust and dropped
+REBALANCE_MIN_TRADE_USD = Decimal(os.getenv("REBALANCE_MIN_TRADE_USD", "10"))
+# Cost model per leg: DEX fee + expected slippage (basis points of notional) + fixed gas (USD)
+REBALANCE_FEE_BPS = Decimal(os.getenv("REBALANCE_FEE_BPS", "30"))
+REBALANCE_SLIPPAGE_BPS = Decimal(os.getenv("REBALANCE_SLIPPAGE_BPS", "50"))
+REBALANCE_GAS_USD = Decimal(os.getenv("REBALANCE_GAS_USD", "0"))
+# Legs whose estimated cost exceeds this share of their notional are not worth trading
+REBALANCE_MAX_COST_PCT = Decimal(os.getenv("REBALANCE_MAX_COST_PCT", "5"))
+# Quote requests in flight at once when pricing a plan
+REBALANCE_QUOTE_CONCURRENCY = int(os.getenv("REBALANCE_QUOTE_CONCURRENCY", "8"))
+# Swaps executed at once; legs selling the same token always run one after another
+REBALANCE_EXECUTION_CONCURRENCY = int(os.getenv("REBALANCE_EXECUTION_CONCURRENCY", "3"))
+
+
+@dataclass(frozen=True)
+class CostModel:
+    fee_bps: Decimal = REBALANCE_FEE_BPS
+    slippage_bps: Decimal = REBALANCE_SLIPPAGE_BPS
+    fixed_usd: Decimal = REBALANCE_GAS_USD
+
+    def cost(self, usd_amount: Decimal) -> Decimal:
+        """Estimated USD lost to fees, slippage and gas when swapping *usd_amount*."""
+        return usd_amount * (self.fee_bps + self.slippage_bps) / Decimal(10_000) + self.fixed_usd
+
+
+def plan_rebalance(
+    holdings: Mapping[str, Mapping[str, Decimal]],
+    target_alloc: Mapping[str, float],
+    tolerance_pct: Decimal = REBALANCE_TOLERANCE_PCT,
+    min_trade_usd: Decimal = REBALANCE_MIN_TRADE_USD,
+    cost_model: Optional[CostModel] = None,
+    max_cost_pct: Decimal = REBALANCE_MAX_COST_PCT,
+) -> List[Dict]:
+    """Minimum-notional transfer plan from current *holdings* to *target_alloc*.
+
+    *holdings* maps symbol -> ``{"value_usd", "quantity"}``; *target_alloc*
+    maps symbol -> percent and is normalised to 100. Assets outside the
+    tolerance band become sellers (overweight) or buyers (underweight). Both
+    lists are sorted by size and matched with two pointers, so every dollar
+    moves exactly once and the plan has at most ``sellers + buyers - 1`` legs.
+    Dust legs (below *min_trade_usd*) and legs whose estimated cost exceeds
+    *max_cost_pct* of their notional are dropped. Runs in O(n log n).
+
+    Returns legs ``{"from", "to", "from_amount", "usd_amount", "est_cost_usd"}``.
+    """
+    cost_model = cost_model or CostModel()
+    total = sum((Decimal(str(h["value_usd"])) for h in holdings.values()), Decimal("0"))
+    target_total = sum(target_alloc.values())
+    if total <= 0 or target_total <= 0:
+        return []
+
+    sellers: List[Tuple[str, Decimal]] = []
+    buyers: List[Tuple[str, Decimal]] = []
+    for symbol in set(holdings) | set(target_alloc):
+        value = Decimal(str(holdings[symbol]["value_usd"])) if symbol in holdings else Decimal("0")
+        target_pct = Decimal(str(target_alloc.get(symbol, 0))) * 100 / Decimal(str(target_total))
+        deviation_pct = value / total * 100 - target_pct
+        if abs(deviation_pct) <= tolerance_pct:
+            continue
+        delta = deviation_pct / 100 * total
+        (sellers if delta > 0 else buyers).append((symbol, abs(delta)))
+    if not sellers or not buyers:
+        return []
+
+    # Largest first; ties broken by symbol so plans are deterministic
+    sellers.sort(key=lambda item: (-item[1], item[0]))
+    buyers.sort(key=lambda item: (-item[1], item[0]))
+
+    legs: List[Dict] = []
+    i = j = 0
+    sell_left, buy_left = sellers[0][1], buyers[0][1]
+    while i < len(sellers) and j < len(buyers):
+        usd = min(sell_left, buy_left)
+        from_symbol, to_symbol = sellers[i][0], buyers[j][0]
+        cost = cost_model.cost(usd)
+        if usd >= min_trade_usd and cost <= usd * max_cost_pct / 100:
+            holding = holdings[from_symbol]
+            quantity, value = Decimal(str(holding["quantity"])), Decimal(str(holding["value_usd"]))
+            from_amount = usd * quantity / value if value > 0 else Decimal("0")
+            legs.append({
+                "from": from_symbol,
+                "to": to_symbol,
+                "from_amount": float(round(from_amount, 6)),
+                "usd_amount": float(round(usd, 2)),
+                "est_cost_usd": float(round(cost, 2)),
+            })
+        sell_left -= usd
+        buy_left -= usd
+        if sell_left <= 0:
+            i += 1
+            sell_left = sellers[i][1] if i < len(sellers) else Decimal("0")
+        if buy_left <= 0:
+            j += 1
+            buy_left = buyers[j][1] if j < len(buyers) else Decimal("0")
+    return legs
+
+
+async def price_legs(legs: List[Dict], okx_client, token_resolver, chain_id: int = 1, concurrency: Optional[int] = None) -> List[Dict]:
+    """Quote every leg concurrently (at most *concurrency* in flight) and attach the result.
+
+    Each leg gains ``"quote"``: ``{"success": True, "to_amount", "from_token_address",
+    "to_token_address", "amount_in_smallest_unit"}`` or ``{"success": False, "error"}``.
+    Identical legs share one upstream call through the client's quote cache.
+    """
+    semaphore = asyncio.Semaphore(concurrency or REBALANCE_QUOTE_CONCURRENCY)
+
+    async def price(leg: Dict) -> Dict:
+        from_info = token_resolver.get_token_info(leg["from"], chain_id)
+        to_info = token_resolver.get_token_info(leg["to"], chain_id)
+        if not from_info or not to_info:
+            return {"success": False, "error": "Unknown token address"}
+        amount = str(int(Decimal(str(leg["from_amount"])) * 10 ** from_info["decimals"]))
+        async with semaphore:
+            try:
+                resp = await okx_client.get_live_quote(
+                    from_token_address=from_info["address"],
+                    to_token_address=to_info["address"],
+                    amount=amount,
+                    chainId=chain_id,
+                )
+            except Exception as e:
+                resp = {"success": False, "error": str(e)}
+        if not resp.get("success"):
+            return {"success": False, "error": resp.get("error") or "Quote failed"}
+        return {
+            "success": True,
+            "to_amount": float(resp["data"].get("toTokenAmount", 0)) / 10 ** to_info["decimals"],
+            "from_token_address": from_info["address"],
+            "to_token_address": to_info["address"],
+            "amount_in_smallest_unit": amount,
+        }
+
+    quotes = await asyncio.gather(*(price(leg) for leg in legs))
+    for leg, quote in zip(legs, quotes):
+        leg["quote"] = quote
+    return legs
+
+
+async def execute_legs(
+    legs: List[Dict],
+    execute: Callable[[Dict], Awaitable[Dict]],
+    concurrency: Optional[int] = None,
+    on_status: Optional[Callable[[int, str, Optional[Dict]], Awaitable[None]]] = None,
+) -> List[Dict]:
+    """Execute *legs* with at most *concurrency* swaps in flight; returns results in leg order.
+
+    Legs that sell the same token share its balance and allowance, so they run
+    in order; legs of different tokens run in parallel. *on_status* is awaited
+    with ``(index, "running", None)`` and ``(index, "done", result)``; an
+    exception it raises is logged and does not stop the remaining legs.
+    An exception from *execute* becomes ``{"success": False, "error"}``.
+    """
+    results: List[Optional[Dict]] = [None] * len(legs)
+    by_token: Dict[str, List[int]] = {}
+    for index, leg in enumerate(legs):
+        by_token.setdefault(leg["from"], []).append(index)
+    semaphore = asyncio.Semaphore(concurrency or REBALANCE_EXECUTION_CONCURRENCY)
+
+    async def notify(index: int, state: str, result: Optional[Dict]) -> None:
+        if not on_status:
+            return
+        try:
+            await on_status(index, state, result)
+        except Exception as e:
+            logger.warning("Rebalance status callback failed for leg %s: %s", index, e)
+
+    async def run_in_order(indices: List[int]) -> None:
+        for index in indices:
+            async with semaphore:
+                await notify(index, "running", None)
+                try:
+                    result = await execute(legs[index])
+                except Exception as e:
+                    logger.error("Rebalance leg %s failed: %s", index, e)
+                    result = {"success": False, "error": str(e)}
+            results[index] = result
+            await notify(index, "done", result)
+
+    await asyncio.gather(*(run_in_order(indices) for indices in by_token.values()))
+    return results
@@ -0,0 +1,315 @@
+import os
+import time
+import asyncio
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.database import DB_POOL_MAX, db_connection, save_portfolio_snapshot as _save_portfolio_snapshot
+from src.exceptions import DatabaseConnectionError
+
+logger = logging.getLogger(__name__)
+
+# One worker per pooled connection: more threads would only queue on the pool
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", str(DB_POOL_MAX)))
+
+# users.last_active_at only needs minute-level precision; avoid a write per message
+USER_ACTIVITY_WRITE_SECS = float(os.getenv("USER_ACTIVITY_WRITE_SECS", "300"))
+
+_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db")
+_last_touched: Dict[int, float] = {}
+
+
+@dataclass(frozen=True)
+class UserSettings:
+    live_trading_enabled: bool
+    default_wallet_id: Optional[int]
+
+
+# ----------------------------------------------------------------------
+# Execution helpers
+# ----------------------------------------------------------------------
+async def run(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking, DB-bound callable on the dedicated database executor.
+
+    Keeps psycopg2 work (and any wait for a pooled connection) off the event
+    loop so one slow query only occupies a DB worker, not every chat.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+def _with_connection(fn: Callable[..., Any], *args) -> Any:
+    with db_connection() as conn:
+        if conn is None:
+            raise DatabaseConnectionError("No database connection available.")
+        return fn(conn, *args)
+
+
+async def _query(fn: Callable[..., Any], *args) -> Any:
+    """Check out a pooled connection on the executor and call ``fn(conn, *args)``."""
+    return await run(_with_connection, fn, *args)
+
+
+def shutdown() -> None:
+    """Wait for in-flight queries and stop the executor (call before closing the pool)."""
+    _executor.shutdown(wait=True)
+
+
+# ----------------------------------------------------------------------
+# users
+# ----------------------------------------------------------------------
+def _get_or_create_user(conn, telegram_id: int, username: Optional[str]) -> bool:
+    with conn.cursor() as cur:
+        cur.execute("SELECT id FROM users WHERE telegram_id = %s;", (telegram_id,))
+        if cur.fetchone() is not None:
+            return False
+        cur.execute(
+            "INSERT INTO users (telegram_id, username) VALUES (%s, %s);",
+            (telegram_id, username)
+        )
+    conn.commit()
+    return True
+
+
+async def get_or_create_user(telegram_id: int, username: Optional[str]) -> bool:
+    """Register *telegram_id* if needed; returns True when a new user was created."""
+    return await _query(_get_or_create_user, telegram_id, username)
+
+
+def _get_user_settings(conn, telegram_id: int) -> Optional[UserSettings]:
+    with conn.cursor() as cur:
+        cur.execute("SELECT live_trading_enabled, default_wallet_id FROM users WHERE telegram_id = %s;", (telegram_id,))
+        row = cur.fetchone()
+    if row is None:
+        return None
+    return UserSettings(live_trading_enabled=bool(row[0]), default_wallet_id=row[1])
+
+
+async def get_user_settings(telegram_id: int) -> Optional[UserSettings]:
+    """Return the user's trading settings, or None for an unknown user."""
+    return await _query(_get_user_settings, telegram_id)
+
+
+def _set_default_wallet(conn, telegram_id: int, wallet_id: int) -> None:
+    with conn.cursor() as cur:
+        cur.execute("UPDATE users SET default_wallet_id = %s WHERE telegram_id = %s;", (wallet_id, telegram_id))
+    conn.commit()
+
+
+async def set_default_wallet(telegram_id: int, wallet_id: int) -> None:
+    await _query(_set_default_wallet, telegram_id, wallet_id)
+
+
+def _set_live_trading(conn, telegram_id: int, enabled: bool) -> None:
+    with conn.cursor() as cur:
+        cur.execute("UPDATE users SET live_trading_enabled = %s WHERE telegram_id = %s;", (enabled, telegram_id))
+    conn.commit()
+
+
+async def set_live_trading(telegram_id: int, enabled: bool) -> None:
+    await _query(_set_live_trading, telegram_id, enabled)
+
+
+def _touch_user(conn, telegram_id: int) -> None:
+    with conn.cursor() as cur:
+        cur.execute("UPDATE users SET last_active_at = CURRENT_TIMESTAMP WHERE telegram_id = %s;", (telegram_id,))
+    conn.commit()
+
+
+async def touch_user(telegram_id: int) -> None:
+    """Record user activity (drives sync priority); written at most once per USER_ACTIVITY_WRITE_SECS.
+
+    Best effort: failures are logged and never reach the caller.
+    """
+    now = time.monotonic()
+    last = _last_touched.get(telegram_id)
+    if last is not None and now - last < USER_ACTIVITY_WRITE_SECS:
+        return
+    _last_touched[telegram_id] = now
+    try:
+        await _query(_touch_user, telegram_id)
+    except Exception as e:
+        logger.debug("Could not record activity for user %s: %s", telegram_id, e)
+
+
+def _active_users(conn, telegram_ids: List[int], within_secs: float) -> List[int]:
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT telegram_id FROM users
+            WHERE telegram_id = ANY(%s) AND last_active_at > NOW() - %s * INTERVAL '1 second'
+            ORDER BY last_active_at DESC;
+            """,
+            (list(telegram_ids), within_secs)
+        )
+        return [row[0] for row in cur.fetchall()]
+
+
+async def active_users(telegram_ids: List[int], within_secs: float) -> List[int]:
+    """Those of *telegram_ids* active in the last *within_secs*, most recent first."""
+    if not telegram_ids:
+        return []
+    return await _query(_active_users, telegram_ids, within_secs)
+
+
+def _held_symbols(conn) -> List[str]:
+    with conn.cursor() as cur:
+        cur.execute("SELECT DISTINCT UPPER(symbol) FROM holdings WHERE symbol IS NOT NULL AND amount > 0;")
+        return [row[0] for row in cur.fetchall()]
+
+
+async def held_symbols() -> List[str]:
+    """Every token symbol some user currently holds."""
+    return await _query(_held_symbols)
+
+
+def _list_users(conn) -> List[Tuple[int, int]]:
+    with conn.cursor() as cur:
+        cur.execute("SELECT id, telegram_id FROM users;")
+        return cur.fetchall()
+
+
+async def list_users() -> List[Tuple[int, int]]:
+    """Return ``(id, telegram_id)`` for every registered user."""
+    return await _query(_list_users)
+
+
+# ----------------------------------------------------------------------
+# wallets
+# ----------------------------------------------------------------------
+def _list_wallets(conn, telegram_id: int) -> Optional[List[Tuple[int, str, str]]]:
+    with conn.cursor() as cur:
+        cur.execute("SELECT id FROM users WHERE telegram_id = %s;", (telegram_id,))
+        row = cur.fetchone()
+        if row is None:
+            return None
+        cur.execute("SELECT id, name, address FROM wallets WHERE user_id = %s ORDER BY id;", (row[0],))
+        return cur.fetchall()
+
+
+async def list_wallets(telegram_id: int) -> Optional[List[Tuple[int, str, str]]]:
+    """Return ``(id, name, address)`` rows, or None if the user is not registered."""
+    return await _query(_list_wallets, telegram_id)
+
+
+def _get_wallet(conn, wallet_id: int) -> Optional[Tuple[str, Any]]:
+    with conn.cursor() as cur:
+        cur.execute("SELECT address, encrypted_private_key FROM wallets WHERE id = %s;", (wallet_id,))
+        return cur.fetchone()
+
+
+async def get_wallet(wallet_id: int) -> Optional[Tuple[str, Any]]:
+    """Return ``(address, encrypted_private_key)`` for *wallet_id*, or None."""
+    return await _query(_get_wallet, wallet_id)
+
+
+def _delete_wallet(conn, telegram_id: int, name: str) -> int:
+    with conn.cursor() as cur:
+        cur.execute(
+            "DELETE FROM wallets WHERE name = %s AND user_id = (SELECT id FROM users WHERE telegram_id = %s);",
+            (name, telegram_id)
+        )
+        deleted = cur.rowcount
+    conn.commit()
+    return deleted
+
+
+async def delete_wallet(telegram_id: int, name: str) -> int:
+    """Delete the user's wallet called *name*; returns the number of rows removed."""
+    return await _query(_delete_wallet, telegram_id, name)
+
+
+# ----------------------------------------------------------------------
+# alerts
+# ----------------------------------------------------------------------
+def _add_alert(conn, telegram_id: int, symbol: str, target_price: float, condition: str) -> Optional[Tuple[int, int]]:
+    with conn.cursor() as cur:
+        cur.execute("SELECT id FROM users WHERE telegram_id = %s;", (telegram_id,))
+        row = cur.fetchone()
+        if row is None:
+            return None
+        user_id = row[0]
+        cur.execute(
+            "INSERT INTO alerts (user_id, symbol, target_price, condition) VALUES (%s, %s, %s, %s) RETURNING id;",
+            (user_id, symbol, target_price, condition)
+        )
+        alert_id = cur.fetchone()[0]
+    conn.commit()
+    return alert_id, user_id
+
+
+async def add_alert(telegram_id: int, symbol: str, target_price: float, condition: str) -> Optional[Tuple[int, int]]:
+    """Insert an active alert; returns ``(alert_id, user_id)`` or None for an unknown user."""
+    return await _query(_add_alert, telegram_id, symbol, target_price, condition)
+
+
+def _list_active_alerts(conn, telegram_id: int) -> List[Tuple[str, str, float]]:
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT a.symbol, a.condition, a.target_price
+            FROM alerts a
+            JOIN users u ON a.user_id = u.id
+            WHERE u.telegram_id = %s AND a.is_active = TRUE
+            ORDER BY a.id;
+            """,
+            (telegram_id,)
+        )
+        return cur.fetchall()
+
+
+async def list_active_alerts(telegram_id: int) -> List[Tuple[str, str, float]]:
+    """Return ``(symbol, condition, target_price)`` for the user's active alerts."""
+    return await _query(_list_active_alerts, telegram_id)
+
+
+# ----------------------------------------------------------------------
+# holdings / portfolio_history
+# ----------------------------------------------------------------------
+def _get_holdings(conn, telegram_id: int) -> List[Tuple[str, Any, int, Any]]:
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT h.symbol, h.amount, h.decimals, h.value_usd
+            FROM holdings h
+            JOIN portfolios p ON h.portfolio_id = p.id
+            JOIN users u ON p.user_id = u.id
+            WHERE u.telegram_id = %s;
+            """,
+            (telegram_id,)
+        )
+        return cur.fetchall()
+
+
+async def get_holdings(telegram_id: int) -> List[Tuple[str, Any, int, Any]]:
+    """Return raw ``(symbol, amount, decimals, value_usd)`` holding rows."""
+    return await _query(_get_holdings, telegram_id)
+
+
+def _get_portfolio_history(conn, telegram_id: int, days: int) -> List[Tuple[Any, Any]]:
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT ph.snapshot_date, ph.total_value_usd
+            FROM portfolio_history ph
+            JOIN users u ON ph.user_id = u.id
+            WHERE u.telegram_id = %s
+            AND ph.snapshot_date >= (CURRENT_DATE - %s * INTERVAL '1 day')
+            ORDER BY ph.snapshot_date;
+            """,
+            (telegram_id, days)
+        )
+        return cur.fetchall()
+
+
+async def get_portfolio_history(telegram_id: int, days: int = 30) -> List[Tuple[Any, Any]]:
+    """Return ``(snapshot_date, total_value_usd)`` rows for the last *days* days, oldest first."""
+    return await _query(_get_portfolio_history, telegram_id, days)
+
+
+async def save_portfolio_snapshot(user_id: int, total_value_usd: float) -> None:
+    """Upsert today's portfolio_history row for *user_id* (internal id)."""
+    await run(_save_portfolio_snapshot, user_id, total_value_usd)
@@ -1,7 +1,8 @@
 import os
 import random
 import time
-from typing import List, Callable
+import asyncio
+from typing import List, Callable, Awaitable
 
 
 # Environment-configurable defaults
@@ -56,4 +57,16 @@ def sleep_with_backoff(
     if 0 <= attempt_index < len(delays):
         sleep_duration = delays[attempt_index]
         if sleep_duration > 0:
-            sleep_fn(sleep_duration) 
\ No newline at end of file
+            sleep_fn(sleep_duration) 
+
+
+async def async_sleep_with_backoff(
+    attempt_index: int,
+    delays: List[float],
+    sleep_fn: Callable[[float], Awaitable[None]] = asyncio.sleep,
+) -> None:
+    """Non-blocking counterpart of sleep_with_backoff for use on the event loop."""
+    if 0 <= attempt_index < len(delays):
+        sleep_duration = delays[attempt_index]
+        if sleep_duration > 0:
+            await sleep_fn(sleep_duration)
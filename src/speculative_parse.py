@@ -0,0 +1,141 @@
+import os
+import logging
+import threading
+from dataclasses import dataclass, asdict, field
+from decimal import Decimal, InvalidOperation
+from typing import Callable, Dict, Optional, Tuple
+
+from src.constants import CHAIN_ID_MAP
+
+logger = logging.getLogger(__name__)
+
+# How a Flash parse of a trade is checked before it is used:
+#   reconcile - use it once it validates, re-parse with Pro in the background and compare
+#   validate  - use it once it validates; Pro runs only when validation fails
+#   off       - always re-parse with Pro before acting (the old two-call path)
+SPECULATIVE_PARSE_MODE = os.getenv("SPECULATIVE_PARSE_MODE", "reconcile").lower()
+
+TRADE_INTENTS = ("buy_token", "sell_token")
+
+
+def parse_amount(value) -> Optional[Decimal]:
+    """A positive, finite amount from an LLM entity (``0.5``, ``"1,000"``, ``"$50"``), else None."""
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        amount = Decimal(str(value).strip().lstrip("$").replace(",", ""))
+    except (InvalidOperation, ValueError):
+        return None
+    if not amount.is_finite() or amount <= 0:
+        return None
+    return amount
+
+
+def validate_trade(entities: Dict, resolve_token: Callable[[str], Optional[Dict]]) -> Optional[str]:
+    """Why a buy/sell parse cannot be acted on, or None when it can.
+
+    Checks the same things the trade handlers need before they request a quote:
+    both tokens resolve, they differ, the amount is a positive number and any
+    named chain is supported.
+    """
+    symbol, currency = entities.get("symbol"), entities.get("currency")
+    if not symbol or not currency or entities.get("amount") in (None, ""):
+        return "missing_entities"
+    if parse_amount(entities.get("amount")) is None:
+        return "bad_amount"
+    if str(symbol).upper() == str(currency).upper():
+        return "same_token"
+    for key in ("source_chain", "destination_chain"):
+        chain = entities.get(key)
+        if chain and str(chain).lower() not in CHAIN_ID_MAP:
+            return "unknown_chain"
+    try:
+        if not resolve_token(str(symbol).upper()) or not resolve_token(str(currency).upper()):
+            return "unknown_token"
+    except Exception as e:
+        logger.debug("Token lookup failed during validation: %s", e)
+        return "unknown_token"
+    return None
+
+
+def trade_key(parsed: Dict) -> Tuple:
+    """Comparable form of a trade parse: intent, tokens, amount and chains (defaults filled in)."""
+    entities = parsed.get("entities") or {}
+    amount = parse_amount(entities.get("amount"))
+    return (
+        parsed.get("intent"),
+        str(entities.get("symbol") or "").upper(),
+        str(entities.get("currency") or "").upper(),
+        amount.normalize() if amount is not None else None,
+        str(entities.get("source_chain") or "ethereum").lower(),
+        str(entities.get("destination_chain") or "ethereum").lower(),
+    )
+
+
+def describe_trade(parsed: Dict) -> str:
+    """``"buy 0.5 ETH with USDT"`` / ``"sell 1 ETH for USDC"`` for user-facing messages."""
+    intent, symbol, currency, amount, _, _ = trade_key(parsed)
+    amount_text = f"{amount:f}" if amount is not None else "?"
+    if intent == "buy_token":
+        return f"buy {amount_text} {symbol} with {currency}"
+    if intent == "sell_token":
+        return f"sell {amount_text} {symbol} for {currency}"
+    return str(intent).replace("_", " ")
+
+
+@dataclass
+class SpeculationStats:
+    accepted: int = 0  # Flash parses acted on without waiting for Pro
+    rejected: int = 0  # Flash parses that failed validation and went to Pro
+    rejected_reasons: Dict[str, int] = field(default_factory=dict)
+    pro_agreed: int = 0  # background Pro parses that matched Flash
+    pro_changed: int = 0  # background Pro parses that read the trade differently
+    pro_failed: int = 0  # background Pro parses that errored or returned "unknown"
+
+
+class SpeculationMetrics:
+    """Counters for the speculative Flash path and how often Pro overrules it."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = SpeculationStats()
+
+    def record_accepted(self) -> None:
+        with self._lock:
+            self._stats.accepted += 1
+
+    def record_rejected(self, reason: str) -> None:
+        with self._lock:
+            self._stats.rejected += 1
+            self._stats.rejected_reasons[reason] = self._stats.rejected_reasons.get(reason, 0) + 1
+
+    def record_reconciled(self, flash: Dict, pro: Optional[Dict]) -> bool:
+        """Record a background Pro parse; returns True when it changes the trade."""
+        with self._lock:
+            if not pro or pro.get("intent") in (None, "unknown"):
+                self._stats.pro_failed += 1
+                return False
+            if trade_key(flash) == trade_key(pro):
+                self._stats.pro_agreed += 1
+                return False
+            self._stats.pro_changed += 1
+            return True
+
+    def stats(self) -> dict:
+        """Counters plus the share of Flash parses accepted and the rate at which Pro changes them."""
+        with self._lock:
+            data = asdict(self._stats)
+        parsed = data["accepted"] + data["rejected"]
+        checked = data["pro_agreed"] + data["pro_changed"]
+        data["mode"] = SPECULATIVE_PARSE_MODE
+        data["accept_rate"] = data["accepted"] / parsed if parsed else 0.0
+        data["pro_change_rate"] = data["pro_changed"] / checked if checked else 0.0
+        return data
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats = SpeculationStats()
+
+
+# Process-wide counters, served at /nlp/speculation
+speculation_metrics = SpeculationMetrics()
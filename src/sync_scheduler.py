@@ -0,0 +1,248 @@
+import os
+import time
+import socket
+import asyncio
+import logging
+from dataclasses import dataclass, asdict
+from typing import Callable, List, Optional, Tuple
+
+from src import repository
+from src.database import db_connection
+from src.exceptions import DatabaseConnectionError
+
+logger = logging.getLogger(__name__)
+
+# Users are partitioned by ``users.id % SYNC_SHARD_COUNT``; every node running
+# the monitor claims shards from the shared sync_shards table.
+SYNC_SHARD_COUNT = int(os.getenv("SYNC_SHARD_COUNT", "64"))
+SYNC_WORKERS = int(os.getenv("SYNC_WORKERS", "4"))  # shards processed concurrently per node
+SYNC_SHARD_LEASE_SECS = int(os.getenv("SYNC_SHARD_LEASE_SECS", "300"))  # a crashed node's shard is reclaimable after this
+
+
+@dataclass
+class SyncProgress:
+    pass_id: Optional[int] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    shards_completed: int = 0  # by this node
+    cluster_shards_completed: int = 0  # by every node, as of this node's last completion
+    users_synced: int = 0
+    users_failed: int = 0
+
+
+class ShardedSyncScheduler:
+    """Runs the all-users portfolio sync as leased shards across a worker pool.
+
+    A pass is identified by ``floor(now / interval)`` so every node agrees on
+    it without coordination. Workers claim the lowest due shard with
+    ``FOR UPDATE SKIP LOCKED`` and stamp a lease on it, sync that shard's
+    users one by one via *sync_user*, then mark the shard done for the pass.
+    Shards whose lease expires (e.g. the node died) are picked up again.
+    """
+
+    def __init__(
+        self,
+        sync_user: Callable[[int], bool],
+        interval_secs: float,
+        shard_count: Optional[int] = None,
+        workers: Optional[int] = None,
+        lease_secs: Optional[int] = None,
+        node_id: Optional[str] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.sync_user = sync_user
+        self.interval_secs = interval_secs
+        self.shard_count = shard_count if shard_count is not None else SYNC_SHARD_COUNT
+        self.workers = workers if workers is not None else SYNC_WORKERS
+        self.lease_secs = lease_secs if lease_secs is not None else SYNC_SHARD_LEASE_SECS
+        self.node_id = node_id or f"{socket.gethostname()}:{os.getpid()}"
+        self._clock = clock
+        self._progress = SyncProgress()
+
+    # ------------------------------------------------------------------
+    # Shard table access (blocking; run on the DB executor)
+    # ------------------------------------------------------------------
+    def _ensure_shards(self) -> None:
+        with db_connection() as conn:
+            if conn is None:
+                raise DatabaseConnectionError("No database connection available.")
+            with conn.cursor() as cur:
+                cur.execute(
+                    "INSERT INTO sync_shards (shard_id) SELECT generate_series(0, %s - 1) ON CONFLICT DO NOTHING;",
+                    (self.shard_count,)
+                )
+                # Shards beyond the configured count would never match a user
+                cur.execute("DELETE FROM sync_shards WHERE shard_id >= %s;", (self.shard_count,))
+            conn.commit()
+
+    def _claim_shard(self, pass_id: int) -> Optional[int]:
+        with db_connection() as conn:
+            if conn is None:
+                raise DatabaseConnectionError("No database connection available.")
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    UPDATE sync_shards
+                    SET owner = %s, leased_until = NOW() + %s * INTERVAL '1 second'
+                    WHERE shard_id = (
+                        SELECT shard_id FROM sync_shards
+                        WHERE (pass_id IS NULL OR pass_id < %s)
+                        AND (leased_until IS NULL OR leased_until < NOW())
+                        ORDER BY shard_id
+                        LIMIT 1
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING shard_id;
+                    """,
+                    (self.node_id, self.lease_secs, pass_id)
+                )
+                row = cur.fetchone()
+            conn.commit()
+            return row[0] if row else None
+
+    def _shard_users(self, shard_id: int) -> List[Tuple[int, int]]:
+        with db_connection() as conn:
+            if conn is None:
+                raise DatabaseConnectionError("No database connection available.")
+            with conn.cursor() as cur:
+                # Recently active users and larger portfolios first
+                cur.execute(
+                    """
+                    SELECT u.id, u.telegram_id
+                    FROM users u
+                    LEFT JOIN portfolios p ON p.user_id = u.id
+                    LEFT JOIN holdings h ON h.portfolio_id = p.id
+                    WHERE u.id %% %s = %s
+                    GROUP BY u.id, u.telegram_id, u.last_active_at
+                    ORDER BY u.last_active_at DESC NULLS LAST, COALESCE(SUM(h.value_usd), 0) DESC, u.id;
+                    """,
+                    (self.shard_count, shard_id)
+                )
+                return cur.fetchall()
+
+    def _extend_lease(self, shard_id: int) -> None:
+        with db_connection() as conn:
+            if conn is None:
+                return
+            with conn.cursor() as cur:
+                cur.execute(
+                    "UPDATE sync_shards SET leased_until = NOW() + %s * INTERVAL '1 second' WHERE shard_id = %s AND owner = %s;",
+                    (self.lease_secs, shard_id, self.node_id)
+                )
+            conn.commit()
+
+    def _complete_shard(self, shard_id: int, pass_id: int, synced: int, failed: int, duration_secs: float) -> int:
+        """Mark *shard_id* done for *pass_id*; returns how many shards the pass has completed cluster-wide."""
+        with db_connection() as conn:
+            if conn is None:
+                raise DatabaseConnectionError("No database connection available.")
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    UPDATE sync_shards
+                    SET pass_id = %s, owner = NULL, leased_until = NULL, completed_at = NOW(),
+                        users_synced = %s, users_failed = %s, duration_secs = %s
+                    WHERE shard_id = %s AND owner = %s;
+                    """,
+                    (pass_id, synced, failed, duration_secs, shard_id, self.node_id)
+                )
+                cur.execute("SELECT COUNT(*) FROM sync_shards WHERE pass_id = %s;", (pass_id,))
+                completed = cur.fetchone()[0]
+            conn.commit()
+            return completed
+
+    # ------------------------------------------------------------------
+    # Pass execution
+    # ------------------------------------------------------------------
+    def current_pass_id(self) -> int:
+        return int(self._clock() // self.interval_secs)
+
+    async def _run_shard(self, shard_id: int, pass_id: int) -> None:
+        started = time.monotonic()
+        lease_renewed = started
+        users = await repository.run(self._shard_users, shard_id)
+        synced = failed = 0
+        for user_pk, telegram_id in users:
+            try:
+                # sync_balances does blocking HTTP + DB work; run it off the event loop
+                ok = await asyncio.to_thread(self.sync_user, telegram_id)
+            except Exception as exc:
+                logger.warning("Portfolio sync failed for %s: %s", telegram_id, exc)
+                ok = False
+            if ok:
+                synced += 1
+                self._progress.users_synced += 1
+            else:
+                failed += 1
+                self._progress.users_failed += 1
+            # Keep the lease alive on long shards so no other node steals it
+            if time.monotonic() - lease_renewed >= self.lease_secs / 2:
+                await repository.run(self._extend_lease, shard_id)
+                lease_renewed = time.monotonic()
+
+        duration = time.monotonic() - started
+        completed = await repository.run(self._complete_shard, shard_id, pass_id, synced, failed, duration)
+        self._progress.shards_completed += 1
+        self._progress.cluster_shards_completed = max(self._progress.cluster_shards_completed, completed)
+        logger.info(
+            "Sync shard %s/%s done in %.1fs – %s synced, %s failed (%s/%s shards complete for pass %s)",
+            shard_id, self.shard_count, duration, synced, failed, completed, self.shard_count, pass_id,
+        )
+
+    async def _worker(self, pass_id: int) -> None:
+        while True:
+            shard_id = await repository.run(self._claim_shard, pass_id)
+            if shard_id is None:
+                return
+            try:
+                await self._run_shard(shard_id, pass_id)
+            except Exception as exc:
+                # Leave the lease in place; the shard is retried once it expires
+                logger.error("Sync shard %s failed: %s", shard_id, exc)
+
+    async def run_pass(self) -> SyncProgress:
+        """Claim and process due shards until none are left for the current pass."""
+        pass_id = self.current_pass_id()
+        self._progress = SyncProgress(pass_id=pass_id, started_at=self._clock())
+        logger.info("Starting portfolio sync pass %s on %s with %s worker(s) ...", pass_id, self.node_id, self.workers)
+        try:
+            await repository.run(self._ensure_shards)
+            await asyncio.gather(*[self._worker(pass_id) for _ in range(max(1, self.workers))])
+        except DatabaseConnectionError:
+            logger.error("Database connection failed – cannot sync portfolios.")
+        except Exception as e:
+            logger.error("Error during portfolio sync: %s", e)
+        self._progress.finished_at = self._clock()
+
+        metrics = self.metrics()
+        logger.info(
+            "Portfolio sync pass %s done – %s users synced, %s failed, %s shard(s) in %.1fs (%.1f users/s)",
+            pass_id, metrics["users_synced"], metrics["users_failed"], metrics["shards_completed"],
+            metrics["elapsed_secs"], metrics["users_per_sec"],
+        )
+        if metrics["elapsed_secs"] > self.interval_secs:
+            logger.warning(
+                "Portfolio sync pass %s took %.1fs, longer than PORTFOLIO_SYNC_INTERVAL (%ss); add workers or nodes",
+                pass_id, metrics["elapsed_secs"], self.interval_secs,
+            )
+        return self._progress
+
+    def metrics(self) -> dict:
+        """Progress and throughput of the current (or last) pass on this node."""
+        data = asdict(self._progress)
+        started, finished = self._progress.started_at, self._progress.finished_at
+        elapsed = ((finished or self._clock()) - started) if started is not None else 0.0
+        users = self._progress.users_synced + self._progress.users_failed
+        cluster_done = self._progress.cluster_shards_completed
+        data.update(
+            node_id=self.node_id,
+            shard_count=self.shard_count,
+            workers=self.workers,
+            interval_secs=self.interval_secs,
+            running=started is not None and finished is None,
+            elapsed_secs=elapsed,
+            users_per_sec=users / elapsed if elapsed > 0 else 0.0,
+            # Whole-pass estimate from the cluster-wide shard completion rate
+            projected_pass_secs=elapsed * self.shard_count / cluster_done if cluster_done else None,
+        )
+        return data
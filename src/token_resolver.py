@@ -1,18 +1,42 @@
+import os
+import time
 import logging
-from src.database import get_db_connection
+import threading
+from typing import Dict, Optional, Set, Tuple
+from src.database import db_connection
 from src.constants import TOKEN_ADDRESSES, TOKEN_DECIMALS
 
 logger = logging.getLogger(__name__)
 
+# How long the in-memory registry serves a snapshot of the tokens table before
+# reloading it in the background; call refresh() after writing to the table.
+TOKEN_REGISTRY_REFRESH_SECS = float(os.getenv("TOKEN_REGISTRY_REFRESH_SECS", "300"))
+
+
 class TokenResolver:
-    def __init__(self):
+    """In-process registry of the ``tokens`` table.
+
+    Rows are loaded once at start-up and kept in dicts keyed by
+    ``(symbol, chain_id)`` and ``(address, chain_id)``, so lookups never touch
+    the database. Once the snapshot is older than TOKEN_REGISTRY_REFRESH_SECS
+    the next lookup triggers a background reload and keeps serving the
+    current snapshot meanwhile.
+    """
+
+    def __init__(self, refresh_secs: float | None = None):
+        self.refresh_secs = refresh_secs if refresh_secs is not None else TOKEN_REGISTRY_REFRESH_SECS
+        self._lock = threading.Lock()
+        self._by_symbol: Dict[Tuple[str, int], Dict] = {}
+        self._by_address: Dict[Tuple[str, int], str] = {}
+        self._loaded_at: float | None = None
+        self._refreshing = False
         self.seed_tokens()
+        self.refresh()
 
     def seed_tokens(self):
         """Seeds the tokens table with initial data from constants."""
         try:
-            conn = get_db_connection()
-            with conn.cursor() as cur:
+            with db_connection() as conn, conn.cursor() as cur:
                 for symbol, address in TOKEN_ADDRESSES.items():
                     if symbol == 'BTC': # Skip BTC as it's an instrument ID
                         continue
@@ -29,40 +53,85 @@ class TokenResolver:
                 conn.commit()
         except Exception as e:
             logger.error(f"Error seeding tokens: {e}")
-        finally:
-            if conn:
-                conn.close()
 
-    def get_token_info(self, symbol, chain_id=1):
-        """Resolves token information from the database.
-        Special-cases BTC to use WBTC address/decimals for EVM swaps/quotes.
-        Falls back to constants if DB has no entry.
+    def refresh(self) -> bool:
+        """Reload the registry from the tokens table.
+
+        On failure the previous snapshot (and the constants fallback) stays
+        in place. Returns ``True`` if the table was read.
         """
         try:
-            # Normalize BTC to WBTC for EVM address contexts
-            lookup_symbol = symbol.upper()
-            if lookup_symbol == 'BTC':
-                lookup_symbol = 'WBTC'
-
-            conn = get_db_connection()
-            with conn.cursor() as cur:
-                cur.execute(
-                    "SELECT address, decimals FROM tokens WHERE symbol = %s AND chain_id = %s;",
-                    (lookup_symbol, chain_id)
-                )
-                result = cur.fetchone()
-                if result:
-                    return {"address": result[0], "decimals": result[1]}
-                # Fallback to constants if DB miss
-                const_address = TOKEN_ADDRESSES.get(lookup_symbol)
-                const_decimals = TOKEN_DECIMALS.get(lookup_symbol)
-                if const_address and const_decimals is not None:
-                    return {"address": const_address, "decimals": const_decimals}
-                else:
-                    return None
+            with db_connection() as conn, conn.cursor() as cur:
+                cur.execute("SELECT symbol, chain_id, address, decimals FROM tokens;")
+                rows = cur.fetchall()
         except Exception as e:
-            logger.error(f"Error resolving token info for {symbol}: {e}")
-            return None
-        finally:
-            if conn:
-                conn.close()
+            logger.error(f"Error loading token registry: {e}")
+            with self._lock:
+                self._loaded_at = time.monotonic()
+                self._refreshing = False
+            return False
+
+        by_symbol = {}
+        by_address = {}
+        for symbol, chain_id, address, decimals in rows:
+            symbol = symbol.upper()
+            by_symbol[(symbol, int(chain_id))] = {"address": address, "decimals": int(decimals)}
+            by_address[(address.lower(), int(chain_id))] = symbol
+        with self._lock:
+            self._by_symbol = by_symbol
+            self._by_address = by_address
+            self._loaded_at = time.monotonic()
+            self._refreshing = False
+        logger.info("Token registry loaded with %s token(s)", len(by_symbol))
+        return True
+
+    def invalidate(self):
+        """Mark the snapshot stale so the next lookup schedules a reload."""
+        with self._lock:
+            self._loaded_at = None
+
+    def _maybe_refresh(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_secs:
+                return
+            self._refreshing = True
+        threading.Thread(target=self.refresh, name="token-registry-refresh", daemon=True).start()
+
+    def get_token_info(self, symbol, chain_id=1):
+        """Resolves token information from the in-memory registry.
+        Special-cases BTC to use WBTC address/decimals for EVM swaps/quotes.
+        Falls back to constants if the registry has no entry.
+        """
+        # Normalize BTC to WBTC for EVM address contexts
+        lookup_symbol = symbol.upper()
+        if lookup_symbol == 'BTC':
+            lookup_symbol = 'WBTC'
+
+        self._maybe_refresh()
+        info = self._by_symbol.get((lookup_symbol, int(chain_id)))
+        if info:
+            return dict(info)
+        # Fallback to constants on a registry miss
+        const_address = TOKEN_ADDRESSES.get(lookup_symbol)
+        const_decimals = TOKEN_DECIMALS.get(lookup_symbol)
+        if const_address and const_decimals is not None:
+            return {"address": const_address, "decimals": const_decimals}
+        return None
+
+    def symbols(self) -> Set[str]:
+        """Every symbol registered on any chain (without triggering a refresh)."""
+        with self._lock:
+            return {symbol for symbol, _ in self._by_symbol}
+
+    def get_symbol(self, address, chain_id=1) -> Optional[str]:
+        """Reverse lookup: the symbol registered for *address* on *chain_id*, if any."""
+        self._maybe_refresh()
+        symbol = self._by_address.get((address.lower(), int(chain_id)))
+        if symbol is not None:
+            return symbol
+        for const_symbol, const_address in TOKEN_ADDRESSES.items():
+            if const_symbol != 'BTC' and const_address.lower() == address.lower():
+                return const_symbol
+        return None
@@ -0,0 +1,57 @@
+import unittest
+
+from src.alert_index import AlertIndex
+
+
+class TestAlertIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = AlertIndex()
+        self.index.load([
+            (1, 10, 'ETH', 1800.0, 'above'),
+            (2, 10, 'ETH', 2000.0, 'above'),
+            (3, 11, 'ETH', 2200.0, 'above'),
+            (4, 12, 'ETH', 1900.0, 'below'),
+            (5, 12, 'ETH', 2100.0, 'below'),
+            (6, 13, 'btc', 60000.0, 'below'),
+        ])
+
+    def test_pop_triggered_uses_strict_crossing(self):
+        fired = self.index.pop_triggered('ETH', 2000.0)
+        # above: 1800 < 2000 fires, 2000 does not; below: 2100 > 2000 fires
+        self.assertCountEqual([a.alert_id for a in fired], [1, 5])
+        self.assertEqual(len(self.index), 4)
+
+        # Popped alerts do not fire again
+        self.assertEqual(self.index.pop_triggered('ETH', 2000.0), [])
+
+    def test_symbols_are_case_insensitive(self):
+        self.assertEqual(self.index.symbols(), ['BTC', 'ETH'])
+        fired = self.index.pop_triggered('btc', 59000.0)
+        self.assertEqual([a.alert_id for a in fired], [6])
+        self.assertEqual(self.index.symbols(), ['ETH'])
+
+    def test_incremental_add_and_remove(self):
+        self.index.add(7, 14, 'eth', 2050.0, 'ABOVE')
+        self.assertTrue(self.index.remove(2))
+        self.assertFalse(self.index.remove(2))
+
+        fired = self.index.pop_triggered('ETH', 2150.0)
+        self.assertCountEqual([a.alert_id for a in fired], [1, 7])
+
+    def test_restore_puts_alerts_back(self):
+        fired = self.index.pop_triggered('ETH', 2300.0)
+        self.assertCountEqual([a.alert_id for a in fired], [1, 2, 3])
+        self.index.restore(fired)
+        self.assertEqual(len(self.index), 6)
+
+    def test_needs_reload_after_reconcile_interval(self):
+        self.assertFalse(self.index.needs_reload)
+        self.assertTrue(AlertIndex().needs_reload)
+        always_stale = AlertIndex(reconcile_secs=0)
+        always_stale.load([])
+        self.assertTrue(always_stale.needs_reload)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import math
+import unittest
+from datetime import date
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+
+from src import analytics
+
+nan = np.nan
+
+
+class TestAnalyticsMetrics(unittest.TestCase):
+
+    def test_daily_returns_and_total_return(self):
+        values = np.array([
+            [100.0, 110.0, 99.0],
+            [nan, 50.0, 75.0],  # joined on day 2
+        ])
+        returns = analytics.daily_returns(values)
+
+        np.testing.assert_allclose(returns[0], [0.10, -0.10])
+        self.assertTrue(math.isnan(returns[1, 0]))
+        self.assertAlmostEqual(returns[1, 1], 0.5)
+        np.testing.assert_allclose(analytics.total_return(values), [-0.01, 0.5])
+
+    def test_forward_fill_keeps_leading_gaps(self):
+        filled = analytics.forward_fill(np.array([[nan, 1.0, nan, 3.0, nan]]))
+        np.testing.assert_array_equal(np.isnan(filled[0]), [True, False, False, False, False])
+        np.testing.assert_allclose(filled[0, 1:], [1.0, 1.0, 3.0, 3.0])
+
+    def test_max_drawdown(self):
+        values = np.array([
+            [100.0, 120.0, 90.0, 130.0, 65.0],
+            [10.0, 11.0, 12.0, 13.0, 14.0],
+        ])
+        np.testing.assert_allclose(analytics.max_drawdown(values), [-0.5, 0.0])
+
+    def test_rolling_volatility_shape_and_value(self):
+        returns = np.array([[0.01, -0.01, 0.01, -0.01, 0.01]])
+        rolling = analytics.rolling_volatility(returns, 3)
+
+        self.assertEqual(rolling.shape, (1, 3))
+        expected = np.std([0.01, -0.01, 0.01], ddof=1) * math.sqrt(365)
+        np.testing.assert_allclose(rolling[0], [expected] * 3)
+
+    def test_sharpe_and_sortino(self):
+        returns = np.array([
+            [0.02, -0.01, 0.03, -0.02, 0.01],
+            [0.01, 0.01, 0.01, 0.01, 0.01],  # no variance: ratios undefined
+        ])
+        sharpe = analytics.sharpe_ratio(returns)
+        sortino = analytics.sortino_ratio(returns)
+
+        row = returns[0]
+        self.assertAlmostEqual(sharpe[0], row.mean() / row.std(ddof=1) * math.sqrt(365))
+        downside = math.sqrt(np.mean(np.minimum(row, 0) ** 2))
+        self.assertAlmostEqual(sortino[0], row.mean() / downside * math.sqrt(365))
+        self.assertTrue(math.isnan(sharpe[1]))
+        self.assertTrue(math.isnan(sortino[1]))
+
+    def test_asset_contributions_sum_to_portfolio_return(self):
+        quantities = np.array([[1.0, 100.0], [0.0, 10.0]])
+        start = np.array([2000.0, 1.0])
+        end = np.array([2200.0, 1.0])
+        contributions = analytics.asset_contributions(quantities, start, end)
+
+        np.testing.assert_allclose(contributions[0], [200.0 / 2100.0, 0.0])
+        np.testing.assert_allclose(contributions[1], [0.0, 0.0])
+
+
+class TestNightlyJob(unittest.TestCase):
+
+    def _mock_db(self, mock_db_connection, history, positions):
+        conn = MagicMock()
+        cur = MagicMock()
+        cur.fetchall.side_effect = [history, positions]
+        conn.cursor.return_value.__enter__.return_value = cur
+        mock_db_connection.return_value.__enter__.return_value = conn
+        return conn
+
+    @patch('src.analytics.execute_values')
+    @patch('src.analytics.db_connection')
+    def test_run_nightly_batches_all_users_and_windows(self, mock_db_connection, mock_execute_values):
+        today = date(2024, 3, 31)
+        history = [(1, date(2024, 3, d), Decimal(100 + d)) for d in range(1, 32)]
+        history += [(2, date(2024, 3, d), Decimal(50)) for d in range(25, 32)]
+        positions = [(1, 'ETH', Decimal('0.05'), Decimal('131')), (2, 'USDC', Decimal('50'), Decimal('50'))]
+        conn = self._mock_db(mock_db_connection, history, positions)
+        candles = MagicMock()
+        candles.opening_prices.return_value = {'ETH': Decimal('2000'), 'USDC': Decimal('1')}
+
+        written = analytics.run_nightly(candles=candles, windows=[7, 30], today=today)
+
+        self.assertEqual(written, 4)
+        rows = mock_execute_values.call_args.args[2]
+        by_key = {(r[0], r[1]): r for r in rows}
+        self.assertAlmostEqual(by_key[(1, 30)][3], 131 / 101 - 1, places=6)
+        self.assertEqual(by_key[(2, 7)][3], 0.0)  # flat
+        self.assertEqual(by_key[(2, 7)][6], 0.0)  # no drawdown
+        self.assertAlmostEqual(by_key[(1, 7)][9].adapted['ETH'], 0.05 * (2620 - 2000) / 100, places=6)
+        self.assertEqual(candles.opening_prices.call_count, 2)  # once per window, all symbols together
+        conn.commit.assert_called_once()
+
+    @patch('src.analytics.db_connection')
+    def test_run_nightly_without_history_writes_nothing(self, mock_db_connection):
+        self._mock_db(mock_db_connection, [], [])
+        self.assertEqual(analytics.run_nightly(candles=MagicMock(), windows=[7]), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
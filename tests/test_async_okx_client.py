@@ -0,0 +1,118 @@
+import asyncio
+import os
+import unittest
+from unittest.mock import patch, AsyncMock
+
+import httpx
+
+from src.http_transport import AsyncHTTPTransport
+from src.okx_client import AsyncOKXClient
+from src.okx_explorer import AsyncOKXExplorer
+from src.quote_cache import quote_cache
+
+
+def _json(payload: dict, status_code: int = 200) -> httpx.Response:
+    return httpx.Response(status_code, json=payload)
+
+
+class TestAsyncOKXClient(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        quote_cache.clear()
+        patcher = patch.dict(os.environ, {
+            "OKX_API_KEY": "test_key",
+            "OKX_API_SECRET": "test_secret",
+            "OKX_API_PASSPHRASE": "test_passphrase",
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _transport(self, handler, **kwargs) -> AsyncHTTPTransport:
+        transport = AsyncHTTPTransport(transport=httpx.MockTransport(handler), **kwargs)
+        self.addAsyncCleanup(transport.aclose)
+        return transport
+
+    async def test_get_live_quote_success(self):
+        """The async client returns the same response shape as OKXClient."""
+        def handler(request):
+            self.assertEqual(request.url.path, "/api/v5/dex/aggregator/quote")
+            self.assertIn("OK-ACCESS-SIGN", request.headers)
+            return _json({"code": "0", "data": [{"toTokenAmount": "3000000000"}]})
+
+        client = AsyncOKXClient(transport=self._transport(handler), base_url="https://okx.test")
+        result = await client.get_live_quote("from_addr", "to_addr", "100")
+
+        self.assertTrue(result["success"])
+        self.assertEqual(result["data"]["toTokenAmount"], "3000000000")
+
+    @patch('src.okx_client.async_sleep_with_backoff', new_callable=AsyncMock)
+    async def test_get_live_quote_retries_without_blocking(self, mock_sleep):
+        """HTTP errors are retried with the non-blocking backoff."""
+        responses = [
+            _json({"msg": "busy"}, status_code=503),
+            _json({"code": "0", "data": [{"toTokenAmount": "1"}]}),
+        ]
+
+        client = AsyncOKXClient(
+            transport=self._transport(lambda request: responses.pop(0)),
+            base_url="https://okx.test",
+        )
+        result = await client.get_live_quote("from_addr", "to_addr", "100")
+
+        self.assertTrue(result["success"])
+        mock_sleep.assert_awaited_once()
+
+    async def test_network_error_returns_error_shape(self):
+        def handler(request):
+            raise httpx.ConnectError("boom", request=request)
+
+        client = AsyncOKXClient(transport=self._transport(handler), base_url="https://okx.test")
+        with patch('src.okx_client.async_sleep_with_backoff', new_callable=AsyncMock) as mock_sleep:
+            result = await client.get_live_quote("from_addr", "to_addr", "100")
+
+        self.assertFalse(result["success"])
+        self.assertEqual(result["code"], "E_OKX_HTTP")
+        mock_sleep.assert_not_awaited()
+
+    async def test_execute_swap_dry_run(self):
+        def handler(request):
+            return _json({"code": "0", "data": [{"toTokenAmount": "500"}]})
+
+        client = AsyncOKXClient(transport=self._transport(handler), base_url="https://okx.test")
+        result = await client.execute_swap("from", "to", "100", "wallet_addr", dry_run=True)
+
+        self.assertTrue(result["success"])
+        self.assertEqual(result["status"], "simulated")
+        self.assertEqual(result["data"]["toTokenAmount"], "500")
+
+    async def test_concurrency_is_bounded(self):
+        async def handler(request):
+            await asyncio.sleep(0.01)
+            return _json({"code": "0", "data": [{"toTokenAmount": "1"}]})
+
+        transport = self._transport(handler, max_concurrency=2)
+        client = AsyncOKXClient(transport=transport, base_url="https://okx.test")
+        results = await asyncio.gather(*[
+            client.get_live_quote("from_addr", "to_addr", str(i)) for i in range(6)
+        ])
+
+        self.assertTrue(all(r["success"] for r in results))
+        metrics = transport.metrics()
+        self.assertEqual(metrics["requests"], 6)
+        self.assertLessEqual(metrics["max_in_flight"], 2)
+        self.assertEqual(metrics["in_flight"], 0)
+
+    async def test_async_explorer_balances(self):
+        def handler(request):
+            self.assertEqual(request.url.params["chains"], "1,56")
+            return _json({"code": "0", "data": [{"chainIndex": "1", "tokenAssets": []}]})
+
+        explorer = AsyncOKXExplorer(transport=self._transport(handler), base_url="https://okx.test")
+        result = await explorer.get_all_balances("0xabc", chains=[1, 56])
+
+        self.assertTrue(result["success"])
+        self.assertEqual(result["data"][0]["chainIndex"], "1")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+from src.candle_store import BAR_MS, CandleStore
+
+DAY = BAR_MS["1D"]
+NOW = 1_700_000_000  # seconds
+LATEST = NOW * 1000 // DAY * DAY
+
+
+class _FakeCandleTable:
+    """Serves the coverage query and records upserts, like the candles table would."""
+
+    def __init__(self):
+        self.rows = {}  # (inst_id, bar, ts) -> open
+
+    def coverage(self, bar, insts, start):
+        result = []
+        for inst in insts:
+            stamps = sorted(ts for (i, b, ts) in self.rows if i == inst and b == bar and ts >= start)
+            if stamps:
+                result.append((inst, stamps[0], stamps[-1], self.rows[(inst, bar, stamps[0])]))
+        return result
+
+    def upsert(self, rows):
+        for inst, bar, ts, open_, *_ in rows:
+            self.rows[(inst, bar, ts)] = open_
+
+
+def _candles(first_ts, count, open_=Decimal("10")):
+    """OKX-style array rows, newest first."""
+    return [[str(first_ts + i * DAY), str(open_ + i), "0", "0", "0"] for i in reversed(range(count))]
+
+
+class TestCandleStore(unittest.TestCase):
+
+    def setUp(self):
+        self.table = _FakeCandleTable()
+        conn = MagicMock()
+        cur = MagicMock()
+        conn.cursor.return_value.__enter__.return_value = cur
+
+        def execute(sql, params):
+            cur.fetchall.return_value = self.table.coverage(*params)
+
+        cur.execute.side_effect = execute
+        db_patcher = patch('src.candle_store.db_connection')
+        values_patcher = patch('src.candle_store.execute_values', side_effect=lambda cur, sql, rows: self.table.upsert(rows))
+        mock_db_connection = db_patcher.start()
+        values_patcher.start()
+        self.addCleanup(db_patcher.stop)
+        self.addCleanup(values_patcher.stop)
+        mock_db_connection.return_value.__enter__.return_value = conn
+
+        self.explorer = MagicMock()
+
+        def get_kline(symbol, bar, limit, after):
+            first = after - limit * DAY
+            return {"success": True, "data": _candles(first, limit)}
+
+        self.explorer.get_kline.side_effect = get_kline
+        self.clock = {"now": NOW}
+        self.store = CandleStore(self.explorer, clock=lambda: self.clock["now"])
+
+    def test_first_read_fetches_window_then_serves_locally(self):
+        prices = self.store.opening_prices(["eth", "BTC"], bar="1D", bars=30)
+
+        self.assertEqual(set(prices), {"ETH", "BTC"})
+        self.assertEqual(self.explorer.get_kline.call_count, 2)  # one page per symbol
+        self.assertEqual(len(self.table.rows), 2 * 31)
+
+        self.explorer.get_kline.reset_mock()
+        again = self.store.opening_prices(["ETH", "BTC"], bar="1D", bars=30)
+        self.assertEqual(again, prices)
+        self.explorer.get_kline.assert_not_called()
+
+    def test_next_day_requests_only_missing_bars(self):
+        self.store.opening_prices(["ETH"], bar="1D", bars=30)
+        self.explorer.get_kline.reset_mock()
+
+        self.clock["now"] += 2 * DAY // 1000
+        self.store.opening_prices(["ETH"], bar="1D", bars=30)
+
+        call = self.explorer.get_kline.call_args
+        self.assertEqual(call.kwargs["limit"], 3)  # yesterday's forming bar + two new ones
+        self.assertEqual(call.kwargs["after"], LATEST + 3 * DAY)
+
+    def test_long_windows_are_paged_concurrently(self):
+        self.store.opening_prices(["ETH"], bar="1D", bars=250)
+
+        limits = sorted(c.kwargs["limit"] for c in self.explorer.get_kline.call_args_list)
+        self.assertEqual(limits, [51, 100, 100])
+        self.assertEqual(len(self.table.rows), 251)
+
+    def test_symbol_without_candles_is_not_refetched(self):
+        self.explorer.get_kline.side_effect = None
+        self.explorer.get_kline.return_value = {"success": True, "data": []}
+
+        self.assertEqual(self.store.opening_prices(["NOPE"]), {})
+        self.assertEqual(self.store.opening_prices(["NOPE"]), {})
+        self.assertEqual(self.explorer.get_kline.call_count, 1)
+
+    def test_failed_fetch_is_retried_next_time(self):
+        self.explorer.get_kline.side_effect = [{"success": False, "error": "boom"}, {"success": True, "data": _candles(LATEST - 30 * DAY, 31)}]
+
+        self.assertEqual(self.store.opening_prices(["ETH"]), {})
+        self.assertEqual(self.store.opening_prices(["ETH"]), {"ETH": Decimal("10")})
+
+
+if __name__ == '__main__':
+    unittest.main()
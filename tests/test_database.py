@@ -2,6 +2,7 @@ import unittest
 from unittest.mock import patch, MagicMock
 import os
 import psycopg2
+import psycopg2.extensions
 from src import database
 
 class TestDatabase(unittest.TestCase):
@@ -25,12 +26,12 @@ class TestDatabase(unittest.TestCase):
         conn = database.get_db_connection()
         self.assertIsNone(conn)
 
-    @patch('src.database.get_db_connection')
-    def test_initialize_database(self, mock_get_conn):
+    @patch('src.database.db_connection')
+    def test_initialize_database(self, mock_db_connection):
         """Test the database initialization function."""
         mock_conn = MagicMock()
         mock_cursor = MagicMock()
-        mock_get_conn.return_value = mock_conn
+        mock_db_connection.return_value.__enter__.return_value = mock_conn
         mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
 
         database.initialize_database()
@@ -50,28 +51,102 @@ class TestDatabase(unittest.TestCase):
         self.assertIn("CREATE TABLE IF NOT EXISTS portfolio_history", executed_sql)
         
         mock_conn.commit.assert_called_once()
-        mock_conn.close.assert_called_once()
+        mock_db_connection.return_value.__exit__.assert_called_once()  # returned to the pool
 
-    @patch('src.database.get_db_connection')
-    def test_save_portfolio_snapshot(self, mock_get_conn):
+    @patch('src.database.db_connection')
+    def test_save_portfolio_snapshot(self, mock_db_connection):
         """Test saving a portfolio snapshot."""
         mock_conn = MagicMock()
         mock_cursor = MagicMock()
-        mock_get_conn.return_value = mock_conn
+        mock_db_connection.return_value.__enter__.return_value = mock_conn
         mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
 
         database.save_portfolio_snapshot(1, 1234.56)
 
         mock_cursor.execute.assert_called_once_with(
             """
-                INSERT INTO portfolio_history (user_id, total_value_usd, snapshot_date)
-                VALUES (%s, %s, CURRENT_DATE)
-                ON CONFLICT (user_id, snapshot_date) DO UPDATE SET total_value_usd = EXCLUDED.total_value_usd;
-                """,
+                    INSERT INTO portfolio_history (user_id, total_value_usd, snapshot_date)
+                    VALUES (%s, %s, CURRENT_DATE)
+                    ON CONFLICT (user_id, snapshot_date) DO UPDATE SET total_value_usd = EXCLUDED.total_value_usd;
+                    """,
             (1, 1234.56)
         )
         mock_conn.commit.assert_called_once()
-        mock_conn.close.assert_called_once()
+        mock_db_connection.return_value.__exit__.assert_called_once()  # returned to the pool
+
+
+class TestDatabasePool(unittest.TestCase):
+
+    def _conn(self, closed=0, status=psycopg2.extensions.TRANSACTION_STATUS_IDLE):
+        conn = MagicMock()
+        conn.closed = closed
+        conn.get_transaction_status.return_value = status
+        return conn
+
+    @patch('src.database.ThreadedConnectionPool')
+    def test_checkout_returns_connection_and_records_metrics(self, mock_pool_cls):
+        conn = self._conn()
+        mock_pool_cls.return_value.getconn.return_value = conn
+        pool = database.DatabasePool(dsn="dummy_url", minconn=1, maxconn=2)
+
+        with pool.connection() as checked_out:
+            self.assertIs(checked_out, conn)
+            self.assertEqual(pool.metrics()["in_use"], 1)
+            self.assertEqual(pool.metrics()["saturation"], 0.5)
+
+        mock_pool_cls.assert_called_once_with(1, 2, "dummy_url")
+        mock_pool_cls.return_value.putconn.assert_called_once_with(conn, close=False)
+        metrics = pool.metrics()
+        self.assertEqual(metrics["checkouts"], 1)
+        self.assertEqual(metrics["in_use"], 0)
+        self.assertEqual(metrics["max_in_use"], 1)
+
+    @patch('src.database.ThreadedConnectionPool')
+    def test_uncommitted_work_is_rolled_back_on_return(self, mock_pool_cls):
+        conn = self._conn(status=psycopg2.extensions.TRANSACTION_STATUS_INTRANS)
+        mock_pool_cls.return_value.getconn.return_value = conn
+        pool = database.DatabasePool(dsn="dummy_url")
+
+        with pool.connection():
+            pass
+
+        conn.rollback.assert_called_once()
+
+    @patch('src.database.ThreadedConnectionPool')
+    def test_closed_connection_is_discarded_on_checkout(self, mock_pool_cls):
+        dead, alive = self._conn(closed=1), self._conn()
+        mock_pool_cls.return_value.getconn.side_effect = [dead, alive]
+        pool = database.DatabasePool(dsn="dummy_url")
+
+        with pool.connection() as conn:
+            self.assertIs(conn, alive)
+
+        mock_pool_cls.return_value.putconn.assert_any_call(dead, close=True)
+        self.assertEqual(pool.metrics()["discarded"], 1)
+
+    @patch('src.database.ThreadedConnectionPool')
+    def test_saturated_pool_times_out_with_none(self, mock_pool_cls):
+        mock_pool_cls.return_value.getconn.return_value = self._conn()
+        pool = database.DatabasePool(dsn="dummy_url", maxconn=1, timeout_secs=0.01)
+
+        with pool.connection() as first:
+            self.assertIsNotNone(first)
+            with pool.connection() as second:
+                self.assertIsNone(second)
+
+        self.assertEqual(pool.metrics()["timeouts"], 1)
+
+    @patch('src.database.ThreadedConnectionPool', side_effect=psycopg2.OperationalError("Connection failed"))
+    def test_unreachable_database_yields_none(self, mock_pool_cls):
+        pool = database.DatabasePool(dsn="dummy_url", maxconn=1)
+
+        with pool.connection() as conn:
+            self.assertIsNone(conn)
+        # The slot was released, so a later checkout can try again
+        with pool.connection() as conn:
+            self.assertIsNone(conn)
+        self.assertEqual(mock_pool_cls.call_count, 2)
+
 
 if __name__ == '__main__':
     unittest.main()
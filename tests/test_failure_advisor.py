@@ -1,16 +1,19 @@
 import os
 import json
+import asyncio
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock, MagicMock, patch
 
 from src.failure_advisor import FailureAdvisor
+from src.llm_executor import PRIORITY_BACKGROUND, llm_executor
 
 
 class DummyModel:
     def __init__(self, text: str):
         self._text = text
 
-    def generate_content(self, prompt: str):
+    def generate_content(self, prompt: str, request_options=None):
+        self.request_options = request_options
         # Return an object with .text and .parts similar to Gemini SDK responses
         return type("Resp", (), {"text": self._text, "parts": [self._text]})()
 
@@ -54,6 +57,20 @@ class TestFailureAdvisor(unittest.TestCase):
         self.assertEqual(res["message"], "Service is busy; please try again soon.")
         self.assertIn("Retry", res["actions"])  # Title-cased
 
+    def test_sdk_call_carries_the_model_timeout(self):
+        nlp = DummyNLPClient('{"message":"x","actions":["Retry","Help"]}')
+        FailureAdvisor(nlp_client=nlp).summarize({"error_code": "E_OKX_HTTP"})
+        self.assertEqual(nlp.flash_model.request_options, {"timeout": llm_executor.timeout_for("flash")})
+
+    @patch('src.failure_advisor.llm_executor')
+    def test_async_advice_runs_as_background_work(self, mock_executor):
+        mock_executor.run = AsyncMock(return_value={"message": "x", "actions": ["Retry"]})
+        advisor = FailureAdvisor(nlp_client=DummyNLPClient(""))
+
+        asyncio.run(advisor.asummarize({"error_code": "E_OKX_HTTP"}))
+
+        self.assertEqual(mock_executor.run.await_args.kwargs["priority"], PRIORITY_BACKGROUND)
+
     def test_returns_none_on_malformed_response(self):
         advisor = FailureAdvisor(nlp_client=DummyNLPClient("not json"))
         res = advisor.summarize({"error_code": "E_UNKNOWN"})
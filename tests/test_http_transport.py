@@ -0,0 +1,116 @@
+import asyncio
+import json
+import os
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import httpx
+
+from src.http_transport import AsyncHTTPTransport, HTTPTransport
+from src.okx_client import OKXClient
+from src.okx_explorer import OKXExplorer
+from src.quote_cache import quote_cache
+
+
+class _StubOKXHandler(BaseHTTPRequestHandler):
+    """Minimal stand-in for the OKX endpoints used by the clients."""
+
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_GET(self):
+        if self.path.startswith("/api/v5/dex/aggregator/quote"):
+            payload = {"code": "0", "data": [{"toTokenAmount": "3000000000"}]}
+        elif self.path.startswith("/api/v5/dex/balance/all-token-balances-by-address"):
+            payload = {"code": "0", "data": [{"chainIndex": "1", "tokenAssets": []}]}
+        else:
+            payload = {"code": "51000", "msg": "Not found"}
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestHTTPTransport(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _StubOKXHandler)
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        quote_cache.clear()
+        patcher = patch.dict(os.environ, {
+            "OKX_API_KEY": "dummy",
+            "OKX_API_SECRET": "dummy",
+            "OKX_API_PASSPHRASE": "dummy",
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.transport = HTTPTransport(pool_maxsize=2)
+        self.addCleanup(self.transport.close)
+
+    def test_connection_is_reused_across_requests(self):
+        client = OKXClient(transport=self.transport, base_url=self.base_url)
+        for _ in range(3):
+            res = client.get_live_quote("from", "to", "100", use_cache=False)
+            self.assertTrue(res["success"])
+
+        metrics = self.transport.metrics()["127.0.0.1"]
+        self.assertEqual(metrics["requests"], 3)
+        self.assertEqual(metrics["new_connections"], 1)
+        self.assertEqual(metrics["hits"], 2)
+        self.assertGreaterEqual(metrics["wait_time_secs"], 0.0)
+
+    def test_clients_share_one_pool(self):
+        client = OKXClient(transport=self.transport, base_url=self.base_url)
+        explorer = OKXExplorer(transport=self.transport, base_url=self.base_url)
+
+        self.assertTrue(client.get_live_quote("from", "to", "100")["success"])
+        self.assertTrue(explorer.get_all_balances("0xabc", chains=[1])["success"])
+
+        metrics = self.transport.metrics()["127.0.0.1"]
+        self.assertEqual(metrics["new_connections"], 1)
+        self.assertEqual(metrics["hits"], 1)
+
+    def test_default_timeouts_are_tunable(self):
+        transport = HTTPTransport(connect_timeout=1.5, read_timeout=4)
+        self.addCleanup(transport.close)
+        self.assertEqual(transport.timeout, (1.5, 4))
+        self.assertEqual(transport.timeout_for(15), (1.5, 15))
+
+
+class TestAsyncHTTPTransport(unittest.TestCase):
+
+    def test_client_from_a_previous_loop_is_closed(self):
+        transport = AsyncHTTPTransport(transport=httpx.MockTransport(lambda request: httpx.Response(200, json={})))
+
+        async def fetch():
+            await transport.get("https://okx.test/quote")
+            await asyncio.sleep(0)  # let the close of a replaced client run
+            return transport._client
+
+        first = asyncio.run(fetch())
+        second = asyncio.run(fetch())
+
+        self.assertIsNot(first, second)
+        self.assertTrue(first.is_closed)
+        self.assertFalse(second.is_closed)
+        asyncio.run(transport.aclose())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,9 @@
 import unittest
-from unittest.mock import patch, MagicMock
+import asyncio
+from unittest.mock import patch, MagicMock, AsyncMock
 from src.insights import InsightsClient
+from src.llm_executor import PRIORITY_BACKGROUND
+from src.insights_cache import InsightsCache
 import os
 
 class TestInsightsClient(unittest.TestCase):
@@ -39,6 +42,50 @@ class TestInsightsClient(unittest.TestCase):
         mock_pro_instance.generate_content.assert_called_once()
         mock_port_instance.get_snapshot.assert_called_once_with(123)
 
+    @patch('src.insights.PortfolioService')
+    @patch('src.insights.OKXClient')
+    @patch('google.generativeai.GenerativeModel')
+    def test_agenerate_insights_runs_pro_at_background_priority(self, mock_gen_model, mock_okx_client, mock_portfolio_svc):
+        """The async path sends the Pro call through the LLM executor behind intent parsing."""
+        mock_portfolio_svc.return_value.get_snapshot.return_value = {"assets": [{"symbol": "ETH", "quantity": 1.5}]}
+        mock_okx_client.return_value.get_live_quote.return_value = {"success": False}
+        mock_gen_model.return_value.generate_content.return_value = MagicMock(text="Steady week.")
+
+        with patch.dict(os.environ, {"GEMINI_API_KEY": "test_key"}), \
+                patch('src.insights.llm_executor.run', new_callable=AsyncMock) as run:
+            run.return_value = MagicMock(text="Steady week.")
+            result = asyncio.run(InsightsClient(cache=InsightsCache(persist=False)).agenerate_insights(123))
+
+        self.assertEqual(result, "Steady week.")
+        self.assertEqual(run.call_args.args[0], "pro")
+        self.assertEqual(run.call_args.kwargs["priority"], PRIORITY_BACKGROUND)
+        self.assertIn("'ETH': 1.5", run.call_args.args[2])
+
+    @patch('src.insights.PortfolioService')
+    @patch('src.insights.OKXClient')
+    @patch('google.generativeai.GenerativeModel')
+    def test_insights_generated_only_on_cache_miss(self, mock_gen_model, mock_okx_client, mock_portfolio_svc):
+        """A second request for an unchanged portfolio in the same epoch is served from cache."""
+        snapshot = {"assets": [{"symbol": "ETH", "quantity": 1.5}]}
+        mock_portfolio_svc.return_value.get_snapshot.return_value = snapshot
+        mock_okx_client.return_value.get_live_quote.return_value = {"success": False}
+
+        async def scenario(client):
+            first = await client.aget_insights(123)
+            second = await client.aget_insights(123)
+            snapshot["assets"] = [{"symbol": "ETH", "quantity": 3.0}]
+            third = await client.aget_insights(123)
+            return first, second, third
+
+        with patch.dict(os.environ, {"GEMINI_API_KEY": "test_key"}), \
+                patch('src.insights.llm_executor.run', new_callable=AsyncMock) as run:
+            run.side_effect = [MagicMock(text="First take."), MagicMock(text="Portfolio changed.")]
+            first, second, third = asyncio.run(scenario(InsightsClient(cache=InsightsCache(persist=False))))
+
+        self.assertIs(first, second)
+        self.assertEqual(third.text, "Portfolio changed.")
+        self.assertEqual(run.await_count, 2)
+
     @patch.dict(os.environ, clear=True)
     def test_init_no_api_key(self):
         """Test that InsightsClient raises an error if the API key is missing."""
@@ -0,0 +1,136 @@
+import asyncio
+import unittest
+from unittest.mock import patch, MagicMock
+
+from conftest import FakeClock
+from src.insights_cache import InsightsCache, portfolio_hash
+
+
+class TestPortfolioHash(unittest.TestCase):
+
+    def test_order_case_and_dust_do_not_change_the_hash(self):
+        a = portfolio_hash({"ETH": 1.5, "usdc": 1000.0})
+        b = portfolio_hash({"USDC": 1000.2, "ETH": 1.5001, "DOGE": 0})
+        self.assertEqual(a, b)
+
+    def test_composition_change_changes_the_hash(self):
+        self.assertNotEqual(portfolio_hash({"ETH": 1.5}), portfolio_hash({"ETH": 3.0}))
+        self.assertNotEqual(portfolio_hash({"ETH": 1.5}), portfolio_hash({"ETH": 1.5, "BTC": 0.1}))
+
+
+class TestInsightsCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.clock = FakeClock(1_000_000.0)
+        self.cache = InsightsCache(epoch_secs=3600, max_entries=2, persist=False, enabled=True, clock=self.clock)
+        self.calls = 0
+
+    async def _generate(self, text="Insight."):
+        self.calls += 1
+        await asyncio.sleep(0)
+        return text
+
+    async def test_hit_within_epoch_and_miss_after(self):
+        first = await self.cache.aget_or_generate(1, "h", self._generate)
+        self.assertIs(await self.cache.aget_or_generate(1, "h", self._generate), first)
+        self.assertEqual(first.generated_at, self.clock.now)
+
+        self.clock.now += 3600
+        await self.cache.aget_or_generate(1, "h", self._generate)
+        stats = self.cache.stats()
+        self.assertEqual((self.calls, stats["hits"], stats["misses"]), (2, 1, 2))
+
+    def test_epochs_roll_over_at_different_times_per_user(self):
+        def rollover(user):
+            # Seconds until the user's epoch changes, checked minute by minute
+            start, base = self.cache.market_epoch(user), self.clock.now
+            for elapsed in range(60, 3601, 60):
+                self.clock.now = base + elapsed
+                if self.cache.market_epoch(user) != start:
+                    self.clock.now = base
+                    return elapsed
+
+        rollovers = [rollover(user) for user in range(1, 21)]
+        self.assertTrue(all(r is not None for r in rollovers))
+        self.assertGreater(len(set(rollovers)), 5)
+
+    async def test_portfolio_change_replaces_entry(self):
+        await self.cache.aget_or_generate(1, "old", self._generate)
+        await self.cache.aget_or_generate(1, "new", self._generate)
+        self.assertIsNone(await self.cache.get(1, "old"))
+        self.assertIsNotNone(await self.cache.get(1, "new"))
+        self.assertEqual(self.cache.stats()["size"], 1)
+
+    async def test_concurrent_requests_share_one_generation(self):
+        results = await asyncio.gather(*(self.cache.aget_or_generate(1, "h", self._generate) for _ in range(3)))
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(all(r is results[0] for r in results))
+        self.assertEqual(self.cache.stats()["coalesced"], 2)
+
+    async def test_cancelled_background_leader_hands_generation_to_a_user(self):
+        started = asyncio.Event()
+
+        async def slow_generate():
+            started.set()
+            await asyncio.sleep(10)
+            return "Never."
+
+        leader = asyncio.create_task(self.cache.aget_or_generate(1, "h", slow_generate, background=True))
+        await started.wait()
+        follower = asyncio.create_task(self.cache.aget_or_generate(1, "h", self._generate))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        insight = await follower
+        self.assertEqual(insight.text, "Insight.")
+        self.assertTrue(leader.cancelled())
+        self.assertEqual(self.calls, 1)
+
+    async def test_failed_generation_is_not_cached(self):
+        async def fail():
+            return None
+
+        self.assertIsNone(await self.cache.aget_or_generate(1, "h", fail))
+        self.assertIsNone(await self.cache.get(1, "h"))
+
+    async def test_background_refresh_counts_as_precompute_not_hit(self):
+        await self.cache.aget_or_generate(1, "h", self._generate, background=True)
+        await self.cache.aget_or_generate(1, "h", self._generate, background=True)
+        await self.cache.get(1, "h")
+        stats = self.cache.stats()
+        self.assertEqual((stats["precomputed"], stats["hits"], stats["misses"], stats["hit_rate"]), (1, 1, 0, 1.0))
+
+    async def test_lru_bound(self):
+        for user in (1, 2, 3):
+            await self.cache.aget_or_generate(user, "h", self._generate)
+        self.assertIsNone(await self.cache.get(1, "h"))
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    @patch('src.insights_cache.db_connection')
+    async def test_persisted_entry_is_served_from_database(self, mock_db_connection):
+        cur = MagicMock()
+        cur.fetchone.return_value = ("From another node.", "h", self.cache.market_epoch(42), self.clock.now - 60)
+        conn = MagicMock()
+        conn.cursor.return_value.__enter__.return_value = cur
+        mock_db_connection.return_value.__enter__.return_value = conn
+        self.cache.persist = True
+
+        insight = await self.cache.get(42, "h")
+
+        self.assertEqual(insight.text, "From another node.")
+        self.assertEqual(insight.age_secs(self.clock.now), 60)
+        self.assertEqual(self.cache.stats()["db_hits"], 1)
+
+    @patch('src.insights_cache.db_connection')
+    async def test_database_errors_are_misses(self, mock_db_connection):
+        mock_db_connection.side_effect = RuntimeError("db down")
+        self.cache.persist = True
+
+        insight = await self.cache.aget_or_generate(7, "h", self._generate)
+
+        self.assertEqual(insight.text, "Insight.")
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
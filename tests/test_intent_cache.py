@@ -0,0 +1,107 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from conftest import FakeClock
+from src.intent_cache import IntentCache
+
+
+PRICE = {"intent": "get_price", "entities": {"symbol": "ETH"}}
+
+
+class TestIntentCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = IntentCache(ttl_secs=60, max_entries=2, persist=False, clock=self.clock)
+
+    def test_normalized_repeats_hit_until_expiry(self):
+        parse = MagicMock(return_value=PRICE)
+
+        self.assertEqual(self.cache.get_or_parse("price of eth", "flash", parse), PRICE)
+        self.assertEqual(self.cache.get_or_parse("  Price of ETH? ", "flash", parse), PRICE)
+        self.assertEqual(self.cache.get_or_parse("please price of eth", "flash", parse), PRICE)
+        self.assertEqual(parse.call_count, 1)
+
+        self.clock.now = 60.0
+        self.cache.get_or_parse("price of eth", "flash", parse)
+        self.assertEqual(parse.call_count, 2)
+
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 2))
+        self.assertEqual(stats["llm_calls"], {"flash": 2})
+        self.assertEqual(stats["llm_calls_saved"], 2)
+        self.assertAlmostEqual(stats["hit_rate"], 0.5)
+
+    def test_models_are_cached_separately(self):
+        parse = MagicMock(return_value=PRICE)
+        self.cache.get_or_parse("price of eth", "flash", parse)
+        self.cache.get_or_parse("price of eth", "pro", parse)
+        self.assertEqual(parse.call_count, 2)
+
+    def test_unknown_parses_are_not_cached(self):
+        parse = MagicMock(return_value={"intent": "unknown", "entities": {}})
+        self.cache.get_or_parse("asdf", "flash", parse)
+        self.cache.get_or_parse("asdf", "flash", parse)
+        self.assertEqual(parse.call_count, 2)
+
+    def test_lru_eviction(self):
+        parse = MagicMock(return_value=PRICE)
+        for text in ("a", "b", "a", "c"):
+            self.cache.get_or_parse(text, "flash", parse)
+        self.cache.get_or_parse("a", "flash", parse)  # still cached (recently used)
+        self.assertEqual(parse.call_count, 3)
+        self.cache.get_or_parse("b", "flash", parse)  # evicted
+        self.assertEqual(parse.call_count, 4)
+        self.assertEqual(self.cache.stats()["evictions"], 2)
+
+    def test_disabled_cache_always_parses(self):
+        cache = IntentCache(ttl_secs=0, persist=False)
+        parse = MagicMock(return_value=PRICE)
+        cache.get_or_parse("price of eth", "flash", parse)
+        cache.get_or_parse("price of eth", "flash", parse)
+        self.assertEqual(parse.call_count, 2)
+        self.assertEqual(cache.stats()["llm_calls"], {"flash": 2})
+
+    @patch('src.intent_cache.db_connection')
+    def test_persisted_parse_is_served_from_database(self, mock_db_connection):
+        conn, cur = MagicMock(), MagicMock()
+        mock_db_connection.return_value.__enter__.return_value = conn
+        conn.cursor.return_value.__enter__.return_value = cur
+        cur.fetchone.return_value = (PRICE, 30.0)
+        cache = IntentCache(ttl_secs=60, persist=True, clock=self.clock)
+        parse = MagicMock()
+
+        self.assertEqual(cache.get_or_parse("price of eth", "flash", parse), PRICE)
+        self.assertEqual(cache.get_or_parse("price of eth", "flash", parse), PRICE)
+
+        parse.assert_not_called()
+        self.assertEqual(cur.execute.call_count, 1)  # second lookup served from memory
+        self.assertEqual(cur.execute.call_args.args[1], ("flash", "price of eth"))
+        stats = cache.stats()
+        self.assertEqual((stats["db_hits"], stats["hits"]), (1, 1))
+
+    @patch('src.intent_cache.db_connection')
+    def test_new_parse_is_written_to_database(self, mock_db_connection):
+        conn, cur = MagicMock(), MagicMock()
+        mock_db_connection.return_value.__enter__.return_value = conn
+        conn.cursor.return_value.__enter__.return_value = cur
+        cur.fetchone.return_value = None
+        cache = IntentCache(ttl_secs=60, persist=True, clock=self.clock)
+
+        cache.get_or_parse("price of eth", "flash", MagicMock(return_value=PRICE))
+
+        insert = cur.execute.call_args_list[-1]
+        self.assertIn("INSERT INTO intent_cache", insert.args[0])
+        self.assertEqual(insert.args[1][:2], ("flash", "price of eth"))
+        conn.commit.assert_called_once()
+
+    @patch('src.intent_cache.db_connection', side_effect=RuntimeError("db down"))
+    def test_database_errors_fall_back_to_the_llm(self, _):
+        cache = IntentCache(ttl_secs=60, persist=True, clock=self.clock)
+        parse = MagicMock(return_value=PRICE)
+        self.assertEqual(cache.get_or_parse("price of eth", "flash", parse), PRICE)
+        parse.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from src.intent_classifier import IntentClassifier, load_corpus, load_logged_examples
+
+
+class TestIntentClassifier(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.corpus = load_corpus()
+        cls.classifier = IntentClassifier().fit(cls.corpus)
+
+    def test_corpus_covers_every_intent(self):
+        # 15 intents plus "unknown" counter-examples (negations, questions about state)
+        self.assertEqual(len({intent for _, intent in self.corpus}), 16)
+
+    def test_held_out_accuracy_and_confident_precision(self):
+        train = [ex for i, ex in enumerate(self.corpus) if i % 5]
+        test = [ex for i, ex in enumerate(self.corpus) if not i % 5]
+        model = IntentClassifier().fit(train)
+        correct = sum(model.predict(text)[0] == intent for text, intent in test)
+        self.assertGreaterEqual(correct / len(test), 0.75)
+        answered = [(model.classify(text), intent) for text, intent in test]
+        answered = [(p, e) for p, e in answered if p is not None]
+        self.assertGreater(len(answered), len(test) // 3)
+        self.assertGreaterEqual(sum(p == e for p, e in answered) / len(answered), 0.9)
+
+    def test_amounts_and_symbols_are_placeholders(self):
+        self.assertEqual(IntentClassifier.features("buy 0.5 ETH"), IntentClassifier.features("buy 20 btc"))
+
+    def test_paraphrases(self):
+        self.assertEqual(self.classifier.classify("connect a wallet please"), "add_wallet")
+        self.assertEqual(self.classifier.classify("turn live mode on"), "enable_live_trading")
+        self.assertEqual(self.classifier.classify("i want to sell my bitcoin"), "sell_token")
+
+    def test_off_topic_text_escalates(self):
+        self.assertIsNone(self.classifier.classify("whats the weather in paris"))
+        self.assertIsNone(self.classifier.classify(""))
+
+    def test_negated_requests_escalate(self):
+        for text in ["don't rebalance my portfolio", "cancel rebalance", "Please do NOT enable live trading",
+                     "stop rebalancing", "never add a wallet"]:
+            self.assertIsNone(self.classifier.classify(text), text)
+        self.assertEqual(self.classifier.classify("rebalance my portfolio"), "execute_rebalance")
+
+    def test_questions_about_state_are_not_commands(self):
+        self.assertNotEqual(self.classifier.classify("is live trading on?"), "enable_live_trading")
+        self.assertNotEqual(self.classifier.classify("did the rebalance run?"), "execute_rebalance")
+
+    def test_unfitted_classifier_escalates(self):
+        self.assertIsNone(IntentClassifier().classify("show my portfolio"))
+
+    def test_prediction_is_sub_millisecond(self):
+        texts = [text for text, _ in self.corpus]
+        start = time.perf_counter()
+        for text in texts:
+            self.classifier.predict(text)
+        self.assertLess((time.perf_counter() - start) / len(texts), 0.001)
+
+    @patch('src.intent_classifier.db_connection')
+    def test_logged_examples_come_from_intent_cache(self, mock_db_connection):
+        conn, cur = MagicMock(), MagicMock()
+        mock_db_connection.return_value.__enter__.return_value = conn
+        conn.cursor.return_value.__enter__.return_value = cur
+        cur.fetchall.return_value = [("what do i hold", "show_portfolio")]
+
+        self.assertEqual(load_logged_examples(), [("what do i hold", "show_portfolio")])
+        self.assertIn("FROM intent_cache", cur.execute.call_args.args[0])
+
+    @patch('src.intent_classifier.db_connection', side_effect=RuntimeError("db down"))
+    def test_logged_examples_empty_without_database(self, _):
+        self.assertEqual(load_logged_examples(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+
+from src.intent_grammar import IntentGrammar
+
+
+class TestIntentGrammar(unittest.TestCase):
+
+    def setUp(self):
+        self.grammar = IntentGrammar(known_symbols=lambda: {"SOL", "ARB"})
+
+    def test_examples_from_help_text(self):
+        cases = {
+            "Show me my portfolio": ("show_portfolio", {}),
+            "What's my performance 30d?": ("get_portfolio_performance", {"period": "30d"}),
+            "Show price chart for BTC 7d": ("get_price_chart", {"symbol": "BTC", "period": "7d"}),
+            "Add a new wallet": ("add_wallet", {}),
+            "List my wallets": ("list_wallets", {}),
+            "Buy 0.1 ETH with USDC": ("buy_token", {"amount": 0.1, "symbol": "ETH", "currency": "USDC"}),
+            "Sell 50 USDC for ETH": ("sell_token", {"amount": 50, "symbol": "USDC", "currency": "ETH"}),
+            "What is the price of BTC?": ("get_price", {"symbol": "BTC"}),
+            "Give me insights": ("get_insights", {}),
+            "Rebalance my portfolio": ("execute_rebalance", {}),
+        }
+        for text, (intent, entities) in cases.items():
+            with self.subTest(text=text):
+                self.assertEqual(self.grammar.parse(text), {"intent": intent, "entities": entities})
+
+    def test_chain_sets_source_and_destination(self):
+        parsed = self.grammar.parse("please swap 1 eth to usdc on arbitrum")
+        self.assertEqual(parsed["intent"], "sell_token")
+        self.assertEqual(parsed["entities"]["source_chain"], "arbitrum")
+        self.assertEqual(parsed["entities"]["destination_chain"], "arbitrum")
+
+    def test_aliases_and_registry_symbols(self):
+        self.assertEqual(self.grammar.parse("price of bitcoin")["entities"], {"symbol": "BTC"})
+        self.assertEqual(self.grammar.parse("SOL price")["entities"], {"symbol": "SOL"})
+
+    def test_stop_loss_and_take_profit(self):
+        self.assertEqual(
+            self.grammar.parse("set a stop-loss for ETH at 2500"),
+            {"intent": "set_stop_loss", "entities": {"symbol": "ETH", "price": 2500}},
+        )
+        self.assertEqual(
+            self.grammar.parse("take profit on btc @ $90000.5"),
+            {"intent": "set_take_profit", "entities": {"symbol": "BTC", "price": 90000.5}},
+        )
+
+    def test_ambiguous_text_falls_through(self):
+        for text in ("price of pepe", "buy some eth", "how is the market looking today", "", "sell everything"):
+            with self.subTest(text=text):
+                self.assertIsNone(self.grammar.parse(text))
+
+    def test_extra_words_around_a_keyword_fall_through(self):
+        for text in (
+            "portfolio rebalance please",
+            "show my portfolio and then sell all my eth",
+            "my wallets are empty, why did you delete them",
+            "balance of eth on arbitrum vs polygon",
+            "why are my wallets gone",
+            "hello, buy 1 eth with usdc",
+        ):
+            with self.subTest(text=text):
+                self.assertIsNone(self.grammar.parse(text))
+
+    def test_registry_failure_is_treated_as_unknown(self):
+        def broken():
+            raise RuntimeError("registry down")
+        grammar = IntentGrammar(known_symbols=broken)
+        self.assertIsNone(grammar.parse("price of sol"))
+        self.assertEqual(grammar.parse("price of eth")["entities"], {"symbol": "ETH"})
+
+
+if __name__ == '__main__':
+    unittest.main()
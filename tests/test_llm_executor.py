@@ -0,0 +1,120 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from src.llm_executor import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, LLMExecutor, LLMTimeoutError
+
+
+class TestLLMExecutor(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.executor = LLMExecutor(workers=4, reserved_interactive=1, concurrency={"flash": 4, "pro": 1}, timeouts={"flash": 5, "pro": 5})
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    async def test_runs_blocking_call_off_the_event_loop(self):
+        loop_thread = threading.get_ident()
+        result = await self.executor.run("flash", lambda x: (x * 2, threading.get_ident()), 21)
+        self.assertEqual(result[0], 42)
+        self.assertNotEqual(result[1], loop_thread)
+        self.assertEqual(self.executor.metrics()["models"]["flash"]["completed"], 1)
+
+    async def test_model_concurrency_limit(self):
+        active, peak, lock = [0], [0], threading.Lock()
+
+        def call():
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+
+        await asyncio.gather(*(self.executor.run("pro", call) for _ in range(3)))
+        self.assertEqual(peak[0], 1)
+
+    async def test_interactive_calls_overtake_queued_background_calls(self):
+        release = threading.Event()
+        order = []
+        blocker = asyncio.create_task(self.executor.run("pro", release.wait))
+        await asyncio.sleep(0.05)
+
+        background = asyncio.create_task(self.executor.run("pro", order.append, "background", priority=PRIORITY_BACKGROUND))
+        await asyncio.sleep(0.01)
+        interactive = asyncio.create_task(self.executor.run("pro", order.append, "interactive", priority=PRIORITY_INTERACTIVE))
+        await asyncio.sleep(0.01)
+
+        queued = self.executor.metrics()["models"]["pro"]
+        self.assertEqual((queued["queued_interactive"], queued["queued_background"]), (1, 1))
+        release.set()
+        await asyncio.gather(blocker, background, interactive)
+        self.assertEqual(order, ["interactive", "background"])
+
+    async def test_background_calls_leave_reserved_threads_free(self):
+        release = threading.Event()
+        background = [
+            asyncio.create_task(self.executor.run("flash", release.wait, priority=PRIORITY_BACKGROUND))
+            for _ in range(4)
+        ]
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.executor.metrics()["background_in_use"], 3)
+
+        # The reserved thread still serves intent parsing at once
+        self.assertEqual(await asyncio.wait_for(self.executor.run("flash", lambda: "parsed"), 1), "parsed")
+        release.set()
+        await asyncio.gather(*background)
+
+    async def test_background_calls_leave_a_model_slot_for_interactive_calls(self):
+        executor = LLMExecutor(workers=4, reserved_interactive=1, concurrency={"pro": 2}, timeouts={"pro": 5})
+        release = threading.Event()
+        try:
+            background = [
+                asyncio.create_task(executor.run("pro", release.wait, priority=PRIORITY_BACKGROUND))
+                for _ in range(2)
+            ]
+            await asyncio.sleep(0.05)
+            pro = executor.metrics()["models"]["pro"]
+            self.assertEqual((pro["background_limit"], pro["background_in_use"], pro["in_flight"]), (1, 1, 1))
+
+            # The second background call queues; the user's Pro call is admitted at once
+            self.assertEqual(await asyncio.wait_for(executor.run("pro", lambda: "parsed"), 1), "parsed")
+            release.set()
+            await asyncio.gather(*background)
+        finally:
+            release.set()
+            executor.shutdown()
+
+    async def test_timeout_raises_and_frees_slot_when_thread_finishes(self):
+        release = threading.Event()
+        with self.assertRaises(LLMTimeoutError):
+            await self.executor.run("pro", release.wait, timeout=0.05)
+        self.assertEqual(self.executor.metrics()["models"]["pro"]["timeouts"], 1)
+
+        release.set()
+        self.assertEqual(await self.executor.run("pro", lambda: "ok"), "ok")
+        self.assertEqual(self.executor.metrics()["models"]["pro"]["in_flight"], 0)
+
+    async def test_timeout_while_queued_gives_up_its_place(self):
+        release = threading.Event()
+        blocker = asyncio.create_task(self.executor.run("pro", release.wait))
+        await asyncio.sleep(0.05)
+        with self.assertRaises(LLMTimeoutError):
+            await self.executor.run("pro", lambda: "never", timeout=0.05)
+        self.assertEqual(self.executor.metrics()["models"]["pro"]["queued_interactive"], 0)
+        release.set()
+        await blocker
+
+    async def test_failures_are_counted_and_raised(self):
+        def boom():
+            raise ValueError("bad request")
+
+        with self.assertRaises(ValueError):
+            await self.executor.run("flash", boom)
+        stats = self.executor.metrics()["models"]["flash"]
+        self.assertEqual((stats["failed"], stats["in_flight"]), (1, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
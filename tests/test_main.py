@@ -1,11 +1,13 @@
 import unittest
 from unittest.mock import AsyncMock, MagicMock, patch
 import asyncio
+import time
 
 from telegram import Update, User
 from telegram.ext import ConversationHandler, Application, ContextTypes
 
 from src.database import initialize_database
+from src.nlp import NLPClient
 from src.main import (
     start,
     help_command,
@@ -21,6 +23,7 @@ from src.main import (
     set_default_wallet_callback,
     enable_live_trading_start,
     enable_live_trading_callback,
+    AWAIT_CONFIRMATION,
     AWAIT_WALLET_SELECTION,
     AWAIT_LIVE_TRADING_CONFIRMATION,
 )
@@ -81,15 +84,15 @@ class TestMainHandlers(unittest.IsolatedAsyncioTestCase):
         conn.cursor.return_value.__enter__.return_value = cur
         return conn, cur
 
-    @patch('src.main.get_db_connection')
-    async def test_start_new_user(self, mock_get_conn):
+    @patch('src.repository.db_connection')
+    async def test_start_new_user(self, mock_db_connection):
         """Test the /start command for a new user."""
         update, context = await self._create_update_context()
         
         # Simulate a new user (fetchone returns None)
         mock_conn, mock_cur = self._mock_db()
         mock_cur.fetchone.return_value = None
-        mock_get_conn.return_value = mock_conn
+        mock_db_connection.return_value.__enter__.return_value = mock_conn
 
         await start(update, context)
 
@@ -99,15 +102,15 @@ class TestMainHandlers(unittest.IsolatedAsyncioTestCase):
         self.assertIn("Hello! I'm Esther", call_args.args[0])
         self.assertIsNotNone(call_args.kwargs.get('reply_markup'))
 
-    @patch('src.main.get_db_connection')
-    async def test_start_existing_user(self, mock_get_conn):
+    @patch('src.repository.db_connection')
+    async def test_start_existing_user(self, mock_db_connection):
         """Test the /start command for an existing user."""
         update, context = await self._create_update_context()
         
         # Simulate an existing user
         mock_conn, mock_cur = self._mock_db()
         mock_cur.fetchone.return_value = (1,)  # User ID
-        mock_get_conn.return_value = mock_conn
+        mock_db_connection.return_value.__enter__.return_value = mock_conn
 
         await start(update, context)
 
@@ -142,110 +145,297 @@ class TestMainHandlers(unittest.IsolatedAsyncioTestCase):
         self.assertIn("Here's what I can do for you", query.edit_message_text.call_args.args[0])
 
     @patch('src.main.list_wallets')
-    @patch('src.main.nlp_client')
+    @patch('src.main.nlp_client', spec=NLPClient)
     async def test_handle_text_list_wallets(self, mock_nlp_client, mock_list_wallets):
         """Test that 'list_wallets' intent calls the correct handler."""
         # Arrange
         update, context = await self._create_update_context("show me my wallets")
-        mock_nlp_client.parse_intent.return_value = {"intent": "list_wallets", "entities": {}}
+        mock_nlp_client.aparse_intent.return_value = {"intent": "list_wallets", "entities": {}}
         mock_list_wallets.return_value = None # It's an async function
 
         # Act
         result = await handle_text(update, context)
 
         # Assert
-        mock_nlp_client.parse_intent.assert_called_once_with("show me my wallets", model_type='flash')
+        mock_nlp_client.aparse_intent.assert_not_called()  # resolved by the local grammar
         mock_list_wallets.assert_called_once_with(update, context)
         self.assertEqual(result, ConversationHandler.END)
 
     @patch('src.main.add_wallet_start')
-    @patch('src.main.nlp_client')
+    @patch('src.main.nlp_client', spec=NLPClient)
     async def test_handle_text_add_wallet(self, mock_nlp_client, mock_add_wallet_start):
         """Test that 'add_wallet' intent calls the correct handler."""
         # Arrange
         update, context = await self._create_update_context("add a new wallet")
-        mock_nlp_client.parse_intent.return_value = {"intent": "add_wallet", "entities": {}}
+        mock_nlp_client.aparse_intent.return_value = {"intent": "add_wallet", "entities": {}}
         mock_add_wallet_start.return_value = ConversationHandler.END # Simulate conversation end
 
         # Act
         result = await handle_text(update, context)
 
         # Assert
-        mock_nlp_client.parse_intent.assert_called_once_with("add a new wallet", model_type='flash')
+        mock_nlp_client.aparse_intent.assert_not_called()  # resolved by the local grammar
         mock_add_wallet_start.assert_called_once_with(update, context)
         self.assertEqual(result, ConversationHandler.END)
 
     @patch('src.main.portfolio')
-    @patch('src.main.nlp_client')
+    @patch('src.main.nlp_client', spec=NLPClient)
     async def test_handle_text_show_portfolio(self, mock_nlp_client, mock_portfolio):
         """Test that 'show_portfolio' intent calls the correct handler."""
         # Arrange
         update, context = await self._create_update_context("show my assets")
-        mock_nlp_client.parse_intent.return_value = {"intent": "show_portfolio", "entities": {}}
+        mock_nlp_client.aparse_intent.return_value = {"intent": "show_portfolio", "entities": {}}
         mock_portfolio.return_value = None # It's an async function
 
         # Act
         result = await handle_text(update, context)
 
         # Assert
-        mock_nlp_client.parse_intent.assert_called_once_with("show my assets", model_type='flash')
+        mock_nlp_client.aparse_intent.assert_not_called()  # resolved by the local grammar
         mock_portfolio.assert_called_once_with(update, context)
         self.assertEqual(result, ConversationHandler.END)
 
+    @patch('src.main.repository.touch_user', new_callable=AsyncMock)
+    @patch('src.main.portfolio_service')
+    async def test_portfolio_replies_with_stored_snapshot_then_edits(self, mock_portfolio_service, _):
+        """The stored snapshot is shown at once; the message is edited only when a refresh changes it."""
+        from src import main
+        update, context = await self._create_update_context()
+        sent = MagicMock()
+        sent.edit_text = AsyncMock()
+        update.message.reply_text.return_value = sent
+        stored = {"total_value_usd": 100.0, "assets": [{"symbol": "ETH", "quantity": 0.05, "value_usd": 100.0}], "age_secs": 600.0}
+        fresh = {"total_value_usd": 120.0, "assets": [{"symbol": "ETH", "quantity": 0.05, "value_usd": 120.0}], "age_secs": 1.0}
+        mock_portfolio_service.get_snapshot.side_effect = [stored, fresh]
+        mock_portfolio_service.sync_balances.return_value = True
+
+        await main.portfolio(update, context)
+
+        text = update.message.reply_text.call_args.args[0]
+        self.assertIn("$100.00", text)
+        self.assertIn("updated 10 min ago", text)
+        await asyncio.gather(*main._background_tasks)
+        mock_portfolio_service.sync_balances.assert_called_once_with(123, incremental=True)
+        edited = sent.edit_text.call_args.args[0]
+        self.assertIn("$120.00", edited)
+        self.assertIn("updated just now", edited)
+
+    @patch('src.main.repository.touch_user', new_callable=AsyncMock)
+    @patch('src.main.portfolio_service')
+    async def test_portfolio_unchanged_after_refresh_is_not_edited(self, mock_portfolio_service, _):
+        from src import main
+        update, context = await self._create_update_context()
+        sent = MagicMock()
+        sent.edit_text = AsyncMock()
+        update.message.reply_text.return_value = sent
+        stored = {"total_value_usd": 100.0, "assets": [{"symbol": "ETH", "quantity": 0.05, "value_usd": 100.0}], "age_secs": 30.0}
+        mock_portfolio_service.get_snapshot.side_effect = [stored, dict(stored, age_secs=0.0)]
+        mock_portfolio_service.sync_balances.return_value = True
+
+        await main.portfolio(update, context)
+        await asyncio.gather(*main._background_tasks)
+
+        sent.edit_text.assert_not_called()
+
+    @patch('src.main.intent_classifier')
     @patch('src.main.insights')
-    @patch('src.main.nlp_client')
-    async def test_handle_text_get_insights(self, mock_nlp_client, mock_insights):
-        """Test that 'get_insights' intent calls the correct handler and uses the Pro model."""
+    @patch('src.main.nlp_client', spec=NLPClient)
+    async def test_handle_text_get_insights(self, mock_nlp_client, mock_insights, mock_classifier):
+        """Test that 'get_insights' intent calls the correct handler with a single Flash parse."""
         # Arrange
-        update, context = await self._create_update_context("give me insights")
-        # Simulate the two-step parsing process
-        mock_nlp_client.parse_intent.side_effect = [
-            {"intent": "get_insights", "entities": {}}, # First call (Flash)
-            {"intent": "get_insights", "entities": {}}  # Second call (Pro)
-        ]
+        update, context = await self._create_update_context("anything interesting in the market for me today?")
+        mock_classifier.classify.return_value = None  # not confident: Gemini decides
+        mock_nlp_client.aparse_intent.return_value = {"intent": "get_insights", "entities": {}}
         mock_insights.return_value = None
 
         # Act
         result = await handle_text(update, context)
 
-        # Assert
-        self.assertEqual(mock_nlp_client.parse_intent.call_count, 2)
-        # Check that the second call specifically used the 'pro' model
-        self.assertEqual(mock_nlp_client.parse_intent.call_args_list[1].kwargs['model_type'], 'pro')
+        # Assert: insights carry no entities, so there is nothing for Pro to improve
+        mock_nlp_client.aparse_intent.assert_called_once_with(
+            "anything interesting in the market for me today?", model_type='flash'
+        )
+        mock_insights.assert_called_once_with(update, context)
+        self.assertEqual(result, ConversationHandler.END)
+
+    async def _speculative_buy(self, flash, pro, mode="reconcile"):
+        """Run handle_text for an ambiguous buy with the given Flash and Pro parses."""
+        from src import main
+        update, context = await self._create_update_context("grab me half an eth using my usdc")
+        resolver = MagicMock()
+        resolver.get_token_info.side_effect = lambda s, chain_id=1: {"address": s, "decimals": 18} if s in ("ETH", "USDC") else None
+        parses = {"flash": flash, "pro": pro}
+        with patch.object(main, 'intent_classifier') as classifier, \
+                patch.object(main, 'nlp_client', spec=NLPClient) as nlp, \
+                patch.object(main, 'token_resolver', resolver), \
+                patch.object(main.speculative_parse, 'SPECULATIVE_PARSE_MODE', mode), \
+                patch.object(main, 'buy_token_intent', new_callable=AsyncMock) as buy:
+            classifier.classify.return_value = None
+            nlp.aparse_intent.side_effect = lambda text, model_type, **kwargs: parses[model_type]
+            buy.return_value = AWAIT_CONFIRMATION
+            main.speculation_metrics.reset()
+            await handle_text(update, context)
+            await asyncio.gather(*list(main._background_tasks))
+            return update, nlp, buy, main.speculation_metrics.stats()
+
+    async def test_valid_flash_trade_is_used_while_pro_reconciles(self):
+        """A Flash trade that validates is quoted at once; Pro agreeing costs the user nothing."""
+        flash = {"intent": "buy_token", "entities": {"amount": "0.5", "symbol": "eth", "currency": "USDC"}}
+        pro = {"intent": "buy_token", "entities": {"amount": 0.5, "symbol": "ETH", "currency": "USDC"}}
+        update, nlp, buy, stats = await self._speculative_buy(flash, pro)
+
+        self.assertEqual(buy.call_args.args[2], flash["entities"])
+        self.assertEqual([c.kwargs["model_type"] for c in nlp.aparse_intent.call_args_list], ["flash", "pro"])
+        self.assertEqual((stats["accepted"], stats["pro_agreed"], stats["pro_changed"]), (1, 1, 0))
+        update.message.reply_text.assert_not_called()
+
+    async def test_formatted_flash_amount_reaches_handler_normalized(self):
+        """"$1,000"-style amounts pass validation, so the handler must get a float()-able amount."""
+        flash = {"intent": "buy_token", "entities": {"amount": "$1,000", "symbol": "ETH", "currency": "USDC"}}
+        _, nlp, buy, stats = await self._speculative_buy(flash, None, mode="validate")
+
+        self.assertEqual(buy.call_args.args[2], {"amount": "1000", "symbol": "ETH", "currency": "USDC"})
+        self.assertEqual(float(buy.call_args.args[2]["amount"]), 1000.0)
+        self.assertEqual([c.kwargs["model_type"] for c in nlp.aparse_intent.call_args_list], ["flash"])
+        self.assertEqual(stats["accepted"], 1)
+
+    async def test_pro_disagreement_warns_user(self):
+        flash = {"intent": "buy_token", "entities": {"amount": "0.5", "symbol": "ETH", "currency": "USDC"}}
+        pro = {"intent": "buy_token", "entities": {"amount": "0.05", "symbol": "ETH", "currency": "USDC"}}
+        update, _, buy, stats = await self._speculative_buy(flash, pro)
+
+        buy.assert_called_once()
+        self.assertEqual(stats["pro_changed"], 1)
+        self.assertEqual(stats["pro_change_rate"], 1.0)
+        self.assertIn("buy 0.05 ETH with USDC", update.message.reply_text.call_args.args[0])
+
+    async def test_invalid_flash_trade_waits_for_pro(self):
+        flash = {"intent": "buy_token", "entities": {"amount": "half", "symbol": "ETH", "currency": "USDC"}}
+        pro = {"intent": "buy_token", "entities": {"amount": 0.5, "symbol": "ETH", "currency": "USDC"}}
+        _, nlp, buy, stats = await self._speculative_buy(flash, pro, mode="validate")
+
+        self.assertEqual(buy.call_args.args[2], pro["entities"])
+        self.assertEqual(nlp.aparse_intent.call_count, 2)
+        self.assertEqual(stats["rejected_reasons"], {"bad_amount": 1})
+
+    async def test_validate_mode_skips_pro_for_valid_trades(self):
+        flash = {"intent": "buy_token", "entities": {"amount": 1, "symbol": "ETH", "currency": "USDC"}}
+        _, nlp, buy, stats = await self._speculative_buy(flash, None, mode="validate")
+
+        nlp.aparse_intent.assert_called_once()
+        self.assertEqual(buy.call_args.args[2], dict(flash["entities"], amount="1"))
+        self.assertEqual(stats["accepted"], 1)
+
+    @patch('src.main.buy_token_intent', new_callable=AsyncMock)
+    @patch('src.main.nlp_client', spec=NLPClient)
+    async def test_handle_text_structured_buy_skips_llm(self, mock_nlp_client, mock_buy_token_intent):
+        """A fully specified trade is parsed locally and never reaches Gemini."""
+        update, context = await self._create_update_context("Buy 0.1 ETH with USDC on arbitrum")
+        mock_buy_token_intent.return_value = AWAIT_CONFIRMATION
+
+        result = await handle_text(update, context)
+
+        mock_nlp_client.aparse_intent.assert_not_called()
+        mock_buy_token_intent.assert_called_once_with(update, context, {
+            "amount": 0.1, "symbol": "ETH", "currency": "USDC",
+            "source_chain": "arbitrum", "destination_chain": "arbitrum",
+        })
+        self.assertEqual(result, AWAIT_CONFIRMATION)
+
+    @patch('src.main.intent_classifier')
+    @patch('src.main.insights')
+    @patch('src.main.nlp_client', spec=NLPClient)
+    async def test_handle_text_confident_classifier_skips_llm(self, mock_nlp_client, mock_insights, mock_classifier):
+        """A confident entity-free label from the local classifier is acted on without Gemini."""
+        update, context = await self._create_update_context("anything interesting in the market for me today?")
+        mock_classifier.classify.return_value = "get_insights"
+
+        result = await handle_text(update, context)
+
+        mock_nlp_client.aparse_intent.assert_not_called()
         mock_insights.assert_called_once_with(update, context)
         self.assertEqual(result, ConversationHandler.END)
 
+    @patch('src.main.insights_client')
+    async def test_insights_served_from_cache_with_freshness(self, mock_insights_client):
+        """A precomputed insight is sent at once, labelled with its age, without generating."""
+        from src.main import insights
+        from src.insights_cache import CachedInsight
+        update, context = await self._create_update_context()
+        cached = CachedInsight(text="ETH looks steady.", portfolio_hash="h", market_epoch=1, generated_at=time.time() - 600)
+        mock_insights_client.aget_insights = AsyncMock(return_value=cached)
+
+        await insights(update, context)
+
+        mock_insights_client.aget_insights.assert_awaited_once_with(123, generate=False)
+        update.message.reply_text.assert_awaited_once_with("ETH looks steady.\n\n🕒 generated 10 min ago")
+
+    @patch('src.main.rebalance_portfolio_start', new_callable=AsyncMock)
+    @patch('src.main.nlp_client', spec=NLPClient)
+    async def test_handle_text_negated_command_goes_to_flash(self, mock_nlp_client, mock_rebalance):
+        """The classifier never answers "don't rebalance ..." with a rebalance; Flash reads it."""
+        from src.intent_classifier import IntentClassifier, load_corpus
+        update, context = await self._create_update_context("don't rebalance my portfolio")
+        mock_nlp_client.aparse_intent.return_value = {"intent": "unknown", "entities": {}}
+
+        with patch('src.main.intent_classifier', IntentClassifier().fit(load_corpus())):
+            await handle_text(update, context)
+
+        mock_nlp_client.aparse_intent.assert_called_once_with("don't rebalance my portfolio", model_type='flash')
+        mock_rebalance.assert_not_called()
+
+    async def test_handle_text_classified_trade_uses_validated_flash_parse(self):
+        """A trade the classifier predicts still goes through Flash and is used once it validates."""
+        from src import main
+        update, context = await self._create_update_context("offload half an eth into usdc")
+        resolver = MagicMock()
+        resolver.get_token_info.side_effect = lambda s, chain_id=1: {"address": s, "decimals": 18} if s in ("ETH", "USDC") else None
+        flash = {"intent": "sell_token", "entities": {"amount": "0.5", "symbol": "ETH", "currency": "USDC"}}
+        with patch.object(main, 'intent_classifier') as classifier, \
+                patch.object(main, 'nlp_client', spec=NLPClient) as nlp, \
+                patch.object(main, 'token_resolver', resolver), \
+                patch.object(main.speculative_parse, 'SPECULATIVE_PARSE_MODE', "validate"), \
+                patch.object(main, 'sell_token_intent', new_callable=AsyncMock) as sell:
+            classifier.classify.return_value = "sell_token"
+            nlp.aparse_intent.return_value = flash
+            sell.return_value = ConversationHandler.END
+            await handle_text(update, context)
+            await asyncio.gather(*list(main._background_tasks))
+
+        nlp.aparse_intent.assert_called_once_with("offload half an eth into usdc", model_type='flash')
+        sell.assert_called_once_with(update, context, flash["entities"])
+
     @patch('src.main.set_default_wallet_start')
-    @patch('src.main.nlp_client')
+    @patch('src.main.nlp_client', spec=NLPClient)
     async def test_handle_text_set_default_wallet(self, mock_nlp_client, mock_set_default_wallet_start):
         """Test that 'set_default_wallet' intent calls the correct handler."""
         # Arrange
         update, context = await self._create_update_context("set my default wallet")
-        mock_nlp_client.parse_intent.return_value = {"intent": "set_default_wallet", "entities": {}}
+        mock_nlp_client.aparse_intent.return_value = {"intent": "set_default_wallet", "entities": {}}
         mock_set_default_wallet_start.return_value = AWAIT_WALLET_SELECTION
 
         # Act
         result = await handle_text(update, context)
 
         # Assert
-        mock_nlp_client.parse_intent.assert_called_once_with("set my default wallet", model_type='flash')
+        mock_nlp_client.aparse_intent.assert_not_called()  # resolved by the local grammar
         mock_set_default_wallet_start.assert_called_once_with(update, context)
         self.assertEqual(result, AWAIT_WALLET_SELECTION)
 
     @patch('src.main.enable_live_trading_start')
-    @patch('src.main.nlp_client')
+    @patch('src.main.nlp_client', spec=NLPClient)
     async def test_handle_text_enable_live_trading(self, mock_nlp_client, mock_enable_live_trading_start):
         """Test that 'enable_live_trading' intent calls the correct handler."""
         # Arrange
         update, context = await self._create_update_context("enable live trading")
-        mock_nlp_client.parse_intent.return_value = {"intent": "enable_live_trading", "entities": {}}
+        mock_nlp_client.aparse_intent.return_value = {"intent": "enable_live_trading", "entities": {}}
         mock_enable_live_trading_start.return_value = AWAIT_LIVE_TRADING_CONFIRMATION
 
         # Act
         result = await handle_text(update, context)
 
         # Assert
-        mock_nlp_client.parse_intent.assert_called_once_with("enable live trading", model_type='flash')
+        mock_nlp_client.aparse_intent.assert_not_called()  # resolved by the local grammar
         mock_enable_live_trading_start.assert_called_once_with(update, context)
         self.assertEqual(result, AWAIT_LIVE_TRADING_CONFIRMATION)
 
@@ -264,9 +454,9 @@ class TestMainHandlers(unittest.IsolatedAsyncioTestCase):
         self.assertIn("web_app", kwargs['reply_markup'].inline_keyboard[0][0].to_dict())
         self.assertEqual(result, 9) # AWAIT_WEB_APP_DATA
 
-    @patch('src.database.get_db_connection')
+    @patch('src.database.db_connection')
     @patch('src.main.encrypt_data', return_value=b"encrypted_key")
-    async def test_received_private_key_saves_wallet(self, mock_encrypt, mock_get_conn):
+    async def test_received_private_key_saves_wallet(self, mock_encrypt, mock_db_connection):
         """Test that received_private_key saves the wallet."""
         # Arrange
         update, context = await self._create_update_context()
@@ -278,7 +468,7 @@ class TestMainHandlers(unittest.IsolatedAsyncioTestCase):
         
         mock_conn, mock_cur = self._mock_db()
         mock_cur.fetchone.return_value = (1,) # User ID
-        mock_get_conn.return_value = mock_conn
+        mock_db_connection.return_value.__enter__.return_value = mock_conn
 
         # Act
         result = await received_private_key(update, context)
@@ -356,12 +546,12 @@ class TestLiveTradingSettings(unittest.IsolatedAsyncioTestCase):
         conn.cursor.return_value.__enter__.return_value = cur
         return conn, cur
 
-    @patch('src.main.get_db_connection')
-    async def test_set_default_wallet_start(self, mock_get_conn):
+    @patch('src.repository.db_connection')
+    async def test_set_default_wallet_start(self, mock_db_connection):
         """Test starting the set default wallet conversation."""
         update, context = await self._create_update_context()
         mock_conn, mock_cur = self._mock_db()
-        mock_get_conn.return_value = mock_conn
+        mock_db_connection.return_value.__enter__.return_value = mock_conn
         mock_cur.fetchone.return_value = (1,)  # User ID
         mock_cur.fetchall.return_value = [(1, "My Wallet", "0x123...abc")]
 
@@ -371,8 +561,8 @@ class TestLiveTradingSettings(unittest.IsolatedAsyncioTestCase):
         self.assertIn("Which wallet would you like to set as your default", update.message.reply_text.call_args.args[0])
         self.assertEqual(result, AWAIT_WALLET_SELECTION)
 
-    @patch('src.main.get_db_connection')
-    async def test_set_default_wallet_callback(self, mock_get_conn):
+    @patch('src.repository.db_connection')
+    async def test_set_default_wallet_callback(self, mock_db_connection):
         """Test the callback for setting the default wallet."""
         update, context = await self._create_update_context()
         query = AsyncMock(spec=Update.callback_query)
@@ -382,7 +572,7 @@ class TestLiveTradingSettings(unittest.IsolatedAsyncioTestCase):
         update.callback_query = query
         
         mock_conn, mock_cur = self._mock_db()
-        mock_get_conn.return_value = mock_conn
+        mock_db_connection.return_value.__enter__.return_value = mock_conn
 
         result = await set_default_wallet_callback(update, context)
 
@@ -390,13 +580,13 @@ class TestLiveTradingSettings(unittest.IsolatedAsyncioTestCase):
         query.edit_message_text.assert_called_once_with("✅ Default wallet has been set successfully.")
         self.assertEqual(result, ConversationHandler.END)
 
-    @patch('src.main.get_db_connection')
-    async def test_enable_live_trading_start(self, mock_get_conn):
+    @patch('src.repository.db_connection')
+    async def test_enable_live_trading_start(self, mock_db_connection):
         """Test starting the enable live trading conversation."""
         update, context = await self._create_update_context()
         mock_conn, mock_cur = self._mock_db()
-        mock_get_conn.return_value = mock_conn
-        mock_cur.fetchone.return_value = (1, False) # default_wallet_id, live_trading_enabled
+        mock_db_connection.return_value.__enter__.return_value = mock_conn
+        mock_cur.fetchone.return_value = (False, 1) # live_trading_enabled, default_wallet_id
 
         result = await enable_live_trading_start(update, context)
 
@@ -404,8 +594,8 @@ class TestLiveTradingSettings(unittest.IsolatedAsyncioTestCase):
         self.assertIn("Live trading is currently **disabled**", update.message.reply_text.call_args.args[0])
         self.assertEqual(result, AWAIT_LIVE_TRADING_CONFIRMATION)
 
-    @patch('src.main.get_db_connection')
-    async def test_enable_live_trading_callback(self, mock_get_conn):
+    @patch('src.repository.db_connection')
+    async def test_enable_live_trading_callback(self, mock_db_connection):
         """Test the callback for enabling live trading."""
         update, context = await self._create_update_context()
         query = AsyncMock(spec=Update.callback_query)
@@ -415,7 +605,7 @@ class TestLiveTradingSettings(unittest.IsolatedAsyncioTestCase):
         update.callback_query = query
         
         mock_conn, mock_cur = self._mock_db()
-        mock_get_conn.return_value = mock_conn
+        mock_db_connection.return_value.__enter__.return_value = mock_conn
 
         result = await enable_live_trading_callback(update, context)
 
@@ -423,11 +613,91 @@ class TestLiveTradingSettings(unittest.IsolatedAsyncioTestCase):
         query.edit_message_text.assert_called_once_with("✅ Live trading has been **enabled**.", parse_mode='Markdown')
         self.assertEqual(result, ConversationHandler.END)
 
+class TestRebalanceFlow(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.app = Application.builder().token("test-token").build()
+        self.legs = [
+            {"from": "ETH", "to": "USDC", "from_amount": 0.1, "usd_amount": 200.0, "est_cost_usd": 1.6},
+            {"from": "ETH", "to": "LINK", "from_amount": 0.05, "usd_amount": 100.0, "est_cost_usd": 0.8},
+            {"from": "BTC", "to": "USDC", "from_amount": 0.001, "usd_amount": 60.0, "est_cost_usd": 0.48},
+        ]
+
+    def _context(self):
+        return ContextTypes.DEFAULT_TYPE(application=self.app, chat_id=123, user_id=123)
+
+    def _resolver(self):
+        resolver = MagicMock()
+        resolver.get_token_info.side_effect = lambda sym, chain_id=1: {"address": f"0x{sym}", "decimals": 6}
+        return resolver
+
+    @patch('src.main.schedule_state_timeout')
+    @patch('src.main.repository.run', new_callable=AsyncMock)
+    @patch('src.main.okx_client')
+    async def test_start_quotes_all_legs_and_asks_once(self, mock_okx_client, mock_run, _):
+        from src import main
+        mock_run.return_value = [dict(leg) for leg in self.legs]
+        mock_okx_client.get_live_quote = AsyncMock(side_effect=[
+            {"success": True, "data": {"toTokenAmount": "200000000"}},
+            {"success": True, "data": {"toTokenAmount": "7000000"}},
+            {"success": False, "error": "no route"},
+        ])
+        update = MagicMock(spec=Update)
+        update.effective_user = User(id=123, first_name="Test", is_bot=False)
+        update.message = MagicMock()
+        update.message.reply_text = AsyncMock()
+        context = self._context()
+
+        with patch('src.main.token_resolver', self._resolver()):
+            state = await main.rebalance_portfolio_start(update, context)
+
+        self.assertEqual(state, main.AWAIT_REBALANCE_CONFIRMATION)
+        self.assertEqual(mock_okx_client.get_live_quote.await_count, 3)
+        self.assertEqual(len(context.user_data['rebalance_plan']), 2)  # unquoted leg dropped
+        summary = update.message.reply_text.call_args
+        self.assertIn("1 trade(s) skipped", summary.args[0])
+        self.assertIsNotNone(summary.kwargs.get('reply_markup'))
+
+    @patch('src.main.REBALANCE_STATUS_EDIT_SECS', 0)
+    @patch('src.main.repository.get_user_settings', new_callable=AsyncMock, return_value=None)
+    @patch('src.main.okx_client')
+    async def test_confirm_executes_legs_and_streams_status(self, mock_okx_client, _):
+        from src import main
+        legs = [dict(leg, quote={"success": True, "from_token_address": f"0x{leg['from']}",
+                                 "to_token_address": f"0x{leg['to']}", "amount_in_smallest_unit": "1", "to_amount": 1.0})
+                for leg in self.legs]
+        mock_okx_client.execute_swap = AsyncMock(side_effect=[
+            {"success": True, "data": {"toTokenAmount": "199000000"}},
+            {"success": True, "data": {"toTokenAmount": "59000000"}},
+            {"success": False, "error": "slippage"},
+        ])
+        update = MagicMock(spec=Update)
+        update.effective_user = User(id=123, first_name="Test", is_bot=False)
+        update.callback_query = MagicMock()
+        update.callback_query.answer = AsyncMock()
+        update.callback_query.edit_message_text = AsyncMock()
+        context = self._context()
+        context.user_data['rebalance_plan'] = legs
+
+        with patch('src.main.token_resolver', self._resolver()):
+            state = await main.confirm_rebalance(update, context)
+
+        self.assertEqual(state, ConversationHandler.END)
+        self.assertEqual(mock_okx_client.execute_swap.await_count, 3)
+        self.assertTrue(all(c.kwargs['dry_run'] for c in mock_okx_client.execute_swap.await_args_list))
+        final = update.callback_query.edit_message_text.call_args.kwargs['text']
+        self.assertIn("[DRY RUN] Rebalance finished – 3/3", final)
+        self.assertEqual(final.count("✅"), 2)
+        self.assertIn("❌", final)
+        self.assertGreater(update.callback_query.edit_message_text.await_count, 2)  # streamed, one message
+        self.assertNotIn('rebalance_plan', context.user_data)
+
+
 class TestConfirmSwap(unittest.IsolatedAsyncioTestCase):
 
     @patch('src.main.token_resolver', new_callable=MagicMock)
-    @patch('src.main.get_db_connection')
-    def setUp(self, mock_get_conn, mock_token_resolver):
+    @patch('src.main.db_connection')
+    def setUp(self, mock_db_connection, mock_token_resolver):
         """Set up a basic test environment and initialize the database."""
         self.app = Application.builder().token("test-token").build()
         # Ensure the test database has the latest schema
@@ -462,11 +732,11 @@ class TestConfirmSwap(unittest.IsolatedAsyncioTestCase):
         return conn, cur
 
     @patch('src.main.token_resolver', new_callable=MagicMock)
-    @patch('src.main.get_db_connection')
+    @patch('src.repository.db_connection')
     @patch('src.main.okx_client.execute_swap')
     @patch('src.main.decrypt_data', return_value="decrypted_key")
     @patch('src.main.DRY_RUN_MODE', False)
-    async def test_confirm_swap_live_trade(self, mock_decrypt, mock_execute_swap, mock_get_conn, mock_token_resolver):
+    async def test_confirm_swap_live_trade(self, mock_decrypt, mock_execute_swap, mock_db_connection, mock_token_resolver):
         """Test confirm_swap executes a live trade when conditions are met."""
         # Arrange
         mock_token_resolver.get_token_info.return_value = {'decimals': 18}
@@ -483,7 +753,7 @@ class TestConfirmSwap(unittest.IsolatedAsyncioTestCase):
         }
         
         mock_conn, mock_cur = self._mock_db()
-        mock_get_conn.return_value = mock_conn
+        mock_db_connection.return_value.__enter__.return_value = mock_conn
         # Simulate live trading enabled and default wallet set
         mock_cur.fetchone.side_effect = [
             (True, 1), # user_settings
@@ -507,10 +777,10 @@ class TestConfirmSwap(unittest.IsolatedAsyncioTestCase):
         self.assertIn("LIVE", final_call.kwargs.get('text', ''))
 
     @patch('src.main.token_resolver', new_callable=MagicMock)
-    @patch('src.main.get_db_connection')
+    @patch('src.repository.db_connection')
     @patch('src.main.okx_client.execute_swap')
     @patch('src.main.DRY_RUN_MODE', False)
-    async def test_confirm_swap_dry_run_when_live_disabled(self, mock_execute_swap, mock_get_conn, mock_token_resolver):
+    async def test_confirm_swap_dry_run_when_live_disabled(self, mock_execute_swap, mock_db_connection, mock_token_resolver):
         """Test confirm_swap performs a dry run when live trading is disabled."""
         # Arrange
         mock_token_resolver.get_token_info.return_value = {'decimals': 18}
@@ -527,7 +797,7 @@ class TestConfirmSwap(unittest.IsolatedAsyncioTestCase):
         }
         
         mock_conn, mock_cur = self._mock_db()
-        mock_get_conn.return_value = mock_conn
+        mock_db_connection.return_value.__enter__.return_value = mock_conn
         # Simulate live trading disabled
         mock_cur.fetchone.return_value = (False, 1)
         
@@ -546,10 +816,10 @@ class TestConfirmSwap(unittest.IsolatedAsyncioTestCase):
         self.assertIn("DRY RUN", final_call.kwargs.get('text', ''))
 
     @patch('src.main.token_resolver', new_callable=MagicMock)
-    @patch('src.main.get_db_connection')
+    @patch('src.repository.db_connection')
     @patch('src.main.okx_client.execute_swap')
     @patch('src.main.DRY_RUN_MODE', True)
-    async def test_confirm_swap_respects_dry_run_mode(self, mock_execute_swap, mock_get_conn, mock_token_resolver):
+    async def test_confirm_swap_respects_dry_run_mode(self, mock_execute_swap, mock_db_connection, mock_token_resolver):
         """Test that confirm_swap passes the DRY_RUN_MODE constant to execute_swap."""
         # Arrange
         mock_token_resolver.get_token_info.return_value = {'decimals': 18}
@@ -566,10 +836,11 @@ class TestConfirmSwap(unittest.IsolatedAsyncioTestCase):
         }
         
         mock_conn, mock_cur = self._mock_db()
-        mock_get_conn.return_value = mock_conn
+        mock_db_connection.return_value.__enter__.return_value = mock_conn
         # Simulate live trading enabled and default wallet set
         mock_cur.fetchone.side_effect = [
             (True, 1), # user_settings
+            ("0xLiveWallet", b"encrypted_key") # wallet_data
         ]
         
         mock_execute_swap.return_value = {"success": True, "data": {"toTokenAmount": "100000000000000000"}}
@@ -584,9 +855,9 @@ class TestConfirmSwap(unittest.IsolatedAsyncioTestCase):
         final_call = query.edit_message_text.call_args_list[-1]
         self.assertIn("DRY RUN", final_call.kwargs.get('text', ''))
 
-    @patch('src.main.get_db_connection')
+    @patch('src.repository.db_connection')
     @patch('src.main.okx_client.execute_swap')
-    async def test_confirm_swap_no_default_wallet(self, mock_execute_swap, mock_get_conn):
+    async def test_confirm_swap_no_default_wallet(self, mock_execute_swap, mock_db_connection):
         """Test confirm_swap when live trading is enabled but no default wallet is set."""
         # Arrange
         update, context = await self._create_update_context()
@@ -602,7 +873,7 @@ class TestConfirmSwap(unittest.IsolatedAsyncioTestCase):
         }
         
         mock_conn, mock_cur = self._mock_db()
-        mock_get_conn.return_value = mock_conn
+        mock_db_connection.return_value.__enter__.return_value = mock_conn
         # Simulate live trading enabled but no default wallet
         mock_cur.fetchone.return_value = (True, None)
 
@@ -613,9 +884,9 @@ class TestConfirmSwap(unittest.IsolatedAsyncioTestCase):
         mock_execute_swap.assert_not_called()
         query.edit_message_text.assert_called_once_with("Live trading is enabled, but you have not set a default wallet. Please use /setdefaultwallet.")
 
-    @patch('src.main.get_db_connection')
+    @patch('src.repository.db_connection')
     @patch('src.main.okx_client.execute_swap')
-    async def test_confirm_swap_wallet_not_found(self, mock_execute_swap, mock_get_conn):
+    async def test_confirm_swap_wallet_not_found(self, mock_execute_swap, mock_db_connection):
         """Test confirm_swap when the default wallet is not found in the database."""
         # Arrange
         update, context = await self._create_update_context()
@@ -631,7 +902,7 @@ class TestConfirmSwap(unittest.IsolatedAsyncioTestCase):
         }
         
         mock_conn, mock_cur = self._mock_db()
-        mock_get_conn.return_value = mock_conn
+        mock_db_connection.return_value.__enter__.return_value = mock_conn
         # Simulate live trading enabled, default wallet set, but wallet not found
         mock_cur.fetchone.side_effect = [
             (True, 1), # user_settings
@@ -0,0 +1,132 @@
+import asyncio
+import unittest
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from conftest import FakeClock
+from src.alert_index import alert_index
+from src.market_data import MarketDataService, trend_of
+
+TOKENS = {
+    "ETH": {"address": "0xeth", "decimals": 18},
+    "WBTC": {"address": "0xwbtc", "decimals": 8},
+    "PEPE": {"address": "0xpepe", "decimals": 18},
+    "USDT": {"address": "0xusdt", "decimals": 6},
+}
+PRICES = {"0xeth": 3000, "0xwbtc": 60000, "0xpepe": 0.00001}
+
+
+class TestMarketDataService(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        alert_index.reset()
+        self.clock = FakeClock(1_700_000_000.0)
+        self.okx = MagicMock()
+        self.okx.get_live_quote = AsyncMock(side_effect=self._quote)
+        self.references = MagicMock(return_value={"ETH": Decimal("2900"), "WBTC": Decimal("60100")})
+        self.service = MarketDataService(
+            okx_client=self.okx,
+            reference_prices=self.references,
+            held_symbols=AsyncMock(return_value=["pepe"]),
+            resolve_token=TOKENS.get,
+            max_age_secs=120,
+            reference_refresh_secs=900,
+            clock=self.clock,
+        )
+
+    async def _quote(self, from_token_address, to_token_address, amount):
+        price = PRICES.get(from_token_address)
+        if price is None:
+            return {"success": False, "error": "no route"}
+        return {"success": True, "data": {"toTokenAmount": str(int(price * 10**6))}}
+
+    async def test_refresh_publishes_prices_and_24h_trend(self):
+        snapshot = await self.service.refresh()
+
+        self.assertEqual(snapshot.version, 1)
+        eth = snapshot.get("eth")
+        self.assertEqual(eth.price, 3000)
+        self.assertAlmostEqual(eth.change_24h_pct, 3.448, places=3)
+        self.assertEqual(eth.trend, "up")
+        self.assertEqual(snapshot.get("WBTC").trend, "flat")
+        # Held symbol without candles: priced, trend unknown
+        self.assertEqual(snapshot.as_dict()["PEPE"]["trend"], "unknown")
+        self.assertIsNone(snapshot.get("USDT"))
+
+    async def test_tracks_alert_and_held_symbols(self):
+        alert_index.add(1, 7, "wbtc", 50000.0, "below")
+        await self.service.refresh()
+
+        quoted = {c.kwargs["from_token_address"] for c in self.okx.get_live_quote.call_args_list}
+        self.assertEqual(quoted, {"0xeth", "0xwbtc", "0xpepe"})
+        self.references.assert_called_once_with(["ETH", "PEPE", "WBTC"])
+
+    async def test_upstream_calls_do_not_depend_on_readers(self):
+        await self.service.refresh()
+        for _ in range(100):
+            self.assertEqual(self.service.price("ETH").price, 3000)
+        self.assertEqual(self.okx.get_live_quote.await_count, 3)
+        self.assertEqual(self.service.metrics()["reads"], 100)
+
+    async def test_failed_quote_keeps_last_price_until_stale(self):
+        await self.service.refresh()
+        saved = dict(PRICES)
+        try:
+            del PRICES["0xeth"]
+            self.clock.now += 60
+            snapshot = await self.service.refresh()
+            self.assertEqual(snapshot.get("ETH").price, 3000)
+            self.assertIsNotNone(self.service.price("ETH"))
+
+            self.clock.now += 61
+            self.assertIsNone(self.service.price("ETH"))
+            self.assertEqual(self.service.metrics()["quote_failures"], 1)
+        finally:
+            PRICES.clear()
+            PRICES.update(saved)
+
+    async def test_references_reload_on_their_own_cadence(self):
+        await self.service.refresh()
+        self.clock.now += 30
+        await self.service.refresh()
+        self.assertEqual(self.references.call_count, 1)
+        self.clock.now += 900
+        await self.service.refresh()
+        self.assertEqual(self.references.call_count, 2)
+
+    async def test_concurrency_limit(self):
+        in_flight, peak = [0], [0]
+
+        async def slow_quote(**kwargs):
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+            await asyncio.sleep(0.01)
+            in_flight[0] -= 1
+            return await self._quote(**kwargs)
+
+        self.okx.get_live_quote = AsyncMock(side_effect=slow_quote)
+        self.service.concurrency = 2
+        await self.service.refresh()
+        self.assertEqual(peak[0], 2)
+
+    async def test_start_and_stop(self):
+        self.service.poll_secs = 3600
+        task = self.service.start()
+        self.assertIs(self.service.start(), task)
+        await asyncio.sleep(0.01)
+        self.assertTrue(self.service.metrics()["running"])
+        await self.service.stop()
+        self.assertEqual(self.service.metrics()["polls"], 1)
+
+
+class TestTrend(unittest.TestCase):
+
+    def test_trend_of(self):
+        self.assertEqual(trend_of(1.2, flat_pct=0.5), "up")
+        self.assertEqual(trend_of(-0.7, flat_pct=0.5), "down")
+        self.assertEqual(trend_of(0.3, flat_pct=0.5), "flat")
+        self.assertEqual(trend_of(None), "unknown")
+
+
+if __name__ == '__main__':
+    unittest.main()
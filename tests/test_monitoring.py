@@ -1,51 +1,198 @@
 import unittest
-from unittest.mock import patch, MagicMock, AsyncMock
+from unittest.mock import patch, MagicMock, AsyncMock, PropertyMock
 import asyncio
 
-from src.monitoring import sync_all_portfolios, check_alerts
+from src import monitoring
+from src.monitoring import sync_all_portfolios, check_alerts, _sync_user, precompute_insights
+from src.alert_index import alert_index
 
 class TestMonitoring(unittest.IsolatedAsyncioTestCase):
 
-    @patch('src.monitoring.portfolio_service')
-    @patch('src.monitoring.get_db_connection')
-    async def test_sync_all_portfolios(self, mock_get_conn, mock_portfolio_service):
-        # Mock DB to return two users
-        conn = MagicMock()
-        cur = MagicMock()
-        cur.fetchall.return_value = [(1, 111), (2, 222)]
-        conn.cursor.return_value.__enter__.return_value = cur
-        mock_get_conn.return_value = conn
+    def setUp(self):
+        alert_index.reset()
+        monitoring._pending_deactivations.clear()
 
-        mock_portfolio_service.sync_balances.return_value = True
+    @patch('src.monitoring.sync_scheduler')
+    async def test_sync_all_portfolios(self, mock_scheduler):
+        mock_scheduler.run_pass = AsyncMock()
 
         await sync_all_portfolios()
 
-        # Ensure sync_balances called for both users
-        calls = [c.args[0] for c in mock_portfolio_service.sync_balances.call_args_list]
-        self.assertListEqual(calls, [111, 222])
+        mock_scheduler.run_pass.assert_awaited_once()
+
+    @patch('src.monitoring.portfolio_service')
+    def test_sync_user_records_snapshot(self, mock_portfolio_service):
+        mock_portfolio_service.sync_balances.return_value = True
+
+        self.assertTrue(_sync_user(111))
+
+        mock_portfolio_service.sync_balances.assert_called_once_with(111, record_snapshot=True, incremental=True)
+
+    @patch('src.monitoring._get_insights_client')
+    @patch('src.monitoring.repository.active_users', new_callable=AsyncMock)
+    @patch('src.monitoring.portfolio_service')
+    async def test_precompute_insights_for_active_synced_users(self, mock_portfolio_service, mock_active_users, mock_get_client):
+        mock_portfolio_service.sync_balances.side_effect = lambda telegram_id, **kwargs: telegram_id != 333
+        mock_active_users.return_value = [111]
+        mock_get_client.return_value.precompute = AsyncMock(return_value=1)
+        monitoring._synced_users.clear()
+        for telegram_id in (111, 222, 333):
+            _sync_user(telegram_id)
+
+        self.assertEqual(await precompute_insights(), 1)
+
+        self.assertEqual(sorted(mock_active_users.call_args.args[0]), [111, 222])
+        mock_get_client.return_value.precompute.assert_awaited_once_with([111], monitoring.INSIGHTS_PRECOMPUTE_CONCURRENCY)
+        self.assertEqual(monitoring._synced_users, set())
+        self.assertEqual(await precompute_insights(), 0)  # nothing synced since
 
+    @patch('src.monitoring.market_data')
     @patch('src.monitoring.bot', new_callable=AsyncMock)
     @patch('src.monitoring.okx_client')
-    @patch('src.monitoring.get_db_connection')
-    async def test_check_alerts_trigger(self, mock_get_conn, mock_okx_client, mock_bot):
+    async def test_check_alerts_uses_market_snapshot(self, mock_okx_client, mock_bot, mock_market_data):
+        """A fresh snapshot price triggers alerts without any live quote."""
+        alert_index.load([(1, 123, 'ETH', 2000.0, 'below')])
+        mock_market_data.price.return_value = MagicMock(price=1900.0)
+        mock_okx_client.get_live_quote = AsyncMock()
+
+        with patch('src.monitoring.db_connection') as mock_db_connection:
+            conn = MagicMock()
+            mock_db_connection.return_value.__enter__.return_value = conn
+            await check_alerts()
+
+        mock_okx_client.get_live_quote.assert_not_awaited()
+        mock_bot.send_message.assert_awaited_once()
+        self.assertIn("$1900.00", mock_bot.send_message.call_args.kwargs["text"])
+
+    @patch('src.monitoring.bot', new_callable=AsyncMock)
+    @patch('src.monitoring.okx_client')
+    @patch('src.monitoring.db_connection')
+    async def test_check_alerts_trigger(self, mock_db_connection, mock_okx_client, mock_bot):
         """Test that an alert is triggered and the user is notified."""
         # Mock DB to return one active alert
         conn = MagicMock()
         cur = MagicMock()
         cur.fetchall.return_value = [(1, 123, 'ETH', 2000.0, 'below')]
         conn.cursor.return_value.__enter__.return_value = cur
-        mock_get_conn.return_value = conn
+        mock_db_connection.return_value.__enter__.return_value = conn
 
         # Mock OKX client to return a price that triggers the alert
-        mock_okx_client.get_live_quote.return_value = {
+        mock_okx_client.get_live_quote = AsyncMock(return_value={
             "success": True,
             "data": {"toTokenAmount": "1900000000"} # 1900 USDT
-        }
+        })
 
         await check_alerts()
 
         # Verify that the bot sent a message
         mock_bot.send_message.assert_awaited_once()
         # Verify that the alert was deactivated
-        cur.execute.assert_any_call("UPDATE alerts SET is_active = FALSE WHERE id = %s;", (1,))
+        cur.execute.assert_any_call("UPDATE alerts SET is_active = FALSE WHERE id = ANY(%s);", ([1],))
+        conn.commit.assert_called_once()
+        self.assertEqual(len(alert_index), 0)
+
+    @patch('src.monitoring.asyncio.sleep', new_callable=AsyncMock)
+    @patch('src.monitoring.bot', new_callable=AsyncMock)
+    @patch('src.monitoring.okx_client')
+    @patch('src.monitoring.db_connection')
+    async def test_check_alerts_one_quote_per_symbol(self, mock_db_connection, mock_okx_client, mock_bot, mock_sleep):
+        """Alerts are grouped by symbol and deactivated in a single batched UPDATE."""
+        conn = MagicMock()
+        cur = MagicMock()
+        cur.fetchall.return_value = [
+            (1, 11, 'ETH', 2000.0, 'below'),   # fires
+            (2, 12, 'eth', 1800.0, 'below'),   # not crossed
+            (3, 13, 'ETH', 1500.0, 'above'),   # fires
+            (4, 14, 'BTC', 50000.0, 'above'),  # not crossed
+            (5, 15, 'DOGE', 1.0, 'above'),     # unknown symbol, skipped
+        ]
+        conn.cursor.return_value.__enter__.return_value = cur
+        mock_db_connection.return_value.__enter__.return_value = conn
+
+        async def quote(from_token_address, to_token_address, amount):
+            usdt = "1900000000" if amount == str(10**18) else "40000000000"
+            return {"success": True, "data": {"toTokenAmount": usdt}}
+        mock_okx_client.get_live_quote = AsyncMock(side_effect=quote)
+
+        await check_alerts()
+
+        self.assertEqual(mock_okx_client.get_live_quote.await_count, 2)
+        self.assertEqual(mock_bot.send_message.await_count, 2)
+        update_calls = [c for c in cur.execute.call_args_list if c.args[0].startswith("UPDATE")]
+        self.assertEqual(len(update_calls), 1)
+        self.assertCountEqual(update_calls[0].args[1][0], [1, 3])
         conn.commit.assert_called_once()
+
+    @patch('src.monitoring.asyncio.sleep', new_callable=AsyncMock)
+    @patch('src.monitoring.bot', new_callable=AsyncMock)
+    @patch('src.monitoring.okx_client')
+    @patch('src.monitoring.db_connection')
+    async def test_check_alerts_uses_index_between_reloads(self, mock_db_connection, mock_okx_client, mock_bot, mock_sleep):
+        """After the first load the table is not re-read; new alerts arrive via the index."""
+        conn = MagicMock()
+        cur = MagicMock()
+        cur.fetchall.return_value = [(1, 11, 'ETH', 2000.0, 'above')]
+        conn.cursor.return_value.__enter__.return_value = cur
+        mock_db_connection.return_value.__enter__.return_value = conn
+        mock_okx_client.get_live_quote = AsyncMock(return_value={
+            "success": True, "data": {"toTokenAmount": "1900000000"}
+        })
+
+        await check_alerts()
+        alert_index.add(2, 12, 'ETH', 1950.0, 'below')
+        await check_alerts()
+
+        selects = [c for c in cur.execute.call_args_list if c.args[0].startswith("SELECT")]
+        self.assertEqual(len(selects), 1)
+        cur.execute.assert_any_call("UPDATE alerts SET is_active = FALSE WHERE id = ANY(%s);", ([2],))
+        self.assertEqual(len(alert_index), 1)
+
+    @patch('src.monitoring.asyncio.sleep', new_callable=AsyncMock)
+    @patch('src.monitoring.bot', new_callable=AsyncMock)
+    @patch('src.monitoring.okx_client')
+    @patch('src.monitoring.db_connection')
+    async def test_check_alerts_deactivates_notified_alerts_when_scan_fails(self, mock_db_connection, mock_okx_client, mock_bot, mock_sleep):
+        """Alerts notified before the scan broke are still deactivated."""
+        conn = MagicMock()
+        cur = MagicMock()
+        cur.fetchall.return_value = [(1, 11, 'BTC', 50000.0, 'below'), (2, 12, 'ETH', 2000.0, 'below')]
+        conn.cursor.return_value.__enter__.return_value = cur
+        mock_db_connection.return_value.__enter__.return_value = conn
+        mock_okx_client.get_live_quote = AsyncMock(side_effect=[
+            {"success": True, "data": {"toTokenAmount": "40000000000"}},  # BTC fires
+            RuntimeError("connection reset"),  # ETH quote blows up
+        ])
+
+        await check_alerts()
+
+        mock_bot.send_message.assert_awaited_once()
+        cur.execute.assert_any_call("UPDATE alerts SET is_active = FALSE WHERE id = ANY(%s);", ([1],))
+        self.assertEqual(monitoring._pending_deactivations, set())
+
+    @patch('src.monitoring.asyncio.sleep', new_callable=AsyncMock)
+    @patch('src.monitoring.bot', new_callable=AsyncMock)
+    @patch('src.monitoring.okx_client')
+    @patch('src.monitoring.db_connection')
+    async def test_failed_deactivation_is_retried_without_renotifying(self, mock_db_connection, mock_okx_client, mock_bot, mock_sleep):
+        conn = MagicMock()
+        cur = MagicMock()
+        cur.fetchall.return_value = [(1, 11, 'ETH', 2000.0, 'below')]
+        conn.cursor.return_value.__enter__.return_value = cur
+        mock_db_connection.return_value.__enter__.return_value = conn
+        mock_okx_client.get_live_quote = AsyncMock(return_value={
+            "success": True, "data": {"toTokenAmount": "1900000000"}
+        })
+        conn.commit.side_effect = [RuntimeError("db down"), RuntimeError("db down"), None]
+
+        await check_alerts()
+        self.assertEqual(monitoring._pending_deactivations, {1})
+
+        # A reload still sees the alert as active; it is not indexed (or notified) again
+        with patch.object(type(alert_index), 'needs_reload', new_callable=PropertyMock, return_value=True):
+            await check_alerts()
+
+        mock_bot.send_message.assert_awaited_once()
+        updates = [c for c in cur.execute.call_args_list if c.args[0].startswith("UPDATE")]
+        self.assertEqual(len(updates), 3)
+        self.assertEqual(monitoring._pending_deactivations, set())
+        self.assertEqual(len(alert_index), 0)
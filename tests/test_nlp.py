@@ -1,8 +1,10 @@
 import unittest
 from unittest.mock import patch, MagicMock
 import os
+import asyncio
 
 from src.nlp import NLPClient
+from src.intent_cache import IntentCache
 
 class TestNLPClient(unittest.TestCase):
 
@@ -44,6 +46,20 @@ class TestNLPClient(unittest.TestCase):
         MockGenerativeModel.assert_called_once_with('gemini-2.5-pro')
         self.assertEqual(result, {"intent": "buy_token"})
 
+    @patch('src.nlp.genai.GenerativeModel')
+    def test_repeated_message_uses_intent_cache(self, MockGenerativeModel):
+        """The same phrasing is only sent to Gemini once."""
+        mock_model_instance = MagicMock()
+        mock_model_instance.generate_content.return_value.text = '{"intent": "show_portfolio", "entities": {}}'
+        MockGenerativeModel.return_value = mock_model_instance
+
+        client = NLPClient(cache=IntentCache(ttl_secs=60, persist=False))
+        client.parse_intent("what do i hold", model_type='flash')
+        result = client.parse_intent("What do I hold?", model_type='flash')
+
+        self.assertEqual(result["intent"], "show_portfolio")
+        mock_model_instance.generate_content.assert_called_once()
+
     @patch('src.nlp.genai.GenerativeModel')
     def test_lazy_loading(self, MockGenerativeModel):
         """Test that models are only initialized when first used."""
@@ -97,5 +113,17 @@ class TestNLPClient(unittest.TestCase):
             
             self.assertEqual(parsed_intent['intent'], 'get_insights')
 
+    def test_aparse_intent_timeout_returns_unknown(self):
+        """A Gemini call that outlives the executor timeout degrades to 'unknown' and is not cached."""
+        from src.llm_executor import LLMTimeoutError
+        with patch('src.nlp.genai.GenerativeModel'), \
+                patch('src.nlp.llm_executor.run', side_effect=LLMTimeoutError("flash call timed out")):
+            cache = IntentCache(ttl_secs=60, persist=False)
+            client = NLPClient(cache=cache)
+            parsed_intent = asyncio.run(client.aparse_intent("what's going on with my bags"))
+
+        self.assertEqual(parsed_intent, {"intent": "unknown", "entities": {}})
+        self.assertEqual(cache.stats()["size"], 0)
+
 if __name__ == '__main__':
     unittest.main()
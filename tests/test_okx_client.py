@@ -5,15 +5,20 @@ import requests
 from src.okx_client import OKXClient
 from src.constants import DRY_RUN_MODE, OKX_PROJECT_ID
 from src import okx_client as okx_client_module
+from src.quote_cache import quote_cache
 
 class TestOKXClient(unittest.TestCase):
 
+    def setUp(self):
+        # Quotes are cached process-wide; start every test from a cold cache
+        quote_cache.clear()
+
     @patch.dict(os.environ, {
         "OKX_API_KEY": "test_key",
         "OKX_API_SECRET": "test_secret",
         "OKX_API_PASSPHRASE": "test_passphrase"
     })
-    @patch('src.okx_client.requests.get')
+    @patch('src.okx_client.default_transport.get')
     def test_get_live_quote_success(self, mock_get):
         """Test successful fetching of a live swap quote."""
         mock_response = MagicMock()
@@ -44,7 +49,7 @@ class TestOKXClient(unittest.TestCase):
         self.assertTrue(result['success'])
         self.assertEqual(result['status'], 'simulated')
         self.assertEqual(result['data']['toTokenAmount'], '500')
-        mock_get_live_quote.assert_called_once_with("from", "to", "100", 1)
+        mock_get_live_quote.assert_called_once_with("from", "to", "100", 1, use_cache=False)
 
     @patch.object(OKXClient, 'get_live_quote')
     def test_execute_swap_dry_run_quote_fails(self, mock_get_live_quote):
@@ -61,7 +66,7 @@ class TestOKXClient(unittest.TestCase):
         self.assertEqual(result['error'], "Insufficient liquidity")
 
     @patch('src.okx_client.OKXClient.get_live_quote')
-    @patch('src.okx_client.requests.post')
+    @patch('src.okx_client.default_transport.post')
     def test_execute_swap_real_run_success(self, mock_post, mock_get_live_quote):
         """Test a successful real swap execution."""
         mock_get_live_quote.return_value = {"success": True, "data": {}}
@@ -81,7 +86,7 @@ class TestOKXClient(unittest.TestCase):
         mock_post.assert_called_once()
         self.assertEqual(mock_post.call_args.kwargs['json']['privateKey'], "pk_test")
 
-    @patch('src.okx_client.requests.get', side_effect=requests.exceptions.HTTPError("500 Server Error"))
+    @patch('src.okx_client.default_transport.get', side_effect=requests.exceptions.HTTPError("500 Server Error"))
     @patch('src.okx_client.sleep_with_backoff', return_value=None) # Mock backoff sleep to avoid delays
     def test_get_live_quote_retry_logic(self, mock_sleep, mock_get):
         """Test the retry logic for get_live_quote with exponential backoff helper."""
@@ -95,7 +100,7 @@ class TestOKXClient(unittest.TestCase):
         self.assertEqual(mock_sleep.call_count, 3)
 
     @patch('src.okx_client.OKXClient.get_live_quote')
-    @patch('src.okx_client.requests.post', side_effect=requests.exceptions.HTTPError("500 Server Error"))
+    @patch('src.okx_client.default_transport.post', side_effect=requests.exceptions.HTTPError("500 Server Error"))
     @patch('src.okx_client.sleep_with_backoff', return_value=None)
     def test_execute_swap_retry_logic(self, mock_sleep, mock_post, mock_get_live_quote):
         """Test the retry logic for execute_swap with backoff helper."""
@@ -138,7 +143,7 @@ class TestOKXClient(unittest.TestCase):
         "OKX_API_SECRET": "test_secret",
         "OKX_API_PASSPHRASE": "test_passphrase"
     })
-    @patch('src.okx_client.requests.get')
+    @patch('src.okx_client.default_transport.get')
     def test_get_live_quote_with_chain_id(self, mock_get):
         """Test get_live_quote with a specific chainId."""
         mock_response = MagicMock()
@@ -167,7 +172,7 @@ class TestOKXClient(unittest.TestCase):
         client = OKXClient()
         client.execute_swap("from", "to", "100", "wallet_addr", chainId=42, dry_run=True)
 
-        mock_get_live_quote.assert_called_once_with("from", "to", "100", 42)
+        mock_get_live_quote.assert_called_once_with("from", "to", "100", 42, use_cache=False)
 
     @patch('src.okx_client.DRY_RUN_MODE', True)
     @patch.object(OKXClient, 'get_live_quote')
@@ -185,7 +190,7 @@ class TestOKXClient(unittest.TestCase):
 
     @patch('src.okx_client.DRY_RUN_MODE', False)
     @patch('src.okx_client.OKXClient.get_live_quote')
-    @patch('src.okx_client.requests.post')
+    @patch('src.okx_client.default_transport.post')
     def test_execute_swap_respects_dry_run_mode_constant_false(self, mock_post, mock_get_live_quote):
         """Test that execute_swap defaults to DRY_RUN_MODE=False from constants."""
         mock_get_live_quote.return_value = {"success": True, "data": {}}
@@ -217,7 +222,7 @@ class TestOKXClient(unittest.TestCase):
         "OKX_API_SECRET": "test_secret",
         "OKX_API_PASSPHRASE": "test_passphrase"
     })
-    @patch('src.okx_client.requests.get')
+    @patch('src.okx_client.default_transport.get')
     def test_get_historical_price_success(self, mock_get):
         """Test successful fetching of historical price data."""
         mock_response = MagicMock()
@@ -247,7 +252,7 @@ class TestOKXClient(unittest.TestCase):
         "OKX_API_PASSPHRASE": "test_passphrase"
     })
     @patch('src.okx_client.OKX_PROJECT_ID', 'test_project_id')
-    @patch('src.okx_client.requests.get')
+    @patch('src.okx_client.default_transport.get')
     def test_ok_access_project_header(self, mock_get):
         """Test that the OK-ACCESS-PROJECT header is added when OKX_PROJECT_ID is set."""
         mock_response = MagicMock()
@@ -17,7 +17,7 @@ class TestOKXExplorer(unittest.TestCase):
         self.addCleanup(patcher.stop)
         self.explorer = OKXExplorer()
 
-    @patch("src.okx_explorer.requests.get")
+    @patch("src.okx_explorer.default_transport.get")
     def test_get_all_balances_success(self, mock_get):
         mock_resp = MagicMock()
         mock_resp.raise_for_status.return_value = None
@@ -37,7 +37,7 @@ class TestOKXExplorer(unittest.TestCase):
         self.assertEqual(len(result["data"]), 1)
         self.assertEqual(result["data"][0]["tokenAssets"][0]["symbol"], "ETH")
 
-    @patch("src.okx_explorer.requests.get")
+    @patch("src.okx_explorer.default_transport.get")
     def test_get_kline_failure(self, mock_get):
         mock_resp = MagicMock()
         mock_resp.raise_for_status.return_value = None
@@ -59,7 +59,7 @@ class TestOKXExplorer(unittest.TestCase):
         self.assertEqual(res.get("code"), "E_OKX_HTTP")
         self.assertIn("circuit", res)
 
-    @patch("src.okx_explorer.requests.get")
+    @patch("src.okx_explorer.default_transport.get")
     @patch("src.okx_explorer.sleep_with_backoff", return_value=None)
     def test_retry_helper_called(self, mock_sleep, mock_get):
         mock_get.side_effect = requests.exceptions.HTTPError("500")
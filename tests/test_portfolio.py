@@ -1,3 +1,5 @@
+import threading
+import time
 import unittest
 from unittest.mock import patch, MagicMock
 from decimal import Decimal
@@ -14,8 +16,9 @@ class TestPortfolioService(unittest.TestCase):
         conn.cursor.return_value.__enter__.return_value = cur
         return conn, cur
 
-    @patch('src.portfolio.get_db_connection')
-    def test_sync_balances_success(self, mock_get_conn):
+    @patch('src.portfolio.execute_values')
+    @patch('src.portfolio.db_connection')
+    def test_sync_balances_success(self, mock_db_connection, mock_execute_values):
         """
         Verify that sync_balances correctly processes API data and updates the database.
         """
@@ -23,10 +26,10 @@ class TestPortfolioService(unittest.TestCase):
         # Mock the database connection and cursor
         conn, cur = self._mock_db_conn()
         # Simulate resolving telegram_id to user_pk, then finding no portfolio, then getting new ID
-        cur.fetchone.side_effect = [(1,), None, (100,)]
-        # Simulate fetching one wallet for the user
-        cur.fetchall.return_value = [('0xWalletAddress', 1)]  # address, chain_id
-        mock_get_conn.return_value = conn
+        cur.fetchone.side_effect = [(1, None), None, (100,)]
+        # Simulate fetching one wallet for the user, then no stored holdings yet
+        cur.fetchall.side_effect = [[('0xWalletAddress', 1, None)], []]  # address, chain_id, age
+        mock_db_connection.return_value.__enter__.return_value = conn
 
         # Mock the OKX Explorer API client
         explorer = MagicMock()
@@ -51,29 +54,186 @@ class TestPortfolioService(unittest.TestCase):
         self.assertTrue(result)
         # Ensure the API was called with the correct wallet address and chain
         explorer.get_all_balances.assert_called_once_with('0xWalletAddress', chains=['1'])
-        # Check that the holdings were deleted and then the new holding was inserted
+        # The new holding is written in one batched upsert; nothing is stale so nothing is deleted
+        mock_execute_values.assert_called_once()
+        _, sql, rows = mock_execute_values.call_args.args
+        self.assertIn('INSERT INTO holdings', sql)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0][:5], (100, 1, '0xeeee', '0xwalletaddress', 'ETH'))
         delete_call = any('DELETE FROM holdings' in str(call) for call in cur.execute.call_args_list)
-        insert_call = any('INSERT INTO holdings' in str(call) for call in cur.execute.call_args_list)
-        self.assertTrue(delete_call, "DELETE FROM holdings should have been called")
-        self.assertTrue(insert_call, "INSERT INTO holdings should have been called")
+        self.assertFalse(delete_call, "DELETE FROM holdings should not run without stale rows")
+        self.assertEqual(service.last_sync_stats.inserted, 1)
         # Check that the transaction was committed
         conn.commit.assert_called_once()
-        conn.close.assert_called_once()
+        # One checkout to read the wallets, one to write; both returned to the pool
+        self.assertEqual(mock_db_connection.return_value.__exit__.call_count, 2)
 
-    @patch('src.portfolio.get_db_connection')
-    def test_get_snapshot_calculates_correctly(self, mock_get_conn):
+    @patch('src.portfolio.execute_values')
+    @patch('src.portfolio.db_connection')
+    def test_sync_balances_diffs_holdings(self, mock_db_connection, mock_execute_values):
+        """Unchanged rows are skipped, changed rows upserted and vanished rows deleted in one statement."""
+        conn, cur = self._mock_db_conn()
+        cur.fetchone.side_effect = [(1, None), (100,)]
+        stored = [
+            # id, chain_id, token_address, wallet_address, symbol, amount, decimals, value_usd
+            (1, 1, '0xeeee', '0xwallet', 'ETH', Decimal('1500000000000000000'), 18, Decimal('4500.0')),
+            (2, 1, '0xa0b8', '0xwallet', 'USDC', Decimal('1000000'), 6, Decimal('1.0')),
+            (3, 1, '0xdead', '0xwallet', 'DUST', Decimal('1'), 18, Decimal('0')),
+        ]
+        cur.fetchall.side_effect = [[('0xWallet', 1, None)], stored]
+        mock_db_connection.return_value.__enter__.return_value = conn
+
+        explorer = MagicMock()
+        explorer.get_all_balances.return_value = {
+            'success': True,
+            'data': [{
+                "chainIndex": "1",
+                "tokenAssets": [
+                    {'symbol': 'ETH', 'balance': '1.5', 'tokenPrice': '3000.0', 'tokenContractAddress': '0xEEEE'},
+                    {'symbol': 'USDC', 'balance': '2', 'tokenPrice': '1.0', 'tokenContractAddress': '0xA0b8'},
+                    {'symbol': 'DAI', 'balance': '5', 'tokenPrice': '1.0', 'tokenContractAddress': '0x6b17'},
+                ]
+            }]
+        }
+        service = PortfolioService(explorer=explorer)
+
+        self.assertTrue(service.sync_balances(telegram_id=12345))
+
+        stats = service.last_sync_stats
+        self.assertEqual((stats.inserted, stats.updated, stats.deleted, stats.unchanged), (1, 1, 1, 1))
+        cur.execute.assert_any_call("DELETE FROM holdings WHERE id = ANY(%s);", ([3],))
+        rows = mock_execute_values.call_args.args[2]
+        self.assertEqual(sorted(r[4] for r in rows), ['DAI', 'USDC'])
+        conn.commit.assert_called_once()
+
+    @patch('src.portfolio.execute_values')
+    @patch('src.portfolio.db_connection')
+    def test_sync_balances_keeps_holdings_of_failed_wallet(self, mock_db_connection, mock_execute_values):
+        """One failing wallet yields a partial sync; its stored rows are not deleted."""
+        conn, cur = self._mock_db_conn()
+        cur.fetchone.side_effect = [(1, None), (100,)]
+        stored = [
+            (1, 1, '0xeeee', '0xgood', 'ETH', Decimal('1000000000000000000'), 18, Decimal('3000.0')),
+            (2, 1, '0xeeee', '0xbad', 'ETH', Decimal('2000000000000000000'), 18, Decimal('6000.0')),
+        ]
+        cur.fetchall.side_effect = [[('0xGood', 1, None), ('0xBad', 1, None)], stored]
+        mock_db_connection.return_value.__enter__.return_value = conn
+
+        def balances(address, chains):
+            if address == '0xBad':
+                raise ConnectionError("timeout")
+            return {'success': True, 'data': [{"chainIndex": "1", "tokenAssets": [
+                {'symbol': 'ETH', 'balance': '1', 'tokenPrice': '3000.0', 'tokenContractAddress': '0xeeee'},
+            ]}]}
+
+        explorer = MagicMock()
+        explorer.get_all_balances.side_effect = balances
+        service = PortfolioService(explorer=explorer)
+
+        self.assertTrue(service.sync_balances(telegram_id=12345))
+
+        stats = service.last_sync_stats
+        self.assertEqual((stats.inserted, stats.updated, stats.deleted, stats.unchanged), (0, 0, 0, 2))
+        self.assertFalse(any('DELETE FROM holdings' in str(c) for c in cur.execute.call_args_list))
+        mock_execute_values.assert_not_called()
+
+    @patch('src.portfolio.db_connection')
+    def test_sync_balances_fails_when_every_wallet_fails(self, mock_db_connection):
+        conn, cur = self._mock_db_conn()
+        cur.fetchone.side_effect = [(1, None)]
+        cur.fetchall.side_effect = [[('0xA', 1, None), ('0xB', 1, None)]]
+        mock_db_connection.return_value.__enter__.return_value = conn
+
+        explorer = MagicMock()
+        explorer.get_all_balances.return_value = {'success': False, 'error': 'boom'}
+        service = PortfolioService(explorer=explorer)
+
+        self.assertFalse(service.sync_balances(telegram_id=12345))
+        conn.commit.assert_not_called()
+
+    @patch('src.portfolio.execute_values')
+    @patch('src.portfolio.db_connection')
+    def test_incremental_sync_skips_fresh_wallets(self, mock_db_connection, mock_execute_values):
+        """Only wallets older than the max age are fetched; fresh wallets keep their rows."""
+        conn, cur = self._mock_db_conn()
+        # Active user (idle 60s); 0xFresh synced 10s ago, 0xStale an hour ago
+        cur.fetchone.side_effect = [(1, 60.0), (100,)]
+        stored = [
+            (1, 1, '0xeeee', '0xfresh', 'ETH', Decimal('1000000000000000000'), 18, Decimal('3000.0')),
+        ]
+        cur.fetchall.side_effect = [[('0xFresh', 1, 10.0), ('0xStale', 1, 3600.0)], stored]
+        mock_db_connection.return_value.__enter__.return_value = conn
+
+        explorer = MagicMock()
+        explorer.get_all_balances.return_value = {'success': True, 'data': [{"chainIndex": "1", "tokenAssets": [
+            {'symbol': 'DAI', 'balance': '5', 'tokenPrice': '1.0', 'tokenContractAddress': '0x6b17'},
+        ]}]}
+        service = PortfolioService(explorer=explorer)
+
+        self.assertTrue(service.sync_balances(telegram_id=12345, incremental=True))
+
+        explorer.get_all_balances.assert_called_once_with('0xStale', chains=['1'])
+        stats = service.last_sync_stats
+        self.assertEqual((stats.inserted, stats.deleted, stats.unchanged), (1, 0, 1))
+        cur.execute.assert_any_call(
+            "UPDATE wallets SET last_synced_at = CURRENT_TIMESTAMP WHERE user_id = %s AND LOWER(address) = ANY(%s);",
+            (1, ['0xstale']),
+        )
+
+    @patch('src.portfolio.db_connection')
+    def test_incremental_sync_without_stale_wallets_makes_no_calls(self, mock_db_connection):
+        conn, cur = self._mock_db_conn()
+        # Idle user: the longer idle max age applies
+        cur.fetchone.side_effect = [(1, None)]
+        cur.fetchall.side_effect = [[('0xA', 1, 1800.0)]]
+        mock_db_connection.return_value.__enter__.return_value = conn
+        explorer = MagicMock()
+        service = PortfolioService(explorer=explorer)
+
+        self.assertTrue(service.sync_balances(telegram_id=12345, incremental=True))
+
+        explorer.get_all_balances.assert_not_called()
+        conn.commit.assert_not_called()
+
+    @patch('src.portfolio.SYNC_WALLET_CONCURRENCY', 2)
+    def test_wallet_fetches_run_concurrently_in_order(self):
+        """Fetches overlap up to the limit and results come back in wallet order."""
+        lock = threading.Lock()
+        state = {"active": 0, "peak": 0}
+
+        def balances(address, chains):
+            with lock:
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+            time.sleep(0.02)
+            with lock:
+                state["active"] -= 1
+            return {'success': True, 'data': address}
+
+        explorer = MagicMock()
+        explorer.get_all_balances.side_effect = balances
+        service = PortfolioService(explorer=explorer)
+
+        addresses = ['0x1', '0x2', '0x3', '0x4', '0x5']
+        results = service._fetch_wallet_balances(addresses, ['1'])
+
+        self.assertEqual([r['data'] for r in results], addresses)
+        self.assertEqual(state["peak"], 2)
+
+    @patch('src.portfolio.db_connection')
+    def test_get_snapshot_calculates_correctly(self, mock_db_connection):
         """
         Verify that get_snapshot correctly retrieves data and calculates portfolio value.
         """
         # --- Arrange ---
         conn, cur = self._mock_db_conn()
-        # symbol, amount, decimals, value_usd
+        # symbol, amount, decimals, value_usd, seconds since last sync, total, allocation %, past value
         mock_rows = [
-            ('BTC', Decimal('50000000'), 8, Decimal('35000.0')),
-            ('ETH', Decimal('2000000000000000000'), 18, Decimal('6000.0')),
+            ('BTC', Decimal('50000000'), 8, Decimal('35000.0'), 120.0, Decimal('41000.0'), Decimal('85.37'), None),
+            ('ETH', Decimal('2000000000000000000'), 18, Decimal('6000.0'), 120.0, Decimal('41000.0'), Decimal('14.63'), None),
         ]
         cur.fetchall.return_value = mock_rows
-        mock_get_conn.return_value = conn
+        mock_db_connection.return_value.__enter__.return_value = conn
 
         service = PortfolioService(explorer=MagicMock())
 
@@ -90,19 +250,20 @@ class TestPortfolioService(unittest.TestCase):
         self.assertAlmostEqual(snapshot['assets'][0]['quantity'], 0.5)
         # Check if the quantity for ETH was calculated correctly (2.0)
         self.assertAlmostEqual(snapshot['assets'][1]['quantity'], 2.0)
-        conn.close.assert_called_once()
+        self.assertEqual(snapshot['age_secs'], 120.0)
+        mock_db_connection.return_value.__exit__.assert_called_once()  # returned to the pool
 
-    @patch('src.portfolio.get_db_connection')
-    @patch.object(PortfolioService, 'get_snapshot')
-    def test_get_portfolio_performance(self, mock_get_snapshot, mock_get_conn):
+    @patch('src.portfolio.db_connection')
+    def test_get_portfolio_performance(self, mock_db_connection):
         """Test the portfolio performance calculation."""
         # --- Arrange ---
         conn, cur = self._mock_db_conn()
-        mock_get_conn.return_value = conn
+        mock_db_connection.return_value.__enter__.return_value = conn
 
-        # Mock current and past portfolio values
-        mock_get_snapshot.return_value = {"total_value_usd": 1100.0}
-        cur.fetchone.return_value = (Decimal("1000.0"),)
+        # Current holdings and the past value come back from the same query
+        cur.fetchall.return_value = [
+            ('ETH', Decimal('500000000000000000'), 18, Decimal('1100.0'), 60.0, Decimal('1100.0'), Decimal('100'), Decimal('1000.0')),
+        ]
 
         service = PortfolioService()
 
@@ -114,4 +275,38 @@ class TestPortfolioService(unittest.TestCase):
         self.assertAlmostEqual(performance['past_value'], 1000.0)
         self.assertAlmostEqual(performance['absolute_change'], 100.0)
         self.assertAlmostEqual(performance['percentage_change'], 10.0)
-        conn.close.assert_called_once()
+        cur.execute.assert_called_once()  # one round-trip
+        self.assertEqual(cur.execute.call_args.args[1], (12345, 7))
+        mock_db_connection.return_value.__exit__.assert_called_once()  # returned to the pool
+
+    @patch('src.portfolio.db_connection')
+    def test_view_without_holdings_keeps_past_value(self, mock_db_connection):
+        conn, cur = self._mock_db_conn()
+        mock_db_connection.return_value.__enter__.return_value = conn
+        cur.fetchall.return_value = [(None, None, None, None, None, Decimal('0'), Decimal('0'), Decimal('250.0'))]
+
+        view = PortfolioService(explorer=MagicMock()).load_view(telegram_id=1, period_days=30)
+
+        self.assertEqual(view.assets, [])
+        self.assertEqual(view.past_value_usd, Decimal('250.0'))
+        self.assertEqual(view.period_days, 30)
+
+    @patch('src.portfolio.db_connection')
+    def test_analytics_reuse_a_loaded_view(self, mock_db_connection):
+        conn, cur = self._mock_db_conn()
+        mock_db_connection.return_value.__enter__.return_value = conn
+        cur.fetchall.return_value = [
+            ('ETH', Decimal('1000000000000000000'), 18, Decimal('300'), 5.0, Decimal('400'), Decimal('75'), Decimal('200')),
+            ('ETH', Decimal('500000000000000000'), 18, Decimal('100'), 5.0, Decimal('400'), Decimal('25'), Decimal('200')),
+        ]
+        service = PortfolioService(explorer=MagicMock())
+
+        view = service.load_view(telegram_id=1)
+        allocation = service.get_diversification(1, view=view)
+        performance = service.get_portfolio_performance(1, view=view)
+        plan = service.suggest_rebalance(1, target_alloc={'ETH': 100}, view=view)
+
+        self.assertEqual(allocation, {'ETH': 100.0})  # same token in two wallets
+        self.assertAlmostEqual(performance['percentage_change'], 100.0)
+        self.assertEqual(plan, [])
+        self.assertEqual(mock_db_connection.call_count, 1)
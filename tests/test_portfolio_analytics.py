@@ -6,17 +6,17 @@ from src.portfolio import PortfolioService
 
 class TestPortfolioAnalytics(unittest.TestCase):
 
-    @patch('src.portfolio.get_db_connection')
-    def test_diversification(self, mock_get_conn):
+    @patch('src.portfolio.db_connection')
+    def test_diversification(self, mock_db_connection):
         rows = [
-            ('ETH', Decimal('1000000000000000000'), 18, Decimal('2000')),
-            ('USDC', Decimal('1000000'), 6, Decimal('100')),
+            ('ETH', Decimal('1000000000000000000'), 18, Decimal('2000'), 120.0, Decimal('2100'), Decimal('95.238'), None),
+            ('USDC', Decimal('1000000'), 6, Decimal('100'), 120.0, Decimal('2100'), Decimal('4.762'), None),
         ]
         conn = MagicMock()
         cur = MagicMock()
         cur.fetchall.return_value = rows
         conn.cursor.return_value.__enter__.return_value = cur
-        mock_get_conn.return_value = conn
+        mock_db_connection.return_value.__enter__.return_value = conn
 
         svc = PortfolioService(explorer=MagicMock())
         alloc = svc.get_diversification(telegram_id=1)
@@ -24,41 +24,36 @@ class TestPortfolioAnalytics(unittest.TestCase):
         self.assertAlmostEqual(alloc['ETH'], 95.24, places=1)
         self.assertAlmostEqual(alloc['USDC'], 4.76, places=1)
 
-    @patch('src.portfolio.get_db_connection')
-    def test_roi(self, mock_get_conn):
+    @patch('src.portfolio.db_connection')
+    def test_roi(self, mock_db_connection):
         rows = [
-            ('ETH', Decimal('1000000000000000000'), 18, Decimal('2000')),
+            ('ETH', Decimal('1000000000000000000'), 18, Decimal('2000'), 120.0, Decimal('2000'), Decimal('100'), None),
         ]
         conn = MagicMock()
         cur = MagicMock()
         cur.fetchall.return_value = rows
         conn.cursor.return_value.__enter__.return_value = cur
-        mock_get_conn.return_value = conn
+        mock_db_connection.return_value.__enter__.return_value = conn
 
-        explorer = MagicMock()
-        explorer.get_kline.return_value = {
-            'success': True,
-            'data': [
-                {'open': '1500'},  # earliest price 30d ago
-                {'open': '1600'},
-            ]
-        }
-        svc = PortfolioService(explorer=explorer)
+        candles = MagicMock()
+        candles.opening_prices.return_value = {'ETH': Decimal('1500')}  # daily open 30d ago
+        svc = PortfolioService(explorer=MagicMock(), candles=candles)
         roi = svc.get_roi(telegram_id=1, window_days=30)
         # (2000-1500)/1500 = 0.3333
-        self.assertAlmostEqual(roi, 0.3333, places=4) 
+        self.assertAlmostEqual(roi, 0.3333, places=4)
+        candles.opening_prices.assert_called_once_with(['ETH'], bar='1D', bars=30)
 
-    @patch('src.portfolio.get_db_connection')
-    def test_rebalance_suggestion(self, mock_get_conn):
+    @patch('src.portfolio.db_connection')
+    def test_rebalance_suggestion(self, mock_db_connection):
         rows = [
-            ('ETH', Decimal('1500'), 0, Decimal('1500')),
-            ('USDC', Decimal('500'), 0, Decimal('500')),
+            ('ETH', Decimal('1500'), 0, Decimal('1500'), 120.0, Decimal('2000'), Decimal('75'), None),
+            ('USDC', Decimal('500'), 0, Decimal('500'), 120.0, Decimal('2000'), Decimal('25'), None),
         ]
         conn = MagicMock()
         cur = MagicMock()
         cur.fetchall.return_value = rows
         conn.cursor.return_value.__enter__.return_value = cur
-        mock_get_conn.return_value = conn
+        mock_db_connection.return_value.__enter__.return_value = conn
 
         svc = PortfolioService(explorer=MagicMock())
         plan = svc.suggest_rebalance(telegram_id=1, target_alloc={'ETH': 50, 'USDC': 50})
@@ -2,26 +2,26 @@ import unittest
 from unittest.mock import MagicMock
 from decimal import Decimal
 
-from src.portfolio import PortfolioService
+from src.portfolio import PortfolioService, PortfolioView
 
 class TestPortfolioRebalance(unittest.TestCase):
     def test_suggest_rebalance_calculates_from_amount(self):
         # Arrange
         service = PortfolioService()
         
-        # Mock the get_snapshot method to return a predictable portfolio
-        service.get_snapshot = MagicMock(return_value={
-            "total_value_usd": 1000.0,
-            "assets": [
-                {"symbol": "BTC", "quantity": 0.02, "value_usd": 800.0},
-                {"symbol": "ETH", "quantity": 0.1, "value_usd": 200.0},
+        # A predictable, already-loaded portfolio view
+        view = PortfolioView(
+            total_value_usd=Decimal("1000"),
+            assets=[
+                {"symbol": "BTC", "quantity": Decimal("0.02"), "value_usd": Decimal("800"), "allocation_pct": Decimal("80")},
+                {"symbol": "ETH", "quantity": Decimal("0.1"), "value_usd": Decimal("200"), "allocation_pct": Decimal("20")},
             ],
-        })
+        )
         
         target_alloc = {"BTC": 50, "ETH": 50}
 
         # Act
-        plan = service.suggest_rebalance(telegram_id=123, target_alloc=target_alloc)
+        plan = service.suggest_rebalance(telegram_id=123, target_alloc=target_alloc, view=view)
 
         # Assert
         self.assertEqual(len(plan), 1)
@@ -0,0 +1,157 @@
+import asyncio
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, AsyncMock
+
+from conftest import FakeClock
+from src.okx_client import OKXClient, AsyncOKXClient
+from src.quote_cache import QuoteCache
+
+
+OK = {"success": True, "data": {"toTokenAmount": "1"}}
+FAIL = {"success": False, "error": "boom", "code": "E_OKX_HTTP"}
+
+
+class TestQuoteCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = QuoteCache(ttl_secs=5, max_entries=2, clock=self.clock)
+        self.key = QuoteCache.make_key(1, "0xA", "0xB", "100")
+
+    def test_hit_within_ttl_and_refetch_after_expiry(self):
+        fetch = MagicMock(return_value=OK)
+
+        self.assertEqual(self.cache.get_or_fetch(self.key, fetch), OK)
+        self.assertEqual(self.cache.get_or_fetch(self.key, fetch), OK)
+        self.assertEqual(fetch.call_count, 1)
+
+        self.clock.now = 5.0
+        self.cache.get_or_fetch(self.key, fetch)
+        self.assertEqual(fetch.call_count, 2)
+
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 2))
+
+    def test_key_normalizes_address_case(self):
+        self.assertEqual(self.key, QuoteCache.make_key("1", "0xa", "0xb", 100))
+
+    def test_failures_are_not_cached(self):
+        fetch = MagicMock(return_value=FAIL)
+        self.cache.get_or_fetch(self.key, fetch)
+        self.cache.get_or_fetch(self.key, fetch)
+        self.assertEqual(fetch.call_count, 2)
+        self.assertEqual(self.cache.stats()["size"], 0)
+
+    def test_lru_eviction(self):
+        keys = [QuoteCache.make_key(1, "a", "b", str(i)) for i in range(3)]
+        fetch = MagicMock(return_value=OK)
+        self.cache.get_or_fetch(keys[0], fetch)
+        self.cache.get_or_fetch(keys[1], fetch)
+        self.cache.get_or_fetch(keys[0], fetch)  # keys[0] is now most recently used
+        self.cache.get_or_fetch(keys[2], fetch)  # evicts keys[1]
+
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+        self.cache.get_or_fetch(keys[0], fetch)
+        self.assertEqual(fetch.call_count, 3)
+        self.cache.get_or_fetch(keys[1], fetch)
+        self.assertEqual(fetch.call_count, 4)
+
+    def test_concurrent_threads_share_one_fetch(self):
+        release = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            release.wait(2)
+            return OK
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.cache.get_or_fetch(self.key, fetch))) for _ in range(4)]
+        for t in threads:
+            t.start()
+        # Wait until the followers have joined the in-flight call
+        deadline = time.monotonic() + 2
+        while self.cache.stats()["coalesced"] < 3 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        release.set()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [OK] * 4)
+
+
+class TestQuoteCacheAsync(unittest.IsolatedAsyncioTestCase):
+
+    async def test_concurrent_coroutines_share_one_fetch(self):
+        cache = QuoteCache(ttl_secs=5)
+        key = QuoteCache.make_key(1, "a", "b", "1")
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            return OK
+
+        fetch_mock = AsyncMock(side_effect=fetch)
+        results = await asyncio.gather(*[cache.aget_or_fetch(key, fetch_mock) for _ in range(5)])
+
+        self.assertEqual(fetch_mock.await_count, 1)
+        self.assertEqual(results, [OK] * 5)
+        stats = cache.stats()
+        self.assertEqual((stats["misses"], stats["coalesced"]), (1, 4))
+
+    async def test_cancelled_leader_hands_the_fetch_to_a_follower(self):
+        cache = QuoteCache(ttl_secs=5)
+        key = QuoteCache.make_key(1, "a", "b", "1")
+        started = asyncio.Event()
+
+        async def slow_fetch():
+            started.set()
+            await asyncio.sleep(10)
+            return OK
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            return OK
+
+        fetch_mock = AsyncMock(side_effect=fetch)
+        leader = asyncio.create_task(cache.aget_or_fetch(key, slow_fetch))
+        await started.wait()
+        followers = [asyncio.create_task(cache.aget_or_fetch(key, fetch_mock)) for _ in range(3)]
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        self.assertEqual(await asyncio.gather(*followers), [OK] * 3)
+        self.assertTrue(leader.cancelled())
+        self.assertEqual(fetch_mock.await_count, 1)
+
+    async def test_swaps_bypass_cache(self):
+        cache = QuoteCache(ttl_secs=5)
+        client = AsyncOKXClient(quote_cache=cache)
+        client._fetch_live_quote = AsyncMock(return_value=OK)
+
+        await client.get_live_quote("a", "b", "1")
+        await client.execute_swap("a", "b", "1", "wallet", dry_run=True)
+
+        self.assertEqual(client._fetch_live_quote.await_count, 2)
+        self.assertEqual(cache.stats()["hits"], 0)
+
+
+class TestOKXClientCaching(unittest.TestCase):
+
+    def test_repeated_quotes_hit_cache(self):
+        cache = QuoteCache(ttl_secs=5)
+        client = OKXClient(quote_cache=cache)
+        client._fetch_live_quote = MagicMock(return_value=OK)
+
+        client.get_live_quote("a", "b", "1")
+        client.get_live_quote("A", "B", "1")
+        client.get_live_quote("a", "b", "1", chainId=56)
+
+        self.assertEqual(client._fetch_live_quote.call_count, 2)
+        self.assertEqual(cache.stats()["hits"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import time
+import unittest
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock
+
+import asyncio
+
+from src.rebalance import CostModel, execute_legs, plan_rebalance, price_legs
+
+
+def _holdings(values, prices=None):
+    prices = prices or {}
+    return {
+        sym: {"value_usd": Decimal(str(v)), "quantity": Decimal(str(v)) / Decimal(str(prices.get(sym, 1)))}
+        for sym, v in values.items()
+    }
+
+
+class TestPlanRebalance(unittest.TestCase):
+
+    def test_moves_each_dollar_once_across_several_buyers(self):
+        holdings = _holdings({"ETH": 700, "BTC": 100, "USDC": 100, "LINK": 100}, prices={"ETH": 2000})
+        plan = plan_rebalance(holdings, {"ETH": 25, "BTC": 25, "USDC": 25, "LINK": 25}, cost_model=CostModel(0, 0, 0))
+
+        self.assertEqual([leg["from"] for leg in plan], ["ETH"] * 3)
+        self.assertEqual(sorted(leg["to"] for leg in plan), ["BTC", "LINK", "USDC"])
+        self.assertAlmostEqual(sum(leg["usd_amount"] for leg in plan), 450.0)  # minimum notional
+        self.assertAlmostEqual(plan[0]["from_amount"], 150 / 2000)
+
+    def test_tolerance_band_and_dust(self):
+        holdings = _holdings({"ETH": 515, "BTC": 485})
+        self.assertEqual(plan_rebalance(holdings, {"ETH": 50, "BTC": 50}), [])  # 1.5pp off, inside 2pp band
+
+        holdings = _holdings({"ETH": 56, "BTC": 44})
+        self.assertEqual(plan_rebalance(holdings, {"ETH": 50, "BTC": 50}, min_trade_usd=Decimal("10")), [])
+
+    def test_fixed_costs_drop_uneconomic_legs(self):
+        holdings = _holdings({"ETH": 1000, "BTC": 0.0001, "LINK": 0.0001})
+        costly = CostModel(fee_bps=Decimal(30), slippage_bps=Decimal(0), fixed_usd=Decimal(30))
+        plan = plan_rebalance(holdings, {"ETH": 60, "BTC": 38, "LINK": 2}, cost_model=costly, min_trade_usd=Decimal(1))
+
+        # BTC leg (~$380) pays $31.14 (8.2%) and is kept only under a looser cap
+        self.assertEqual(plan, [])
+        plan = plan_rebalance(holdings, {"ETH": 60, "BTC": 38, "LINK": 2}, cost_model=costly,
+                              min_trade_usd=Decimal(1), max_cost_pct=Decimal(10))
+        self.assertEqual([(leg["to"], leg["est_cost_usd"]) for leg in plan], [("BTC", 31.14)])
+
+    def test_buys_assets_not_yet_held(self):
+        plan = plan_rebalance(_holdings({"ETH": 1000}), {"ETH": 50, "USDC": 50})
+        self.assertEqual([(leg["from"], leg["to"], leg["usd_amount"]) for leg in plan], [("ETH", "USDC", 500.0)])
+
+    def test_large_portfolio_is_fast(self):
+        holdings = _holdings({f"T{i}": 10 + (i * 37) % 500 for i in range(500)})
+        started = time.perf_counter()
+        plan = plan_rebalance(holdings, {sym: 1 for sym in holdings})
+        self.assertLess(time.perf_counter() - started, 0.5)
+        self.assertLess(len(plan), len(holdings))
+
+
+class TestPriceLegs(unittest.IsolatedAsyncioTestCase):
+
+    async def test_legs_are_quoted_with_their_result_attached(self):
+        resolver = MagicMock()
+        resolver.get_token_info.side_effect = lambda sym, chain_id=1: (
+            {"address": f"0x{sym}", "decimals": 6} if sym != "NOPE" else None
+        )
+        client = MagicMock()
+        client.get_live_quote = AsyncMock(side_effect=[
+            {"success": True, "data": {"toTokenAmount": "2500000"}},
+            {"success": False, "error": "no route"},
+        ])
+        legs = [
+            {"from": "ETH", "to": "USDC", "from_amount": 1.5},
+            {"from": "BTC", "to": "USDC", "from_amount": 0.1},
+            {"from": "ETH", "to": "NOPE", "from_amount": 1.0},
+        ]
+
+        priced = await price_legs(legs, client, resolver, concurrency=2)
+
+        self.assertEqual(priced[0]["quote"]["to_amount"], 2.5)
+        self.assertEqual(priced[0]["quote"]["amount_in_smallest_unit"], "1500000")
+        self.assertEqual(priced[1]["quote"], {"success": False, "error": "no route"})
+        self.assertFalse(priced[2]["quote"]["success"])
+        self.assertEqual(client.get_live_quote.await_count, 2)
+
+
+class TestExecuteLegs(unittest.IsolatedAsyncioTestCase):
+
+    async def test_bounded_parallelism_and_per_token_ordering(self):
+        legs = [{"from": sym, "to": "USDC"} for sym in ["ETH", "BTC", "ETH", "LINK", "UNI"]]
+        running = {"now": 0, "peak": 0}
+        started = []
+
+        async def execute(leg):
+            running["now"] += 1
+            running["peak"] = max(running["peak"], running["now"])
+            started.append(leg["from"])
+            await asyncio.sleep(0.01)
+            running["now"] -= 1
+            if leg is legs[3]:
+                raise RuntimeError("boom")
+            return {"success": True}
+
+        events = []
+
+        async def on_status(index, state, result):
+            events.append((index, state))
+
+        results = await execute_legs(legs, execute, concurrency=2, on_status=on_status)
+
+        self.assertEqual(running["peak"], 2)
+        self.assertEqual(results[3], {"success": False, "error": "boom"})
+        self.assertTrue(all(r["success"] for i, r in enumerate(results) if i != 3))
+        # The second ETH leg only starts after the first one is done
+        self.assertLess(events.index((0, "done")), events.index((2, "running")))
+
+    async def test_failing_status_callback_does_not_stop_the_legs(self):
+        legs = [{"from": sym, "to": "USDC"} for sym in ["ETH", "ETH", "BTC"]]
+
+        async def execute(leg):
+            return {"success": True}
+
+        async def on_status(index, state, result):
+            if state == "done":
+                raise KeyError("data")
+
+        results = await execute_legs(legs, execute, on_status=on_status)
+
+        self.assertEqual(results, [{"success": True}] * 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import asyncio
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from src import repository
+from src.exceptions import DatabaseConnectionError
+
+
+class TestRepository(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.conn = MagicMock()
+        self.cur = MagicMock()
+        self.conn.cursor.return_value.__enter__.return_value = self.cur
+        patcher = patch('src.repository.db_connection')
+        self.mock_db_connection = patcher.start()
+        self.mock_db_connection.return_value.__enter__.return_value = self.conn
+        self.addCleanup(patcher.stop)
+
+    async def test_queries_run_off_the_event_loop(self):
+        """Cursor work happens on a DB executor thread, not the loop's thread."""
+        seen = []
+        self.cur.execute.side_effect = lambda *args: seen.append(threading.current_thread().name)
+        self.cur.fetchone.return_value = (1,)
+
+        await repository.get_or_create_user(123, "testuser")
+
+        self.assertTrue(seen)
+        self.assertTrue(all(name.startswith("db") for name in seen))
+        self.assertNotIn(threading.current_thread().name, seen)
+
+    async def test_connection_failure_raises(self):
+        self.mock_db_connection.return_value.__enter__.return_value = None
+        with self.assertRaises(DatabaseConnectionError):
+            await repository.list_wallets(123)
+
+    async def test_get_or_create_user_inserts_new_user(self):
+        self.cur.fetchone.return_value = None
+
+        created = await repository.get_or_create_user(123, "testuser")
+
+        self.assertTrue(created)
+        self.cur.execute.assert_called_with(
+            "INSERT INTO users (telegram_id, username) VALUES (%s, %s);", (123, "testuser")
+        )
+        self.conn.commit.assert_called_once()
+
+    async def test_list_wallets_unknown_user(self):
+        self.cur.fetchone.return_value = None
+        self.assertIsNone(await repository.list_wallets(123))
+        self.cur.fetchall.assert_not_called()
+
+    async def test_get_user_settings(self):
+        self.cur.fetchone.return_value = (True, 7)
+        settings = await repository.get_user_settings(123)
+        self.assertEqual(settings, repository.UserSettings(live_trading_enabled=True, default_wallet_id=7))
+
+    async def test_add_alert_returns_ids(self):
+        self.cur.fetchone.side_effect = [(5,), (42,)]
+
+        result = await repository.add_alert(123, "ETH", 3000.0, "above")
+
+        self.assertEqual(result, (42, 5))
+        self.conn.commit.assert_called_once()
+
+    async def test_slow_query_does_not_stall_other_chats(self):
+        """A blocked query only occupies one DB worker; the loop keeps serving."""
+        release = threading.Event()
+
+        def slow(conn):
+            release.wait(2)
+            return "slow"
+
+        slow_task = asyncio.create_task(repository._query(slow))
+        self.cur.fetchall.return_value = [("ETH", "above", 3000.0)]
+        alerts = await asyncio.wait_for(repository.list_active_alerts(123), timeout=1)
+        self.assertFalse(slow_task.done())
+
+        release.set()
+        self.assertEqual(await slow_task, "slow")
+        self.assertEqual(alerts, [("ETH", "above", 3000.0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+
+from src.speculative_parse import SpeculationMetrics, describe_trade, parse_amount, trade_key, validate_trade
+
+
+def _resolve(symbol):
+    return {"address": symbol, "decimals": 18} if symbol in ("ETH", "USDC", "WBTC") else None
+
+
+class TestValidateTrade(unittest.TestCase):
+
+    def test_valid_trade(self):
+        self.assertIsNone(validate_trade({"amount": "0.5", "symbol": "eth", "currency": "usdc", "source_chain": "Arbitrum"}, _resolve))
+
+    def test_rejections(self):
+        cases = {
+            "missing_entities": {"symbol": "ETH", "currency": "USDC"},
+            "bad_amount": {"amount": "half", "symbol": "ETH", "currency": "USDC"},
+            "same_token": {"amount": 1, "symbol": "ETH", "currency": "eth"},
+            "unknown_chain": {"amount": 1, "symbol": "ETH", "currency": "USDC", "destination_chain": "solana"},
+            "unknown_token": {"amount": 1, "symbol": "PEPE", "currency": "USDC"},
+        }
+        for reason, entities in cases.items():
+            with self.subTest(reason=reason):
+                self.assertEqual(validate_trade(entities, _resolve), reason)
+
+    def test_parse_amount(self):
+        self.assertEqual(parse_amount("$1,000.50"), parse_amount(1000.5))
+        for bad in (None, True, "", "-1", 0, "nan", "inf", "abc"):
+            self.assertIsNone(parse_amount(bad))
+
+
+class TestReconciliation(unittest.TestCase):
+
+    def test_equivalent_parses_have_the_same_key(self):
+        a = {"intent": "sell_token", "entities": {"amount": "1.50", "symbol": "eth", "currency": "USDC"}}
+        b = {"intent": "sell_token", "entities": {"amount": 1.5, "symbol": "ETH", "currency": "usdc", "source_chain": "ethereum"}}
+        self.assertEqual(trade_key(a), trade_key(b))
+        self.assertEqual(describe_trade(a), "sell 1.5 ETH for USDC")
+
+    def test_metrics(self):
+        metrics = SpeculationMetrics()
+        flash = {"intent": "buy_token", "entities": {"amount": 1, "symbol": "ETH", "currency": "USDC"}}
+        metrics.record_accepted()
+        metrics.record_accepted()
+        metrics.record_rejected("bad_amount")
+        self.assertFalse(metrics.record_reconciled(flash, dict(flash)))
+        self.assertTrue(metrics.record_reconciled(flash, {"intent": "sell_token", "entities": flash["entities"]}))
+        self.assertFalse(metrics.record_reconciled(flash, {"intent": "unknown", "entities": {}}))
+
+        stats = metrics.stats()
+        self.assertAlmostEqual(stats["accept_rate"], 2 / 3)
+        self.assertEqual((stats["pro_agreed"], stats["pro_changed"], stats["pro_failed"]), (1, 1, 1))
+        self.assertEqual(stats["pro_change_rate"], 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
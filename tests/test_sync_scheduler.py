@@ -0,0 +1,142 @@
+import asyncio
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from src.sync_scheduler import ShardedSyncScheduler
+
+
+class _FakeShardTable:
+    """In-memory stand-in for sync_shards + users shared by several schedulers."""
+
+    def __init__(self, shard_count, users):
+        self.lock = threading.Lock()
+        self.shards = {i: {"pass_id": None, "owner": None, "leased": False} for i in range(shard_count)}
+        self.users = users
+        self.claims = []
+
+
+class _FakeScheduler(ShardedSyncScheduler):
+
+    def __init__(self, table, **kwargs):
+        super().__init__(**kwargs)
+        self.table = table
+
+    def _ensure_shards(self):
+        pass
+
+    def _claim_shard(self, pass_id):
+        with self.table.lock:
+            for shard_id, shard in sorted(self.table.shards.items()):
+                if (shard["pass_id"] is None or shard["pass_id"] < pass_id) and not shard["leased"]:
+                    shard.update(owner=self.node_id, leased=True)
+                    self.table.claims.append((self.node_id, shard_id))
+                    return shard_id
+        return None
+
+    def _shard_users(self, shard_id):
+        return [(pk, tg) for pk, tg in self.table.users if pk % self.shard_count == shard_id]
+
+    def _extend_lease(self, shard_id):
+        pass
+
+    def _complete_shard(self, shard_id, pass_id, synced, failed, duration_secs):
+        with self.table.lock:
+            self.table.shards[shard_id].update(pass_id=pass_id, owner=None, leased=False)
+            return sum(1 for s in self.table.shards.values() if s["pass_id"] == pass_id)
+
+
+class TestShardedSyncScheduler(unittest.IsolatedAsyncioTestCase):
+
+    def _scheduler(self, table, sync_user, node_id, now=1000.0):
+        return _FakeScheduler(
+            table,
+            sync_user=sync_user,
+            interval_secs=600,
+            shard_count=len(table.shards),
+            workers=3,
+            node_id=node_id,
+            clock=lambda: now,
+        )
+
+    async def test_every_user_synced_once_across_nodes(self):
+        users = [(pk, 1000 + pk) for pk in range(1, 41)]
+        table = _FakeShardTable(shard_count=8, users=users)
+        seen = []
+        lock = threading.Lock()
+
+        def sync_user(telegram_id):
+            with lock:
+                seen.append(telegram_id)
+            return telegram_id % 7 != 0
+
+        node_a = self._scheduler(table, sync_user, "a")
+        node_b = self._scheduler(table, sync_user, "b")
+        progress_a, progress_b = await asyncio.gather(node_a.run_pass(), node_b.run_pass())
+
+        self.assertEqual(sorted(seen), sorted(tg for _, tg in users))
+        self.assertEqual(len(table.claims), 8)
+        self.assertEqual(progress_a.shards_completed + progress_b.shards_completed, 8)
+        failed = sum(1 for _, tg in users if tg % 7 == 0)
+        self.assertEqual(progress_a.users_failed + progress_b.users_failed, failed)
+        self.assertEqual(progress_a.users_synced + progress_b.users_synced, len(users) - failed)
+
+    async def test_completed_shards_wait_for_next_pass(self):
+        table = _FakeShardTable(shard_count=2, users=[(1, 11), (2, 12)])
+        sync_user = MagicMock(return_value=True)
+
+        await self._scheduler(table, sync_user, "a", now=1000.0).run_pass()
+        await self._scheduler(table, sync_user, "a", now=1100.0).run_pass()  # same 600s window
+        self.assertEqual(sync_user.call_count, 2)
+
+        await self._scheduler(table, sync_user, "a", now=1300.0).run_pass()  # next window
+        self.assertEqual(sync_user.call_count, 4)
+
+    async def test_user_exception_counts_as_failure(self):
+        table = _FakeShardTable(shard_count=1, users=[(1, 11), (2, 12)])
+        sync_user = MagicMock(side_effect=[RuntimeError("boom"), True])
+
+        progress = await self._scheduler(table, sync_user, "a").run_pass()
+
+        self.assertEqual((progress.users_synced, progress.users_failed), (1, 1))
+
+    async def test_metrics_report_throughput_and_projection(self):
+        clock = {"now": 1200.0}
+        table = _FakeShardTable(shard_count=4, users=[(pk, pk) for pk in range(8)])
+
+        def sync_user(telegram_id):
+            clock["now"] += 1
+            return True
+
+        scheduler = _FakeScheduler(
+            table, sync_user=sync_user, interval_secs=600, shard_count=4, workers=1,
+            node_id="a", clock=lambda: clock["now"],
+        )
+        await scheduler.run_pass()
+        metrics = scheduler.metrics()
+
+        self.assertFalse(metrics["running"])
+        self.assertEqual(metrics["elapsed_secs"], 8)
+        self.assertAlmostEqual(metrics["users_per_sec"], 1.0)
+        self.assertEqual(metrics["cluster_shards_completed"], 4)
+        self.assertAlmostEqual(metrics["projected_pass_secs"], 8)
+
+    @patch('src.sync_scheduler.db_connection')
+    def test_claim_uses_skip_locked_lease(self, mock_db_connection):
+        conn = MagicMock()
+        cur = MagicMock()
+        cur.fetchone.return_value = (3,)
+        conn.cursor.return_value.__enter__.return_value = cur
+        mock_db_connection.return_value.__enter__.return_value = conn
+
+        scheduler = ShardedSyncScheduler(sync_user=MagicMock(), interval_secs=600, lease_secs=120, node_id="a")
+
+        self.assertEqual(scheduler._claim_shard(7), 3)
+        sql, params = cur.execute.call_args.args
+        self.assertIn("FOR UPDATE SKIP LOCKED", sql)
+        self.assertEqual(params, ("a", 120, 7))
+        conn.commit.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
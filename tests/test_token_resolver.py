@@ -4,14 +4,18 @@ from src.token_resolver import TokenResolver
 
 class TestTokenResolver(unittest.TestCase):
 
-    @patch('src.token_resolver.get_db_connection')
-    def test_get_token_info_success(self, mock_get_conn):
-        """Test successful resolution of token info."""
+    def _mock_db(self, mock_db_connection, rows):
         conn = MagicMock()
         cur = MagicMock()
-        cur.fetchone.return_value = ('0xeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee', 18)
+        cur.fetchall.return_value = rows
         conn.cursor.return_value.__enter__.return_value = cur
-        mock_get_conn.return_value = conn
+        mock_db_connection.return_value.__enter__.return_value = conn
+        return cur
+
+    @patch('src.token_resolver.db_connection')
+    def test_get_token_info_success(self, mock_db_connection):
+        """Test successful resolution of token info."""
+        self._mock_db(mock_db_connection, [('ETH', 1, '0xeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee', 18)])
 
         resolver = TokenResolver()
         result = resolver.get_token_info('ETH')
@@ -20,29 +24,21 @@ class TestTokenResolver(unittest.TestCase):
         self.assertEqual(result['address'], '0xeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee')
         self.assertEqual(result['decimals'], 18)
 
-    @patch('src.token_resolver.get_db_connection')
-    def test_get_token_info_not_found(self, mock_get_conn):
+    @patch('src.token_resolver.db_connection')
+    def test_get_token_info_not_found(self, mock_db_connection):
         """Test token info not found."""
-        conn = MagicMock()
-        cur = MagicMock()
-        cur.fetchone.return_value = None
-        conn.cursor.return_value.__enter__.return_value = cur
-        mock_get_conn.return_value = conn
+        self._mock_db(mock_db_connection, [])
 
         resolver = TokenResolver()
         result = resolver.get_token_info('UNKNOWN')
 
         self.assertIsNone(result)
 
-    @patch('src.token_resolver.get_db_connection')
-    def test_btc_aliases_to_wbtc(self, mock_get_conn):
+    @patch('src.token_resolver.db_connection')
+    def test_btc_aliases_to_wbtc(self, mock_db_connection):
         """BTC should resolve to WBTC address/decimals for EVM contexts."""
-        conn = MagicMock()
-        cur = MagicMock()
-        # Simulate DB miss so fallback to constants is exercised
-        cur.fetchone.return_value = None
-        conn.cursor.return_value.__enter__.return_value = cur
-        mock_get_conn.return_value = conn
+        # Simulate an empty table so fallback to constants is exercised
+        self._mock_db(mock_db_connection, [])
 
         resolver = TokenResolver()
         result = resolver.get_token_info('BTC')
@@ -52,14 +48,10 @@ class TestTokenResolver(unittest.TestCase):
         self.assertTrue(result['address'].lower().startswith('0x'))
         self.assertIn(result['decimals'], (8, 18))
 
-    @patch('src.token_resolver.get_db_connection')
-    def test_fallback_to_constants_when_db_miss(self, mock_get_conn):
+    @patch('src.token_resolver.db_connection')
+    def test_fallback_to_constants_when_db_miss(self, mock_db_connection):
         """If DB has no row, resolver should return constants when available."""
-        conn = MagicMock()
-        cur = MagicMock()
-        cur.fetchone.return_value = None
-        conn.cursor.return_value.__enter__.return_value = cur
-        mock_get_conn.return_value = conn
+        self._mock_db(mock_db_connection, [])
 
         resolver = TokenResolver()
         result = resolver.get_token_info('USDC')
@@ -67,5 +59,48 @@ class TestTokenResolver(unittest.TestCase):
         self.assertIsNotNone(result)
         self.assertEqual(result['decimals'], 6)
 
+    @patch('src.token_resolver.db_connection')
+    def test_lookups_do_not_query_the_database(self, mock_db_connection):
+        """After warm-up, lookups are served from memory, keyed by (symbol, chain_id)."""
+        self._mock_db(mock_db_connection, [
+            ('USDC', 1, '0xA0b8', 6),
+            ('USDC', 137, '0x2791', 6),
+        ])
+        resolver = TokenResolver()
+        checkouts = mock_db_connection.call_count
+
+        for _ in range(5):
+            resolver.get_token_info('usdc')
+        self.assertEqual(resolver.get_token_info('USDC', chain_id=137)['address'], '0x2791')
+        self.assertEqual(mock_db_connection.call_count, checkouts)
+
+    @patch('src.token_resolver.db_connection')
+    def test_reverse_lookup_by_address(self, mock_db_connection):
+        self._mock_db(mock_db_connection, [('LINK', 1, '0x514910771AF9Ca656af840dff83E8264EcF986CA', 18)])
+        resolver = TokenResolver()
+
+        self.assertEqual(resolver.get_symbol('0x514910771af9ca656af840dff83e8264ecf986ca'), 'LINK')
+        self.assertEqual(resolver.get_symbol('0xdac17f958d2ee523a2206206994597c13d831ec7'), 'USDT')
+        self.assertIsNone(resolver.get_symbol('0x0000000000000000000000000000000000000001'))
+
+    @patch('src.token_resolver.db_connection')
+    def test_refresh_picks_up_new_rows(self, mock_db_connection):
+        cur = self._mock_db(mock_db_connection, [])
+        resolver = TokenResolver()
+        self.assertIsNone(resolver.get_token_info('LINK'))
+
+        cur.fetchall.return_value = [('LINK', 1, '0x5149', 18)]
+        self.assertTrue(resolver.refresh())
+        self.assertEqual(resolver.get_token_info('LINK')['decimals'], 18)
+
+    @patch('src.token_resolver.db_connection')
+    def test_failed_refresh_keeps_previous_snapshot(self, mock_db_connection):
+        cur = self._mock_db(mock_db_connection, [('LINK', 1, '0x5149', 18)])
+        resolver = TokenResolver()
+
+        cur.execute.side_effect = Exception("db down")
+        self.assertFalse(resolver.refresh())
+        self.assertEqual(resolver.get_token_info('LINK')['address'], '0x5149')
+
 if __name__ == '__main__':
     unittest.main()